@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+"""
+Fill the scan summary columns (subject, preview, indicators, recommendation
+codes) for scans written before they existed, in both user_scans and
+user_scans_archive. Safe to re-run; only rows without a summary are touched.
+
+Usage:
+    python3 backfill_scan_summaries.py
+    python3 backfill_scan_summaries.py --batch-size 2000
+"""
+import argparse
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+try:
+    from src.main import create_app
+    from src.scan_summary import backfill_scan_summaries
+except ImportError:
+    from main import create_app
+    from scan_summary import backfill_scan_summaries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--batch-size', type=int, default=500, help='scans updated per transaction')
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        updated = backfill_scan_summaries(batch_size=args.batch_size)
+    print(f"Done. Summarized {updated} scans.")
+
+
+if __name__ == '__main__':
+    main()
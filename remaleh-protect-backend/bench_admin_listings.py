@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Benchmark the admin user and report listings.
+
+Seeds a throwaway SQLite database (or DATABASE_URL if set) with --users users
+(--deleted of them soft-deleted) and --reports community reports, then times
+in-process requests and counts the SQL statements each one issues:
+
+  /api/admin/users?per_page=N          first and a deep page
+  /api/admin/users/deleted             every soft-deleted user
+  /api/admin/reports?per_page=N        first and a deep page
+
+Usage:
+    python bench_admin_listings.py
+    python bench_admin_listings.py --users 100000 --reports 300000 --per-page 100
+"""
+
+import argparse
+import logging
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+os.environ.setdefault('DATABASE_URL', f"sqlite:///{tempfile.mkdtemp(prefix='remaleh_bench_')}/bench.db")
+os.environ.setdefault('RATE_LIMIT_STORAGE_URL', 'memory://')
+os.environ.setdefault('RATE_LIMIT_DEFAULT', '1000000 per minute')
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+from sqlalchemy import event, insert  # noqa: E402
+
+from main import app  # noqa: E402
+from models import db, User, CommunityReport  # noqa: E402
+from auth import create_tokens  # noqa: E402
+
+logging.getLogger('remaleh').setLevel(logging.WARNING)
+logging.getLogger('routes.admin').setLevel(logging.WARNING)
+
+THREAT_TYPES = ['phishing', 'sms_scam', 'investment', 'romance', 'tech_support', 'marketplace']
+STATUSES = ['APPROVED'] * 6 + ['VERIFIED', 'PENDING', 'REJECTED']
+
+
+def seed(users, deleted, reports, batch=50000):
+    with app.app_context():
+        if User.query.count() >= users:
+            return
+        rng = random.Random(42)
+        start = datetime.utcnow()
+        for offset in range(0, users, batch):
+            db.session.execute(insert(User.__table__), [
+                {
+                    'email': f"bench-{i}@example.com",
+                    'password_hash': 'x',
+                    'first_name': 'Bench',
+                    'last_name': str(i),
+                    'role': 'USER',
+                    'account_status': 'DELETED' if i < deleted else 'ACTIVE',
+                    'created_at': start - timedelta(seconds=i),
+                }
+                for i in range(offset, min(users, offset + batch))
+            ])
+            db.session.commit()
+            print(f"  seeded {min(users, offset + batch):,}/{users:,} users", flush=True)
+        user_ids = [u.id for u in User.query.with_entities(User.id).all()]
+        for offset in range(0, reports, batch):
+            db.session.execute(insert(CommunityReport.__table__), [
+                {
+                    'user_id': rng.choice(user_ids),
+                    'threat_type': rng.choice(THREAT_TYPES),
+                    'description': 'Benchmark report describing a scam attempt',
+                    'urgency': 'MEDIUM',
+                    'status': rng.choice(STATUSES),
+                    'created_at': start - timedelta(seconds=rng.randint(0, 365 * 86400)),
+                    'votes_up': 0,
+                    'votes_down': 0,
+                    'score': 0,
+                    'verified': False,
+                }
+                for _ in range(offset, min(reports, offset + batch))
+            ])
+            db.session.commit()
+            print(f"  seeded {min(reports, offset + batch):,}/{reports:,} reports", flush=True)
+        if db.engine.dialect.name in ('sqlite', 'postgresql'):
+            db.session.execute(db.text('ANALYZE'))
+            db.session.commit()
+
+
+def timed(client, headers, path, params, repeat):
+    with app.app_context():
+        engine = db.engine
+    statements = []
+
+    def _record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    samples = []
+    for i in range(repeat):
+        if i == 0:
+            event.listen(engine, 'before_cursor_execute', _record)
+        started = time.perf_counter()
+        response = client.get(path, headers=headers, query_string=params)
+        samples.append((time.perf_counter() - started) * 1000)
+        if i == 0:
+            event.remove(engine, 'before_cursor_execute', _record)
+        assert response.status_code == 200, response.get_data(as_text=True)
+    return statistics.median(samples), len(statements)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=100000)
+    parser.add_argument('--deleted', type=int, default=2000)
+    parser.add_argument('--reports', type=int, default=300000)
+    parser.add_argument('--per-page', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"🌱 Seeding {args.users:,} users and {args.reports:,} reports...")
+    seed(args.users, args.deleted, args.reports)
+
+    with app.app_context():
+        admin = User(email=f"bench-admin-{random.random()}@example.com", first_name='Bench', last_name='Admin',
+                     role='ADMIN', is_admin=True)
+        admin.set_password('Password123!')
+        db.session.add(admin)
+        db.session.commit()
+        token, _ = create_tokens(admin.id)
+    headers = {'Authorization': f'Bearer {token}'}
+    client = app.test_client()
+
+    deep_users = max(1, (args.users - args.deleted) // args.per_page // 2)
+    deep_reports = max(1, args.reports // args.per_page // 2)
+    cases = [
+        ('/api/admin/users', {'per_page': args.per_page, 'page': 1}),
+        ('/api/admin/users', {'per_page': args.per_page, 'page': deep_users}),
+        ('/api/admin/users/deleted', {}),
+        ('/api/admin/reports', {'per_page': args.per_page, 'page': 1}),
+        ('/api/admin/reports', {'per_page': args.per_page, 'page': deep_reports}),
+    ]
+
+    print("\n| endpoint | page | median ms | queries |")
+    print("|----------|-----:|----------:|--------:|")
+    for path, params in cases:
+        ms, queries = timed(client, headers, path, params, args.repeat)
+        print(f"| {path} | {params.get('page', '-')} | {ms:.1f} | {queries} |", flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Benchmark hard-deleting a prolific user.
+
+Seeds a throwaway SQLite database (or DATABASE_URL if set) with one user who
+has --reports community reports. Each report has a local upload, --votes
+votes and comments from other users, and point logs. Then it calls
+DELETE /api/admin/users/<id>/hard-delete. If the endpoint answers 202, the
+benchmark waits for the deletion job to finish.
+
+Reports:
+  request ms        time until the endpoint answered
+  total ms          time until the user and their data were gone
+  transactions      committed transactions that did the work
+  longest txn ms    longest single transaction (how long locks were held)
+
+Usage:
+    python bench_bulk_delete.py
+    python bench_bulk_delete.py --reports 5000 --votes 5
+"""
+
+import argparse
+import logging
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+os.environ.setdefault('DATABASE_URL', f"sqlite:///{tempfile.mkdtemp(prefix='remaleh_bench_')}/bench.db")
+os.environ.setdefault('RATE_LIMIT_STORAGE_URL', 'memory://')
+os.environ.setdefault('RATE_LIMIT_DEFAULT', '1000000 per minute')
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+from sqlalchemy import event, insert  # noqa: E402
+
+from main import app  # noqa: E402
+from models import (db, User, CommunityReport, CommunityReportMedia, CommunityReportComment,  # noqa: E402
+                    ReportVote, UserPointLog)
+from auth import create_tokens  # noqa: E402
+
+logging.getLogger('remaleh').setLevel(logging.WARNING)
+
+
+def seed(reports, votes, upload_folder, batch=1000):
+    rng = random.Random(7)
+    now = datetime.utcnow()
+    with app.app_context():
+        suffix = rng.random()
+        admin = User(email=f"bench-admin-{suffix}@example.com", role='ADMIN', is_admin=True)
+        target = User(email=f"bench-target-{suffix}@example.com", first_name='Prolific')
+        voters = [User(email=f"bench-voter-{suffix}-{i}@example.com") for i in range(votes)]
+        for user in [admin, target] + voters:
+            user.set_password('Password123!')
+            db.session.add(user)
+        db.session.commit()
+        voter_ids = [v.id for v in voters]
+        for offset in range(0, reports, batch):
+            count = min(batch, reports - offset)
+            db.session.execute(insert(CommunityReport.__table__), [
+                {'user_id': target.id, 'threat_type': rng.choice(['PHISHING', 'SMS_SCAM']),
+                 'description': 'Scam description ' * 20, 'status': 'APPROVED', 'urgency': 'MEDIUM',
+                 'created_at': now, 'votes_up': votes, 'votes_down': 0, 'score': votes}
+                for _ in range(count)
+            ])
+            ids = [r.id for r in db.session.query(CommunityReport.id).filter_by(user_id=target.id)
+                   .order_by(CommunityReport.id.desc()).limit(count)]
+            media = []
+            for report_id in ids:
+                filename = f"bench-{report_id}.png"
+                with open(os.path.join(upload_folder, filename), 'wb') as f:
+                    f.write(b'png')
+                media.append({'report_id': report_id, 'media_url': f"/api/community/uploads/{filename}",
+                              'media_type': 'image', 'created_at': now})
+            db.session.execute(insert(CommunityReportMedia.__table__), media)
+            db.session.execute(insert(ReportVote.__table__), [
+                {'report_id': rid, 'user_id': uid, 'vote_type': 'up', 'created_at': now}
+                for rid in ids for uid in voter_ids
+            ])
+            db.session.execute(insert(CommunityReportComment.__table__), [
+                {'report_id': rid, 'user_id': uid, 'comment': 'Thanks!', 'created_at': now}
+                for rid in ids for uid in voter_ids
+            ])
+            db.session.execute(insert(UserPointLog.__table__), [
+                {'user_id': target.id, 'report_id': rid, 'points': 5, 'reason': 'report approved', 'created_at': now}
+                for rid in ids
+            ])
+            db.session.commit()
+        token, _ = create_tokens(admin.id)
+        return target.id, token
+
+
+class TransactionTimer:
+    """Wall time of every committed transaction that deleted rows, from any thread"""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.started = {}
+        self.deleting = set()
+        self.durations = []
+        self.lock = threading.Lock()
+
+    def _begin(self, conn):
+        self.started[id(conn)] = time.perf_counter()
+
+    def _execute(self, conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('DELETE'):
+            self.deleting.add(id(conn))
+
+    def _commit(self, conn):
+        began = self.started.pop(id(conn), None)
+        if began is not None and id(conn) in self.deleting:
+            self.deleting.discard(id(conn))
+            with self.lock:
+                self.durations.append((time.perf_counter() - began) * 1000)
+
+    def __enter__(self):
+        event.listen(self.engine, 'begin', self._begin)
+        event.listen(self.engine, 'before_cursor_execute', self._execute)
+        event.listen(self.engine, 'commit', self._commit)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, 'begin', self._begin)
+        event.remove(self.engine, 'before_cursor_execute', self._execute)
+        event.remove(self.engine, 'commit', self._commit)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--reports', type=int, default=2000)
+    parser.add_argument('--votes', type=int, default=5, help='votes and comments per report')
+    args = parser.parse_args()
+
+    upload_folder = tempfile.mkdtemp(prefix='remaleh_bench_uploads_')
+    app.config['UPLOAD_FOLDER'] = upload_folder
+    print(f"🌱 Seeding {args.reports:,} reports with {args.votes} votes and comments each...")
+    user_id, token = seed(args.reports, args.votes, upload_folder)
+    client = app.test_client()
+    headers = {'Authorization': f'Bearer {token}'}
+    with app.app_context():
+        engine = db.engine
+
+    with TransactionTimer(engine) as timer:
+        started = time.perf_counter()
+        response = client.delete(f"/api/admin/users/{user_id}/hard-delete", headers=headers)
+        request_ms = (time.perf_counter() - started) * 1000
+        assert response.status_code in (200, 202), response.get_data(as_text=True)
+        if response.status_code == 202:
+            job_id = response.get_json()['job']['id']
+            while True:
+                job = client.get(f"/api/admin/deletion-jobs/{job_id}", headers=headers).get_json()['job']
+                if job['status'] in ('done', 'failed'):
+                    assert job['status'] == 'done', job
+                    break
+                time.sleep(0.01)
+        total_ms = (time.perf_counter() - started) * 1000
+        # Wait for queued media removals so they don't overlap the next run
+        while os.listdir(upload_folder):
+            time.sleep(0.05)
+        media_ms = (time.perf_counter() - started) * 1000
+
+    with app.app_context():
+        assert db.session.get(User, user_id) is None
+    work = timer.durations
+    print("\n| request ms | total ms | files removed ms | transactions | longest txn ms |")
+    print("|-----------:|---------:|-----------------:|-------------:|---------------:|")
+    print(f"| {request_ms:.0f} | {total_ms:.0f} | {media_ms:.0f} | {len(work)} | {max(work):.0f} |")
+
+
+if __name__ == "__main__":
+    main()
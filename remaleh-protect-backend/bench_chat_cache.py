@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Benchmark the chat assistant's answer cache.
+
+Replays a stream of questions against a local OpenAI-compatible stub that
+answers after --delay seconds. The stream draws from --questions distinct
+questions with a Zipf-like skew, each asked in one of a few wordings (case,
+punctuation, filler words), from --concurrency clients at once. "before"
+asks upstream for every question, which is what every chat request used to
+do; "exact" caches by normalised question and coalesces identical in-flight
+questions; "similar" also answers reworded questions at
+CHAT_CACHE_SIMILARITY 0.9 and 0.8. The stub echoes the question, so an
+answer given to a different question is counted as wrong.
+
+Reports upstream calls, hit rate, estimated cost, wall time, and the
+lookup cost of a hit and of a similarity miss with a full cache.
+
+Usage:
+    python bench_chat_cache.py
+    python bench_chat_cache.py --requests 5000 --questions 200 --delay 0.05
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from openai import OpenAI
+
+os.environ.setdefault('DATABASE_URL', f"sqlite:///{tempfile.mkdtemp(prefix='remaleh_bench_')}/bench.db")
+os.environ.setdefault('RATE_LIMIT_STORAGE_URL', 'memory://')
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+from main import app  # noqa: E402
+import chat_cache  # noqa: E402
+import routes.chat as chat  # noqa: E402
+
+SENDERS = ['my bank', 'the tax office', 'a parcel company', 'my phone provider', 'a crypto exchange', 'my boss',
+           'a dating match', 'a charity', 'my energy company', 'a recruiter']
+ASKS = ['a refund', 'gift cards', 'my login code', 'a missed delivery fee', 'my card details', 'a remote access app',
+        'an urgent transfer', 'a prize claim', 'a password reset', 'an overdue invoice']
+WORDINGS = ['Is this {} a scam?', 'is this {} a scam', 'Is this {} a scam or not?', 'IS THIS {} A SCAM??']
+_calls = []
+
+
+class Stub(BaseHTTPRequestHandler):
+    delay = 0.1
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        _calls.append(body['model'])
+        time.sleep(Stub.delay)
+        data = json.dumps({
+            'id': 'chatcmpl-bench', 'object': 'chat.completion', 'created': int(time.time()), 'model': body['model'],
+            'choices': [{'index': 0, 'finish_reason': 'stop',
+                         'message': {'role': 'assistant', 'content': body['messages'][-1]['content']}}],
+            'usage': {'prompt_tokens': 220, 'completion_tokens': 180, 'total_tokens': 400},
+        }).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+def _stream(count, questions, seed=7):
+    rng = random.Random(seed)
+    pairs = [(sender, ask) for sender in SENDERS for ask in ASKS]
+    bases = [f"message from {sender} asking for {ask}" for sender, ask in rng.sample(pairs, min(questions, len(pairs)))]
+    weights = [1 / (rank + 1) for rank in range(questions)]
+    return [(base, rng.choice(WORDINGS).format(base)) for base in rng.choices(bases, weights, k=count)]
+
+
+def _run(mode, similarity, stream, concurrency):
+    _calls.clear()
+    chat_cache.clear()
+    app.config['CHAT_CACHE_SECONDS'] = 0 if mode == 'before' else 3600
+    app.config['CHAT_CACHE_SIMILARITY'] = similarity
+
+    def ask(item):
+        base, message = item
+        with app.app_context():
+            return base.casefold() not in chat_cache.normalize_question(chat.get_openai_response(message))
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        wrong = sum(pool.map(ask, stream))
+    elapsed = time.perf_counter() - started
+    stats = chat_cache.stats()
+    upstream_cost = len(_calls) * (0.22 * 0.03 + 0.18 * 0.06)
+    hit_rate = 1 - len(_calls) / len(stream)
+    return mode, len(_calls), hit_rate, wrong, upstream_cost, stats['cost_saved_usd'], elapsed
+
+
+def _lookup_us(entries):
+    chat_cache.clear()
+    app.config['CHAT_CACHE_SIMILARITY'] = 0.8
+    with app.app_context():
+        for i in range(entries):
+            sender, ask = SENDERS[i % len(SENDERS)], ASKS[i // len(SENDERS) % len(ASKS)]
+            chat_cache._remember(chat_cache.question_key(f"question {i}"), f"message {i} from {sender} asking for {ask}",
+                                 {'text': 'answer'}, 3600)
+        hit = chat_cache.normalize_question('Is this message from my bank asking for a refund a scam?')
+        miss = 'what should i do about a completely different thing'
+        chat_cache._remember(chat_cache.question_key(hit), hit, {'text': 'answer'}, 3600)
+        timings = []
+        for question in (hit, miss):
+            started = time.perf_counter()
+            for _ in range(200):
+                chat_cache.get_answer(question, lambda q: None)
+            timings.append((time.perf_counter() - started) / 200 * 1e6)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--questions', type=int, default=100)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--delay', type=float, default=0.1)
+    parser.add_argument('--entries', type=int, default=5000)
+    args = parser.parse_args()
+
+    Stub.delay = args.delay
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Stub)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    chat.client = OpenAI(api_key='bench', base_url=f"http://127.0.0.1:{server.server_port}/v1", max_retries=0)
+
+    stream = _stream(args.requests, args.questions)
+    modes = [('before', 0), ('exact', 0), ('similar 0.9', 0.9), ('similar 0.8', 0.8)]
+    rows = [_run(mode, similarity, stream, args.concurrency) for mode, similarity in modes]
+    hit_us, miss_us = _lookup_us(args.entries)
+
+    print(f"\n{args.requests} questions, {args.questions} distinct x {len(WORDINGS)} wordings, "
+          f"concurrency {args.concurrency}, upstream {args.delay * 1000:.0f} ms")
+    print("\n| mode | upstream calls | answered without a call | wrong answers | upstream cost $ | cost saved $ | wall s |")
+    print("|------|---------------:|------------------------:|--------------:|----------------:|-------------:|-------:|")
+    for mode, calls, hit_rate, wrong, cost, saved, elapsed in rows:
+        print(f"| {mode} | {calls:,} | {hit_rate:.1%} | {wrong} | {cost:.2f} | {saved:.2f} | {elapsed:.1f} |")
+    print(f"\nLookup with {args.entries:,} cached questions (similarity on): "
+          f"hit {hit_us:.0f} µs, similarity miss {miss_us:.0f} µs")
+    app.config['CHAT_CACHE_SECONDS'] = 21600
+    app.config['CHAT_CACHE_SIMILARITY'] = 0
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Benchmark time to first byte of chat answers, streamed and not.
+
+The app is served over HTTP by a threaded werkzeug server, in front of a
+local OpenAI-compatible stub that takes --first-ms before the first token
+and --token-ms per token after it, for --tokens tokens (one word each).
+"before" is POST /api/chat/, which returns once the whole answer is
+generated; "after" is POST /api/chat/stream, which relays the answer over
+server-sent events. The answer cache is off so every request reaches the
+stub.
+
+Reports, over --runs requests each: median time to the first byte of the
+response body, to the first answer text, and to the complete answer.
+
+Usage:
+    python bench_chat_stream.py
+    python bench_chat_stream.py --tokens 200 --token-ms 15 --runs 10
+"""
+
+import argparse
+import http.client
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from openai import OpenAI
+from werkzeug.serving import make_server
+
+os.environ.setdefault('DATABASE_URL', f"sqlite:///{tempfile.mkdtemp(prefix='remaleh_bench_')}/bench.db")
+os.environ.setdefault('RATE_LIMIT_STORAGE_URL', 'memory://')
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+from main import app  # noqa: E402
+import routes.chat as chat  # noqa: E402
+
+WORDS = ['Banks', 'never', 'ask', 'for', 'your', 'password', 'or', 'codes', 'by', 'text;', 'call', 'the', 'number',
+         'printed', 'on', 'your', 'card', 'and', 'ask', 'them.']
+
+
+class Stub(BaseHTTPRequestHandler):
+    tokens, first, per_token = 80, 0.4, 0.02
+
+    def _write(self, payload):
+        self.wfile.write(f"data: {json.dumps(payload)}\n\n".encode())
+        self.wfile.flush()
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        words = [WORDS[i % len(WORDS)] + ' ' for i in range(Stub.tokens)]
+        chunk = {'id': 'chatcmpl-bench', 'object': 'chat.completion.chunk', 'created': int(time.time()),
+                 'model': body['model']}
+        time.sleep(Stub.first)
+        if not body.get('stream'):
+            time.sleep(Stub.per_token * (Stub.tokens - 1))
+            data = json.dumps({**chunk, 'object': 'chat.completion', 'choices': [
+                {'index': 0, 'finish_reason': 'stop', 'message': {'role': 'assistant', 'content': ''.join(words)}}]
+            }).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.end_headers()
+        for i, word in enumerate(words):
+            if i:
+                time.sleep(Stub.per_token)
+            self._write({**chunk, 'choices': [{'index': 0, 'delta': {'content': word}, 'finish_reason': None}]})
+        self._write({**chunk, 'choices': [{'index': 0, 'delta': {}, 'finish_reason': 'stop'}]})
+        self.wfile.write(b"data: [DONE]\n\n")
+
+    def log_message(self, *args):
+        pass
+
+
+def _timed_post(port, path, message):
+    """(first body byte, first answer text, complete) seconds for one request"""
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    started = time.perf_counter()
+    conn.request('POST', path, json.dumps({'message': message}), {'Content-Type': 'application/json'})
+    response = conn.getresponse()
+    first_byte = first_text = None
+    while True:
+        data = response.read1(65536)
+        if not data:
+            break
+        now = time.perf_counter() - started
+        first_byte = first_byte if first_byte is not None else now
+        if first_text is None and (b'"delta"' in data or b'"response"' in data):
+            first_text = now
+    complete = time.perf_counter() - started
+    conn.close()
+    return first_byte, first_text, complete
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tokens', type=int, default=80)
+    parser.add_argument('--first-ms', type=float, default=400)
+    parser.add_argument('--token-ms', type=float, default=20)
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    Stub.tokens, Stub.first, Stub.per_token = args.tokens, args.first_ms / 1000, args.token_ms / 1000
+    stub = ThreadingHTTPServer(('127.0.0.1', 0), Stub)
+    threading.Thread(target=stub.serve_forever, daemon=True).start()
+    chat.client = OpenAI(api_key='bench', base_url=f"http://127.0.0.1:{stub.server_port}/v1", max_retries=0)
+    app.config['CHAT_CACHE_SECONDS'] = 0
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    rows = []
+    for label, path in (('before: POST /api/chat/', '/api/chat/'), ('after: POST /api/chat/stream', '/api/chat/stream')):
+        _timed_post(server.server_port, path, 'Is this text from my bank a scam?')
+        timings = [_timed_post(server.server_port, path, f'Is this text number {i} from my bank a scam?')
+                   for i in range(args.runs)]
+        rows.append((label, *(statistics.median(column) * 1000 for column in zip(*timings))))
+    server.shutdown()
+
+    print(f"\nStub: {args.first_ms:.0f} ms to first token, then {args.tokens} tokens at {args.token_ms:.0f} ms; "
+          f"median of {args.runs} requests")
+    print("\n| endpoint | first byte ms | first answer text ms | complete ms |")
+    print("|----------|--------------:|---------------------:|------------:|")
+    for label, first_byte, first_text, complete in rows:
+        print(f"| {label} | {first_byte:.0f} | {first_text:.0f} | {complete:.0f} |")
+    app.config['CHAT_CACHE_SECONDS'] = 21600
+
+
+if __name__ == "__main__":
+    main()
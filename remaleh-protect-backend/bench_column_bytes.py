@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Measure how many bytes of column data each endpoint reads from the database.
+
+Seeds a throwaway SQLite database (or DATABASE_URL if set, e.g. PostgreSQL)
+with learning modules carrying full lesson JSON, users with bios, community
+reports with long descriptions and one user's scan history. For each
+endpoint it records every SELECT the request issues, replays them on a raw
+DBAPI cursor and sums the size of the returned values (text, JSON and bytes
+by length, other values by their text form, which is what PostgreSQL's text
+protocol sends). Reports statements and bytes per request.
+
+Usage:
+    python bench_column_bytes.py
+    DATABASE_URL=postgresql://... python bench_column_bytes.py --users 5000
+"""
+
+import argparse
+import logging
+import os
+import random
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+os.environ.setdefault('DATABASE_URL', f"sqlite:///{tempfile.mkdtemp(prefix='remaleh_bench_')}/bench.db")
+os.environ.setdefault('RATE_LIMIT_STORAGE_URL', 'memory://')
+os.environ.setdefault('RATE_LIMIT_DEFAULT', '1000000 per minute')
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+from sqlalchemy import event, insert  # noqa: E402
+
+from main import app  # noqa: E402
+from models import db, User, CommunityReport, LearningModule, UserScan  # noqa: E402
+from auth import create_tokens  # noqa: E402
+
+logging.getLogger('remaleh').setLevel(logging.WARNING)
+logging.getLogger('routes.admin').setLevel(logging.WARNING)
+logging.getLogger('routes.learning_content').setLevel(logging.WARNING)
+
+
+def seed(modules, users, reports, scans):
+    rng = random.Random(11)
+    now = datetime.utcnow()
+    with app.app_context():
+        for m in range(modules):
+            db.session.add(LearningModule(
+                title=f"Bench module {m}", description='Benchmark module', difficulty='BEGINNER', estimated_time=20,
+                content={'lessons': [
+                    {'id': i, 'title': f"Lesson {i}", 'type': 'info', 'duration': 5,
+                     'content': 'Lesson body text explaining a scam technique. ' * 25}
+                    for i in range(1, 31)
+                ]},
+            ))
+        db.session.commit()
+        db.session.execute(insert(User.__table__), [
+            {'email': f"bytes-{i}-{rng.random()}@example.com", 'password_hash': 'x', 'first_name': 'Bench',
+             'last_name': str(i), 'role': 'USER', 'account_status': 'ACTIVE', 'is_admin': False,
+             'bio': 'Community member who reports scams they come across. ' * 10,
+             'created_at': now - timedelta(seconds=i)}
+            for i in range(users)
+        ])
+        admin = User(email=f"bytes-admin-{rng.random()}@example.com", first_name='Bench', last_name='Admin',
+                     role='ADMIN', is_admin=True, bio='Administrator. ' * 30)
+        admin.set_password('Password123!')
+        db.session.add(admin)
+        db.session.commit()
+        user_ids = [u.id for u in User.query.with_entities(User.id).all()]
+        db.session.execute(insert(CommunityReport.__table__), [
+            {'user_id': admin.id if i < 50 else rng.choice(user_ids), 'threat_type': 'phishing',
+             'description': 'Detailed account of the scam attempt, the messages received and links. ' * 20,
+             'urgency': 'MEDIUM', 'status': 'APPROVED', 'created_at': now - timedelta(minutes=i),
+             'votes_up': 0, 'votes_down': 0, 'score': 0, 'verified': False}
+            for i in range(reports)
+        ])
+        for i in range(scans):
+            db.session.add(UserScan(
+                user_id=admin.id, message='Forwarded email body text. ' * 150, risk_level='SUSPICIOUS',
+                risk_score=60, threat_type='EMAIL_FORWARD', scanned_at=now - timedelta(hours=i),
+                analysis_result={'indicators': ['Urgency', 'Prize claim', 'Link'], 'patterns': ['url'],
+                                 'debug_info': {'subject': f"Subject {i}", 'preview': 'Preview ' * 20,
+                                                'keyword_hits': {f"k{k}": k for k in range(100)}}},
+            ))
+        db.session.commit()
+        token, _ = create_tokens(admin.id)
+        return admin.id, token
+
+
+def _value_size(value):
+    if value is None:
+        return 0
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return len(value)
+    return len(str(value).encode('utf-8'))
+
+
+def measure(client, headers, path, params):
+    with app.app_context():
+        engine = db.engine
+    statements = []
+
+    def _record(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    event.listen(engine, 'before_cursor_execute', _record)
+    try:
+        response = client.get(path, headers=headers, query_string=params)
+    finally:
+        event.remove(engine, 'before_cursor_execute', _record)
+    assert response.status_code == 200, response.get_data(as_text=True)
+
+    total = 0
+    raw = engine.raw_connection()
+    try:
+        cursor = raw.cursor()
+        for statement, parameters in statements:
+            if not statement.lstrip().upper().startswith('SELECT'):
+                continue
+            cursor.execute(statement, parameters)
+            total += sum(_value_size(v) for row in cursor.fetchall() for v in row)
+    finally:
+        raw.close()
+    return len(statements), total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--modules', type=int, default=20)
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--reports', type=int, default=5000)
+    parser.add_argument('--scans', type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"🌱 Seeding {args.modules} modules, {args.users:,} users, {args.reports:,} reports, {args.scans} scans...")
+    admin_id, token = seed(args.modules, args.users, args.reports, args.scans)
+    client = app.test_client()
+    headers = {'Authorization': f'Bearer {token}'}
+
+    cases = [
+        ('/api/learning/progress/overview', {}),
+        ('/api/learning/modules', {}),
+        ('/api/admin/users', {'per_page': 100}),
+        (f"/api/admin/users/{admin_id}", {}),
+        ('/api/admin/reports', {'per_page': 100}),
+        ('/api/community/reports', {'per_page': 20}),
+        ('/api/auth/profile/activity', {}),
+        ('/api/enhanced-scam/recent-scans', {'limit': 50}),
+    ]
+    print("\n| endpoint | queries | bytes read |")
+    print("|----------|--------:|-----------:|")
+    for path, params in cases:
+        queries, size = measure(client, headers, path, params)
+        label = path.replace(str(admin_id), '<id>')
+        print(f"| {label} | {queries} | {size:,} |", flush=True)
+
+
+if __name__ == "__main__":
+    main()
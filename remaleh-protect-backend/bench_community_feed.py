@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Benchmark community feed page latency: OFFSET pagination vs keyset cursors.
+
+Seeds a throwaway SQLite database (or DATABASE_URL if set) with --reports
+community reports, then times GET /api/community/reports in-process at
+increasing depths for the "newest" and "top" sorts:
+
+  offset+count  ?page=N                        (previous behaviour)
+  offset        ?page=N&include_total=false
+  cursor        ?cursor=<cursor at the same position>
+
+Usage:
+    python bench_community_feed.py
+    python bench_community_feed.py --reports 100000 --repeat 3
+"""
+
+import argparse
+import logging
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+os.environ.setdefault('DATABASE_URL', f"sqlite:///{tempfile.mkdtemp(prefix='remaleh_bench_')}/bench.db")
+os.environ.setdefault('RATE_LIMIT_STORAGE_URL', 'memory://')
+os.environ.setdefault('RATE_LIMIT_DEFAULT', '1000000 per minute')
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+from sqlalchemy import insert  # noqa: E402
+
+from main import app  # noqa: E402
+from models import db, User, CommunityReport  # noqa: E402
+from auth import create_tokens  # noqa: E402
+from pagination import encode_cursor  # noqa: E402
+
+logging.getLogger('remaleh').setLevel(logging.WARNING)
+
+THREAT_TYPES = ['phishing', 'sms_scam', 'investment', 'romance', 'tech_support', 'marketplace']
+URGENCIES = ['LOW', 'MEDIUM', 'HIGH']
+STATUSES = ['APPROVED'] * 8 + ['VERIFIED', 'PENDING']
+
+
+def seed(total, users=1000, batch=50000):
+    with app.app_context():
+        existing = CommunityReport.query.count()
+        if existing >= total:
+            return
+        db.session.execute(insert(User.__table__), [
+            {'email': f"bench-{i}-{random.random()}@example.com", 'password_hash': 'x', 'first_name': 'Bench', 'last_name': str(i)}
+            for i in range(users)
+        ])
+        user_ids = [u.id for u in User.query.with_entities(User.id).all()]
+        start = datetime.utcnow()
+        rng = random.Random(42)
+        remaining = total - existing
+        while remaining > 0:
+            rows = []
+            for _ in range(min(batch, remaining)):
+                up, down = rng.randint(0, 40), rng.randint(0, 10)
+                rows.append({
+                    'user_id': rng.choice(user_ids),
+                    'threat_type': rng.choice(THREAT_TYPES),
+                    'description': 'Benchmark report describing a scam attempt',
+                    'urgency': rng.choice(URGENCIES),
+                    'status': rng.choice(STATUSES),
+                    'created_at': start - timedelta(seconds=rng.randint(0, 365 * 86400)),
+                    'votes_up': up,
+                    'votes_down': down,
+                    'score': up - down,
+                    'verified': False,
+                })
+            db.session.execute(insert(CommunityReport.__table__), rows)
+            db.session.commit()
+            remaining -= len(rows)
+            print(f"  seeded {total - remaining:,}/{total:,}", flush=True)
+        if db.engine.dialect.name in ('sqlite', 'postgresql'):
+            db.session.execute(db.text('ANALYZE'))
+            db.session.commit()
+
+
+def cursor_at(sort_columns, offset):
+    """Cursor that resumes the visible feed after `offset` rows"""
+    with app.app_context():
+        row = CommunityReport.query.filter(CommunityReport.status.in_(['APPROVED', 'VERIFIED'])).order_by(
+            *[c.desc() for c in sort_columns]
+        ).offset(offset - 1).limit(1).first()
+        return encode_cursor([getattr(row, c.key) for c in sort_columns])
+
+
+def timed(client, headers, params, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        response = client.get('/api/community/reports', headers=headers, query_string=params)
+        samples.append((time.perf_counter() - started) * 1000)
+        assert response.status_code == 200, response.get_data(as_text=True)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--reports', type=int, default=1000000)
+    parser.add_argument('--per-page', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"🌱 Seeding {args.reports:,} reports...")
+    seed(args.reports)
+
+    with app.app_context():
+        user_id = User.query.with_entities(User.id).first()[0]
+        token, _ = create_tokens(user_id)
+    headers = {'Authorization': f'Bearer {token}'}
+    client = app.test_client()
+
+    sorts = {
+        'newest': [CommunityReport.created_at, CommunityReport.id],
+        'top': [CommunityReport.score, CommunityReport.created_at, CommunityReport.id],
+    }
+    pages = [1, 10, 1000, max(1, int(args.reports * 0.8) // args.per_page)]
+
+    print("\n| sort | page | offset+count ms | offset ms | cursor ms |")
+    print("|------|-----:|----------------:|----------:|----------:|")
+    for sort, columns in sorts.items():
+        for page in pages:
+            base = {'sort': sort, 'per_page': args.per_page}
+            offset_count = timed(client, headers, {**base, 'page': page}, args.repeat)
+            offset_only = timed(client, headers, {**base, 'page': page, 'include_total': 'false'}, args.repeat)
+            cursor = '' if page == 1 else cursor_at(columns, (page - 1) * args.per_page)
+            keyset = timed(client, headers, {**base, 'cursor': cursor}, args.repeat)
+            print(f"| {sort} | {page:,} | {offset_count:.1f} | {offset_only:.1f} | {keyset:.1f} |", flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Benchmark disposable-domain checks at registration.
+
+"before" is the check registration used to run: rebuild a set from the
+built-in domains plus the comma-separated DISPOSABLE_EMAIL_DOMAINS setting
+on every call, then test the exact domain. "after" is the DomainList
+lookup (domain_index.py), whose index is built once. Lists of --sizes
+synthetic domains are passed through the setting for "before" and through
+DISPOSABLE_DOMAINS_FILE for "after".
+
+Reports per list size: µs per check for each, and the one-off time to
+build the index from the file.
+
+Usage:
+    python bench_disposable_domains.py
+    python bench_disposable_domains.py --sizes 1000 100000 --checks 2000
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+os.environ.setdefault('DATABASE_URL', f"sqlite:///{tempfile.mkdtemp(prefix='remaleh_bench_')}/bench.db")
+os.environ.setdefault('RATE_LIMIT_STORAGE_URL', 'memory://')
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+from main import app  # noqa: E402
+from domain_index import DISPOSABLE_DOMAINS_DEFAULT, DomainList  # noqa: E402
+
+# Registration emails: mostly ordinary providers, some listed domains and subdomains
+DOMAINS = ['gmail.com', 'outlook.com', 'mail.company.com.au', 'mailinator.com', 'inbox.eu.mailinator.com',
+           'bigpond.net.au', 'yopmail.com', 'student.uni.edu.au']
+
+
+def before_check(domain, extra):
+    """The check registration used to run, copied from routes/auth.py"""
+    domain = domain.lower()
+    disposable = set(DISPOSABLE_DOMAINS_DEFAULT)
+    if extra:
+        for d in str(extra).split(','):
+            d = d.strip().lower()
+            if d:
+                disposable.add(d)
+    return domain in disposable
+
+
+def per_check_us(check, count):
+    started = time.perf_counter()
+    for i in range(count):
+        check(DOMAINS[i % len(DOMAINS)])
+    return (time.perf_counter() - started) / count * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[12, 1000, 50000])
+    parser.add_argument('--checks', type=int, default=1000)
+    args = parser.parse_args()
+
+    rows = []
+    for size in args.sizes:
+        synthetic = [f"temp{i}-mail.example" for i in range(max(size - len(DISPOSABLE_DOMAINS_DEFAULT), 0))]
+        path = os.path.join(tempfile.mkdtemp(prefix='remaleh_bench_'), 'disposable.txt')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(synthetic) + '\n')
+        extra = ','.join(synthetic)
+        domains = DomainList(DISPOSABLE_DOMAINS_DEFAULT, 'BENCH_DOMAINS_FILE')
+        app.config['BENCH_DOMAINS_FILE'] = path
+        with app.app_context():
+            started = time.perf_counter()
+            domains.index()
+            build_ms = (time.perf_counter() - started) * 1000
+            # Fewer "before" checks for large lists: each one rebuilds the whole set
+            before = per_check_us(lambda d: before_check(d, extra), max(args.checks * 100 // max(size, 100), 20))
+            after = per_check_us(lambda d: d in domains, args.checks * 100)
+        rows.append((size, before, after, build_ms))
+
+    print("\n| domains | before µs/check | after µs/check | index build ms (once) |")
+    print("|--------:|----------------:|---------------:|---------------------:|")
+    for size, before, after, build_ms in rows:
+        print(f"| {size:,} | {before:,.1f} | {after:.2f} | {build_ms:.1f} |")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Benchmark password-reset emails against a slow SMTP relay.
+
+Starts the SMTP stand-in from test_email_outbox.py with --delay seconds
+added to its greeting and to the login, like a remote relay doing a TLS
+handshake. Then it sends --requests POST /api/auth/request-password-reset
+requests from --clients concurrent clients.
+
+Reports:
+  request p50 / p95 ms   how long a request took to answer
+  delivered s            time until the relay had received every message
+  connections            SMTP connections opened (each one a greeting and login)
+
+Usage:
+    python bench_email_outbox.py
+    python bench_email_outbox.py --requests 200 --delay 0.2 --clients 8
+"""
+
+import argparse
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+os.environ.setdefault('DATABASE_URL', f"sqlite:///{tempfile.mkdtemp(prefix='remaleh_bench_')}/bench.db")
+os.environ.setdefault('RATE_LIMIT_STORAGE_URL', 'memory://')
+os.environ.setdefault('RATE_LIMIT_DEFAULT', '1000000 per minute')
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+from sqlalchemy import insert  # noqa: E402
+
+from main import app  # noqa: E402
+from models import db, User  # noqa: E402
+from config import Config  # noqa: E402
+from test_email_outbox import SmtpStandIn  # noqa: E402
+
+# The test module shortens this; benchmark the configured sender
+app.config['EMAIL_SMTP_IDLE_SECONDS'] = Config.EMAIL_SMTP_IDLE_SECONDS
+
+logging.getLogger('remaleh').setLevel(logging.WARNING)
+
+
+def seed(count):
+    emails = [f"bench-mail-{uuid.uuid4().hex[:10]}@example.com" for _ in range(count)]
+    with app.app_context():
+        user = User(email='hash@example.com')
+        user.set_password('Password123!')
+        db.session.execute(insert(User.__table__), [
+            {'email': email, 'password_hash': user.password_hash, 'first_name': 'Bench', 'is_active': True}
+            for email in emails
+        ])
+        db.session.commit()
+    return emails
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=100)
+    parser.add_argument('--clients', type=int, default=4)
+    parser.add_argument('--delay', type=float, default=0.1, help='seconds added to SMTP greeting and login')
+    args = parser.parse_args()
+
+    smtp = SmtpStandIn(delay=args.delay)
+    smtp.configure(app.config)
+    emails = seed(args.requests)
+    print(f"📧 {args.requests} password resets from {args.clients} clients, relay delay {args.delay}s...")
+
+    def reset(email):
+        started = time.perf_counter()
+        response = app.test_client().post('/api/auth/request-password-reset', json={'email': email})
+        assert response.status_code == 200, response.get_data(as_text=True)
+        return (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(args.clients) as pool:
+        latencies = sorted(pool.map(reset, emails))
+    deadline = time.time() + 300
+    while len(smtp.messages) < args.requests and time.time() < deadline:
+        time.sleep(0.01)
+    delivered = time.perf_counter() - started
+    assert len(smtp.messages) == args.requests, f"only {len(smtp.messages)} delivered"
+    smtp.stop()
+
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    print("\n| request p50 ms | request p95 ms | delivered s | connections |")
+    print("|---------------:|---------------:|------------:|------------:|")
+    print(f"| {statistics.median(latencies):.0f} | {p95:.0f} | {delivered:.2f} | {smtp.connections} |")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Benchmark the chat assistant's rule-based routing.
+
+"before" is the path chat messages used to take, copied from routes/chat.py:
+the escalation keyword lists, country detection, the country-context list
+and the rule and knowledge-base keywords, each scanned with its own
+``keyword in message.lower()`` loops. "after" is route_message() and
+get_local_reply(), one scan with the compiled IntentRouter. Both run over
+the same messages, and their replies are compared.
+
+The knowledge base is then extended with --extra synthetic categories of 6
+keywords each, to show how each path grows with it.
+
+Reports µs per message for each, on messages that match a rule early, late
+or not at all (those go on to the model, and are the slowest before).
+
+Usage:
+    python bench_intent_router.py
+    python bench_intent_router.py --extra 500 --rounds 2000
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+os.environ.setdefault('DATABASE_URL', f"sqlite:///{tempfile.mkdtemp(prefix='remaleh_bench_')}/bench.db")
+os.environ.setdefault('RATE_LIMIT_STORAGE_URL', 'memory://')
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+import routes.chat as chat  # noqa: E402
+
+MESSAGES = {
+    'early rule': ['How do I set up a password manager?', 'Can I talk to someone at Remaleh?',
+                   'I got a phishing email, what now?'],
+    'late rule': ['Is my company at risk from employees?', 'How do I secure my smartphone?',
+                  'Should I escalate this to a guardian?'],
+    'country': ['I live in Australia', 'Where do I report fraud in the UK?', 'I need local police contacts'],
+    'no rule (to model)': ['Is this text from my bank a scam?', 'Someone sent me a QR code at a parking meter',
+                           'My grandmother got a call saying her grandson is in jail and needs bail money'],
+}
+
+
+# --- before: copied from routes/chat.py ---------------------------------------------
+
+def before_rule_based_response(message, knowledge):
+    message_lower = message.lower()
+    for rule in chat.PRIORITY_RULES:
+        if any(keyword in message_lower for keyword in rule['keywords']):
+            return {'response': rule['response'], 'source': 'expert_knowledge', 'category': rule['category']}
+    for category, data in knowledge.items():
+        for keyword in data['keywords']:
+            if keyword in message_lower:
+                return {'response': data['response'], 'source': 'expert_knowledge', 'category': category}
+    return None
+
+
+def before_should_escalate(message):
+    message_lower = message.lower()
+    for keyword in chat.ESCALATION_KEYWORDS['high']:
+        if keyword in message_lower:
+            return 'high'
+    for keyword in chat.ESCALATION_KEYWORDS['medium']:
+        if keyword in message_lower:
+            return 'medium'
+    return None
+
+
+def before_needs_country_context(message):
+    message_lower = message.lower()
+    for keyword in chat.COUNTRY_CONTEXT_KEYWORDS:
+        if keyword in message_lower:
+            return True
+    return False
+
+
+def before_local_reply(message, knowledge):
+    escalation_level = before_should_escalate(message)
+    country_keywords = ['australia', 'united states', 'uk', 'canada', 'us', 'united kingdom', 'i am in', 'i live in', 'located in']
+    if any(keyword in message.lower() for keyword in country_keywords):
+        detected_country = None
+        if any(country in message.lower() for country in ['australia', 'australian']):
+            detected_country = 'australia'
+        elif any(country in message.lower() for country in ['united states', 'us', 'usa', 'american']):
+            detected_country = 'united states'
+        elif any(country in message.lower() for country in ['united kingdom', 'uk', 'british', 'england']):
+            detected_country = 'united kingdom'
+        elif any(country in message.lower() for country in ['canada', 'canadian']):
+            detected_country = 'canada'
+        if detected_country:
+            return {'response': chat.get_country_specific_response(detected_country), 'source': 'country_specific_knowledge',
+                    'success': True, 'escalation_level': escalation_level,
+                    'guardian_url': 'https://www.remaleh.com.au/contact-us' if escalation_level else None}
+    if before_needs_country_context(message):
+        if not any(country in message.lower() for country in ['australia', 'united states', 'uk', 'canada', 'us', 'united kingdom']):
+            return {'response': "I'd be happy to help you with scam reporting options! To give you the most accurate information, could you please let me know which country you're located in? This will help me provide specific reporting channels and resources for your area.",
+                    'source': 'country_context_request', 'success': True, 'escalation_level': None,
+                    'guardian_url': None, 'needs_country': True}
+    rule_response = before_rule_based_response(message, knowledge)
+    if rule_response:
+        if escalation_level:
+            final_response = chat.get_guardian_response(escalation_level, rule_response['response'])
+            source = 'expert_knowledge_with_guardian'
+        else:
+            final_response = rule_response['response']
+            source = 'expert_knowledge'
+        return {'response': final_response, 'source': source, 'success': True, 'escalation_level': escalation_level,
+                'guardian_url': 'https://www.remaleh.com.au/contact-us' if escalation_level else None}
+    return escalation_level
+
+
+def after_local_reply(message):
+    intent = chat.route_message(message)
+    return chat.get_local_reply(intent) or intent['escalation_level']
+
+
+def per_message_us(route, messages, rounds):
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for message in messages:
+            route(message)
+    return (time.perf_counter() - started) / (rounds * len(messages)) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--extra', type=int, default=200)
+    parser.add_argument('--rounds', type=int, default=1000)
+    args = parser.parse_args()
+
+    # Synthetic extra topics, with keywords that ordinary messages don't contain
+    extra = {f'topic_{i}': {'keywords': [f'zq{i}x{k} topic' for k in range(6)], 'response': f'Topic {i}'}
+             for i in range(args.extra)}
+    knowledge_sets = [('knowledge base as shipped', chat.CYBERSECURITY_KNOWLEDGE),
+                      (f'+{args.extra} categories', {**chat.CYBERSECURITY_KNOWLEDGE, **extra})]
+
+    all_messages = [message for messages in MESSAGES.values() for message in messages]
+    mismatches = [m for m in all_messages if before_local_reply(m, chat.CYBERSECURITY_KNOWLEDGE) != after_local_reply(m)]
+    print(f"\nSame reply before and after: {len(all_messages) - len(mismatches)}/{len(all_messages)} messages")
+
+    rows = []
+    shipped = chat.INTENT_ROUTER, chat.RULES
+    try:
+        for label, knowledge in knowledge_sets:
+            chat.RULES = chat.PRIORITY_RULES + [{'category': c, 'keywords': d['keywords'], 'response': d['response']}
+                                                for c, d in knowledge.items()]
+            chat.INTENT_ROUTER = chat.build_intent_router(chat.RULES)
+            keywords = sum(len(rule['keywords']) for rule in chat.RULES)
+            for kind, messages in MESSAGES.items():
+                before = per_message_us(lambda m: before_local_reply(m, knowledge), messages, args.rounds)
+                after = per_message_us(after_local_reply, messages, args.rounds)
+                rows.append((label, keywords, kind, before, after))
+    finally:
+        chat.INTENT_ROUTER, chat.RULES = shipped
+
+    print("\n| knowledge base | rule keywords | messages | before µs | after µs |")
+    print("|----------------|--------------:|----------|----------:|---------:|")
+    for label, keywords, kind, before, after in rows:
+        print(f"| {label} | {keywords:,} | {kind} | {before:.1f} | {after:.1f} |")
+
+
+if __name__ == "__main__":
+    main()
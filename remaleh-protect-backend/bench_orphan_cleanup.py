@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Benchmark orphan cleanup.
+
+Seeds a throwaway SQLite database (or DATABASE_URL if set) with --reports
+community reports, each with one media row, one comment, --votes votes and
+one point log. Then it deletes --orphaned percent of the reports with a
+plain DELETE, which leaves their child rows orphaned. The same data is
+cleaned twice, reseeding in between:
+
+  legacy   the old endpoint: DELETE ... WHERE report_id NOT IN (SELECT id
+           FROM community_reports) per table, all in one transaction
+  batched  cleanup_orphans(): NOT EXISTS anti-joins, one transaction per batch
+
+Usage:
+    python bench_orphan_cleanup.py
+    python bench_orphan_cleanup.py --reports 50000 --batch-size 1000
+"""
+
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+os.environ.setdefault('DATABASE_URL', f"sqlite:///{tempfile.mkdtemp(prefix='remaleh_bench_')}/bench.db")
+os.environ.setdefault('RATE_LIMIT_STORAGE_URL', 'memory://')
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+from sqlalchemy import event, insert, text  # noqa: E402
+
+from main import app  # noqa: E402
+from models import (db, User, CommunityReport, CommunityReportMedia, CommunityReportComment,  # noqa: E402
+                    ReportVote, UserPointLog)
+from orphan_cleanup import cleanup_orphans, count_orphans  # noqa: E402
+
+logging.getLogger('remaleh').setLevel(logging.WARNING)
+logging.getLogger('orphan_cleanup').setLevel(logging.WARNING)
+app.config['ORPHAN_CLEANUP_ENABLED'] = False
+
+LEGACY_TABLES = ('user_point_logs', 'community_report_media', 'community_report_comments', 'report_votes')
+
+
+def seed(reports, votes, orphaned, batch=5000):
+    now = datetime.utcnow()
+    with app.app_context():
+        for model in (ReportVote, CommunityReportComment, CommunityReportMedia, UserPointLog, CommunityReport):
+            db.session.query(model).delete()
+        voters = User.query.filter(User.email.like('bench-orphans-%')).all()
+        for i in range(len(voters), votes + 1):
+            user = User(email=f"bench-orphans-{i}@example.com")
+            user.password_hash = 'x'
+            db.session.add(user)
+            voters.append(user)
+        db.session.commit()
+        owner, voter_ids = voters[0].id, [v.id for v in voters[1:votes + 1]]
+        for offset in range(0, reports, batch):
+            count = min(batch, reports - offset)
+            db.session.execute(insert(CommunityReport.__table__), [
+                {'user_id': owner, 'threat_type': 'PHISHING', 'description': 'x', 'status': 'APPROVED',
+                 'created_at': now} for _ in range(count)
+            ])
+            ids = [r[0] for r in db.session.query(CommunityReport.id).order_by(CommunityReport.id.desc()).limit(count)]
+            db.session.execute(insert(CommunityReportMedia.__table__),
+                               [{'report_id': rid, 'media_url': f"/m/{rid}.png", 'created_at': now} for rid in ids])
+            db.session.execute(insert(CommunityReportComment.__table__),
+                               [{'report_id': rid, 'user_id': owner, 'comment': 'hi', 'created_at': now} for rid in ids])
+            db.session.execute(insert(ReportVote.__table__),
+                               [{'report_id': rid, 'user_id': uid, 'vote_type': 'up', 'created_at': now}
+                                for rid in ids for uid in voter_ids])
+            db.session.execute(insert(UserPointLog.__table__),
+                               [{'user_id': owner, 'report_id': rid, 'points': 1, 'created_at': now} for rid in ids])
+            db.session.commit()
+        db.session.execute(text("DELETE FROM community_reports WHERE id % 100 < :pct"), {'pct': orphaned})
+        db.session.execute(text('ANALYZE'))
+        db.session.commit()
+        return count_orphans()
+
+
+def legacy_cleanup():
+    for table in LEGACY_TABLES:
+        condition = 'report_id IS NOT NULL AND ' if table == 'user_point_logs' else ''
+        db.session.execute(text(
+            f"DELETE FROM {table} WHERE {condition}report_id NOT IN (SELECT id FROM community_reports)"
+        ))
+    db.session.commit()
+
+
+def timed(engine, fn):
+    """(total ms, transactions, longest transaction ms) for fn()"""
+    started, durations = {}, []
+
+    def _begin(conn):
+        started[id(conn)] = time.perf_counter()
+
+    def _commit(conn):
+        if id(conn) in started:
+            durations.append((time.perf_counter() - started.pop(id(conn))) * 1000)
+
+    event.listen(engine, 'begin', _begin)
+    event.listen(engine, 'commit', _commit)
+    try:
+        t0 = time.perf_counter()
+        fn()
+        total = (time.perf_counter() - t0) * 1000
+    finally:
+        event.remove(engine, 'begin', _begin)
+        event.remove(engine, 'commit', _commit)
+    return total, len(durations), max(durations)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--reports', type=int, default=20000)
+    parser.add_argument('--votes', type=int, default=5)
+    parser.add_argument('--orphaned', type=int, default=10, help='percent of reports deleted')
+    parser.add_argument('--batch-size', type=int, default=1000)
+    args = parser.parse_args()
+
+    with app.app_context():
+        engine = db.engine
+    rows = {}
+    for name in ('legacy', 'batched'):
+        print(f"🌱 Seeding {args.reports:,} reports ({args.orphaned}% orphaned) for {name}...")
+        orphans = seed(args.reports, args.votes, args.orphaned)
+        with app.app_context():
+            if name == 'legacy':
+                rows[name] = timed(engine, legacy_cleanup)
+            else:
+                rows[name] = timed(engine, lambda: cleanup_orphans(batch_size=args.batch_size))
+            assert count_orphans() == {key: 0 for key in orphans}
+    print(f"\nOrphans per run: {orphans}")
+    print("\n| method | total ms | transactions | longest txn ms |")
+    print("|--------|---------:|-------------:|---------------:|")
+    for name, (total, txns, longest) in rows.items():
+        print(f"| {name} | {total:.0f} | {txns} | {longest:.0f} |")
+
+
+if __name__ == "__main__":
+    main()
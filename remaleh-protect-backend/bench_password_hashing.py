@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Benchmark sign-in throughput and the latency of other requests during a
+burst of sign-ins.
+
+Sends --logins POST /api/auth/login requests (each for its own account,
+with the correct password) from --clients concurrent clients. Meanwhile one
+more client calls GET /api/health every 20 ms, standing in for requests that
+need no password hashing.
+
+Reports:
+  logins/s               completed sign-ins per second
+  login p50 / p95 ms     how long a sign-in took to answer
+  503s                   sign-ins refused because hashing was saturated
+  other p50 / p95 ms     latency of the health checks during the burst
+
+Usage:
+    python bench_password_hashing.py
+    python bench_password_hashing.py --logins 200 --clients 16
+    PASSWORD_HASH_WORKERS=0 python bench_password_hashing.py   # inline hashing
+"""
+
+import argparse
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+os.environ.setdefault('DATABASE_URL', f"sqlite:///{tempfile.mkdtemp(prefix='remaleh_bench_')}/bench.db")
+os.environ.setdefault('RATE_LIMIT_STORAGE_URL', 'memory://')
+os.environ.setdefault('RATE_LIMIT_DEFAULT', '1000000 per minute')
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+from sqlalchemy import insert  # noqa: E402
+
+from main import app  # noqa: E402
+from models import db, User  # noqa: E402
+
+logging.getLogger('remaleh').setLevel(logging.WARNING)
+
+PASSWORD = 'Password123!'
+
+
+def seed(count):
+    emails = [f"bench-login-{uuid.uuid4().hex[:10]}@example.com" for _ in range(count)]
+    with app.app_context():
+        user = User(email='hash@example.com')
+        user.set_password(PASSWORD)
+        db.session.execute(insert(User.__table__), [
+            {'email': email, 'password_hash': user.password_hash, 'first_name': 'Bench', 'is_active': True}
+            for email in emails
+        ])
+        db.session.commit()
+    return emails
+
+
+def _p95(values):
+    return values[max(int(len(values) * 0.95) - 1, 0)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--logins', type=int, default=100)
+    parser.add_argument('--clients', type=int, default=8)
+    args = parser.parse_args()
+
+    emails = seed(args.logins)
+    print(f"🔐 {args.logins} sign-ins from {args.clients} clients, "
+          f"PASSWORD_HASH_WORKERS={app.config.get('PASSWORD_HASH_WORKERS', 'n/a')}...")
+
+    def login(email):
+        started = time.perf_counter()
+        response = app.test_client().post('/api/auth/login', json={'email': email, 'password': PASSWORD})
+        assert response.status_code in (200, 503), response.get_data(as_text=True)
+        return response.status_code, (time.perf_counter() - started) * 1000
+
+    other, done = [], threading.Event()
+
+    def probe():
+        client = app.test_client()
+        while not done.is_set():
+            started = time.perf_counter()
+            assert client.get('/api/health').status_code == 200
+            other.append((time.perf_counter() - started) * 1000)
+            time.sleep(0.02)
+
+    # Warm up (first hash starts the pool)
+    login(emails[0])
+    prober = threading.Thread(target=probe)
+    prober.start()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(args.clients) as pool:
+        results = list(pool.map(login, emails))
+    elapsed = time.perf_counter() - started
+    done.set()
+    prober.join()
+
+    latencies = sorted(ms for status, ms in results if status == 200)
+    refused = len([status for status, _ in results if status == 503])
+    other.sort()
+    print("\n| logins/s | login p50 ms | login p95 ms | 503s | other p50 ms | other p95 ms |")
+    print("|---------:|-------------:|-------------:|-----:|-------------:|-------------:|")
+    print(f"| {len(latencies) / elapsed:.1f} | {statistics.median(latencies):.0f} | {_p95(latencies):.0f} | "
+          f"{refused} | {statistics.median(other):.1f} | {_p95(other):.1f} |")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Benchmark the scan history listing for one user with many scans.
+
+Seeds a throwaway SQLite database (or DATABASE_URL if set) with --scans
+forwarded-email scans for one user, each with a --message-bytes message and
+a realistic analysis_result (indicators, patterns, debug_info). The rows are
+inserted without summaries, the way existing rows look after the upgrade.
+
+Times, per page size:
+  legacy      full UserScan rows, JSON parsed and summarized per request
+  summary     the recent-scans listing (summary columns only) after
+              backfill_scan_summaries
+  endpoint    GET /api/enhanced-scam/recent-scans, including auth and JSON
+
+Usage:
+    python bench_recent_scans.py
+    python bench_recent_scans.py --scans 10000 --limit 20 --limit 200
+"""
+
+import argparse
+import logging
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+os.environ.setdefault('DATABASE_URL', f"sqlite:///{tempfile.mkdtemp(prefix='remaleh_bench_')}/bench.db")
+os.environ.setdefault('RATE_LIMIT_STORAGE_URL', 'memory://')
+os.environ.setdefault('RATE_LIMIT_DEFAULT', '1000000 per minute')
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+from sqlalchemy import insert  # noqa: E402
+
+from main import app  # noqa: E402
+from models import db, User, UserScan  # noqa: E402
+from auth import create_tokens  # noqa: E402
+from scan_retention import user_scan_history  # noqa: E402
+from scan_summary import backfill_scan_summaries, scan_summary_items, summarize, RECOMMENDATIONS  # noqa: E402
+
+logging.getLogger('remaleh').setLevel(logging.WARNING)
+logging.getLogger('scan_summary').setLevel(logging.WARNING)
+
+INDICATORS = ['Urgent language', 'Prize claim', 'Suspicious phone number', 'Requests payment', 'Unknown sender']
+PATTERNS = ['url_shortener', 'suspicious_domain', 'money_request', 'urgency']
+
+
+def seed(scans, message_bytes, batch=2000):
+    rng = random.Random(7)
+    with app.app_context():
+        user = User(email=f"bench-scans-{random.random()}@example.com", first_name='Bench', last_name='Scans')
+        user.set_password('Password123!')
+        db.session.add(user)
+        db.session.commit()
+        start = datetime.utcnow()
+        for offset in range(0, scans, batch):
+            db.session.execute(insert(UserScan.__table__), [
+                {
+                    'user_id': user.id,
+                    'message': 'Forwarded email body ' * (message_bytes // 21),
+                    'risk_level': rng.choice(['SCAM', 'SUSPICIOUS', 'SAFE']),
+                    'risk_score': rng.randint(0, 100),
+                    'threat_type': 'EMAIL_FORWARD',
+                    'analysis_result': {
+                        'risk_level': 'SCAM',
+                        'indicators': rng.sample(INDICATORS, 4),
+                        'patterns': rng.sample(PATTERNS, 2),
+                        'debug_info': {
+                            'subject': f"Subject {i}",
+                            'preview': 'Preview text ' * 15,
+                            'attachments': rng.randint(0, 3),
+                            'keyword_hits': {f"keyword_{k}": rng.randint(0, 9) for k in range(60)},
+                        },
+                    },
+                    'scanned_at': start - timedelta(minutes=i),
+                }
+                for i in range(offset, min(scans, offset + batch))
+            ])
+            db.session.commit()
+        db.session.execute(db.text('ANALYZE'))
+        db.session.commit()
+        token, _ = create_tokens(user.id)
+        return user.id, token
+
+
+def legacy_items(user_id, limit):
+    """The listing as it was: full rows, analysis JSON parsed per request"""
+    items = []
+    for s in user_scan_history(user_id, limit):
+        summary = summarize(s.risk_level, s.analysis_result)
+        items.append({'id': s.id, 'subject': summary['summary_subject'], 'indicators': summary['summary_indicators'],
+                      'recommendations': [RECOMMENDATIONS[c] for c in summary['recommendation_codes'].split(',')]})
+    return items
+
+
+def median_ms(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scans', type=int, default=10000)
+    parser.add_argument('--message-bytes', type=int, default=4000)
+    parser.add_argument('--limit', type=int, action='append')
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+    limits = args.limit or [20, 200]
+
+    print(f"🌱 Seeding {args.scans:,} scans for one user...")
+    user_id, token = seed(args.scans, args.message_bytes)
+    client = app.test_client()
+    headers = {'Authorization': f'Bearer {token}'}
+
+    def legacy(limit):
+        with app.app_context():
+            legacy_items(user_id, limit)
+
+    def summary(limit):
+        with app.app_context():
+            scan_summary_items(user_scan_history(user_id, limit, summary_only=True))
+
+    def endpoint(limit):
+        response = client.get('/api/enhanced-scam/recent-scans', headers=headers, query_string={'limit': limit})
+        assert response.status_code == 200, response.get_data(as_text=True)
+
+    legacy_ms = {limit: median_ms(lambda: legacy(limit), args.repeat) for limit in limits}
+    with app.app_context():
+        started = time.perf_counter()
+        backfilled = backfill_scan_summaries(batch_size=1000)
+        backfill_s = time.perf_counter() - started
+    print(f"Backfilled {backfilled:,} scans in {backfill_s:.1f} s")
+
+    print("\n| limit | legacy ms | summary ms | endpoint ms |")
+    print("|------:|----------:|-----------:|------------:|")
+    for limit in limits:
+        summary_ms = median_ms(lambda: summary(limit), args.repeat)
+        endpoint_ms = median_ms(lambda: endpoint(limit), args.repeat)
+        print(f"| {limit} | {legacy_ms[limit]:.1f} | {summary_ms:.1f} | {endpoint_ms:.1f} |", flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Benchmark the cost of checking access tokens for revocation.
+
+Compares, per token check:
+  decode only        verifying the JWT signature and expiry (no revocation)
+  + revocation set   decode, then look the token family up in the
+                     in-process revoked set (what token_required does)
+  + database lookup  decode, then load the token family row (the naive
+                     alternative: one query per authenticated request)
+
+and the end-to-end latency of GET /api/auth/profile, which runs the full
+check. --revoked families are marked revoked first, so the set is not
+trivially empty.
+
+Usage:
+    python bench_token_validation.py
+    python bench_token_validation.py --checks 50000 --revoked 100000
+"""
+
+import argparse
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime
+
+os.environ.setdefault('DATABASE_URL', f"sqlite:///{tempfile.mkdtemp(prefix='remaleh_bench_')}/bench.db")
+os.environ.setdefault('RATE_LIMIT_STORAGE_URL', 'memory://')
+os.environ.setdefault('RATE_LIMIT_DEFAULT', '1000000 per minute')
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+import jwt  # noqa: E402
+from sqlalchemy import insert  # noqa: E402
+
+from main import app  # noqa: E402
+from models import db, User, TokenFamily  # noqa: E402
+from auth import create_tokens  # noqa: E402
+import token_store  # noqa: E402
+
+logging.getLogger('remaleh').setLevel(logging.WARNING)
+
+
+def seed(revoked):
+    with app.app_context():
+        user = User(email=f"bench-token-{uuid.uuid4().hex[:8]}@example.com", first_name='Bench')
+        user.set_password('Password123!')
+        db.session.add(user)
+        db.session.commit()
+        now = datetime.utcnow()
+        fids = [uuid.uuid4().hex for _ in range(revoked)]
+        db.session.execute(insert(TokenFamily.__table__), [
+            {'id': fid, 'user_id': user.id, 'current_jti': fid, 'created_at': now,
+             'expires_at': now + token_store.REFRESH_TOKEN_LIFETIME, 'revoked_at': now, 'revoked_reason': 'logout'}
+            for fid in fids
+        ])
+        db.session.commit()
+        token_store.sync_revocations()
+        access_token, _ = create_tokens(user.id)
+        return access_token
+
+
+def per_check_us(check, count, rounds=3):
+    """Best of `rounds` runs, after a warm-up"""
+    for _ in range(min(count, 100)):
+        check()
+    best = None
+    for _ in range(rounds):
+        started = time.perf_counter()
+        for _ in range(count):
+            check()
+        elapsed = (time.perf_counter() - started) / count * 1e6
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--checks', type=int, default=20000)
+    parser.add_argument('--revoked', type=int, default=10000)
+    parser.add_argument('--requests', type=int, default=2000)
+    args = parser.parse_args()
+
+    token = seed(args.revoked)
+    secret = app.config['SECRET_KEY']
+    print(f"🔑 {args.checks} checks, {len(token_store._revoked)} revoked families in the set...")
+
+    def decode():
+        return jwt.decode(token, secret, algorithms=['HS256'])
+
+    def with_set():
+        assert not token_store.is_revoked(decode()['fid'])
+
+    def with_database():
+        assert db.session.get(TokenFamily, decode()['fid'], populate_existing=True).revoked_at is None
+
+    with app.app_context():
+        rows = [
+            ('decode only', per_check_us(decode, args.checks)),
+            ('+ revocation set', per_check_us(with_set, args.checks)),
+            ('+ database lookup', per_check_us(with_database, args.checks // 10)),
+        ]
+
+    client = app.test_client()
+    headers = {'Authorization': f'Bearer {token}'}
+    latencies = []
+    for _ in range(args.requests):
+        started = time.perf_counter()
+        assert client.get('/api/auth/profile', headers=headers).status_code == 200
+        latencies.append((time.perf_counter() - started) * 1000)
+
+    print("\n| check | µs per check |")
+    print("|-------|-------------:|")
+    for name, us in rows:
+        print(f"| {name} | {us:.1f} |")
+    print(f"\nGET /api/auth/profile: median {statistics.median(latencies):.2f} ms over {args.requests} requests")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Gunicorn configuration for Remaleh Protect Backend.
+
+Usage (from the remaleh-protect-backend directory):
+
+    gunicorn -c gunicorn.conf.py
+
+Serving profiles are selected with GUNICORN_WORKER_CLASS:
+
+  sync     One request per worker process. Best isolation for the CPU-bound
+           scam/text analysis routes; size workers to the CPU count.
+  gthread  (default) Process pool with a small thread pool per worker. Good
+           general-purpose mode: CPU work still spreads over processes while
+           short I/O waits (database, Redis) overlap inside a worker.
+  gevent   Cooperative green threads. Intended for a pool that serves the
+           network-bound routes (/api/link, /api/chat, /api/breach) that
+           spend most of their time waiting on external HTTP APIs.
+
+See PRODUCTION_README.md ("Serving Profiles") for sizing guidance and the
+load-test comparison produced by loadtest_serving_modes.py.
+"""
+
+import multiprocessing
+import os
+
+_cpu_count = multiprocessing.cpu_count()
+
+wsgi_app = os.getenv('GUNICORN_APP', 'src.wsgi:app')
+bind = f"0.0.0.0:{os.getenv('PORT', '10000')}"
+
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gthread')
+
+if worker_class == 'gevent':
+    # One process per core; concurrency comes from green threads
+    workers = int(os.getenv('WEB_CONCURRENCY', _cpu_count))
+    worker_connections = int(os.getenv('GUNICORN_WORKER_CONNECTIONS', 200))
+elif worker_class == 'gthread':
+    workers = int(os.getenv('WEB_CONCURRENCY', _cpu_count + 1))
+    threads = int(os.getenv('GUNICORN_THREADS', 4))
+else:
+    workers = int(os.getenv('WEB_CONCURRENCY', _cpu_count * 2 + 1))
+
+# Preloading shares the imported app (and its memory) across workers; the
+# post_fork hook below gives every worker its own DB and Redis connections.
+# gevent must monkey-patch before the app is imported, so it never preloads.
+preload_app = (
+    os.getenv('GUNICORN_PRELOAD', 'true').lower() == 'true'
+    and worker_class != 'gevent'
+)
+
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 30))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', 5))
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 1000))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', 100))
+
+# Set GUNICORN_ACCESS_LOG to an empty string to disable access logging
+accesslog = os.getenv('GUNICORN_ACCESS_LOG', '-') or None
+errorlog = '-'
+loglevel = os.getenv('LOG_LEVEL', 'info').lower()
+
+# Render and most proxies terminate TLS in front of us
+forwarded_allow_ips = os.getenv('FORWARDED_ALLOW_IPS', '*')
+
+
+def post_fork(server, worker):
+    """Give each worker fresh connections instead of the master's sockets."""
+    if worker_class == 'gevent':
+        try:
+            from psycogreen.gevent import patch_psycopg
+            patch_psycopg()
+        except ImportError:
+            server.log.warning("psycogreen not installed; psycopg2 calls will block the gevent loop")
+
+    if not preload_app:
+        return
+
+    from src.wsgi import reset_connections_after_fork, start_password_pool
+    reset_connections_after_fork()
+    server.log.info(f"Worker {worker.pid} reset inherited connections")
+    try:
+        start_password_pool()
+    except Exception as e:
+        # Hashing still works: the pool is created on first use instead
+        server.log.warning(f"Worker {worker.pid} could not start its password hashing pool: {e}")
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Load-test comparison of the gunicorn serving profiles in gunicorn.conf.py.
+
+Starts the app under each worker class in turn and drives two workloads:
+
+  cpu  POST /api/enhanced-scam/analyze with a long message (pure Python work)
+  io   POST /api/breach/check with an HIBP key set, so the route sleeps for the
+       HIBP rate-limit delay and then calls out over HTTPS. Outbound HTTPS is
+       sent through a local stub proxy that holds each CONNECT for
+       --upstream-delay seconds before failing, so no third-party is contacted.
+
+Usage:
+    python loadtest_serving_modes.py
+    python loadtest_serving_modes.py --modes sync,gthread --scenario cpu --requests 400
+"""
+
+import argparse
+import os
+import socket
+import socketserver
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import json
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+CPU_TEXT = (
+    "URGENT: Your Australia Post parcel is temporarily held at our warehouse. "
+    "Reply with Y, then exit the message and reopen it to activate the link, or copy and paste "
+    "https://auspost-delivery-verify.buzz/track?id=123456 into your Safari browser within 24 hours. "
+    "A $2.99 redelivery fee applies. Best regards, AusPost Team. "
+) * 20
+
+
+class _SlowProxyHandler(socketserver.BaseRequestHandler):
+    """Accept a CONNECT, wait to simulate upstream latency, then refuse it."""
+
+    delay = 0.3
+
+    def handle(self):
+        try:
+            self.request.recv(4096)
+            time.sleep(self.delay)
+            self.request.sendall(b"HTTP/1.1 502 Bad Gateway\r\nContent-Length: 0\r\n\r\n")
+        except OSError:
+            pass
+
+
+class _ThreadingTCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+def _start_stub_proxy(delay):
+    _SlowProxyHandler.delay = delay
+    server = _ThreadingTCPServer(('127.0.0.1', 0), _SlowProxyHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _wait_for_health(port, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/api/health", timeout=2) as r:
+                if r.status == 200:
+                    return True
+        except Exception:
+            time.sleep(0.25)
+    return False
+
+
+def _post(url, payload):
+    body = json.dumps(payload).encode()
+    req = urllib.request.Request(url, data=body, headers={'Content-Type': 'application/json'})
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(req, timeout=60) as r:
+            r.read()
+            ok = 200 <= r.status < 300
+    except Exception:
+        ok = False
+    return time.perf_counter() - start, ok
+
+
+def _run_workload(port, scenario, total, concurrency):
+    if scenario == 'cpu':
+        url = f"http://127.0.0.1:{port}/api/enhanced-scam/analyze"
+        payload = {'text': CPU_TEXT}
+    else:
+        url = f"http://127.0.0.1:{port}/api/breach/check"
+        payload = {'email': 'loadtest@example.com'}
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(lambda _: _post(url, payload), range(total)))
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(r[0] for r in results)
+    errors = sum(1 for r in results if not r[1])
+    return {
+        'rps': total / elapsed,
+        'p50_ms': statistics.median(latencies) * 1000,
+        'p95_ms': latencies[int(len(latencies) * 0.95) - 1] * 1000,
+        'errors': errors,
+    }
+
+
+def run_mode(mode, scenarios, args, proxy_port, db_path):
+    port = _free_port()
+    env = dict(os.environ)
+    env.update({
+        'PORT': str(port),
+        'GUNICORN_WORKER_CLASS': mode,
+        'WEB_CONCURRENCY': str(args.workers),
+        'GUNICORN_THREADS': str(args.threads),
+        'GUNICORN_ACCESS_LOG': '',
+        'LOG_LEVEL': 'warning',
+        'DATABASE_URL': f"sqlite:///{db_path}",
+        'RATE_LIMIT_STORAGE_URL': 'memory://',
+        'RATE_LIMIT_DEFAULT': '1000000 per minute',
+        'HIBP_API_KEY': 'loadtest-dummy-key',
+        'HTTPS_PROXY': f"http://127.0.0.1:{proxy_port}",
+        'https_proxy': f"http://127.0.0.1:{proxy_port}",
+        'NO_PROXY': '127.0.0.1,localhost',
+    })
+    proc = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py'],
+        cwd=BACKEND_DIR, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        if not _wait_for_health(port):
+            print(f"❌ {mode}: server did not become healthy")
+            return {}
+        results = {}
+        for scenario in scenarios:
+            total = args.requests if scenario == 'cpu' else args.io_requests
+            results[scenario] = _run_workload(port, scenario, total, args.concurrency)
+        return results
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--modes', default='sync,gthread,gevent')
+    parser.add_argument('--scenario', choices=['cpu', 'io', 'both'], default='both')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--requests', type=int, default=400, help='requests for the cpu scenario')
+    parser.add_argument('--io-requests', type=int, default=64, help='requests for the io scenario')
+    parser.add_argument('--upstream-delay', type=float, default=0.3)
+    args = parser.parse_args()
+
+    scenarios = ['cpu', 'io'] if args.scenario == 'both' else [args.scenario]
+    proxy = _start_stub_proxy(args.upstream_delay)
+    db_path = os.path.join(tempfile.mkdtemp(prefix='remaleh_loadtest_'), 'loadtest.db')
+
+    print(f"🧪 workers={args.workers} threads={args.threads} concurrency={args.concurrency}")
+    print("| mode | scenario | req/s | p50 ms | p95 ms | errors |")
+    print("|------|----------|------:|-------:|-------:|-------:|")
+    for mode in [m.strip() for m in args.modes.split(',') if m.strip()]:
+        for scenario, r in run_mode(mode, scenarios, args, proxy.server_address[1], db_path).items():
+            print(f"| {mode} | {scenario} | {r['rps']:.1f} | {r['p50_ms']:.0f} | {r['p95_ms']:.0f} | {r['errors']} |")
+    proxy.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+"""
+Reload the Redis leaderboard sorted sets from the points totals tables.
+Run after a Redis flush or failover; until then leaderboard reads use the database.
+
+Usage: python3 rebuild_leaderboard.py
+"""
+import sys
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+try:
+    from src.main import create_app
+    from src.leaderboard import rebuild_leaderboard
+except ImportError:
+    from main import create_app
+    from leaderboard import rebuild_leaderboard
+
+
+def main():
+    app = create_app()
+    with app.app_context():
+        loaded = rebuild_leaderboard()
+    if loaded is None:
+        print("Redis is not configured or unreachable; leaderboard will keep using the database.")
+        sys.exit(1)
+    print(f"Done. Loaded {loaded} users into the Redis leaderboard.")
+
+
+if __name__ == '__main__':
+    main()
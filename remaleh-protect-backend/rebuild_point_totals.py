@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+Rebuild or reconcile the maintained points totals from user_point_logs.
+
+Usage:
+    python3 rebuild_point_totals.py              # recompute all users
+    python3 rebuild_point_totals.py --dry-run    # only report users whose totals drifted
+    python3 rebuild_point_totals.py --user-id 12 --user-id 34
+"""
+import argparse
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+try:
+    from src.main import create_app
+    from src.points import rebuild_point_totals
+    from src.leaderboard import rebuild_leaderboard
+except ImportError:
+    from main import create_app
+    from points import rebuild_point_totals
+    from leaderboard import rebuild_leaderboard
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dry-run', action='store_true', help='report drift without rewriting totals')
+    parser.add_argument('--user-id', type=int, action='append', help='limit to these users (repeatable)')
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        summary = rebuild_point_totals(user_ids=args.user_id, dry_run=args.dry_run)
+        if not args.dry_run and args.user_id is None:
+            # Targeted rebuilds patch Redis themselves; a full one reloads it
+            rebuild_leaderboard()
+
+    action = 'Checked' if args.dry_run else 'Rebuilt'
+    print(f"{action} totals for {summary['users']} users; {summary['mismatched']} had drifted")
+    if summary['mismatched_user_ids']:
+        print(f"Drifted user ids: {', '.join(str(u) for u in summary['mismatched_user_ids'])}")
+
+
+if __name__ == '__main__':
+    main()
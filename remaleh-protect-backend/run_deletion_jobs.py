@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Resume interrupted bulk deletion jobs and retry queued media deletions.
+The app resumes jobs on startup and drains the media queue after each
+deletion; use this from cron so failed media deletions are retried on
+schedule, or to finish a job by hand.
+
+Usage:
+    python3 run_deletion_jobs.py
+    python3 run_deletion_jobs.py --job 42 --batch-size 2000
+    python3 run_deletion_jobs.py --media-only
+"""
+import argparse
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+try:
+    from src.main import create_app
+    from src.bulk_delete import run_deletion_job, resume_deletion_jobs, process_media_deletions
+except ImportError:
+    from main import create_app
+    from bulk_delete import run_deletion_job, resume_deletion_jobs, process_media_deletions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--job', type=int, help='run only this deletion job')
+    parser.add_argument('--batch-size', type=int, help='rows deleted per transaction')
+    parser.add_argument('--media-only', action='store_true', help='only retry queued media deletions')
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        if not args.media_only:
+            if args.job:
+                job = run_deletion_job(args.job, batch_size=args.batch_size)
+                print(f"Job {args.job}: {'done' if job else 'not runnable (finished or held by another worker)'}")
+            else:
+                done = resume_deletion_jobs(batch_size=args.batch_size)
+                print(f"Resumed {len(done)} deletion jobs")
+        summary = process_media_deletions()
+    print(f"Media: deleted {summary['deleted']}, retrying {summary['retrying']}, failed {summary['failed']}")
+
+
+if __name__ == '__main__':
+    main()
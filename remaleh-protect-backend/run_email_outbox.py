@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+"""
+Send queued email from the outbox. The app sends in a background thread as
+soon as a message is queued; use this from cron so retries are picked up
+even when no worker process is running, and to purge old sent messages.
+
+Usage:
+    python3 run_email_outbox.py
+    python3 run_email_outbox.py --status
+"""
+import argparse
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+try:
+    from src.main import create_app
+    from src.email_outbox import send_outbox, purge_sent, outbox_status
+except ImportError:
+    from main import create_app
+    from email_outbox import send_outbox, purge_sent, outbox_status
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--status', action='store_true', help='only print message counts per status')
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        if not args.status:
+            summary = send_outbox()
+            purged = purge_sent()
+            print(f"Sent {summary['sent']}, retrying {summary['retrying']}, failed {summary['failed']}; "
+                  f"purged {purged} old messages")
+        print(f"Outbox: {outbox_status()}")
+
+
+if __name__ == '__main__':
+    main()
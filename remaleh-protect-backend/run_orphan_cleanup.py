@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+"""
+Remove media, comments, votes and point logs whose community report no
+longer exists. The app also does this in the background once a day; use this
+from cron, or with --dry-run to see how many orphans there are.
+
+Usage:
+    python3 run_orphan_cleanup.py --dry-run
+    python3 run_orphan_cleanup.py --batch-size 5000
+"""
+import argparse
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+try:
+    from src.main import create_app
+    from src.orphan_cleanup import cleanup_orphans
+except ImportError:
+    from main import create_app
+    from orphan_cleanup import cleanup_orphans
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--batch-size', type=int, help='orphans deleted per transaction')
+    parser.add_argument('--dry-run', action='store_true', help='only count orphans')
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        summary = cleanup_orphans(batch_size=args.batch_size, dry_run=args.dry_run)
+    counts = summary['orphans' if args.dry_run else 'removed']
+    verb = 'Found' if args.dry_run else 'Removed'
+    print(f"{verb} orphans: " + ', '.join(f"{key} {n}" for key, n in counts.items())
+          + f" ({summary['batches']} batches, {summary['seconds']} s)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+"""
+Move old user scans to the compressed archive and purge expired archived scans.
+The app also does this in the background once an hour; use this from cron, or
+to catch up after changing SCAN_HOT_DAYS / SCAN_RETENTION_DAYS.
+
+Usage:
+    python3 run_scan_retention.py
+    python3 run_scan_retention.py --batch-size 2000
+"""
+import argparse
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+try:
+    from src.main import create_app
+    from src.scan_retention import run_scan_retention
+except ImportError:
+    from main import create_app
+    from scan_retention import run_scan_retention
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--batch-size', type=int, help='scans moved or deleted per transaction')
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        summary = run_scan_retention(batch_size=args.batch_size)
+    print(f"Archived {summary['archived']} scans; purged {summary['purged']} archived scans")
+
+
+if __name__ == '__main__':
+    main()
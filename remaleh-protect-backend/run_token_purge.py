@@ -0,0 +1,30 @@
+#!/usr/bin/env python3
+"""
+Delete token families whose refresh token has expired. Their tokens can no
+longer be used, so the rows only take up space in token_families; run this
+daily from cron.
+
+Usage:
+    python3 run_token_purge.py
+"""
+from dotenv import load_dotenv
+
+load_dotenv()
+
+try:
+    from src.main import create_app
+    from src.token_store import purge_expired_families
+except ImportError:
+    from main import create_app
+    from token_store import purge_expired_families
+
+
+def main():
+    app = create_app()
+    with app.app_context():
+        removed = purge_expired_families()
+    print(f"Purged {removed} expired token families")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,30 +1,44 @@
 from functools import wraps
-from flask import request, jsonify, current_app
+from flask import request, jsonify, current_app, g
 from werkzeug.security import generate_password_hash, check_password_hash
-from datetime import datetime, timedelta
+from datetime import datetime
 import jwt
 import os
 import secrets
 import logging
 
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
 logger = logging.getLogger(__name__)
 
 try:
     from .models import db, User
+    from .cache import cache, CacheKeys
+    from .token_store import start_family, is_revoked, ACCESS_TOKEN_LIFETIME, REFRESH_TOKEN_LIFETIME
 except ImportError:
     from models import db, User
+    from cache import cache, CacheKeys
+    from token_store import start_family, is_revoked, ACCESS_TOKEN_LIFETIME, REFRESH_TOKEN_LIFETIME
+
+def create_tokens(user_id, family=None):
+    """Create access and refresh tokens for a user.
 
-def create_tokens(user_id):
-    """Create access and refresh tokens for a user"""
+    `family` is the (fid, jti) of a rotated refresh token; without it a new
+    token family is started (a new sign-in), which commits the session.
+    """
     from flask import current_app
     
+    fid, jti = family or start_family(user_id)
+    
     # Create access token (1 hour expiry)
     access_token = jwt.encode(
         {
             'user_id': user_id,
-            'exp': datetime.utcnow() + timedelta(hours=1),
+            'exp': datetime.utcnow() + ACCESS_TOKEN_LIFETIME,
             'iat': datetime.utcnow(),
-            'type': 'access'
+            'type': 'access',
+            'fid': fid
         },
         current_app.config['SECRET_KEY'],
         algorithm='HS256'
@@ -34,9 +48,11 @@ def create_tokens(user_id):
     refresh_token = jwt.encode(
         {
             'user_id': user_id,
-            'exp': datetime.utcnow() + timedelta(days=30),
+            'exp': datetime.utcnow() + REFRESH_TOKEN_LIFETIME,
             'iat': datetime.utcnow(),
-            'type': 'refresh'
+            'type': 'refresh',
+            'fid': fid,
+            'jti': jti
         },
         current_app.config['SECRET_KEY'],
         algorithm='HS256'
@@ -44,40 +60,144 @@ def create_tokens(user_id):
     
     return access_token, refresh_token
 
-def token_required(f):
-    """Decorator to protect routes that require authentication"""
-    @wraps(f)
-    def decorated(*args, **kwargs):
-        token = None
-        
-        if 'Authorization' in request.headers:
-            auth_header = request.headers['Authorization']
-            try:
-                token = auth_header.split(" ")[1]
-            except IndexError:
-                logger.info("Auth error: invalid Authorization header format")
-                return jsonify({'message': 'Invalid token format'}), 401
-        
-        if not token:
-            logger.info("Auth error: missing Bearer token")
-            return jsonify({'message': 'Token is missing'}), 401
-        
+# User columns served from the principal cache without loading the row
+PRINCIPAL_FIELDS = (
+    'id', 'email', 'first_name', 'last_name', 'created_at', 'is_active', 'is_admin', 'role',
+    'account_status', 'email_verified', 'email_forward_token',
+)
+# Changes to these invalidate a cached principal
+_PRINCIPAL_STALE = 'principal_stale'
+
+
+class AuthError(Exception):
+    """The request's bearer token could not be turned into a user"""
+
+    def __init__(self, message):
+        super().__init__(message)
+        self.message = message
+
+
+class Principal:
+    """The authenticated user of the current request.
+
+    Attributes in PRINCIPAL_FIELDS come from a cached snapshot. Anything else
+    (relationships, methods such as check_password or to_dict, and any
+    assignment) loads the User row once through the session and is delegated
+    to it from then on, so writes are persisted by the route's commit as
+    before.
+    """
+
+    __slots__ = ('_fields', '_user')
+
+    def __init__(self, fields, user=None):
+        object.__setattr__(self, '_fields', fields)
+        object.__setattr__(self, '_user', user)
+
+    @property
+    def user(self):
+        """The User row, loaded on first use"""
+        if self._user is None:
+            user = db.session.get(User, self._fields['id'])
+            if user is None:
+                raise AuthError('Invalid token')
+            object.__setattr__(self, '_user', user)
+        return self._user
+
+    def __getattr__(self, name):
+        if self._user is None and name in self._fields:
+            return self._fields[name]
+        return getattr(self.user, name)
+
+    def __setattr__(self, name, value):
+        setattr(self.user, name, value)
+
+    def __repr__(self):
+        return f"<Principal {self._fields.get('id')}>"
+
+
+def principal_fields(user):
+    return {name: getattr(user, name) for name in PRINCIPAL_FIELDS}
+
+
+def invalidate_principal(user_id):
+    """Drop a user's cached principal (done automatically when the row changes through the ORM)"""
+    cache.delete(CacheKeys.user_profile(user_id))
+
+
+def _bearer_token():
+    auth_header = request.headers.get('Authorization')
+    if not auth_header:
+        logger.info("Auth error: missing Bearer token")
+        raise AuthError('Token is missing')
+    try:
+        token = auth_header.split(" ")[1]
+    except IndexError:
+        logger.info("Auth error: invalid Authorization header format")
+        raise AuthError('Invalid token format')
+    if not token:
+        raise AuthError('Token is missing')
+    return token
+
+
+def _token_payload():
+    """The request's decoded access token, decoded once per request"""
+    token = _bearer_token()
+    # Keyed by token: a request reuses an already-pushed app context (and its
+    # `g`) when one is active, e.g. CLI commands and tests
+    if g.get('auth_token') != token:
+        g.pop('principal', None)
         try:
-            # Decode the token
-            data = jwt.decode(token, current_app.config['SECRET_KEY'], algorithms=["HS256"])
-            current_user = User.query.get(data['user_id'])
-            
-            if not current_user:
-                logger.info("Auth error: user not found for token user_id=%s", data.get('user_id'))
-                return jsonify({'message': 'Invalid token'}), 401
-                
+            payload = jwt.decode(token, current_app.config['SECRET_KEY'], algorithms=["HS256"])
         except jwt.ExpiredSignatureError:
             logger.info("Auth error: token expired")
-            return jsonify({'message': 'Token has expired'}), 401
+            raise AuthError('Token has expired')
         except jwt.InvalidTokenError:
             logger.info("Auth error: invalid token signature or payload")
-            return jsonify({'message': 'Invalid token'}), 401
-        
+            raise AuthError('Invalid token')
+        if payload.get('type') == 'refresh':
+            logger.info("Auth error: refresh token used as access token")
+            raise AuthError('Invalid token')
+        g.token_payload = payload
+        g.auth_token = token
+    # Checked on every call (not cached on g): an in-memory lookup, see token_store.py
+    fid = g.token_payload.get('fid')
+    if fid and is_revoked(fid):
+        logger.info("Auth error: token family revoked")
+        raise AuthError('Token has been revoked')
+    return g.token_payload
+
+
+def current_principal():
+    """The request's Principal, resolved once per request and cached across requests.
+
+    Raises AuthError if there is no valid token or the user no longer exists.
+    """
+    payload = _token_payload()
+    if 'principal' in g:
+        return g.principal
+    user_id = payload.get('user_id')
+    key = CacheKeys.user_profile(user_id)
+    fields = cache.get(key) if user_id is not None else None
+    user = None
+    if fields is None:
+        user = db.session.get(User, user_id) if user_id is not None else None
+        if user is None:
+            logger.info("Auth error: user not found for token user_id=%s", user_id)
+            raise AuthError('Invalid token')
+        fields = principal_fields(user)
+        cache.set(key, fields, timeout=current_app.config.get('PRINCIPAL_CACHE_TTL', 60))
+    g.principal = Principal(fields, user)
+    return g.principal
+
+
+def token_required(f):
+    """Decorator to protect routes that require authentication"""
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        try:
+            current_user = current_principal()
+        except AuthError as e:
+            return jsonify({'message': e.message}), 401
         return f(current_user, *args, **kwargs)
     
     return decorated
@@ -86,33 +206,13 @@ def admin_required(f):
     """Decorator to protect routes that require admin privileges"""
     @wraps(f)
     def decorated(*args, **kwargs):
-        token = None
-        
-        if 'Authorization' in request.headers:
-            auth_header = request.headers['Authorization']
-            try:
-                token = auth_header.split(" ")[1]
-            except IndexError:
-                return jsonify({'message': 'Invalid token format'}), 401
-        
-        if not token:
-            return jsonify({'message': 'Token is missing'}), 401
-        
         try:
-            data = jwt.decode(token, current_app.config['SECRET_KEY'], algorithms=["HS256"])
-            current_user = User.query.get(data['user_id'])
-            
-            if not current_user:
-                return jsonify({'message': 'Invalid token'}), 401
-            
+            current_user = current_principal()
             # Check if user is admin
             if not getattr(current_user, 'is_admin', False) and getattr(current_user, 'role', '') != 'ADMIN':
                 return jsonify({'message': 'Admin privileges required'}), 403
-                
-        except jwt.ExpiredSignatureError:
-            return jsonify({'message': 'Token has expired'}), 401
-        except jwt.InvalidTokenError:
-            return jsonify({'message': 'Invalid token'}), 401
+        except AuthError as e:
+            return jsonify({'message': e.message}), 401
         except Exception as e:
             logger.error(f"Unexpected error in admin_required: {e}")
             return jsonify({'message': 'Authentication error'}), 500
@@ -123,24 +223,37 @@ def admin_required(f):
 
 def get_current_user_id():
     """Get current user ID from token"""
-    token = None
-    
-    if 'Authorization' in request.headers:
-        auth_header = request.headers['Authorization']
-        try:
-            token = auth_header.split(" ")[1]
-        except IndexError:
-            return None
-    
-    if not token:
-        return None
-    
     try:
-        data = jwt.decode(token, current_app.config['SECRET_KEY'], algorithms=["HS256"])
-        return data['user_id']
-    except:
+        return _token_payload()['user_id']
+    except (AuthError, KeyError):
         return None
 
+
+@event.listens_for(Session, 'before_flush')
+def _collect_stale_principals(session, flush_context, instances):
+    stale = set()
+    for obj in session.deleted:
+        if isinstance(obj, User):
+            stale.add(obj.id)
+    for obj in session.dirty:
+        if isinstance(obj, User):
+            state = inspect(obj)
+            if any(state.attrs[name].history.has_changes() for name in PRINCIPAL_FIELDS):
+                stale.add(obj.id)
+    if stale:
+        session.info.setdefault(_PRINCIPAL_STALE, set()).update(stale)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_stale_principals(session):
+    for user_id in session.info.pop(_PRINCIPAL_STALE, ()):
+        invalidate_principal(user_id)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_stale_principals(session):
+    session.info.pop(_PRINCIPAL_STALE, None)
+
 def update_user_login(user_id):
     """Update user's last login timestamp"""
     user = User.query.get(user_id)
@@ -260,26 +373,3 @@ def validate_password_strength(password):
         return False, "Password must contain at least one special character"
     
     return True, "Password meets security requirements"
-
-def rate_limit_login_attempts(user_id):
-    """Rate limit login attempts for security"""
-    try:
-        from .cache import cache
-        from .monitoring import record_login_attempt
-    except ImportError:
-        from cache import cache
-        from monitoring import record_login_attempt
-    
-    cache_key = f"login_attempts:{user_id}"
-    attempts = cache.get(cache_key) or 0
-    
-    if attempts >= 5:  # Max 5 attempts
-        return False, "Too many login attempts. Please try again later."
-    
-    # Increment attempts
-    cache.set(cache_key, attempts + 1, timeout=300)  # 5 minutes
-    
-    # Record login attempt for monitoring
-    record_login_attempt(user_id, attempts + 1)
-    
-    return True, "Login attempt recorded"
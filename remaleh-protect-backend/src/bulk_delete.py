@@ -0,0 +1,439 @@
+"""
+Batched, resumable deletion of users and community reports.
+
+Deleting a user used to load every report and its media through the ORM,
+call Cloudinary for each file inline, and then issue the per-table DELETEs
+in one long transaction. Here the work is split into steps, and each step
+deletes at most ``BULK_DELETE_BATCH_SIZE`` rows per transaction with
+set-based statements:
+
+  reports            the target's reports, a chunk of ids at a time, with their
+                     media, votes, comments and point logs
+  votes              votes the user cast on other reports (their counters move)
+  comments, point_logs, lesson_progress, learning_progress, protection_status,
+  scans, archived_scans
+  user               rows written while the earlier steps ran, point totals,
+                     then the user row itself
+
+Counters are adjusted from the rows each DELETE actually removed (DELETE ...
+RETURNING), so a chunk that races another deletion never subtracts twice.
+
+A user deletion is a ``deletion_jobs`` row. The job is created in the same
+transaction that deactivates the account and revokes its sign-ins, so the
+user cannot add rows behind the steps that already passed; a request that
+was already in flight can, and the last step sweeps those up. The job's step and per-step row
+counts are committed with every chunk, so ``GET /api/admin/deletion-jobs/<id>``
+shows progress and a crashed job resumes from the step it was in. A worker
+holds a job through a lease (``lease_until``) renewed with every chunk.
+Unfinished jobs whose lease has expired are picked up again on startup,
+by ``POST /api/admin/deletion-jobs/<id>/resume``, or by
+``run_deletion_jobs.py``. A single report is small enough to delete inside
+the request with the same statements.
+
+Media files are never removed inline. Their URLs are written to
+``media_deletions`` in the same transaction that deletes the media rows, and
+a background worker removes the local file or Cloudinary asset, retrying
+failures with exponential backoff up to ``MEDIA_DELETION_MAX_ATTEMPTS``.
+"""
+
+import logging
+import os
+import threading
+from datetime import datetime, timedelta
+from urllib.parse import urlparse
+
+from flask import current_app
+from sqlalchemy import insert, or_, update
+
+try:
+    import cloudinary
+    import cloudinary.uploader
+except ImportError:
+    cloudinary = None
+
+try:
+    from .models import (db, User, UserScan, UserScanArchive, CommunityReport, CommunityReportMedia,
+                         CommunityReportComment, ReportVote, UserPointLog, LessonProgress,
+                         LearningProgress, ProtectionStatus, DeletionJob, MediaDeletion, TokenFamily)
+    from .database import delete_returning
+    from .points import revoke_logged_points, delete_user_points
+    from .trending import reports_deleted
+    from .stats import record_reports_deleted
+    from .votes import apply_vote_counts
+    from .token_store import revoke_user
+    from .work_queue import claim_due, failed_attempt, config_int, ProcessWorker
+except ImportError:
+    from models import (db, User, UserScan, UserScanArchive, CommunityReport, CommunityReportMedia,
+                        CommunityReportComment, ReportVote, UserPointLog, LessonProgress,
+                        LearningProgress, ProtectionStatus, DeletionJob, MediaDeletion, TokenFamily)
+    from database import delete_returning
+    from points import revoke_logged_points, delete_user_points
+    from trending import reports_deleted
+    from stats import record_reports_deleted
+    from votes import apply_vote_counts
+    from token_store import revoke_user
+    from work_queue import claim_due, failed_attempt, config_int, ProcessWorker
+
+logger = logging.getLogger(__name__)
+
+LOCAL_MEDIA_PREFIX = '/api/community/uploads/'
+ACTIVE_STATUSES = ('pending', 'running')
+# Media deletions leased and attempted per round trip to the database
+MEDIA_BATCH_SIZE = 50
+
+
+class MediaDeletionError(Exception):
+    """A media file or asset could not be removed (the deletion is retried)"""
+
+
+def _batch_size(batch_size=None):
+    return batch_size or config_int('BULK_DELETE_BATCH_SIZE', 500)
+
+
+def _ids(column, where, batch_size):
+    return [row[0] for row in db.session.query(column).filter(where).order_by(column).limit(batch_size)]
+
+
+# --- set-based deletion steps --------------------------------------------------
+
+def delete_reports(report_ids, job_id=None, except_user_id=None):
+    """Delete reports and everything hanging off them (caller commits).
+
+    Media URLs are queued for the background worker; vote, point, trending and
+    stats counters are adjusted for the reports actually removed. Returns that
+    number.
+    """
+    if not report_ids:
+        return 0
+    media = CommunityReportMedia.__table__
+    urls = delete_returning(db.session, media, media.c.report_id.in_(report_ids), media.c.media_url)
+    queue_media_deletions([row.media_url for row in urls], job_id=job_id)
+    db.session.execute(ReportVote.__table__.delete().where(ReportVote.report_id.in_(report_ids)))
+    db.session.execute(CommunityReportComment.__table__.delete()
+                       .where(CommunityReportComment.report_id.in_(report_ids)))
+    logs = UserPointLog.__table__
+    revoke_logged_points(
+        delete_returning(db.session, logs, logs.c.report_id.in_(report_ids),
+                         logs.c.user_id, logs.c.points, logs.c.created_at),
+        except_user_id=except_user_id,
+    )
+    reports = CommunityReport.__table__
+    removed = delete_returning(db.session, reports, reports.c.id.in_(report_ids),
+                               reports.c.id, reports.c.user_id, reports.c.status, reports.c.urgency,
+                               reports.c.threat_type, reports.c.created_at)
+    reports_deleted(removed)
+    record_reports_deleted(removed)
+    return len(removed)
+
+
+def _user_reports(user_id, batch_size, job_id):
+    ids = _ids(CommunityReport.id, CommunityReport.user_id == user_id, batch_size)
+    return delete_reports(ids, job_id=job_id, except_user_id=user_id)
+
+
+def _user_votes(user_id, batch_size, job_id):
+    ids = _ids(ReportVote.id, ReportVote.user_id == user_id, batch_size)
+    if not ids:
+        return 0
+    votes = ReportVote.__table__
+    removed = delete_returning(db.session, votes, votes.c.id.in_(ids), votes.c.report_id, votes.c.vote_type)
+    deltas = {}
+    for vote in removed:
+        up, down = deltas.get(vote.report_id, (0, 0))
+        deltas[vote.report_id] = (up - 1, down) if vote.vote_type == 'up' else (up, down - 1)
+    for report_id in sorted(deltas):
+        apply_vote_counts(report_id, *deltas[report_id])
+    return len(removed)
+
+
+def _chunk_deleter(model):
+    """Step deleting up to batch_size of the user's rows from `model` by primary key"""
+    def step(user_id, batch_size, job_id):
+        ids = _ids(model.id, model.user_id == user_id, batch_size)
+        if not ids:
+            return 0
+        return db.session.execute(model.__table__.delete().where(model.id.in_(ids))).rowcount
+    return step
+
+
+def _user_row(user_id, batch_size, job_id):
+    # A request in flight when the account was locked may have added rows
+    # after their step passed; they would block the user's DELETE
+    for _, step in STEPS['user'][:-1]:
+        while step(user_id, batch_size, job_id):
+            pass
+    delete_user_points(user_id)
+    user = db.session.get(User, user_id)
+    if user is None:
+        return 0
+    # Through the ORM so the stats listener sees it
+    db.session.delete(user)
+    return 1
+
+
+STEPS = {
+    'user': (
+        ('reports', _user_reports),
+        ('votes', _user_votes),
+        ('comments', _chunk_deleter(CommunityReportComment)),
+        ('point_logs', _chunk_deleter(UserPointLog)),
+        ('lesson_progress', _chunk_deleter(LessonProgress)),
+        ('learning_progress', _chunk_deleter(LearningProgress)),
+        ('protection_status', _chunk_deleter(ProtectionStatus)),
+        ('scans', _chunk_deleter(UserScan)),
+        ('archived_scans', _chunk_deleter(UserScanArchive)),
+        ('token_families', _chunk_deleter(TokenFamily)),
+        ('user', _user_row),
+    ),
+}
+# Steps that remove a single row and are done after one pass
+_ONE_SHOT = {'user'}
+
+
+# --- jobs ----------------------------------------------------------------------
+
+def start_deletion_job(kind, target_id, requested_by=None):
+    """Create a deletion job, or return the unfinished one for the same target. Commits.
+
+    A user is deactivated and signed out everywhere in the same transaction.
+    """
+    if kind not in STEPS:
+        raise ValueError(f"Unknown deletion kind: {kind}")
+    job = DeletionJob.query.filter(
+        DeletionJob.kind == kind, DeletionJob.target_id == target_id,
+        DeletionJob.status.in_(ACTIVE_STATUSES + ('failed',))
+    ).order_by(DeletionJob.id.desc()).first()
+    if job is None:
+        job = DeletionJob(kind=kind, target_id=target_id, status='pending', step=STEPS[kind][0][0],
+                          progress={}, requested_by=requested_by)
+        db.session.add(job)
+    elif job.status == 'failed':
+        job.status = 'pending'
+    if kind == 'user':
+        user = db.session.get(User, target_id)
+        if user is not None:
+            user.is_active = False
+            user.account_status = 'DELETED'
+        revoke_user(target_id, 'account_deleted')
+    db.session.commit()
+    return job
+
+
+def _claim(job_id):
+    """Take the lease on an unfinished job nobody else holds. Commits."""
+    now = datetime.utcnow()
+    claimed = db.session.execute(
+        update(DeletionJob)
+        .where(DeletionJob.id == job_id,
+               DeletionJob.status.in_(ACTIVE_STATUSES + ('failed',)),
+               or_(DeletionJob.lease_until.is_(None), DeletionJob.lease_until < now))
+        .values(status='running', error=None,
+                lease_until=now + timedelta(seconds=config_int('BULK_DELETE_LEASE_SECONDS', 120)))
+    ).rowcount
+    db.session.commit()
+    return bool(claimed)
+
+
+def run_deletion_job(job_id, batch_size=None):
+    """Run (or resume) a job to completion in this thread. Returns the job, or None
+    if another worker holds it or it is already finished."""
+    if not _claim(job_id):
+        return None
+    batch_size = _batch_size(batch_size)
+    lease = timedelta(seconds=config_int('BULK_DELETE_LEASE_SECONDS', 120))
+    job = db.session.get(DeletionJob, job_id)
+    steps = STEPS[job.kind]
+    names = [name for name, _ in steps]
+    start = names.index(job.step) if job.step in names else 0
+    try:
+        for name, step in steps[start:]:
+            while True:
+                deleted = step(job.target_id, batch_size, job.id)
+                progress = dict(job.progress or {})
+                progress[name] = progress.get(name, 0) + deleted
+                job.progress = progress
+                job.step = name
+                job.lease_until = datetime.utcnow() + lease
+                db.session.commit()
+                if not deleted or name in _ONE_SHOT:
+                    break
+        job.status = 'done'
+        job.step = None
+        job.lease_until = None
+        job.finished_at = datetime.utcnow()
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Deletion job {job_id} failed in step {job.step}: {e}")
+        db.session.execute(
+            update(DeletionJob).where(DeletionJob.id == job_id)
+            .values(status='failed', error=str(e)[:1000], lease_until=None)
+        )
+        db.session.commit()
+        raise
+    logger.info(f"Deletion job {job_id} ({job.kind} {job.target_id}) finished: {job.progress}")
+    return job
+
+
+def resume_deletion_jobs(batch_size=None):
+    """Run every unfinished job whose lease has expired. Returns the ids completed."""
+    ids = [row.id for row in db.session.query(DeletionJob.id)
+           .filter(DeletionJob.status.in_(ACTIVE_STATUSES),
+                   or_(DeletionJob.lease_until.is_(None), DeletionJob.lease_until < datetime.utcnow()))
+           .order_by(DeletionJob.id)]
+    done = []
+    for job_id in ids:
+        try:
+            if run_deletion_job(job_id, batch_size=batch_size) is not None:
+                done.append(job_id)
+        except Exception:
+            # Recorded on the job; carry on with the others
+            continue
+    return done
+
+
+def _run_in_background(app, job_id):
+    with app.app_context():
+        try:
+            if job_id is None:
+                resume_deletion_jobs()
+            else:
+                run_deletion_job(job_id)
+            process_media_deletions()
+        except Exception as e:
+            logger.error(f"Background deletion failed: {e}")
+        finally:
+            db.session.remove()
+
+
+def run_deletion_in_background(job_id=None):
+    """Run a job (or resume all unfinished jobs when job_id is None) in a daemon thread"""
+    threading.Thread(
+        target=_run_in_background, args=(current_app._get_current_object(), job_id),
+        name='bulk-delete', daemon=True,
+    ).start()
+
+
+def maybe_resume_deletion_jobs():
+    """Resume interrupted jobs in the background if there are any (on a process's first request); never raises"""
+    try:
+        stale = db.session.query(DeletionJob.id).filter(
+            DeletionJob.status.in_(ACTIVE_STATUSES),
+            or_(DeletionJob.lease_until.is_(None), DeletionJob.lease_until < datetime.utcnow())
+        ).first()
+        due = db.session.query(MediaDeletion.id).filter(MediaDeletion.status == 'pending').first()
+    except Exception as e:
+        logger.warning(f"Could not check for unfinished deletion jobs: {e}")
+        db.session.rollback()
+        return False
+    if stale is not None:
+        run_deletion_in_background()
+        return True
+    if due is not None:
+        return maybe_process_media_deletions()
+    return False
+
+
+# --- media deletion queue --------------------------------------------------------
+
+def queue_media_deletions(urls, job_id=None):
+    """Queue media URLs for removal by the background worker (caller commits)"""
+    urls = [url for url in urls if url]
+    if urls:
+        now = datetime.utcnow()
+        db.session.execute(insert(MediaDeletion.__table__), [
+            {'media_url': url, 'job_id': job_id, 'status': 'pending', 'attempts': 0,
+             'next_attempt_at': now, 'created_at': now}
+            for url in urls
+        ])
+
+
+def cloudinary_public_id(media_url):
+    """Public id of a Cloudinary delivery URL (the path after upload/<version>/, without extension)"""
+    parts = urlparse(media_url).path.split('/')
+    if 'upload' not in parts:
+        return None
+    public_id_with_ext = '/'.join(parts[parts.index('upload') + 2:])
+    return os.path.splitext(public_id_with_ext)[0] or None
+
+
+def remove_media(media_url):
+    """Remove one local upload or Cloudinary asset; raises MediaDeletionError to retry.
+    Files and assets that are already gone count as removed."""
+    if media_url.startswith(LOCAL_MEDIA_PREFIX):
+        upload_folder = current_app.config.get('UPLOAD_FOLDER')
+        if not upload_folder:
+            return
+        folder = os.path.realpath(upload_folder)
+        file_path = os.path.realpath(os.path.join(folder, media_url[len(LOCAL_MEDIA_PREFIX):]))
+        if not file_path.startswith(folder + os.sep):
+            logger.warning(f"Refusing to delete media outside the upload folder: {media_url}")
+            return
+        try:
+            os.remove(file_path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            raise MediaDeletionError(str(e))
+        return
+    if 'res.cloudinary.com' not in media_url:
+        return
+    public_id = cloudinary_public_id(media_url)
+    if not public_id:
+        return
+    config = current_app.config
+    cloud_name, api_key, api_secret = (config.get('CLOUDINARY_CLOUD_NAME'), config.get('CLOUDINARY_API_KEY'),
+                                       config.get('CLOUDINARY_API_SECRET'))
+    if not (cloudinary and cloud_name and api_key and api_secret):
+        raise MediaDeletionError('Cloudinary is not configured')
+    cloudinary.config(cloud_name=cloud_name, api_key=api_key, api_secret=api_secret, secure=True)
+    try:
+        result = cloudinary.uploader.destroy(public_id)
+    except Exception as e:
+        raise MediaDeletionError(str(e))
+    if (result or {}).get('result') not in ('ok', 'not found'):
+        raise MediaDeletionError(f"Cloudinary destroy returned {result}")
+
+
+def process_media_deletions(limit=None):
+    """Attempt every due media deletion. Returns {'deleted', 'retrying', 'failed'} counts."""
+    max_attempts = config_int('MEDIA_DELETION_MAX_ATTEMPTS', 6)
+    retry_seconds = config_int('MEDIA_DELETION_RETRY_SECONDS', 60)
+    lease = timedelta(seconds=config_int('BULK_DELETE_LEASE_SECONDS', 120))
+    summary = {'deleted': 0, 'retrying': 0, 'failed': 0}
+    while limit is None or sum(summary.values()) < limit:
+        remaining = MEDIA_BATCH_SIZE if limit is None else min(MEDIA_BATCH_SIZE, limit - sum(summary.values()))
+        tasks = claim_due(MediaDeletion, datetime.utcnow(), lease, remaining,
+                          MediaDeletion.id, MediaDeletion.media_url, MediaDeletion.attempts)
+        if tasks is None:
+            break
+        removed = []
+        for task in tasks:
+            try:
+                remove_media(task.media_url)
+            except MediaDeletionError as e:
+                values, outcome = failed_attempt(task.attempts + 1, e, max_attempts, retry_seconds)
+                if outcome == 'failed':
+                    logger.error(f"Giving up deleting media {task.media_url}: {e}")
+                summary[outcome] += 1
+                db.session.execute(update(MediaDeletion).where(MediaDeletion.id == task.id).values(**values))
+            else:
+                removed.append(task.id)
+        if removed:
+            db.session.execute(MediaDeletion.__table__.delete().where(MediaDeletion.id.in_(removed)))
+            summary['deleted'] += len(removed)
+        db.session.commit()
+    return summary
+
+
+def _drain_media_queue():
+    process_media_deletions()
+
+
+# The media deletion thread; deletions queued while it stops wake it for another pass
+_media_worker = ProcessWorker('media-deletion', _drain_media_queue)
+
+
+def maybe_process_media_deletions():
+    """Start a media deletion worker thread unless one is already running; never raises"""
+    return _media_worker.start()
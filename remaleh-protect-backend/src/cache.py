@@ -35,6 +35,15 @@ class RedisCache:
             logger.error(f"Failed to connect to Redis: {e}")
             self.redis_client = None
     
+    def reset_after_fork(self):
+        """Discard Redis connections inherited from a pre-fork parent process"""
+        if not self.redis_client:
+            return
+        try:
+            self.redis_client.connection_pool.reset()
+        except Exception as e:
+            logger.warning(f"Error resetting Redis pool after fork: {e}")
+    
     def get(self, key, default=None):
         """Get value from cache"""
         if not self.redis_client:
@@ -0,0 +1,308 @@
+"""
+Cached answers for the chat assistant's AI fallback.
+
+Questions that no rule answers go to the model, and most of them are the
+same few questions worded slightly differently. Answers are cached by the
+normalised question (case-folded, punctuation and extra whitespace removed)
+for ``CHAT_CACHE_SECONDS``: in process memory, bounded to
+``CHAT_CACHE_MAX_ENTRIES`` with least-recently-used eviction, and in Redis
+(``chat:answer:<hash>``) so one worker's answer serves the others.
+
+With ``CHAT_CACHE_SIMILARITY`` set (e.g. 0.9), a question that is not cached
+word for word can also be answered from a cached question whose character
+4-gram sets have at least that Jaccard similarity. Candidates are found by
+locality-sensitive hashing of MinHash signatures (16 bands of 4 of 64
+hashes), so a lookup touches only questions that share a band, not the whole
+cache; the candidates are then compared exactly. Similar matching uses the
+questions cached in this process.
+
+Concurrent requests with the same normalised question share one upstream
+call: the first asks the model and the others wait up to
+``CHAT_COALESCE_WAIT_SECONDS`` for its answer. Failed calls and answers the
+caller marks as not cacheable are passed to the waiting requests but not
+stored.
+
+Streamed answers can't be shared while they are generated; the streaming
+endpoint looks them up with ``cached_answer`` and stores them with
+``remember_answer`` once complete.
+
+Every lookup is counted by result (hit, similar, coalesced, miss) together
+with the tokens and estimated cost the answer took when it was generated,
+which is what a hit saved.
+"""
+
+import hashlib
+import json
+import logging
+import random
+import re
+import threading
+import time
+import unicodedata
+import zlib
+from collections import OrderedDict
+
+from flask import current_app
+
+try:
+    from .cache import cache
+    from .monitoring import record_chat_answer
+except ImportError:
+    from cache import cache
+    from monitoring import record_chat_answer
+
+logger = logging.getLogger(__name__)
+
+SHINGLE_SIZE = 4
+NUM_HASHES = 64
+BANDS = 16
+_ROWS = NUM_HASHES // BANDS
+_PRIME = (1 << 61) - 1
+_rng = random.Random(20240601)
+_HASH_PARAMS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_HASHES)]
+
+# key -> {'text', 'tokens', 'cost', 'expires' (monotonic), 'shingles', 'bands'}
+_entries = OrderedDict()
+# (band number, band hashes) -> keys of entries with that band
+_buckets = {}
+_lock = threading.Lock()
+# key -> _Call of the upstream request in progress
+_inflight = {}
+_inflight_lock = threading.Lock()
+_stats = {'hit': 0, 'similar': 0, 'coalesced': 0, 'miss': 0, 'tokens_saved': 0, 'cost_saved': 0.0}
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.answer = None
+
+
+def normalize_question(text):
+    """Case-folded question with punctuation removed and whitespace collapsed"""
+    text = unicodedata.normalize('NFKC', text or '').casefold()
+    return ' '.join(re.sub(r'[^\w\s]', ' ', text).split())
+
+
+def shingles(normalized):
+    """Character 4-grams of a normalised question (the whole question if shorter)"""
+    padded = f" {normalized} "
+    if len(padded) <= SHINGLE_SIZE:
+        return frozenset([padded])
+    return frozenset(padded[i:i + SHINGLE_SIZE] for i in range(len(padded) - SHINGLE_SIZE + 1))
+
+
+def minhash(shingle_set):
+    """MinHash signature: per hash function, the smallest hash of any shingle"""
+    values = [zlib.crc32(s.encode('utf-8')) for s in shingle_set]
+    return tuple(min((a * v + b) % _PRIME for v in values) for a, b in _HASH_PARAMS)
+
+
+def _bands(signature):
+    return [(band, signature[band * _ROWS:(band + 1) * _ROWS]) for band in range(BANDS)]
+
+
+def jaccard(a, b):
+    return len(a & b) / len(a | b) if a or b else 1.0
+
+
+def question_key(normalized, version=''):
+    return hashlib.sha256(f"{version}\n{normalized}".encode('utf-8')).hexdigest()[:32]
+
+
+def _redis_key(key):
+    return f"chat:answer:{key}"
+
+
+def _setting(name, default):
+    return current_app.config.get(name, default)
+
+
+def _drop(key):
+    entry = _entries.pop(key, None)
+    for band in (entry or {}).get('bands', ()):
+        keys = _buckets.get(band)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del _buckets[band]
+
+
+def _remember(key, normalized, answer, ttl):
+    shingle_set = shingles(normalized)
+    entry = {
+        'text': answer['text'], 'tokens': answer.get('tokens', 0), 'cost': answer.get('cost', 0.0),
+        'expires': time.monotonic() + ttl, 'shingles': shingle_set, 'bands': _bands(minhash(shingle_set)),
+    }
+    max_entries = int(_setting('CHAT_CACHE_MAX_ENTRIES', 5000))
+    with _lock:
+        _drop(key)
+        _entries[key] = entry
+        for band in entry['bands']:
+            _buckets.setdefault(band, set()).add(key)
+        while len(_entries) > max_entries:
+            _drop(next(iter(_entries)))
+    return entry
+
+
+def _local(key):
+    with _lock:
+        entry = _entries.get(key)
+        if entry is None:
+            return None
+        if entry['expires'] <= time.monotonic():
+            _drop(key)
+            return None
+        _entries.move_to_end(key)
+        return entry
+
+
+def _from_redis(key, normalized):
+    if cache.redis_client is None:
+        return None
+    try:
+        raw = cache.redis_client.get(_redis_key(key))
+        ttl = cache.redis_client.ttl(_redis_key(key)) if raw else None
+    except Exception as e:
+        logger.warning(f"Could not read cached chat answer: {e}")
+        return None
+    if not raw or ttl is None or ttl <= 0:
+        return None
+    return _remember(key, normalized, json.loads(raw), ttl)
+
+
+def _similar(normalized, threshold):
+    shingle_set = shingles(normalized)
+    now = time.monotonic()
+    best, best_score = None, threshold
+    with _lock:
+        candidates = set()
+        for band in _bands(minhash(shingle_set)):
+            candidates.update(_buckets.get(band, ()))
+        for key in candidates:
+            entry = _entries[key]
+            if entry['expires'] <= now:
+                continue
+            score = jaccard(shingle_set, entry['shingles'])
+            if score >= best_score:
+                best, best_score = entry, score
+    return best
+
+
+def _store(key, normalized, answer):
+    ttl = int(_setting('CHAT_CACHE_SECONDS', 21600))
+    _remember(key, normalized, answer, ttl)
+    if cache.redis_client is None:
+        return
+    try:
+        value = {'text': answer['text'], 'tokens': answer.get('tokens', 0), 'cost': answer.get('cost', 0.0)}
+        cache.redis_client.setex(_redis_key(key), ttl, json.dumps(value))
+    except Exception as e:
+        logger.warning(f"Could not cache chat answer: {e}")
+
+
+def _record(result, entry=None):
+    tokens = entry.get('tokens', 0) if entry and result != 'miss' else 0
+    cost = entry.get('cost', 0.0) if entry and result != 'miss' else 0.0
+    _stats[result] += 1
+    _stats['tokens_saved'] += tokens
+    _stats['cost_saved'] += cost
+    record_chat_answer(result, tokens, cost)
+
+
+def _find(key, normalized):
+    entry = _local(key) or _from_redis(key, normalized)
+    if entry is not None:
+        return entry, 'hit'
+    threshold = float(_setting('CHAT_CACHE_SIMILARITY', 0) or 0)
+    if threshold > 0:
+        entry = _similar(normalized, threshold)
+        if entry is not None:
+            return entry, 'similar'
+    return None, None
+
+
+def get_answer(question, ask, version=''):
+    """Answer text for `question`, from the cache or from ``ask(question)``; None if that fails.
+
+    `ask` returns None on failure or a dict with ``text`` and optionally ``tokens``,
+    ``cost`` (estimated USD) and ``cacheable`` (default True). `version` is part of
+    the cache key; change it when prompts or models change.
+    """
+    if int(_setting('CHAT_CACHE_SECONDS', 21600)) <= 0:
+        answer = ask(question)
+        return answer['text'] if answer else None
+
+    normalized = normalize_question(question)
+    key = question_key(normalized, version)
+    entry, result = _find(key, normalized)
+    if entry is not None:
+        _record(result, entry)
+        return entry['text']
+
+    with _inflight_lock:
+        call = _inflight.get(key)
+        leader = call is None
+        if leader:
+            call = _inflight[key] = _Call()
+    if not leader:
+        if call.done.wait(float(_setting('CHAT_COALESCE_WAIT_SECONDS', 30))):
+            _record('coalesced', call.answer)
+            return call.answer['text'] if call.answer else None
+        # The first request is taking too long; ask on this request's own time
+        answer = ask(question)
+        _record('miss')
+        return answer['text'] if answer else None
+
+    answer = None
+    try:
+        answer = ask(question)
+        if answer and answer.get('cacheable', True):
+            _store(key, normalized, answer)
+    finally:
+        call.answer = answer
+        call.done.set()
+        with _inflight_lock:
+            _inflight.pop(key, None)
+    _record('miss')
+    return answer['text'] if answer else None
+
+
+def cached_answer(question, version=''):
+    """Cached answer text for `question`, or None; a miss is counted as one, the caller asks upstream"""
+    if int(_setting('CHAT_CACHE_SECONDS', 21600)) <= 0:
+        return None
+    normalized = normalize_question(question)
+    entry, result = _find(question_key(normalized, version), normalized)
+    _record(result or 'miss', entry)
+    return entry['text'] if entry else None
+
+
+def remember_answer(question, answer, version=''):
+    """Cache an answer obtained without get_answer, e.g. one that was streamed"""
+    if int(_setting('CHAT_CACHE_SECONDS', 21600)) <= 0:
+        return
+    normalized = normalize_question(question)
+    _store(question_key(normalized, version), normalized, answer)
+
+
+def stats():
+    """Lookups by result in this process, hit rate, and tokens and cost saved by hits"""
+    lookups = sum(_stats[result] for result in ('hit', 'similar', 'coalesced', 'miss'))
+    served = lookups - _stats['miss']
+    return {
+        **{result: _stats[result] for result in ('hit', 'similar', 'coalesced', 'miss')},
+        'hit_rate': round(served / lookups, 4) if lookups else 0.0,
+        'tokens_saved': _stats['tokens_saved'],
+        'cost_saved_usd': round(_stats['cost_saved'], 4),
+        'entries': len(_entries),
+    }
+
+
+def clear():
+    """Forget this process's cached answers and counts (Redis entries expire on their own)"""
+    with _lock:
+        _entries.clear()
+        _buckets.clear()
+    for name in _stats:
+        _stats[name] = 0.0 if name == 'cost_saved' else 0
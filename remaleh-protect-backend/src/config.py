@@ -52,6 +52,28 @@ class Config:
     # Performance
     THREAT_INTEL_CACHE_TTL = int(os.getenv('THREAT_INTEL_CACHE_TTL', 1800))
     USER_SCAN_CACHE_TTL = int(os.getenv('USER_SCAN_CACHE_TTL', 900))
+    # Buffer vote counters in Redis for reports voted on faster than this per minute
+    VOTE_BUFFER_ENABLED = os.getenv('VOTE_BUFFER_ENABLED', 'false').lower() == 'true'
+    VOTE_BUFFER_HOT_VOTES_PER_MINUTE = int(os.getenv('VOTE_BUFFER_HOT_VOTES_PER_MINUTE', 30))
+    VOTE_BUFFER_FLUSH_INTERVAL_MS = int(os.getenv('VOTE_BUFFER_FLUSH_INTERVAL_MS', 1000))
+    # Scans older than SCAN_HOT_DAYS move to the compressed archive; archived scans
+    # older than SCAN_RETENTION_DAYS are purged (0 keeps them forever)
+    SCAN_RETENTION_ENABLED = os.getenv('SCAN_RETENTION_ENABLED', 'true').lower() == 'true'
+    SCAN_HOT_DAYS = int(os.getenv('SCAN_HOT_DAYS', 90))
+    SCAN_RETENTION_DAYS = int(os.getenv('SCAN_RETENTION_DAYS', 365))
+    SCAN_RETENTION_BATCH_SIZE = int(os.getenv('SCAN_RETENTION_BATCH_SIZE', 500))
+    SCAN_RETENTION_INTERVAL_SECONDS = int(os.getenv('SCAN_RETENTION_INTERVAL_SECONDS', 3600))
+    # Bulk deletion (bulk_delete.py): rows per transaction, job lease, media deletion retries
+    BULK_DELETE_BATCH_SIZE = int(os.getenv('BULK_DELETE_BATCH_SIZE', 500))
+    BULK_DELETE_LEASE_SECONDS = int(os.getenv('BULK_DELETE_LEASE_SECONDS', 120))
+    MEDIA_DELETION_MAX_ATTEMPTS = int(os.getenv('MEDIA_DELETION_MAX_ATTEMPTS', 6))
+    MEDIA_DELETION_RETRY_SECONDS = int(os.getenv('MEDIA_DELETION_RETRY_SECONDS', 60))
+    # Periodic removal of media/comments/votes/point logs whose report is gone
+    ORPHAN_CLEANUP_ENABLED = os.getenv('ORPHAN_CLEANUP_ENABLED', 'true').lower() == 'true'
+    ORPHAN_CLEANUP_BATCH_SIZE = int(os.getenv('ORPHAN_CLEANUP_BATCH_SIZE', 1000))
+    ORPHAN_CLEANUP_INTERVAL_SECONDS = int(os.getenv('ORPHAN_CLEANUP_INTERVAL_SECONDS', 86400))
+    # Seconds an authenticated user's id/role/status snapshot is cached (auth.py)
+    PRINCIPAL_CACHE_TTL = int(os.getenv('PRINCIPAL_CACHE_TTL', 60))
     
     # SSL/HTTPS
     FORCE_HTTPS = os.getenv('FORCE_HTTPS', 'false').lower() == 'true'
@@ -86,6 +108,12 @@ class Config:
     SMTP_USERNAME = os.getenv('SMTP_USERNAME')
     SMTP_PASSWORD = os.getenv('SMTP_PASSWORD')
     SMTP_USE_TLS = os.getenv('SMTP_USE_TLS', 'true').lower() == 'true'
+    SMTP_TIMEOUT_SECONDS = int(os.getenv('SMTP_TIMEOUT_SECONDS', 10))
+    # Email outbox (email_outbox.py): retries with backoff, idle SMTP session lifetime, sent-row retention
+    EMAIL_MAX_ATTEMPTS = int(os.getenv('EMAIL_MAX_ATTEMPTS', 5))
+    EMAIL_RETRY_SECONDS = int(os.getenv('EMAIL_RETRY_SECONDS', 60))
+    EMAIL_SMTP_IDLE_SECONDS = int(os.getenv('EMAIL_SMTP_IDLE_SECONDS', 30))
+    EMAIL_OUTBOX_RETENTION_DAYS = int(os.getenv('EMAIL_OUTBOX_RETENTION_DAYS', 30))
     RESEND_API_KEY = os.getenv('RESEND_API_KEY')
     SENDGRID_API_KEY = os.getenv('SENDGRID_API_KEY')
     REQUIRE_EMAIL_VERIFICATION = os.getenv('REQUIRE_EMAIL_VERIFICATION', 'false').lower() == 'true'
@@ -100,6 +128,49 @@ class Config:
     APPLE_KEY_ID = os.getenv('APPLE_KEY_ID')
     APPLE_PRIVATE_KEY = os.getenv('APPLE_PRIVATE_KEY')  # contents of .p8 key
     APPLE_REDIRECT_URI = os.getenv('APPLE_REDIRECT_URI')
+    # Google/Apple ID token verification (id_tokens.py): JWKS cache lifetime when the provider
+    # sends no max-age, minimum gap between refreshes for unknown key ids, clock skew allowed
+    JWKS_CACHE_SECONDS = int(os.getenv('JWKS_CACHE_SECONDS', 3600))
+    JWKS_REFRESH_MIN_SECONDS = int(os.getenv('JWKS_REFRESH_MIN_SECONDS', 60))
+    JWKS_TIMEOUT_SECONDS = int(os.getenv('JWKS_TIMEOUT_SECONDS', 5))
+    ID_TOKEN_LEEWAY_SECONDS = int(os.getenv('ID_TOKEN_LEEWAY_SECONDS', 60))
+    # Sign-in throttling (login_throttle.py): failures allowed per sliding window, then a
+    # lockout that doubles with each repeat up to the maximum
+    LOGIN_WINDOW_SECONDS = int(os.getenv('LOGIN_WINDOW_SECONDS', 900))
+    LOGIN_MAX_FAILURES_PER_ACCOUNT = int(os.getenv('LOGIN_MAX_FAILURES_PER_ACCOUNT', 5))
+    LOGIN_MAX_FAILURES_PER_IP = int(os.getenv('LOGIN_MAX_FAILURES_PER_IP', 20))
+    LOGIN_LOCKOUT_SECONDS = int(os.getenv('LOGIN_LOCKOUT_SECONDS', 60))
+    LOGIN_LOCKOUT_MAX_SECONDS = int(os.getenv('LOGIN_LOCKOUT_MAX_SECONDS', 3600))
+    # Proxies in front of the app that append the client address to X-Forwarded-For (Render's
+    # load balancer is one). The client address used for per-IP limits is read from that header,
+    # that many entries from the end; 0 ignores the header and uses the connecting address
+    PROXY_FIX_X_FOR = int(os.getenv('PROXY_FIX_X_FOR', 1))
+    # Password hashing (passwords.py): policy in werkzeug method syntax (older hashes are
+    # upgraded at sign-in), pool processes per worker (0 hashes inline), calls allowed to
+    # queue before new ones are refused, per-call timeout, Retry-After sent when refused
+    PASSWORD_HASH_METHOD = os.getenv('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:600000')
+    PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', 1))
+    PASSWORD_HASH_MAX_PENDING = int(os.getenv('PASSWORD_HASH_MAX_PENDING', 32))
+    PASSWORD_HASH_TIMEOUT_SECONDS = int(os.getenv('PASSWORD_HASH_TIMEOUT_SECONDS', 10))
+    PASSWORD_HASH_RETRY_AFTER_SECONDS = int(os.getenv('PASSWORD_HASH_RETRY_AFTER_SECONDS', 1))
+    # Token revocation (token_store.py): how often each process pulls revocations made by
+    # other processes; revoked sessions' access tokens may be accepted elsewhere this long
+    TOKEN_REVOCATION_SYNC_SECONDS = float(os.getenv('TOKEN_REVOCATION_SYNC_SECONDS', 1))
+    # Domain lists (domain_index.py), matched with subdomains: disposable email providers
+    # rejected at registration (comma-separated extras and/or a file, one domain per line),
+    # malicious domains for link analysis, and how often the files are checked for changes
+    DISPOSABLE_EMAIL_DOMAINS = os.getenv('DISPOSABLE_EMAIL_DOMAINS', '')
+    DISPOSABLE_DOMAINS_FILE = os.getenv('DISPOSABLE_DOMAINS_FILE', '')
+    MALICIOUS_DOMAINS_FILE = os.getenv('MALICIOUS_DOMAINS_FILE', '')
+    DOMAIN_LIST_RELOAD_SECONDS = int(os.getenv('DOMAIN_LIST_RELOAD_SECONDS', 30))
+    # Chat answer cache (chat_cache.py): lifetime of cached AI answers (0 disables caching),
+    # answers kept per process, minimum similarity for answering a reworded question from
+    # the cache (0 = exact normalised match only; 0.9 is a cautious setting), and how long
+    # identical concurrent questions wait for the first one's answer
+    CHAT_CACHE_SECONDS = int(os.getenv('CHAT_CACHE_SECONDS', 21600))
+    CHAT_CACHE_MAX_ENTRIES = int(os.getenv('CHAT_CACHE_MAX_ENTRIES', 5000))
+    CHAT_CACHE_SIMILARITY = float(os.getenv('CHAT_CACHE_SIMILARITY', 0))
+    CHAT_COALESCE_WAIT_SECONDS = float(os.getenv('CHAT_COALESCE_WAIT_SECONDS', 30))
 
 class DevelopmentConfig(Config):
     """Development configuration"""
@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine, Index, text
+from sqlalchemy import create_engine, Index, select, text
 from sqlalchemy.orm import sessionmaker, scoped_session
 from sqlalchemy.pool import QueuePool
 from sqlalchemy.exc import SQLAlchemyError
@@ -162,6 +162,17 @@ class DatabaseManager:
         except Exception as e:
             logger.error(f"Error creating performance indexes: {e}")
     
+    def dispose_after_fork(self):
+        """Drop pooled connections inherited from a pre-fork parent process.
+
+        ``close=False`` leaves the parent's sockets untouched so the master
+        keeps working; the child simply starts with an empty pool.
+        """
+        if self.engine is not None:
+            self.engine.dispose(close=False)
+        if self.Session is not None:
+            self.Session.remove()
+    
     def get_session(self):
         """Get a new database session"""
         return self.Session()
@@ -220,6 +231,48 @@ class DatabaseManager:
 # Global database manager instance
 db_manager = DatabaseManager()
 
+def upsert_increment(session, model, keys, increments):
+    """Atomically add to counter columns of the row identified by `keys`, creating it if missing.
+
+    `increments` maps column name -> delta. Uses INSERT ... ON CONFLICT DO UPDATE
+    on PostgreSQL and SQLite so concurrent writers never lose an update.
+    """
+    table = model.__table__
+    dialect = session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        row = session.query(model).filter_by(**keys).with_for_update().first()
+        if row is None:
+            session.add(model(**keys, **increments))
+        else:
+            for column, delta in increments.items():
+                setattr(row, column, (getattr(row, column) or 0) + delta)
+        return
+    stmt = insert(table).values(**keys, **increments)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=list(keys),
+        set_={column: table.c[column] + delta for column, delta in increments.items()}
+    )
+    session.execute(stmt)
+
+def delete_returning(session, table, where, *columns):
+    """DELETE the rows of `table` matching `where` and return `columns` of the rows actually removed.
+
+    Uses DELETE ... RETURNING where the dialect supports it, so callers adjust
+    counters only for rows this statement deleted. Elsewhere the rows are
+    locked and read first, then deleted by primary key.
+    """
+    if session.get_bind().dialect.delete_returning:
+        return session.execute(table.delete().where(where).returning(*columns)).all()
+    key = list(table.primary_key.columns)[0]
+    rows = session.execute(select(*columns, key.label('_pk')).where(where).with_for_update()).all()
+    if rows:
+        session.execute(table.delete().where(key.in_([row._pk for row in rows])))
+    return rows
+
 def get_db_session():
     """Get database session from manager"""
     return db_manager.get_session()
@@ -0,0 +1,162 @@
+"""
+Domain lists matched with their subdomains: disposable email providers,
+known malicious sites, URL shorteners.
+
+A ``DomainIndex`` is a frozen set of domains. A lookup tries the domain
+itself and then each parent domain (``a.b.example.com``, ``b.example.com``,
+``example.com``), so it costs one set probe per label however many entries
+the list has, and ``inbox.mailinator.com`` matches ``mailinator.com``.
+Single-label entries (``com``) are ignored so a stray line in a list cannot
+match a whole top-level domain.
+
+A ``DomainList`` is a built-in index extended by a comma-separated config
+setting and a local file (one domain per line, ``#`` comments), e.g. a
+public disposable-domain list with tens of thousands of entries. The index
+is built once and rebuilt only when the setting or the file changes; the
+file's modification time is checked at most every
+``DOMAIN_LIST_RELOAD_SECONDS``, so a replaced file is picked up without a
+restart. A file that can't be read keeps the previous index.
+"""
+
+import logging
+import os
+import threading
+import time
+
+from flask import current_app, has_app_context
+
+logger = logging.getLogger(__name__)
+
+DISPOSABLE_DOMAINS_DEFAULT = {
+    'mailinator.com', '10minutemail.com', 'tempmail.com', 'guerrillamail.com',
+    'trashmail.com', 'yopmail.com', 'emailtemp.org', 'maildrop.cc',
+    'dispostable.com', 'fakeinbox.com', 'temp-mail.org', 'moakt.com'
+}
+
+
+def normalize_domain(domain):
+    """Lower-cased host name without user info, port, wildcard prefix or trailing dot"""
+    domain = (domain or '').strip().lower()
+    domain = domain.rsplit('@', 1)[-1].split(':', 1)[0]
+    if domain.startswith('*.'):
+        domain = domain[2:]
+    return domain.strip('.')
+
+
+class DomainIndex:
+    """Immutable set of domains; a domain matches if it or any parent domain is in the set"""
+
+    __slots__ = ('_domains',)
+
+    def __init__(self, domains=()):
+        normalized = (normalize_domain(domain) for domain in domains)
+        self._domains = frozenset(domain for domain in normalized if '.' in domain)
+
+    def match(self, domain):
+        """The listed domain that `domain` equals or is a subdomain of, or None"""
+        domain = normalize_domain(domain)
+        while '.' in domain:
+            if domain in self._domains:
+                return domain
+            domain = domain.split('.', 1)[1]
+        return None
+
+    def __contains__(self, domain):
+        return self.match(domain) is not None
+
+    def __len__(self):
+        return len(self._domains)
+
+
+def read_domain_file(path):
+    """Domains listed in a file, one per line; blank lines and # comments are skipped"""
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.split('#', 1)[0].strip()
+            if line:
+                yield line
+
+
+def _setting(name, default=None):
+    if has_app_context():
+        value = current_app.config.get(name)
+        if value is not None:
+            return value
+    return os.getenv(name, default)
+
+
+class DomainList:
+    """A DomainIndex of built-in domains plus those of a config setting and a local file.
+
+    `extra_setting` names a comma-separated list of domains and `file_setting`
+    the path of a domain file; both are read from the app config, falling back
+    to the environment.
+    """
+
+    def __init__(self, builtin, file_setting, extra_setting=None):
+        self.builtin = tuple(builtin)
+        self.file_setting = file_setting
+        self.extra_setting = extra_setting
+        self._index = DomainIndex(self.builtin)
+        self._source = (None, None, None)
+        # time.monotonic() of the next check for changed sources
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+
+    def _current_source(self):
+        path = _setting(self.file_setting) or None
+        extra = str(_setting(self.extra_setting) or '') if self.extra_setting else ''
+        mtime = None
+        if path:
+            try:
+                mtime = os.stat(path).st_mtime_ns
+            except OSError as e:
+                logger.warning(f"Cannot read domain list {path}: {e}")
+                return None
+        return path, mtime, extra
+
+    def index(self):
+        """The current DomainIndex, rebuilt first if its sources have changed"""
+        if time.monotonic() < self._next_check:
+            return self._index
+        return self.reload()
+
+    def reload(self):
+        """Check the sources now and rebuild the index if they changed; returns the index"""
+        with self._lock:
+            source = self._current_source()
+            if source is not None and source != self._source:
+                self._reload(source)
+            self._next_check = time.monotonic() + float(_setting('DOMAIN_LIST_RELOAD_SECONDS', 30))
+        return self._index
+
+    def _reload(self, source):
+        path, _, extra = source
+        domains = list(self.builtin)
+        domains.extend(domain for domain in extra.split(',') if domain.strip())
+        if path:
+            try:
+                domains.extend(read_domain_file(path))
+            except (OSError, UnicodeDecodeError) as e:
+                logger.warning(f"Keeping previous domain list, cannot read {path}: {e}")
+                return
+        started = time.perf_counter()
+        # Swapped in whole: concurrent lookups see the old index or the new one
+        self._index = DomainIndex(domains)
+        self._source = source
+        logger.info(f"Loaded {len(self._index)} domains for {self.file_setting} "
+                    f"in {(time.perf_counter() - started) * 1000:.0f} ms")
+
+    def match(self, domain):
+        return self.index().match(domain)
+
+    def __contains__(self, domain):
+        return self.index().match(domain) is not None
+
+
+disposable_domains = DomainList(DISPOSABLE_DOMAINS_DEFAULT, 'DISPOSABLE_DOMAINS_FILE', 'DISPOSABLE_EMAIL_DOMAINS')
+
+
+def is_disposable_domain(domain):
+    """Whether an email domain (or a parent of it) is a disposable-mail provider"""
+    return bool(domain) and domain in disposable_domains
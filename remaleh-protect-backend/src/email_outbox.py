@@ -0,0 +1,297 @@
+"""
+Outgoing email, queued in the database and delivered in the background.
+
+Routes used to open an SMTP connection inside the request (connect,
+STARTTLS, login, send, quit) with a 10 s timeout, so a slow relay held a
+request worker and every message paid for a full TLS handshake. Now a route
+only calls ``queue_email`` and commits: the message is written to
+``email_outbox`` in the same transaction as the change that caused it (a
+rolled-back registration sends nothing).
+
+A sender thread (one per process, started by ``maybe_send_outbox``) leases
+up to ``EMAIL_BATCH_SIZE`` due messages at a time and sends them over one
+authenticated SMTP session, which stays open between batches and is
+re-established if the server drops it. The thread keeps running while
+messages are waiting for a retry, and closes the session and exits once the
+queue has been idle for ``EMAIL_SMTP_IDLE_SECONDS``.
+
+Each message ends up ``sent`` or ``failed``. Temporary failures (connection
+errors, 4xx replies, no SMTP configuration) are retried with exponential
+backoff from ``EMAIL_RETRY_SECONDS`` up to ``EMAIL_MAX_ATTEMPTS`` attempts.
+A permanent 5xx reply to the sender or recipients fails the message at once.
+The body is cleared when a message is sent or fails, because it carries
+verification codes and temporary passwords. Sent rows older than
+``EMAIL_OUTBOX_RETENTION_DAYS`` are purged by the sender. ``run_email_outbox.py``
+sends from cron, and ``GET /api/admin/email-outbox`` shows delivery status.
+"""
+
+import logging
+import smtplib
+import time
+from datetime import datetime, timedelta
+from email.mime.text import MIMEText
+
+from flask import current_app
+from sqlalchemy import func, update
+
+try:
+    from .models import db, OutboundEmail
+    from .monitoring import record_email_delivery
+    from .work_queue import claim_due, failed_attempt, config_int, ProcessWorker
+except ImportError:
+    from models import db, OutboundEmail
+    from monitoring import record_email_delivery
+    from work_queue import claim_due, failed_attempt, config_int, ProcessWorker
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SENDER = 'no-reply@remalehprotect.remaleh.com.au'
+# Messages leased and sent per round trip to the database
+EMAIL_BATCH_SIZE = 20
+# Lease on claimed messages; a sender that dies mid-batch releases them after this
+EMAIL_LEASE = timedelta(seconds=120)
+# Longest sleep between retry checks while the sender thread is alive
+MAX_WAIT_SECONDS = 60
+
+
+class EmailDeliveryError(Exception):
+    """A message could not be delivered; `permanent` ones are not retried"""
+
+    def __init__(self, message, permanent=False):
+        super().__init__(message)
+        self.permanent = permanent
+
+
+class SmtpUnavailable(EmailDeliveryError):
+    """The SMTP server could not be reached or refused the login (nothing can be sent)"""
+
+
+def queue_email(subject, to_email, html_body):
+    """Add a message to the outbox (caller commits, then calls maybe_send_outbox)"""
+    message = OutboundEmail(to_email=to_email, subject=subject, html_body=html_body, status='pending',
+                            attempts=0, next_attempt_at=datetime.utcnow())
+    db.session.add(message)
+    return message
+
+
+class SmtpSession:
+    """One authenticated SMTP connection, opened on first use and reused for every message"""
+
+    def __init__(self, config):
+        self.host = config.get('SMTP_HOST')
+        self.port = config.get('SMTP_PORT', 587)
+        self.username = config.get('SMTP_USERNAME')
+        self.password = config.get('SMTP_PASSWORD')
+        self.use_tls = config.get('SMTP_USE_TLS', True)
+        self.timeout = config.get('SMTP_TIMEOUT_SECONDS', 10)
+        self.sender = config.get('EMAIL_SENDER') or DEFAULT_SENDER
+        self.server = None
+        self.connections = 0
+
+    def _connect(self):
+        if not self.host or not self.username or not self.password:
+            raise SmtpUnavailable('SMTP not configured')
+        server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            if self.use_tls:
+                server.starttls()
+            server.login(self.username, self.password)
+        except Exception:
+            server.close()
+            raise
+        self.server = server
+        self.connections += 1
+
+    def send(self, to_email, subject, html_body):
+        msg = MIMEText(html_body or '', 'html')
+        msg['Subject'] = subject
+        msg['From'] = self.sender
+        msg['To'] = to_email
+        # A session left open since the last batch may have been dropped by the
+        # server; in that case reconnect and try once more
+        reused = self.server is not None
+        while True:
+            try:
+                if self.server is None:
+                    self._connect()
+                self.server.sendmail(self.sender, [to_email], msg.as_string())
+                return
+            except smtplib.SMTPRecipientsRefused as e:
+                codes = [code for code, _ in e.recipients.values()]
+                raise EmailDeliveryError(f"Recipient refused: {e.recipients}",
+                                         permanent=all(code >= 500 for code in codes))
+            except (smtplib.SMTPSenderRefused, smtplib.SMTPDataError) as e:
+                raise EmailDeliveryError(f"{e.smtp_code} {e.smtp_error!r}", permanent=e.smtp_code >= 500)
+            except smtplib.SMTPAuthenticationError as e:
+                self.close()
+                raise SmtpUnavailable(f"SMTP login failed: {e.smtp_code}")
+            except (smtplib.SMTPException, OSError) as e:
+                self.close()
+                if not reused:
+                    raise SmtpUnavailable(str(e) or e.__class__.__name__)
+                reused = False
+
+    def close(self):
+        if self.server is not None:
+            try:
+                self.server.quit()
+            except Exception:
+                try:
+                    self.server.close()
+                except Exception:
+                    pass
+            self.server = None
+
+
+def _failure(message, error, max_attempts, retry_seconds):
+    """Column values recording a failed attempt, and its outcome"""
+    values, outcome = failed_attempt(message.attempts + 1, error, max_attempts, retry_seconds,
+                                     give_up=error.permanent)
+    if outcome == 'failed':
+        values['html_body'] = None
+        logger.error(f"Giving up sending email {message.id} to {message.to_email}: {error}")
+    return values, outcome
+
+
+def send_outbox(session=None, limit=None):
+    """Send every due message over one SMTP session. Returns {'sent', 'retrying', 'failed'} counts.
+
+    Pass a SmtpSession to reuse it across calls; otherwise one is opened and closed here.
+    """
+    max_attempts = config_int('EMAIL_MAX_ATTEMPTS', 5)
+    retry_seconds = config_int('EMAIL_RETRY_SECONDS', 60)
+    own_session = session is None
+    session = session or SmtpSession(current_app.config)
+    summary = {'sent': 0, 'retrying': 0, 'failed': 0}
+    try:
+        while limit is None or sum(summary.values()) < limit:
+            remaining = EMAIL_BATCH_SIZE if limit is None else min(EMAIL_BATCH_SIZE, limit - sum(summary.values()))
+            messages = claim_due(OutboundEmail, datetime.utcnow(), EMAIL_LEASE, remaining,
+                                 OutboundEmail.id, OutboundEmail.to_email, OutboundEmail.subject,
+                                 OutboundEmail.html_body, OutboundEmail.attempts)
+            if messages is None:
+                break
+            sent = []
+            unavailable = None
+            for message in messages:
+                error = unavailable
+                if error is None:
+                    started = time.perf_counter()
+                    try:
+                        session.send(message.to_email, message.subject, message.html_body)
+                    except EmailDeliveryError as e:
+                        error = e
+                        if isinstance(e, SmtpUnavailable):
+                            # The rest of the batch would fail the same way
+                            unavailable = e
+                    else:
+                        sent.append(message.id)
+                        record_email_delivery('sent', time.perf_counter() - started)
+                        continue
+                values, outcome = _failure(message, error, max_attempts, retry_seconds)
+                db.session.execute(update(OutboundEmail).where(OutboundEmail.id == message.id).values(**values))
+                summary[outcome] += 1
+                record_email_delivery(outcome)
+            if sent:
+                db.session.execute(
+                    update(OutboundEmail).where(OutboundEmail.id.in_(sent)).values(
+                        status='sent', sent_at=datetime.utcnow(), html_body=None, last_error=None,
+                        attempts=OutboundEmail.attempts + 1, lease_until=None, claimed_by=None)
+                )
+                summary['sent'] += len(sent)
+            db.session.commit()
+            if unavailable is not None:
+                logger.warning(f"SMTP unavailable, {len(messages) - len(sent)} emails will be retried: {unavailable}")
+                break
+    finally:
+        if own_session:
+            session.close()
+    return summary
+
+
+def purge_sent(days=None):
+    """Delete sent messages older than `days` (EMAIL_OUTBOX_RETENTION_DAYS). Commits."""
+    days = config_int('EMAIL_OUTBOX_RETENTION_DAYS', 30) if days is None else days
+    if days <= 0:
+        return 0
+    removed = db.session.execute(
+        OutboundEmail.__table__.delete().where(
+            OutboundEmail.status == 'sent', OutboundEmail.sent_at < datetime.utcnow() - timedelta(days=days))
+    ).rowcount
+    db.session.commit()
+    return removed
+
+
+def outbox_status():
+    """{status: messages} over the whole outbox"""
+    return {
+        status: count
+        for status, count in db.session.query(OutboundEmail.status, func.count(OutboundEmail.id))
+        .group_by(OutboundEmail.status)
+    }
+
+
+def _seconds_until_next_retry():
+    next_at = (
+        db.session.query(func.min(OutboundEmail.next_attempt_at))
+        .filter(OutboundEmail.status == 'pending')
+        .scalar()
+    )
+    if next_at is None:
+        return None
+    # At least a second, so rows due but leased by another sender don't spin this loop
+    return max(1.0, (next_at - datetime.utcnow()).total_seconds())
+
+
+def _send_until_idle():
+    session = SmtpSession(current_app.config)
+    idle_seconds = config_int('EMAIL_SMTP_IDLE_SECONDS', 30)
+    idle_since = time.monotonic()
+    try:
+        while True:
+            _sender.wake.clear()
+            try:
+                if any(send_outbox(session).values()):
+                    idle_since = time.monotonic()
+                wait = _seconds_until_next_retry()
+            except Exception as e:
+                logger.error(f"Email sender failed: {e}")
+                db.session.rollback()
+                wait = MAX_WAIT_SECONDS
+            finally:
+                db.session.remove()
+            idle_left = idle_since + idle_seconds - time.monotonic()
+            if idle_left > 0:
+                timeout = idle_left if wait is None else min(wait, idle_left)
+            elif wait is None:
+                break
+            else:
+                # Only retries are waiting: don't hold the session open until they are due
+                session.close()
+                timeout = wait
+            if _sender.wake.wait(min(timeout, MAX_WAIT_SECONDS)):
+                idle_since = time.monotonic()
+    finally:
+        session.close()
+    purge_sent()
+
+
+# The sender thread; a message queued while it stops (e.g. during the final
+# purge) wakes it for another round
+_sender = ProcessWorker('email-sender', _send_until_idle)
+
+
+def maybe_send_outbox():
+    """Wake this process's sender thread, starting it if needed; never raises"""
+    return _sender.start()
+
+
+def resume_outbox():
+    """Start the sender if messages are waiting (on a process's first request); never raises"""
+    try:
+        waiting = db.session.query(OutboundEmail.id).filter(OutboundEmail.status == 'pending').first()
+    except Exception as e:
+        logger.warning(f"Could not check the email outbox: {e}")
+        db.session.rollback()
+        return False
+    return maybe_send_outbox() if waiting else False
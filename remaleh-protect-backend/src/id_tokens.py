@@ -0,0 +1,180 @@
+"""
+Local verification of Google and Apple ID tokens.
+
+Sign-in used to validate every Google ID token by calling Google's
+``tokeninfo`` endpoint, and Apple ID tokens were decoded without checking
+their signature at all. Here a token is verified in-process: its RS256
+signature against the provider's published keys (JWKS), plus the issuer,
+audience and expiry claims.
+
+Key sets are cached in process memory and in Redis (``jwks:<provider>``) for
+the lifetime the provider advertises in ``Cache-Control: max-age``, or
+``JWKS_CACHE_SECONDS`` when it gives none. Providers rotate keys by
+publishing the new one before signing with it, so a token whose ``kid`` is
+not in the cached set triggers a refresh: first from Redis (another worker
+may have fetched it already), then from the network. Network refreshes for
+unknown key ids happen at most once per ``JWKS_REFRESH_MIN_SECONDS`` per
+provider and process, so tokens with made-up key ids cannot turn into a
+stream of outbound requests.
+"""
+
+import json
+import logging
+import re
+import threading
+import time
+
+import jwt
+import requests
+from flask import current_app
+
+try:
+    from .cache import cache
+except ImportError:
+    from cache import cache
+
+logger = logging.getLogger(__name__)
+
+PROVIDERS = {
+    'google': {
+        'name': 'Google',
+        'jwks_uri': 'https://www.googleapis.com/oauth2/v3/certs',
+        'issuers': ('https://accounts.google.com', 'accounts.google.com'),
+    },
+    'apple': {
+        'name': 'Apple',
+        'jwks_uri': 'https://appleid.apple.com/auth/keys',
+        'issuers': ('https://appleid.apple.com', 'https://appleid.apple.com/'),
+    },
+}
+ALGORITHMS = ['RS256']
+# Longest lifetime honoured from a provider's Cache-Control header
+MAX_CACHE_SECONDS = 24 * 3600
+
+# provider -> {'keys': {kid: PyJWK}, 'expires': monotonic time, 'refreshed': monotonic time}
+_key_sets = {}
+_refresh_locks = {provider: threading.Lock() for provider in PROVIDERS}
+
+
+class IdTokenError(Exception):
+    """An ID token failed verification; the message is safe to return to the client"""
+
+
+def _cache_key(provider):
+    return f"jwks:{provider}"
+
+
+def _max_age(response):
+    match = re.search(r'max-age=(\d+)', response.headers.get('Cache-Control', ''))
+    return min(int(match.group(1)), MAX_CACHE_SECONDS) if match else None
+
+
+def _parse(jwks):
+    keys = {}
+    for data in jwks.get('keys', []):
+        if data.get('kid') and data.get('kty') == 'RSA':
+            try:
+                keys[data['kid']] = jwt.PyJWK(data, algorithm='RS256')
+            except jwt.PyJWTError as e:
+                logger.warning(f"Skipping unusable JWK {data.get('kid')}: {e}")
+    return keys
+
+
+def _remember(provider, jwks, ttl):
+    now = time.monotonic()
+    entry = _key_sets.get(provider, {})
+    _key_sets[provider] = {'keys': _parse(jwks), 'expires': now + ttl, 'refreshed': entry.get('refreshed')}
+    return _key_sets[provider]
+
+
+def _from_redis(provider):
+    if cache.redis_client is None:
+        return None
+    try:
+        raw = cache.redis_client.get(_cache_key(provider))
+        ttl = cache.redis_client.ttl(_cache_key(provider))
+    except Exception as e:
+        logger.warning(f"Could not read cached {provider} JWKS: {e}")
+        return None
+    if not raw or ttl is None or ttl <= 0:
+        return None
+    return _remember(provider, json.loads(raw), ttl)
+
+
+def _from_network(provider):
+    config = current_app.config
+    response = requests.get(PROVIDERS[provider]['jwks_uri'], timeout=int(config.get('JWKS_TIMEOUT_SECONDS', 5)))
+    response.raise_for_status()
+    jwks = response.json()
+    ttl = _max_age(response) or int(config.get('JWKS_CACHE_SECONDS', 3600))
+    if cache.redis_client is not None:
+        try:
+            cache.redis_client.setex(_cache_key(provider), ttl, json.dumps(jwks))
+        except Exception as e:
+            logger.warning(f"Could not cache {provider} JWKS: {e}")
+    entry = _remember(provider, jwks, ttl)
+    entry['refreshed'] = time.monotonic()
+    logger.info(f"Fetched {provider} JWKS ({len(entry['keys'])} keys, cached {ttl}s)")
+    return entry
+
+
+def signing_key(provider, kid):
+    """The provider's public key with this key id, refreshing the cached key set if needed.
+
+    Raises IdTokenError if the key is unknown even after a refresh, or keys cannot be fetched.
+    """
+    entry = _key_sets.get(provider)
+    if entry and entry['expires'] > time.monotonic() and kid in entry['keys']:
+        return entry['keys'][kid]
+    min_refresh = int(current_app.config.get('JWKS_REFRESH_MIN_SECONDS', 60))
+    with _refresh_locks[provider]:
+        # Another request may have refreshed while this one waited
+        entry = _key_sets.get(provider)
+        if not (entry and entry['expires'] > time.monotonic() and kid in entry['keys']):
+            entry = _from_redis(provider) or entry
+        if entry and entry['expires'] > time.monotonic() and kid in entry['keys']:
+            return entry['keys'][kid]
+        expired = not entry or entry['expires'] <= time.monotonic()
+        recently = entry and entry.get('refreshed') and time.monotonic() - entry['refreshed'] < min_refresh
+        if expired or not recently:
+            try:
+                entry = _from_network(provider)
+            except Exception as e:
+                logger.error(f"Could not fetch {provider} JWKS: {e}")
+                if not entry:
+                    raise IdTokenError(f"Could not verify {PROVIDERS[provider]['name']} ID token")
+    if kid not in entry['keys']:
+        raise IdTokenError(f"Invalid {PROVIDERS[provider]['name']} ID token")
+    return entry['keys'][kid]
+
+
+def verify_id_token(provider, token, audiences):
+    """Verify an ID token's signature, issuer, expiry and (if any are given) audience.
+
+    Returns its claims. Raises IdTokenError with a client-facing message otherwise.
+    """
+    name = PROVIDERS[provider]['name']
+    try:
+        header = jwt.get_unverified_header(token)
+    except jwt.PyJWTError:
+        raise IdTokenError(f"Invalid {name} ID token")
+    if header.get('alg') not in ALGORITHMS or not header.get('kid'):
+        raise IdTokenError(f"Invalid {name} ID token")
+    key = signing_key(provider, header['kid'])
+    audiences = [aud for aud in audiences if aud]
+    try:
+        return jwt.decode(
+            token, key, algorithms=ALGORITHMS,
+            audience=audiences or None,
+            issuer=PROVIDERS[provider]['issuers'],
+            leeway=int(current_app.config.get('ID_TOKEN_LEEWAY_SECONDS', 60)),
+            options={'require': ['exp', 'iat', 'iss', 'sub'], 'verify_aud': bool(audiences)},
+        )
+    except jwt.InvalidAudienceError:
+        raise IdTokenError('ID token audience mismatch')
+    except jwt.InvalidIssuerError:
+        raise IdTokenError('Invalid token issuer')
+    except jwt.ExpiredSignatureError:
+        raise IdTokenError(f"{name} ID token has expired")
+    except jwt.PyJWTError:
+        raise IdTokenError(f"Invalid {name} ID token")
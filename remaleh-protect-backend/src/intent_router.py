@@ -0,0 +1,69 @@
+"""
+Keyword intent matching in one pass over a message.
+
+An ``IntentRouter`` is built from a table of intents, each a group, a name
+and a list of keywords, in rank order. An intent matches a message when
+one of its keywords occurs anywhere in the lower-cased message, the same
+test as ``keyword in message.lower()``. All keywords of all intents are
+compiled into a single regular expression: a trie of the keywords (shared
+prefixes factored out) inside a lookahead, so one ``finditer`` scan finds
+the longest keyword starting at every position of the message. Every other
+keyword starting at that position is a prefix of that one, and those are
+worked out when the router is built, so the scan finds every keyword
+occurrence without a search per keyword.
+
+Adding keywords or intents makes the pattern longer, but a message is
+still scanned once; the trie lets the engine reject a position after
+looking at one or two characters.
+"""
+
+import re
+
+
+def _trie_pattern(keywords):
+    """Regular expression matching the longest of `keywords` at a position"""
+    trie = {}
+    for keyword in keywords:
+        node = trie
+        for char in keyword:
+            node = node.setdefault(char, {})
+        node[''] = {}
+
+    def build(node):
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        # Greedy: continue to a longer keyword if the text allows, else end here
+        return f'(?:{body})?' if '' in node else body
+
+    return build(trie)
+
+
+class IntentRouter:
+    """Intents compiled from a keyword table, matched in one scan of a message"""
+
+    def __init__(self, intents):
+        """`intents` is an iterable of (group, name, keywords), best-ranked first"""
+        keyword_intents = {}
+        for rank, (group, name, keywords) in enumerate(intents):
+            for keyword in keywords:
+                keyword_intents.setdefault(keyword.lower(), set()).add((rank, group, name))
+        # The intents of a keyword and of every keyword that is a prefix of it
+        self._implied = {
+            keyword: frozenset().union(*(found for other, found in keyword_intents.items() if keyword.startswith(other)))
+            for keyword in keyword_intents
+        }
+        self._pattern = re.compile(f'(?=({_trie_pattern(keyword_intents)}))') if keyword_intents else None
+
+    def match(self, text):
+        """{group: [names]} of the intents with a keyword in `text`, best-ranked first in each group"""
+        if self._pattern is None or not text:
+            return {}
+        found = set()
+        for match in self._pattern.finditer(text.lower()):
+            found |= self._implied[match.group(1)]
+        groups = {}
+        for _, group, name in sorted(found):
+            groups.setdefault(group, []).append(name)
+        return groups
@@ -0,0 +1,328 @@
+"""
+Redis sorted-set leaderboard.
+
+Keys (scores are points, members are user ids):
+
+  leaderboard:all              all-time points
+  leaderboard:day:<YYYYMMDD>   points earned on one UTC day (expire after the window)
+  leaderboard:90d              merge of the last 90 day buckets
+
+Awards and revocations are buffered on the SQLAlchemy session and applied
+with ZINCRBY only after the transaction commits, so a rolled-back award never
+reaches Redis. ``leaderboard:90d`` is incremented alongside the day bucket
+and re-merged with ZUNIONSTORE once per day to drop days that left the
+window.
+
+``rebuild_leaderboard`` loads copies of the sets under ``leaderboard:rebuild:``
+and renames them over the live ones. While it loads, ``leaderboard:rebuilding``
+is set, and committed changes are applied to the copies as well (a Lua script
+checks the flag and writes both in one step), so points earned during a
+rebuild survive the swap. A user's row loaded from the database replaces
+whatever had been added to their copy before, which already counted in it.
+
+Top-N is ZREVRANGE and rank is a ZCOUNT of strictly higher scores, both
+O(log n). Redis orders equal scores by member string ("9" before "10"), so
+top-N also fetches every member tied at the cut and orders ties by user id,
+as the database does. Until ``leaderboard:ready`` is set (by ``rebuild_leaderboard``) or
+whenever Redis is unavailable, reads fall back to the user_point_totals
+table via points.py.
+"""
+
+import logging
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+try:
+    from .cache import cache
+    from .models import db, User, UserPointTotal, UserPointDaily
+except ImportError:
+    from cache import cache
+    from models import db, User, UserPointTotal, UserPointDaily
+
+logger = logging.getLogger(__name__)
+
+WINDOW_DAYS = 90
+READY_KEY = 'leaderboard:ready'
+ALL_KEY = 'leaderboard:all'
+WINDOW_KEY = 'leaderboard:90d'
+MERGED_ON_KEY = 'leaderboard:90d:merged_on'
+STAGING_PREFIX = 'leaderboard:rebuild:'
+REBUILDING_KEY = 'leaderboard:rebuilding'
+# A crashed rebuild stops mirroring changes into its copies after this long
+REBUILD_FLAG_SECONDS = 600
+_PENDING = 'leaderboard_pending'
+
+# Apply ARGV[1] ('incr' by ARGV[2], or 'set' to ARGV[2], where 0 removes) for
+# member ARGV[3] to sorted set KEYS[2], and to its copy KEYS[3] while a
+# rebuild is loading (KEYS[1] exists)
+_APPLY = """
+local keys = {KEYS[2]}
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    keys[2] = KEYS[3]
+end
+for _, key in ipairs(keys) do
+    if ARGV[1] == 'incr' then
+        redis.call('ZINCRBY', key, ARGV[2], ARGV[3])
+    elseif tonumber(ARGV[2]) == 0 then
+        redis.call('ZREM', key, ARGV[3])
+    else
+        redis.call('ZADD', key, ARGV[2], ARGV[3])
+    end
+end
+"""
+_apply_script = None
+
+# End the rebuild (KEYS[1]) and replace each live set KEYS[i + 1] by its copy
+# KEYS[i], or delete it if the copy is empty
+_SWAP = """
+redis.call('DEL', KEYS[1])
+for i = 2, #KEYS, 2 do
+    if redis.call('EXISTS', KEYS[i]) == 1 then
+        redis.call('RENAME', KEYS[i], KEYS[i + 1])
+    else
+        redis.call('DEL', KEYS[i + 1])
+    end
+end
+"""
+_swap_script = None
+
+# Same fields as the rows of the database fallback (points.top_users)
+LeaderboardRow = namedtuple('LeaderboardRow', ['id', 'first_name', 'last_name', 'points'])
+
+
+def _day_key(day):
+    return f"leaderboard:day:{day.strftime('%Y%m%d')}"
+
+
+def _window_days(today):
+    return [today - timedelta(days=i) for i in range(WINDOW_DAYS)]
+
+
+def _period_key(period):
+    return ALL_KEY if period == 'all' else WINDOW_KEY
+
+
+def _client():
+    """Redis client when the leaderboard is usable, else None"""
+    client = cache.redis_client
+    if client is None:
+        return None
+    try:
+        return client if client.exists(READY_KEY) else None
+    except Exception as e:
+        logger.warning(f"Leaderboard Redis unavailable: {e}")
+        return None
+
+
+def record_points_change(user_id, day, delta):
+    """Queue a points change to apply to Redis once the current transaction commits"""
+    if cache.redis_client is None or not delta:
+        return
+    db.session.info.setdefault(_PENDING, []).append(('incr', int(user_id), day, int(delta)))
+
+
+def record_user_reset(user_id, all_points=0, daily=None):
+    """Queue replacing a user's scores outright (after a reconcile or deletion)"""
+    if cache.redis_client is None:
+        return
+    db.session.info.setdefault(_PENDING, []).append(('reset', int(user_id), int(all_points), dict(daily or {})))
+
+
+def _day_expiry(day):
+    return datetime.combine(day + timedelta(days=WINDOW_DAYS + 1), datetime.min.time())
+
+
+@event.listens_for(Session, 'after_commit')
+def _flush_pending(session):
+    global _apply_script
+    pending = session.info.pop(_PENDING, None)
+    client = cache.redis_client
+    if not pending or client is None:
+        return
+    today = datetime.utcnow().date()
+    window = _window_days(today)
+    oldest = window[-1]
+    try:
+        if _apply_script is None:
+            _apply_script = client.register_script(_APPLY)
+        pipe = client.pipeline(transaction=False)
+
+        def apply(key, op, value, user_id):
+            _apply_script(keys=[REBUILDING_KEY, key, STAGING_PREFIX + key], args=[op, value, user_id], client=pipe)
+
+        for op, user_id, *args in pending:
+            if op == 'reset':
+                all_points, daily = args
+                apply(ALL_KEY, 'set', all_points, user_id)
+                pipe.zrem(WINDOW_KEY, user_id)
+                for d in window:
+                    apply(_day_key(d), 'set', 0, user_id)
+                changes = [(d, pts) for d, pts in daily.items() if d >= oldest]
+            else:
+                day, delta = args
+                apply(ALL_KEY, 'incr', delta, user_id)
+                changes = [(day, delta)] if day >= oldest else []
+            for day, delta in changes:
+                apply(_day_key(day), 'incr', delta, user_id)
+                pipe.expireat(_day_key(day), _day_expiry(day))
+                pipe.zincrby(WINDOW_KEY, delta, user_id)
+        pipe.execute()
+    except Exception as e:
+        # Redis now lags the database; rebuild_leaderboard.py brings it back in line
+        logger.error(f"Failed to apply leaderboard changes: {e}")
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_pending(session):
+    session.info.pop(_PENDING, None)
+
+
+def merge_window(client=None, today=None, force=False):
+    """Rebuild leaderboard:90d from the day buckets. Runs once per day unless forced."""
+    client = client or cache.redis_client
+    if client is None:
+        return False
+    today = today or datetime.utcnow().date()
+    stamp = today.isoformat()
+    if not force and (client.get(MERGED_ON_KEY) or b'').decode() == stamp:
+        return False
+    # Only one worker merges per day
+    if not force and not client.set(f"{MERGED_ON_KEY}:lock:{stamp}", 1, nx=True, ex=300):
+        return False
+    pipe = client.pipeline(transaction=True)
+    pipe.zunionstore(WINDOW_KEY, [_day_key(d) for d in _window_days(today)])
+    pipe.zremrangebyscore(WINDOW_KEY, '-inf', 0)
+    pipe.set(MERGED_ON_KEY, stamp)
+    pipe.execute()
+    return True
+
+
+def top_users(period='90d', limit=20):
+    """Highest-scoring users: [(user_id, first_name, last_name, points)]"""
+    client = _client()
+    if client is None:
+        try:
+            from .points import top_users as db_top_users
+        except ImportError:
+            from points import top_users as db_top_users
+        return db_top_users(period, limit)
+
+    if period != 'all':
+        merge_window(client)
+    ranked = _top_members(client, _period_key(period), limit)
+    ids = [uid for uid, _ in ranked]
+    names = {u.id: u for u in db.session.query(User.id, User.first_name, User.last_name).filter(User.id.in_(ids)).all()} if ids else {}
+    return [
+        LeaderboardRow(uid, names[uid].first_name, names[uid].last_name, int(score))
+        for uid, score in ranked if uid in names
+    ]
+
+
+def _top_members(client, key, limit):
+    """[(user_id, score)] of the `limit` highest positive scores, ties by ascending user id"""
+    ranked = client.zrevrangebyscore(key, '+inf', '(0', start=0, num=limit, withscores=True)
+    if ranked and len(ranked) == limit:
+        # Members tied with the last one may sort after it in Redis but before it by id
+        cut = ranked[-1][1]
+        ranked = [(member, score) for member, score in ranked if score > cut]
+        ranked += client.zrangebyscore(key, cut, cut, withscores=True)
+    return sorted(((int(member), score) for member, score in ranked), key=lambda e: (-e[1], e[0]))[:limit]
+
+
+def user_rank(user_id, period='90d'):
+    """1-based rank by points for a period, or None without points in it"""
+    client = _client()
+    if client is None:
+        try:
+            from .points import user_rank as db_user_rank
+        except ImportError:
+            from points import user_rank as db_user_rank
+        return db_user_rank(user_id, period)
+
+    if period != 'all':
+        merge_window(client)
+    key = _period_key(period)
+    score = client.zscore(key, user_id)
+    if score is None or score <= 0:
+        return None
+    return int(client.zcount(key, f"({score}", '+inf')) + 1
+
+
+def _load_copies(client, day_keys, batch_size):
+    """Load user_point_totals/user_point_daily into the rebuild's copies. Returns users loaded."""
+    loaded = 0
+    last_id = 0
+    while True:
+        rows = db.session.query(UserPointTotal.user_id, UserPointTotal.points_all_time).filter(
+            UserPointTotal.user_id > last_id
+        ).order_by(UserPointTotal.user_id).limit(batch_size).all()
+        if not rows:
+            break
+        mapping = {uid: pts for uid, pts in rows if pts}
+        if mapping:
+            client.zadd(STAGING_PREFIX + ALL_KEY, mapping)
+        client.expire(REBUILDING_KEY, REBUILD_FLAG_SECONDS)
+        loaded += len(rows)
+        last_id = rows[-1][0]
+
+    for day, key in day_keys.items():
+        mapping = {uid: pts for uid, pts in db.session.query(UserPointDaily.user_id, UserPointDaily.points).filter(
+            UserPointDaily.day == day, UserPointDaily.points != 0
+        ).all()}
+        if mapping:
+            client.zadd(STAGING_PREFIX + key, mapping)
+    return loaded
+
+
+def rebuild_leaderboard(batch_size=5000):
+    """Reload every sorted set from user_point_totals/user_point_daily and mark the leaderboard ready.
+    Returns the number of users loaded, or None without Redis.
+    """
+    global _swap_script
+    client = cache.redis_client
+    if client is None:
+        return None
+    try:
+        from .points import roll_point_windows
+    except ImportError:
+        from points import roll_point_windows
+    roll_point_windows()
+
+    today = datetime.utcnow().date()
+    day_keys = {d: _day_key(d) for d in _window_days(today)}
+    live_keys = [ALL_KEY, *day_keys.values()]
+    client.delete(READY_KEY, *[STAGING_PREFIX + key for key in live_keys])
+    # Changes committed from here on are applied to the copies too
+    client.set(REBUILDING_KEY, 1, ex=REBUILD_FLAG_SECONDS)
+    loaded = _load_copies(client, day_keys, batch_size)
+
+    # Swap the copies in, then merge the window and open for reads
+    if _swap_script is None:
+        _swap_script = client.register_script(_SWAP)
+    _swap_script(keys=[REBUILDING_KEY, *[k for key in live_keys for k in (STAGING_PREFIX + key, key)]],
+                 client=client)
+    pipe = client.pipeline(transaction=False)
+    for day, key in day_keys.items():
+        pipe.expireat(key, _day_expiry(day))
+    pipe.execute()
+    merge_window(client, today, force=True)
+    client.set(READY_KEY, datetime.utcnow().isoformat())
+    logger.info(f"Rebuilt Redis leaderboard for {loaded} users")
+    return loaded
+
+
+def ensure_leaderboard():
+    """Build the Redis leaderboard at startup if Redis is up but cold"""
+    client = cache.redis_client
+    if client is None:
+        return
+    try:
+        if client.exists(READY_KEY):
+            return
+        if client.set(f"{READY_KEY}:building", 1, nx=True, ex=600):
+            rebuild_leaderboard()
+    except Exception as e:
+        logger.warning(f"Could not build Redis leaderboard: {e}")
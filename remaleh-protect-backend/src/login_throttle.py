@@ -0,0 +1,222 @@
+"""
+Throttling of failed sign-ins, per account and per client IP.
+
+Failed attempts are counted in a sliding window of ``LOGIN_WINDOW_SECONDS``:
+each failure is a member of a Redis sorted set scored by its timestamp, and
+a Lua script trims members older than the window, adds the new one and
+counts them in a single atomic round trip. Concurrent attempts therefore
+can't both read "4 failures" and slip past the limit, and the window does
+not restart with each attempt.
+
+Reaching ``LOGIN_MAX_FAILURES_PER_ACCOUNT`` (or ``..._PER_IP``) locks the
+account (or IP) out. The first lockout lasts ``LOGIN_LOCKOUT_SECONDS`` and
+each further one doubles, up to ``LOGIN_LOCKOUT_MAX_SECONDS``. The lockout
+level is forgotten after twice the maximum lockout without another, and an
+account's counters reset when it signs in successfully.
+
+Accounts are keyed by a hash of the email, so addresses are not stored in
+Redis. When Redis is not configured or an operation fails, the same counters
+are kept in this process's memory (per worker rather than shared) and Redis
+is retried after ``REDIS_RETRY_SECONDS``.
+"""
+
+import hashlib
+import logging
+import math
+import threading
+import time
+import uuid
+from collections import deque
+
+from flask import current_app
+
+try:
+    from .cache import cache
+    from .monitoring import record_login_throttled, record_login_lockout
+except ImportError:
+    from cache import cache
+    from monitoring import record_login_throttled, record_login_lockout
+
+logger = logging.getLogger(__name__)
+
+# After a Redis error, use the in-process counters for this long
+REDIS_RETRY_SECONDS = 30
+# In-process entries kept before expired ones are pruned
+LOCAL_MAX_KEYS = 10000
+
+# KEYS: failures zset, lock, lockout level
+# ARGV: now ms, window ms, limit, base lockout ms, max lockout ms, unique member
+_RECORD_FAILURE = """
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', tonumber(ARGV[1]) - tonumber(ARGV[2]))
+redis.call('ZADD', KEYS[1], ARGV[1], ARGV[6])
+redis.call('PEXPIRE', KEYS[1], ARGV[2])
+local count = redis.call('ZCARD', KEYS[1])
+if count < tonumber(ARGV[3]) then
+  return {count, 0}
+end
+local level = redis.call('INCR', KEYS[3])
+redis.call('PEXPIRE', KEYS[3], tonumber(ARGV[5]) * 2)
+local lock = math.floor(math.min(tonumber(ARGV[4]) * 2 ^ (level - 1), tonumber(ARGV[5])))
+redis.call('SET', KEYS[2], level, 'PX', lock)
+redis.call('DEL', KEYS[1])
+return {count, lock}
+"""
+
+_redis_down_until = 0.0
+_script = None
+# (scope, subject) -> failures, lockout and level, when Redis is unavailable
+_local = {}
+_local_lock = threading.Lock()
+
+
+def _settings():
+    config = current_app.config
+    return {
+        'window': int(config.get('LOGIN_WINDOW_SECONDS', 900)),
+        'limits': {
+            'account': int(config.get('LOGIN_MAX_FAILURES_PER_ACCOUNT', 5)),
+            'ip': int(config.get('LOGIN_MAX_FAILURES_PER_IP', 20)),
+        },
+        'lockout': int(config.get('LOGIN_LOCKOUT_SECONDS', 60)),
+        'max_lockout': int(config.get('LOGIN_LOCKOUT_MAX_SECONDS', 3600)),
+    }
+
+
+def _subjects(email, ip):
+    """(scope, key id) pairs an attempt counts against"""
+    subjects = []
+    if email:
+        subjects.append(('account', hashlib.sha256(email.strip().lower().encode()).hexdigest()[:32]))
+    if ip:
+        subjects.append(('ip', ip))
+    return subjects
+
+
+def _keys(scope, subject):
+    prefix = f"login:{scope}:{subject}"
+    return f"{prefix}:failures", f"{prefix}:lock", f"{prefix}:level"
+
+
+def _redis():
+    if cache.redis_client is None or time.monotonic() < _redis_down_until:
+        return None
+    return cache.redis_client
+
+
+def _redis_failed(e):
+    global _redis_down_until
+    _redis_down_until = time.monotonic() + REDIS_RETRY_SECONDS
+    logger.warning(f"Login throttling falling back to in-process counters: {e}")
+
+
+# --- in-process fallback ---------------------------------------------------------
+
+def _local_entry(key, now):
+    entry = _local.get(key)
+    if entry is None:
+        if len(_local) >= LOCAL_MAX_KEYS:
+            _prune_local(now)
+        entry = _local[key] = {'failures': deque(), 'locked_until': 0.0, 'level': 0, 'level_until': 0.0}
+    return entry
+
+
+def _prune_local(now):
+    for key in [k for k, e in _local.items() if e['locked_until'] <= now and e['level_until'] <= now]:
+        del _local[key]
+
+
+def _local_retry_after(key, now):
+    entry = _local.get(key)
+    return max(0.0, entry['locked_until'] - now) if entry else 0.0
+
+
+def _local_failure(key, now, settings, limit):
+    entry = _local_entry(key, now)
+    failures = entry['failures']
+    while failures and failures[0] <= now - settings['window']:
+        failures.popleft()
+    failures.append(now)
+    if len(failures) < limit:
+        return 0.0
+    if entry['level_until'] <= now:
+        entry['level'] = 0
+    entry['level'] += 1
+    entry['level_until'] = now + settings['max_lockout'] * 2
+    lock = min(settings['lockout'] * 2 ** (entry['level'] - 1), settings['max_lockout'])
+    entry['locked_until'] = now + lock
+    failures.clear()
+    return lock
+
+
+# --- public API --------------------------------------------------------------------
+
+def check_login(email, ip):
+    """Seconds the caller must wait before trying to sign in again (0 if not locked out)"""
+    subjects = _subjects(email, ip)
+    waits = {}
+    client = _redis()
+    if client is not None:
+        try:
+            pipe = client.pipeline(transaction=False)
+            for scope, subject in subjects:
+                pipe.pttl(_keys(scope, subject)[1])
+            waits = {scope: max(ttl, 0) / 1000 for (scope, _), ttl in zip(subjects, pipe.execute())}
+        except Exception as e:
+            _redis_failed(e)
+            client = None
+    if client is None:
+        now = time.monotonic()
+        with _local_lock:
+            waits = {scope: _local_retry_after((scope, subject), now) for scope, subject in subjects}
+    locked = {scope: wait for scope, wait in waits.items() if wait > 0}
+    for scope in locked:
+        record_login_throttled(scope)
+    return math.ceil(max(locked.values())) if locked else 0
+
+
+def login_failed(email, ip):
+    """Count a failed sign-in. Returns the lockout in seconds it started (0 if none)."""
+    global _script
+    settings = _settings()
+    lockouts = {}
+    client = _redis()
+    if client is not None:
+        try:
+            if _script is None:
+                _script = client.register_script(_RECORD_FAILURE)
+            now_ms = int(time.time() * 1000)
+            for scope, subject in _subjects(email, ip):
+                _, lock_ms = _script(keys=list(_keys(scope, subject)), args=[
+                    now_ms, settings['window'] * 1000, settings['limits'][scope],
+                    settings['lockout'] * 1000, settings['max_lockout'] * 1000, uuid.uuid4().hex,
+                ], client=client)
+                lockouts[scope] = lock_ms / 1000
+        except Exception as e:
+            _redis_failed(e)
+            client = None
+    if client is None:
+        now = time.monotonic()
+        with _local_lock:
+            for scope, subject in _subjects(email, ip):
+                if scope not in lockouts:
+                    lockouts[scope] = _local_failure((scope, subject), now, settings,
+                                                     settings['limits'][scope])
+    for scope, lock in lockouts.items():
+        if lock:
+            record_login_lockout(scope)
+            logger.warning(f"Login lockout ({scope}) for {int(lock)}s")
+    return math.ceil(max(lockouts.values(), default=0))
+
+
+def login_succeeded(email):
+    """Clear an account's failures and lockout level after a successful sign-in"""
+    subjects = _subjects(email, None)
+    client = _redis()
+    if client is not None:
+        try:
+            client.delete(*[key for scope, subject in subjects for key in _keys(scope, subject)])
+        except Exception as e:
+            _redis_failed(e)
+    with _local_lock:
+        for subject in subjects:
+            _local.pop(subject, None)
@@ -2,6 +2,7 @@ from flask import Flask, jsonify, request, g
 from flask_cors import CORS
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
+from werkzeug.middleware.proxy_fix import ProxyFix
 import logging
 import os
 from datetime import datetime
@@ -26,6 +27,9 @@ logging.basicConfig(level=logging.INFO,
                     format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
 logger = logging.getLogger("remaleh")
 
+# Pid of the process that has resumed queued background work (see resume_background_work)
+_background_pid = None
+
 def create_app():
     """
     Create and configure the Flask application with production features.
@@ -36,6 +40,11 @@ def create_app():
     
     # Load production configuration
     app.config.from_object(get_config())
+
+    # Behind a proxy every request comes from the proxy's address: take the client's from
+    # X-Forwarded-For instead, trusting only the entries our own proxies appended
+    if app.config.get('PROXY_FIX_X_FOR'):
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['PROXY_FIX_X_FOR'])
     
     # Initialize production modules
     cache.init_app(app)
@@ -71,7 +80,119 @@ def create_app():
                 logger.info("✓ Ensured email verification columns on users table")
             except Exception as e:
                 logger.warning(f"Could not ensure email verification columns: {e}")
-            
+            # Stored report score + keyset indexes for the community feed
+            try:
+                from sqlalchemy import text
+                with db.engine.connect() as conn:
+                    try:
+                        conn.execute(text("ALTER TABLE community_reports ADD COLUMN IF NOT EXISTS score INTEGER"))
+                        conn.commit()
+                    except Exception:
+                        conn.rollback()
+                        # SQLite has no IF NOT EXISTS here; this fails harmlessly once the column exists
+                        try:
+                            conn.execute(text("ALTER TABLE community_reports ADD COLUMN score INTEGER"))
+                            conn.commit()
+                        except Exception as e:
+                            conn.rollback()
+                            logger.debug(f"score column add skipped: {e}")
+                    conn.execute(text(
+                        "UPDATE community_reports SET score = COALESCE(votes_up, 0) - COALESCE(votes_down, 0) "
+                        "WHERE score IS NULL"
+                    ))
+                    conn.execute(text("CREATE INDEX IF NOT EXISTS idx_community_reports_created_id ON community_reports(created_at, id)"))
+                    conn.execute(text("CREATE INDEX IF NOT EXISTS idx_community_reports_score_created_id ON community_reports(score, created_at, id)"))
+                    conn.execute(text("CREATE INDEX IF NOT EXISTS idx_community_reports_verified_created_id ON community_reports(verified, created_at, id)"))
+                    conn.execute(text("CREATE INDEX IF NOT EXISTS idx_community_reports_user_id ON community_reports(user_id)"))
+                    conn.execute(text("CREATE INDEX IF NOT EXISTS idx_users_created_id ON users(created_at, id)"))
+                    conn.execute(text("CREATE INDEX IF NOT EXISTS idx_user_scans_user_scanned ON user_scans(user_id, scanned_at)"))
+                    conn.execute(text("CREATE INDEX IF NOT EXISTS idx_user_scans_scanned_at ON user_scans(scanned_at)"))
+                    conn.commit()
+                logger.info("✓ Ensured community report score column and listing indexes")
+            except Exception as e:
+                logger.warning(f"Could not ensure community report score column: {e}")
+            # Display summary columns on both scan tiers
+            try:
+                from sqlalchemy import text, inspect as sa_inspect
+                summary_columns = (
+                    ('summary_subject', 'VARCHAR(255)'), ('summary_preview', 'VARCHAR(200)'),
+                    ('summary_attachments', 'INTEGER'), ('summary_indicators', 'JSON'),
+                    ('recommendation_codes', 'VARCHAR(100)'),
+                )
+                with db.engine.connect() as conn:
+                    existing = {
+                        table: {c['name'] for c in sa_inspect(conn).get_columns(table)}
+                        for table in ('user_scans', 'user_scans_archive')
+                    }
+                    for table, columns in existing.items():
+                        for name, ddl in summary_columns:
+                            if name not in columns:
+                                conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {ddl}"))
+                    conn.commit()
+                logger.info("✓ Ensured scan summary columns")
+            except Exception as e:
+                logger.warning(f"Could not ensure scan summary columns: {e}")
+            # Stored lesson counts so progress queries can skip the lesson JSON
+            try:
+                from sqlalchemy import text, inspect as sa_inspect
+                try:
+                    from .models import LearningModule as _LearningModule
+                except ImportError:
+                    from models import LearningModule as _LearningModule
+                with db.engine.connect() as conn:
+                    if 'lesson_count' not in {c['name'] for c in sa_inspect(conn).get_columns('learning_modules')}:
+                        conn.execute(text("ALTER TABLE learning_modules ADD COLUMN lesson_count INTEGER"))
+                        conn.commit()
+                for module in _LearningModule.query.filter(_LearningModule.lesson_count.is_(None)):
+                    # Re-assigning runs the validator that counts the lessons
+                    module.content = module.content
+                db.session.commit()
+                logger.info("✓ Ensured learning module lesson counts")
+            except Exception as e:
+                db.session.rollback()
+                logger.warning(f"Could not ensure learning module lesson counts: {e}")
+            # Build maintained points totals on first start after upgrade
+            try:
+                try:
+                    from .points import ensure_point_totals
+                    from .leaderboard import ensure_leaderboard
+                except ImportError:
+                    from points import ensure_point_totals
+                    from leaderboard import ensure_leaderboard
+                ensure_point_totals()
+                ensure_leaderboard()
+            except Exception as e:
+                db.session.rollback()
+                logger.warning(f"Could not build points totals: {e}")
+            # Email/name search indexes for the admin user listing
+            try:
+                try:
+                    from .user_search import ensure_user_search_indexes
+                except ImportError:
+                    from user_search import ensure_user_search_indexes
+                ensure_user_search_indexes()
+            except Exception as e:
+                logger.warning(f"Could not create user search indexes: {e}")
+            # Build trending counters on first start after upgrade
+            try:
+                try:
+                    from .trending import ensure_trend_buckets
+                except ImportError:
+                    from trending import ensure_trend_buckets
+                ensure_trend_buckets()
+            except Exception as e:
+                db.session.rollback()
+                logger.warning(f"Could not build trend buckets: {e}")
+            # Keep this process's set of revoked token families in sync
+            try:
+                try:
+                    from .token_store import start_revocation_sync
+                except ImportError:
+                    from token_store import start_revocation_sync
+                start_revocation_sync(app)
+            except Exception as e:
+                logger.warning(f"Could not start token revocation sync: {e}")
+
             # Create admin user if it doesn't exist
             try:
                 from .auth import create_admin_user
@@ -84,7 +205,7 @@ def create_app():
                 from .models import LearningModule
             except ImportError:
                 from models import LearningModule
-            if LearningModule.query.count() == 0:
+            if db.session.query(db.func.count(LearningModule.id)).scalar() == 0:
                 sample_modules = [
                     {
                         'title': 'Phishing Awareness',
@@ -181,7 +302,7 @@ def create_app():
                 db.session.commit()
                 logger.info("✓ Sample learning modules created successfully")
             
-            logger.info(f"✓ Database initialized successfully with {LearningModule.query.count()} learning modules")
+            logger.info(f"✓ Database initialized successfully with {db.session.query(db.func.count(LearningModule.id)).scalar()} learning modules")
             
         except Exception as e:
             logger.error(f"❌ Database initialization error: {e}")
@@ -308,6 +429,36 @@ def create_app():
         g.start_time = time.time()
         logger.info(f"Request: {request.method} {request.path} from {request.remote_addr}")
 
+    @app.before_request
+    def resume_background_work():
+        """Resume queued background work once in each process that serves requests.
+
+        Not done in create_app: with preload_app the gunicorn master runs that,
+        and the threads it started would not survive the fork into the workers.
+        """
+        global _background_pid
+        if _background_pid == os.getpid():
+            return
+        _background_pid = os.getpid()
+        # Pick up bulk deletions and media removals interrupted by a restart
+        try:
+            try:
+                from .bulk_delete import maybe_resume_deletion_jobs
+            except ImportError:
+                from bulk_delete import maybe_resume_deletion_jobs
+            maybe_resume_deletion_jobs()
+        except Exception as e:
+            logger.warning(f"Could not resume deletion jobs: {e}")
+        # Deliver emails still waiting in the outbox
+        try:
+            try:
+                from .email_outbox import resume_outbox
+            except ImportError:
+                from email_outbox import resume_outbox
+            resume_outbox()
+        except Exception as e:
+            logger.warning(f"Could not resume the email outbox: {e}")
+
     @app.after_request
     def after_request(response):
         """Log response details and timing."""
@@ -1,8 +1,14 @@
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy.orm import backref
+from sqlalchemy.orm import backref, validates
 from datetime import datetime
-from werkzeug.security import generate_password_hash, check_password_hash
+import json
 import uuid
+import zlib
+
+try:
+    from .passwords import hash_password, verify_password, needs_rehash
+except ImportError:
+    from passwords import hash_password, verify_password, needs_rehash
 
 db = SQLAlchemy()
 
@@ -17,7 +23,8 @@ class User(db.Model):
     # Deprecated: risk_level (kept in DB for backward-compatibility, no longer used)
     risk_level = db.Column(db.String(20), default='MEDIUM')
     # New: optional bio for community profile cards
-    bio = db.Column(db.Text)
+    # Deferred: only profile views and community creator cards need it (undefer_group('profile'))
+    bio = db.deferred(db.Column(db.Text), group='profile')
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     last_login = db.Column(db.DateTime)
     is_active = db.Column(db.Boolean, default=True)
@@ -31,6 +38,11 @@ class User(db.Model):
     email_verification_code = db.Column(db.String(12))
     email_verification_expires_at = db.Column(db.DateTime)
     
+    # Keyset order of the admin user listing
+    __table_args__ = (
+        db.Index('idx_users_created_id', 'created_at', 'id'),
+    )
+    
     # Relationships
     scans = db.relationship('UserScan', backref='user', lazy=True)
     learning_progress = db.relationship('LearningProgress', backref='user', lazy=True)
@@ -39,11 +51,16 @@ class User(db.Model):
     votes = db.relationship('ReportVote', backref='user', lazy=True)
     
     def set_password(self, password):
-        # Use sha256 method instead of scrypt for Python 3.9 compatibility
-        self.password_hash = generate_password_hash(password, method='pbkdf2:sha256')
+        # Hashed in the password pool under PASSWORD_HASH_METHOD (see passwords.py)
+        self.password_hash = hash_password(password)
     
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        if not verify_password(self.password_hash, password):
+            return False
+        # Upgrade hashes made under an older policy; saved with the caller's next commit
+        if needs_rehash(self.password_hash):
+            self.password_hash = hash_password(password)
+        return True
     
     def to_dict(self):
         return {
@@ -62,18 +79,40 @@ class User(db.Model):
             'email_verified': self.email_verified
         }
 
+    def to_summary_dict(self):
+        """Listing variant of to_dict without deferred columns (bio)"""
+        return {
+            'id': self.id,
+            'email': self.email,
+            'first_name': self.first_name,
+            'last_name': self.last_name,
+            'role': self.role,
+            'account_status': self.account_status,
+            'is_admin': self.is_admin
+        }
+
 class UserScan(db.Model):
     __tablename__ = 'user_scans'
+    __table_args__ = (
+        db.Index('idx_user_scans_user_scanned', 'user_id', 'scanned_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
-    message = db.Column(db.Text, nullable=False)
+    # Deferred: listings use the summary columns below (undefer_group('scan_detail'))
+    message = db.deferred(db.Column(db.Text, nullable=False), group='scan_detail')
     risk_level = db.Column(db.String(20), nullable=False)
     risk_score = db.Column(db.Integer)
     threat_type = db.Column(db.String(100))
-    analysis_result = db.Column(db.JSON)
+    analysis_result = db.deferred(db.Column(db.JSON), group='scan_detail')
     scanned_at = db.Column(db.DateTime, default=datetime.utcnow)
     learned_from = db.Column(db.Boolean, default=False)
+    # Display summary written at insert time (see scan_summary.py)
+    summary_subject = db.Column(db.String(255))
+    summary_preview = db.Column(db.String(200))
+    summary_attachments = db.Column(db.Integer)
+    summary_indicators = db.Column(db.JSON)
+    recommendation_codes = db.Column(db.String(100))
     
     def to_dict(self):
         return {
@@ -86,6 +125,66 @@ class UserScan(db.Model):
             'learned_from': self.learned_from
         }
 
+    def to_summary_dict(self):
+        """Listing variant of to_dict without deferred columns (message)"""
+        return {
+            'id': self.id,
+            'subject': self.summary_subject,
+            'risk_level': self.risk_level,
+            'risk_score': self.risk_score,
+            'threat_type': self.threat_type,
+            'scanned_at': self.scanned_at.isoformat() if self.scanned_at else None
+        }
+
+class UserScanArchive(db.Model):
+    """Cold tier of user_scans: older scans with message and analysis compressed (see scan_retention.py)"""
+    __tablename__ = 'user_scans_archive'
+    __table_args__ = (
+        db.Index('idx_user_scans_archive_user_scanned', 'user_id', 'scanned_at'),
+        db.Index('idx_user_scans_archive_scanned_at', 'scanned_at'),
+    )
+
+    # Same id the scan had in user_scans
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    risk_level = db.Column(db.String(20), nullable=False)
+    risk_score = db.Column(db.Integer)
+    threat_type = db.Column(db.String(100))
+    scanned_at = db.Column(db.DateTime)
+    learned_from = db.Column(db.Boolean, default=False)
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow)
+    summary_subject = db.Column(db.String(255))
+    summary_preview = db.Column(db.String(200))
+    summary_attachments = db.Column(db.Integer)
+    summary_indicators = db.Column(db.JSON)
+    recommendation_codes = db.Column(db.String(100))
+    # zlib-compressed JSON: {"message": ..., "analysis_result": ...}
+    payload = db.Column(db.LargeBinary, nullable=False)
+
+    def _unpacked(self):
+        if not hasattr(self, '_payload_cache'):
+            self._payload_cache = json.loads(zlib.decompress(self.payload)) if self.payload else {}
+        return self._payload_cache
+
+    @property
+    def message(self):
+        return self._unpacked().get('message')
+
+    @property
+    def analysis_result(self):
+        return self._unpacked().get('analysis_result')
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'message': self.message,
+            'risk_level': self.risk_level,
+            'risk_score': self.risk_score,
+            'threat_type': self.threat_type,
+            'scanned_at': self.scanned_at.isoformat() if self.scanned_at else None,
+            'learned_from': self.learned_from
+        }
+
 class Threat(db.Model):
     __tablename__ = 'threats'
     
@@ -143,15 +242,27 @@ class CommunityReport(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     threat_type = db.Column(db.String(100), nullable=False)
-    description = db.Column(db.Text, nullable=False)
+    # Deferred: counters, moderation and admin lookups don't need it (undefer_group('report_detail'))
+    description = db.deferred(db.Column(db.Text, nullable=False), group='report_detail')
     location = db.Column(db.String(255))
     urgency = db.Column(db.String(20), default='MEDIUM')
     status = db.Column(db.String(20), default='PENDING')
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     votes_up = db.Column(db.Integer, default=0)
     votes_down = db.Column(db.Integer, default=0)
+    # Stored votes_up - votes_down so "top" ordering can use an index
+    score = db.Column(db.Integer, default=0)
     verified = db.Column(db.Boolean, default=False)
     
+    # Composite indexes matching the keyset orderings of the community feed
+    __table_args__ = (
+        db.Index('idx_community_reports_created_id', 'created_at', 'id'),
+        db.Index('idx_community_reports_score_created_id', 'score', 'created_at', 'id'),
+        db.Index('idx_community_reports_verified_created_id', 'verified', 'created_at', 'id'),
+        # Per-user report counts in the admin user listings
+        db.Index('idx_community_reports_user_id', 'user_id'),
+    )
+    
     # Relationships
     votes = db.relationship('ReportVote', backref='report', lazy=True, cascade="all, delete-orphan")
     media = db.relationship('CommunityReportMedia', backref='report', lazy=True, cascade="all, delete-orphan")
@@ -170,6 +281,19 @@ class CommunityReport(db.Model):
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'votes_up': self.votes_up,
             'votes_down': self.votes_down,
+            'score': self.score,
+            'verified': self.verified
+        }
+
+    def to_summary_dict(self):
+        """Listing variant of to_dict without deferred columns (description)"""
+        return {
+            'id': self.id,
+            'user_id': self.user_id,
+            'threat_type': self.threat_type,
+            'urgency': self.urgency,
+            'status': self.status,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
             'verified': self.verified
         }
 
@@ -243,13 +367,60 @@ class UserPointLog(db.Model):
             'created_at': self.created_at.isoformat() if self.created_at else None
         }
 
+class UserPointTotal(db.Model):
+    """Maintained per-user points totals (see points.py). Rebuildable from user_point_logs."""
+    __tablename__ = 'user_point_totals'
+
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    points_all_time = db.Column(db.Integer, nullable=False, default=0)
+    points_90d = db.Column(db.Integer, nullable=False, default=0)
+    points_today = db.Column(db.Integer, nullable=False, default=0)
+    # UTC day that points_90d and points_today were last brought up to date for
+    rolled_on = db.Column(db.Date)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('idx_user_point_totals_all_time', 'points_all_time'),
+        db.Index('idx_user_point_totals_90d', 'points_90d'),
+    )
+
+    def to_dict(self):
+        return {
+            'user_id': self.user_id,
+            'points_all_time': self.points_all_time,
+            'points_90d': self.points_90d,
+            'points_today': self.points_today,
+            'rolled_on': self.rolled_on.isoformat() if self.rolled_on else None
+        }
+
+class UserPointDaily(db.Model):
+    """Per-user, per-UTC-day points buckets backing the rolling 90-day total"""
+    __tablename__ = 'user_point_daily'
+
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    points = db.Column(db.Integer, nullable=False, default=0)
+
+class ReportTrendBucket(db.Model):
+    """Hourly/daily counts of trend-eligible community reports (see trending.py)"""
+    __tablename__ = 'report_trend_buckets'
+
+    granularity = db.Column(db.String(5), primary_key=True)  # hour | day
+    bucket_start = db.Column(db.DateTime, primary_key=True)
+    threat_type = db.Column(db.String(100), primary_key=True)
+    urgency = db.Column(db.String(20), primary_key=True, default='')
+    report_count = db.Column(db.Integer, nullable=False, default=0)
+
 class LearningModule(db.Model):
     __tablename__ = 'learning_modules'
     
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(255), nullable=False)
     description = db.Column(db.Text)
-    content = db.Column(db.JSON)
+    # Deferred: the full lesson JSON is only needed to render or edit a module
+    # (undefer_group('module_content')); lesson_count answers progress queries
+    content = db.deferred(db.Column(db.JSON), group='module_content')
+    lesson_count = db.Column(db.Integer)
     difficulty = db.Column(db.String(20), default='BEGINNER')
     estimated_time = db.Column(db.Integer)  # in minutes
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -257,6 +428,11 @@ class LearningModule(db.Model):
     
     # Relationships
     lesson_progress = db.relationship('LessonProgress', backref='module', lazy=True)
+
+    @validates('content')
+    def _count_lessons(self, key, content):
+        self.lesson_count = len(content.get('lessons') or []) if isinstance(content, dict) else 0
+        return content
     
     def to_dict(self):
         return {
@@ -269,6 +445,18 @@ class LearningModule(db.Model):
             'is_active': self.is_active
         }
 
+    def to_summary_dict(self):
+        """Listing variant of to_dict without deferred columns (content)"""
+        return {
+            'id': self.id,
+            'title': self.title,
+            'description': self.description,
+            'lesson_count': self.lesson_count or 0,
+            'difficulty': self.difficulty,
+            'estimated_time': self.estimated_time,
+            'is_active': self.is_active
+        }
+
 class LearningProgress(db.Model):
     __tablename__ = 'learning_progress'
     
@@ -342,4 +530,139 @@ class ProtectionStatus(db.Model):
             'last_updated': self.last_updated.isoformat() if self.last_updated else None
         }
 
+class DeletionJob(db.Model):
+    """Progress of a resumable bulk deletion of a user or report (see bulk_delete.py)"""
+    __tablename__ = 'deletion_jobs'
+
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(20), nullable=False)  # user (see bulk_delete.STEPS)
+    target_id = db.Column(db.Integer, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending | running | done | failed
+    step = db.Column(db.String(50))  # step the job is in (or resumes from)
+    progress = db.Column(db.JSON)  # {step: rows deleted}
+    error = db.Column(db.Text)
+    # Not a foreign key: the requesting admin may be deleted later
+    requested_by = db.Column(db.Integer)
+    # A worker owns the job until this time; an expired lease means it can be resumed
+    lease_until = db.Column(db.DateTime)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index('idx_deletion_jobs_status', 'status'),
+        db.Index('idx_deletion_jobs_target', 'kind', 'target_id'),
+    )
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'target_id': self.target_id,
+            'status': self.status,
+            'step': self.step,
+            'progress': self.progress or {},
+            'error': self.error,
+            'requested_by': self.requested_by,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+
+class MediaDeletion(db.Model):
+    """Queued removal of an uploaded file or Cloudinary asset, retried with backoff"""
+    __tablename__ = 'media_deletions'
+
+    id = db.Column(db.Integer, primary_key=True)
+    media_url = db.Column(db.String(512), nullable=False)
+    job_id = db.Column(db.Integer)
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending | failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, default=datetime.utcnow)
+    lease_until = db.Column(db.DateTime)
+    # Random token of the worker holding the lease
+    claimed_by = db.Column(db.String(32))
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('idx_media_deletions_due', 'status', 'next_attempt_at'),
+    )
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'media_url': self.media_url,
+            'job_id': self.job_id,
+            'status': self.status,
+            'attempts': self.attempts,
+            'next_attempt_at': self.next_attempt_at.isoformat() if self.next_attempt_at else None,
+            'last_error': self.last_error
+        }
+
+
+class OutboundEmail(db.Model):
+    """Queued outgoing email, delivered by the background sender in email_outbox.py"""
+    __tablename__ = 'email_outbox'
+
+    id = db.Column(db.Integer, primary_key=True)
+    to_email = db.Column(db.String(255), nullable=False)
+    subject = db.Column(db.String(255), nullable=False)
+    # Cleared once delivered or abandoned, since bodies carry codes and temporary passwords.
+    # Only the sender reads it (through a column query), so listings never load it.
+    html_body = db.deferred(db.Column(db.Text))
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending | sent | failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, default=datetime.utcnow)
+    lease_until = db.Column(db.DateTime)
+    # Random token of the worker holding the lease
+    claimed_by = db.Column(db.String(32))
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index('idx_email_outbox_due', 'status', 'next_attempt_at'),
+    )
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'to_email': self.to_email,
+            'subject': self.subject,
+            'status': self.status,
+            'attempts': self.attempts,
+            'next_attempt_at': self.next_attempt_at.isoformat() if self.next_attempt_at else None,
+            'last_error': self.last_error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'sent_at': self.sent_at.isoformat() if self.sent_at else None
+        }
+
+
+class TokenFamily(db.Model):
+    """A chain of rotated refresh tokens from one sign-in (see token_store.py)"""
+    __tablename__ = 'token_families'
+
+    # Random id, carried as `fid` in the family's access and refresh tokens
+    id = db.Column(db.String(32), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False, index=True)
+    # jti of the only refresh token of this family that may still be used
+    current_jti = db.Column(db.String(32), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    rotated_at = db.Column(db.DateTime)
+    expires_at = db.Column(db.DateTime, nullable=False)
+    revoked_at = db.Column(db.DateTime)
+    revoked_reason = db.Column(db.String(30))  # logout | reuse | password_change | account_deleted
+
+    __table_args__ = (
+        db.Index('idx_token_families_revoked_at', 'revoked_at'),
+    )
+
+
+class VoteFlushBatch(db.Model):
+    """A batch of buffered vote counter deltas already written to the reports (see votes.py)"""
+    __tablename__ = 'vote_flush_batches'
 
+    # Random id given to the batch when it was moved aside in Redis
+    id = db.Column(db.String(32), primary_key=True)
+    flushed_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
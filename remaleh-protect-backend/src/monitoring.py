@@ -27,6 +27,26 @@ SCAN_COUNT = Counter('scam_scans_total', 'Total scam scans performed', ['risk_le
 THREAT_DETECTED = Counter('threats_detected_total', 'Total threats detected', ['threat_type'])
 USER_REGISTRATION = Counter('user_registrations_total', 'Total user registrations')
 
+# Maintenance metrics
+ORPHAN_ROWS_REMOVED = Counter('orphan_rows_removed_total', 'Orphaned child rows removed by cleanup', ['table'])
+ORPHAN_ROWS = Gauge('orphan_rows', 'Orphaned child rows found by the last cleanup pass or dry run', ['table'])
+ORPHAN_CLEANUP_DURATION = Histogram('orphan_cleanup_duration_seconds', 'Duration of orphan cleanup passes')
+EMAILS_DELIVERED = Counter('emails_delivered_total', 'Outbox emails by delivery outcome', ['outcome'])
+EMAIL_SEND_DURATION = Histogram('email_send_duration_seconds', 'Duration of single SMTP sends')
+
+# Security metrics
+LOGIN_THROTTLED = Counter('login_throttled_total', 'Sign-in attempts refused during a lockout', ['scope'])
+LOGIN_LOCKOUTS = Counter('login_lockouts_total', 'Sign-in lockouts started after repeated failures', ['scope'])
+PASSWORD_HASH_PENDING = Gauge('password_hash_pending', 'Password hash/verify calls queued or running in the hashing pool')
+PASSWORD_HASH_CALLS = Counter('password_hash_calls_total', 'Password hash/verify calls by outcome', ['op', 'outcome'])
+PASSWORD_HASH_DURATION = Histogram('password_hash_duration_seconds', 'Duration of password hash/verify calls, including queueing', ['op'])
+
+# Chat assistant metrics
+CHAT_ANSWERS = Counter('chat_answers_total', 'AI chat answers by cache result (hit, similar, coalesced, miss)', ['result'])
+CHAT_TOKENS_SAVED = Counter('chat_tokens_saved_total', 'Model tokens not spent because an answer was cached or shared')
+CHAT_COST_SAVED = Counter('chat_cost_saved_usd_total', 'Estimated model cost (USD) not spent because an answer was cached or shared')
+CHAT_STREAMS = Counter('chat_streams_total', 'Streamed chat replies by outcome (immediate, complete, replaced, failed)', ['outcome'])
+
 class PerformanceMonitor:
     """Performance monitoring and metrics collection"""
     
@@ -48,6 +68,15 @@ class PerformanceMonitor:
             logger.warning(f"Monitoring Redis connection failed: {e}")
             self.redis_client = None
     
+    def reset_after_fork(self):
+        """Discard Redis connections inherited from a pre-fork parent process"""
+        if not self.redis_client:
+            return
+        try:
+            self.redis_client.connection_pool.reset()
+        except Exception as e:
+            logger.warning(f"Error resetting monitoring Redis pool after fork: {e}")
+    
     def track_request(self, f):
         """Decorator to track request performance"""
         @wraps(f)
@@ -231,3 +260,50 @@ def record_threat(threat_type):
 def record_user_registration():
     """Record a user registration"""
     USER_REGISTRATION.inc()
+
+def record_orphan_cleanup(removed, seconds):
+    """Record a completed orphan cleanup pass"""
+    for table, count in removed.items():
+        ORPHAN_ROWS_REMOVED.labels(table=table).inc(count)
+    ORPHAN_CLEANUP_DURATION.observe(seconds)
+
+def record_orphan_counts(counts):
+    """Record how many orphaned rows are left per table"""
+    for table, count in counts.items():
+        ORPHAN_ROWS.labels(table=table).set(count)
+
+def record_email_delivery(outcome, seconds=None):
+    """Record an outbox delivery attempt (sent, retrying or failed)"""
+    EMAILS_DELIVERED.labels(outcome=outcome).inc()
+    if seconds is not None:
+        EMAIL_SEND_DURATION.observe(seconds)
+
+def record_login_throttled(scope):
+    """Record a sign-in attempt refused by an account or IP lockout"""
+    LOGIN_THROTTLED.labels(scope=scope).inc()
+
+def record_login_lockout(scope):
+    """Record the start of an account or IP lockout"""
+    LOGIN_LOCKOUTS.labels(scope=scope).inc()
+
+def record_password_hash(op, outcome, seconds=None):
+    """Record a password hash or verify call (ok, inline, rejected, timeout or error)"""
+    PASSWORD_HASH_CALLS.labels(op=op, outcome=outcome).inc()
+    if seconds is not None:
+        PASSWORD_HASH_DURATION.labels(op=op).observe(seconds)
+
+def set_password_hash_pending(count):
+    """Record how many password hash/verify calls are queued or running"""
+    PASSWORD_HASH_PENDING.set(count)
+
+def record_chat_answer(result, tokens_saved=0, cost_saved=0.0):
+    """Record an AI chat answer lookup and what a cached or shared answer saved"""
+    CHAT_ANSWERS.labels(result=result).inc()
+    if tokens_saved:
+        CHAT_TOKENS_SAVED.inc(tokens_saved)
+    if cost_saved:
+        CHAT_COST_SAVED.inc(cost_saved)
+
+def record_chat_stream(outcome):
+    """Record how a streamed chat reply ended"""
+    CHAT_STREAMS.labels(outcome=outcome).inc()
@@ -0,0 +1,191 @@
+"""
+Cleanup of child rows whose community report no longer exists.
+
+Reports deleted outside ``bulk_delete.py`` (manual SQL, old code paths,
+restored backups) can leave media, comments, votes and point logs pointing
+at a missing report. Each table is walked in primary-key order, at most
+``ORPHAN_CLEANUP_BATCH_SIZE`` orphans per transaction, with a ``NOT EXISTS``
+anti-join:
+
+  SELECT id FROM <table> t
+  WHERE t.id > :last_id AND t.report_id IS NOT NULL
+    AND NOT EXISTS (SELECT 1 FROM community_reports r WHERE r.id = t.report_id)
+  ORDER BY t.id LIMIT :batch
+
+Unlike ``NOT IN (SELECT id ...)``, the anti-join can use the primary key of
+``community_reports`` for each probe, and a NULL ``report_id`` never turns
+the whole predicate unknown. The same condition is repeated in the DELETE,
+so a row whose report reappeared in between is kept. Points from deleted
+logs are subtracted from their users' totals in the same transaction
+(``rebuild_point_totals.py`` repairs totals that had drifted before).
+
+Media rows are deleted without touching the files, since an orphaned URL
+may still be in use elsewhere.
+
+``dry_run`` only counts. Each pass records Prometheus metrics and stores its
+summary in the cache (``ORPHAN_STATUS_KEY``). The pass runs in a background thread
+at most once per ``ORPHAN_CLEANUP_INTERVAL_SECONDS`` (started from feed
+reads, guarded by a Redis lock when available). It can also be run from cron
+with ``run_orphan_cleanup.py`` or triggered via
+``POST /api/admin/reports/cleanup/orphans``.
+"""
+
+import logging
+import threading
+import time
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import exists, func
+
+try:
+    from .models import db, CommunityReport, CommunityReportMedia, CommunityReportComment, ReportVote, UserPointLog
+    from .database import delete_returning
+    from .points import revoke_logged_points
+    from .cache import cache
+    from .monitoring import record_orphan_cleanup, record_orphan_counts
+except ImportError:
+    from models import db, CommunityReport, CommunityReportMedia, CommunityReportComment, ReportVote, UserPointLog
+    from database import delete_returning
+    from points import revoke_logged_points
+    from cache import cache
+    from monitoring import record_orphan_cleanup, record_orphan_counts
+
+logger = logging.getLogger(__name__)
+
+# Result keys (as in the admin endpoint's response) and their tables
+ORPHAN_TABLES = (
+    ('point_logs', UserPointLog),
+    ('media', CommunityReportMedia),
+    ('comments', CommunityReportComment),
+    ('votes', ReportVote),
+)
+CLEANUP_LOCK_KEY = 'orphans:cleanup_lock'
+ORPHAN_STATUS_KEY = 'orphans:last_run'
+STATUS_TTL = 7 * 24 * 3600
+
+# time.monotonic() of this process's last scheduled run
+_last_run = None
+_run_lock = threading.Lock()
+# Summary of this process's last pass, for when the cache is unavailable
+_last_summary = None
+
+
+def orphan_condition(model):
+    """Rows of `model` that reference a community report which does not exist"""
+    return model.report_id.isnot(None) & ~exists().where(CommunityReport.id == model.report_id)
+
+
+def count_orphans():
+    """{key: orphaned rows} per table, without deleting anything"""
+    return {
+        key: int(db.session.query(func.count(model.id)).filter(orphan_condition(model)).scalar() or 0)
+        for key, model in ORPHAN_TABLES
+    }
+
+
+def _delete_batch(model, ids):
+    table = model.__table__
+    where = table.c.id.in_(ids) & orphan_condition(model)
+    if model is not UserPointLog:
+        return db.session.execute(table.delete().where(where)).rowcount
+    logs = delete_returning(db.session, table, where, table.c.user_id, table.c.points, table.c.created_at)
+    revoke_logged_points(logs)
+    return len(logs)
+
+
+def _store_status(summary):
+    global _last_summary
+    _last_summary = summary
+    try:
+        cache.set(ORPHAN_STATUS_KEY, summary, timeout=STATUS_TTL)
+    except Exception as e:
+        logger.warning(f"Could not store orphan cleanup status: {e}")
+
+
+def last_cleanup_status():
+    """Summary of the most recent pass (any worker's with Redis, else this process's)"""
+    return cache.get(ORPHAN_STATUS_KEY) or _last_summary
+
+
+def cleanup_orphans(batch_size=None, dry_run=False):
+    """Remove orphaned child rows in bounded batches, or just count them with ``dry_run``.
+
+    Returns {'dry_run', 'orphans' or 'removed': {key: n}, 'batches', 'seconds', 'finished_at'}.
+    """
+    batch_size = batch_size or int(current_app.config.get('ORPHAN_CLEANUP_BATCH_SIZE', 1000))
+    started = time.perf_counter()
+    if dry_run:
+        counts = count_orphans()
+        record_orphan_counts(counts)
+        summary = {'dry_run': True, 'orphans': counts, 'batches': 0}
+    else:
+        removed = {key: 0 for key, _ in ORPHAN_TABLES}
+        batches = 0
+        for key, model in ORPHAN_TABLES:
+            last_id = 0
+            while True:
+                ids = [row[0] for row in (
+                    db.session.query(model.id)
+                    .filter(model.id > last_id, orphan_condition(model))
+                    .order_by(model.id)
+                    .limit(batch_size)
+                )]
+                if not ids:
+                    break
+                try:
+                    removed[key] += _delete_batch(model, ids)
+                    db.session.commit()
+                except Exception:
+                    db.session.rollback()
+                    raise
+                batches += 1
+                last_id = ids[-1]
+                logger.info(f"Orphan cleanup: {removed[key]} {key} removed so far")
+                if len(ids) < batch_size:
+                    break
+        summary = {'dry_run': False, 'removed': removed, 'batches': batches}
+        record_orphan_cleanup(removed, time.perf_counter() - started)
+        record_orphan_counts({key: 0 for key in removed})
+    summary['seconds'] = round(time.perf_counter() - started, 3)
+    summary['finished_at'] = datetime.utcnow().isoformat()
+    _store_status(summary)
+    return summary
+
+
+def _run_in_background(app):
+    with app.app_context():
+        try:
+            summary = cleanup_orphans()
+            if any(summary['removed'].values()):
+                logger.info(f"Orphan cleanup removed {summary['removed']}")
+        except Exception as e:
+            logger.error(f"Orphan cleanup run failed: {e}")
+        finally:
+            db.session.remove()
+
+
+def maybe_run_orphan_cleanup():
+    """Start a background cleanup pass if one is due; never raises"""
+    global _last_run
+    config = current_app.config
+    if not config.get('ORPHAN_CLEANUP_ENABLED', True):
+        return False
+    interval = int(config.get('ORPHAN_CLEANUP_INTERVAL_SECONDS', 86400))
+    with _run_lock:
+        now = time.monotonic()
+        if _last_run is not None and now - _last_run < interval:
+            return False
+        _last_run = now
+    if cache.redis_client is not None:
+        try:
+            # One worker per interval across processes
+            if not cache.redis_client.set(CLEANUP_LOCK_KEY, 1, nx=True, ex=interval):
+                return False
+        except Exception as e:
+            logger.warning(f"Orphan cleanup lock unavailable, running locally: {e}")
+    threading.Thread(
+        target=_run_in_background, args=(current_app._get_current_object(),),
+        name='orphan-cleanup', daemon=True,
+    ).start()
+    return True
@@ -0,0 +1,160 @@
+"""
+Keyset (cursor) pagination helpers.
+
+OFFSET pagination makes the database walk and discard every row before the
+requested page, and ``paginate()`` adds a ``COUNT(*)`` over the whole filtered
+set. Keyset pagination instead remembers the sort key of the last row served
+and asks for rows strictly "after" it, which an index on the same columns can
+answer directly regardless of depth.
+
+Cursors are opaque URL-safe strings wrapping the sort-key values of the last
+row on a page.
+"""
+
+import base64
+import json
+from datetime import datetime
+
+from sqlalchemy import func, tuple_
+
+# Above this many planned rows, include_total=auto reports the planner estimate
+EXACT_COUNT_LIMIT = 10000
+
+
+class InvalidCursorError(ValueError):
+    """Raised when a client supplies a cursor we did not issue"""
+
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return {'dt': value.isoformat()}
+    return value
+
+
+def _python_type(column):
+    try:
+        return column.type.python_type
+    except (AttributeError, NotImplementedError):
+        return None
+
+
+def _decode_value(value, python_type):
+    """A cursor value as the sort column's type; ValueError/TypeError/KeyError if it isn't one"""
+    if isinstance(value, dict):
+        value = datetime.fromisoformat(value['dt'])
+    if value is None or python_type is None:
+        return value
+    # bool is an int to isinstance(), but a flag is not a valid id and vice versa
+    if not isinstance(value, python_type) or isinstance(value, bool) != issubclass(python_type, bool):
+        raise TypeError(f"expected {python_type.__name__}, got {type(value).__name__}")
+    return value
+
+
+def encode_cursor(values):
+    """Encode a sequence of sort-key values into an opaque cursor string"""
+    payload = json.dumps([_encode_value(v) for v in values], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, columns):
+    """Decode a cursor produced by encode_cursor for the sort ``columns``.
+
+    Returns None for an empty cursor. Raises InvalidCursorError unless the
+    cursor holds one value of the right type per column.
+    """
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8'))
+    except Exception:
+        raise InvalidCursorError('Malformed cursor')
+    if not isinstance(values, list) or len(values) != len(columns):
+        raise InvalidCursorError('Cursor does not match the requested sort order')
+    try:
+        return [_decode_value(v, _python_type(c)) for v, c in zip(values, columns)]
+    except (ValueError, TypeError, KeyError):
+        raise InvalidCursorError('Cursor does not match the requested sort order')
+
+
+def keyset_page(query, columns, cursor, per_page):
+    """Fetch one page of ``query`` ordered descending by ``columns``.
+
+    ``columns`` are the sort-key column expressions, most significant first; the
+    last one must be unique (normally the primary key) so the order is total.
+    Returns ``(rows, next_cursor)``; ``next_cursor`` is None on the last page.
+    """
+    after = decode_cursor(cursor, columns)
+    if after is not None:
+        query = query.filter(tuple_(*columns) < tuple_(*after))
+    query = query.order_by(*[c.desc() for c in columns])
+
+    rows = query.limit(per_page + 1).all()
+    has_next = len(rows) > per_page
+    rows = rows[:per_page]
+
+    next_cursor = None
+    if has_next and rows:
+        last = rows[-1]
+        next_cursor = encode_cursor([getattr(last, c.key) for c in columns])
+    return rows, next_cursor
+
+
+def offset_page(query, page, per_page):
+    """OFFSET page without the COUNT(*) that ``paginate()`` always runs.
+
+    Returns ``(rows, has_next)``.
+    """
+    rows = query.offset((max(page, 1) - 1) * per_page).limit(per_page + 1).all()
+    return rows[:per_page], len(rows) > per_page
+
+
+def exact_count(query):
+    """Exact number of rows ``query`` would return.
+
+    Unlike ``Query.count()``, which wraps a SELECT of every mapped column
+    (deferred ones included), this counts the filtered rows directly. Only
+    for single-entity queries without joins that could duplicate rows.
+    """
+    return query.order_by(None).with_entities(func.count()).scalar()
+
+
+def estimate_row_count(query):
+    """Approximate number of rows ``query`` would return.
+
+    On PostgreSQL this reads the planner's row estimate from EXPLAIN, which is
+    answered from table statistics without scanning. Other databases fall back
+    to an exact COUNT.
+    """
+    session = query.session
+    bind = session.get_bind()
+    if bind.dialect.name != 'postgresql':
+        return exact_count(query)
+
+    compiled = query.order_by(None).statement.compile(dialect=bind.dialect)
+    plan = session.connection().exec_driver_sql(
+        'EXPLAIN (FORMAT JSON) ' + str(compiled), compiled.params
+    ).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+def count_rows(query, mode='true'):
+    """Total for a listing according to an ``include_total`` mode.
+
+    ``true`` counts exactly, ``false`` skips counting, ``approx`` uses the
+    planner estimate and ``auto`` counts exactly only when the estimate is at
+    most EXACT_COUNT_LIMIT. Returns ``(total, is_estimate)``.
+    """
+    if mode == 'false':
+        return None, False
+    if mode == 'true':
+        return exact_count(query), False
+    if query.session.get_bind().dialect.name != 'postgresql':
+        # No cheap estimate available; estimate_row_count counts exactly here
+        return estimate_row_count(query), False
+    estimate = estimate_row_count(query)
+    if mode == 'auto' and estimate <= EXACT_COUNT_LIMIT:
+        return exact_count(query), False
+    return estimate, True
@@ -0,0 +1,181 @@
+"""
+Password hashing and verification off the request thread.
+
+PBKDF2 with 600,000 iterations costs about a quarter of a second of CPU per
+call. Run on the request thread, a burst of sign-ins (or an admin creating
+many accounts) kept every thread of a worker busy hashing, and requests that
+needed no hashing at all queued behind them. Here hashing runs in a small
+process pool (``PASSWORD_HASH_WORKERS`` processes per web worker, created on
+first use in each process), so at most that many hashes run at once.
+
+Admission is bounded: when ``PASSWORD_HASH_MAX_PENDING`` calls are already
+queued or running, further calls fail fast with ``PasswordHashUnavailable``,
+and so does a call that gets no result within
+``PASSWORD_HASH_TIMEOUT_SECONDS``. The login route answers those with 503
+and ``Retry-After``. The pool is rebuilt if one of its processes dies, and
+replaced after a timeout. Under gunicorn with ``preload_app`` each worker
+starts its pool in ``post_fork``, before it runs any other thread.
+``PASSWORD_HASH_WORKERS=0`` hashes inline, as before.
+
+``PASSWORD_HASH_METHOD`` is the hashing policy, in werkzeug's method syntax
+(``pbkdf2:sha256:600000``, ``scrypt:32768:8:1``, ...). Stored hashes record
+the parameters they were made with. When a password verifies against a hash
+made with other parameters, ``User.check_password`` replaces it with one made
+under the current policy, so raising the cost takes effect as users sign in.
+"""
+
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
+
+from flask import current_app, has_app_context
+from werkzeug.security import generate_password_hash, check_password_hash
+
+try:
+    from .monitoring import record_password_hash, set_password_hash_pending
+except ImportError:
+    from monitoring import record_password_hash, set_password_hash_pending
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'PASSWORD_HASH_METHOD': 'pbkdf2:sha256:600000',
+    'PASSWORD_HASH_WORKERS': 1,
+    'PASSWORD_HASH_MAX_PENDING': 32,
+    'PASSWORD_HASH_TIMEOUT_SECONDS': 10,
+}
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+_pending = 0
+_pending_lock = threading.Lock()
+
+
+class PasswordHashUnavailable(Exception):
+    """Hashing is saturated or timed out; the caller should retry later"""
+
+
+def _setting(name):
+    if has_app_context():
+        return current_app.config.get(name, DEFAULTS[name])
+    return DEFAULTS[name]
+
+
+def _get_pool(workers):
+    """This process's pool (a forked worker never reuses its parent's)"""
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            # fork: spawn and forkserver re-import the launching script (e.g. `python src/main.py`,
+            # which builds the whole app) in every pool process. The forked children only run
+            # hashlib on their arguments and never touch the parent's connections or threads.
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('fork'))
+            _pool_pid = os.getpid()
+        return _pool
+
+
+def _discard_pool(pool):
+    """Stop using `pool` and kill its processes (a stuck one would never finish)"""
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    processes = list((pool._processes or {}).values())
+    pool.shutdown(wait=False, cancel_futures=True)
+    for process in processes:
+        process.kill()
+
+
+def warm_pool():
+    """Start this process's pool processes now.
+
+    Forking a process that runs other threads can copy a lock one of them
+    holds, and the child then deadlocks on it. The gunicorn post_fork hook
+    calls this while the new worker still has a single thread; a pool
+    rebuilt later forks from a threaded worker and is discarded if a call
+    times out.
+    """
+    workers = int(_setting('PASSWORD_HASH_WORKERS'))
+    if workers > 0:
+        _get_pool(workers).submit(int).result()
+
+
+def _run(op, fn, *args):
+    global _pending
+    workers = int(_setting('PASSWORD_HASH_WORKERS'))
+    started = time.perf_counter()
+    if workers <= 0:
+        result = fn(*args)
+        record_password_hash(op, 'inline', time.perf_counter() - started)
+        return result
+    with _pending_lock:
+        if _pending >= int(_setting('PASSWORD_HASH_MAX_PENDING')):
+            record_password_hash(op, 'rejected')
+            raise PasswordHashUnavailable('Password hashing is busy, please retry')
+        _pending += 1
+        set_password_hash_pending(_pending)
+    try:
+        for attempt in (1, 2):
+            pool = _get_pool(workers)
+            try:
+                result = pool.submit(fn, *args).result(timeout=float(_setting('PASSWORD_HASH_TIMEOUT_SECONDS')))
+            except BrokenProcessPool:
+                # A pool process died (OOM killer, crash, or a timed-out pool was discarded);
+                # start a fresh pool once
+                _discard_pool(pool)
+                if attempt == 2:
+                    record_password_hash(op, 'error')
+                    raise PasswordHashUnavailable('Password hashing failed, please retry')
+                logger.warning('Password hashing pool broke, restarting it')
+                continue
+            except FutureTimeoutError:
+                # The pool may be stuck (e.g. a child deadlocked after the fork): replace it
+                # rather than have every later call time out too
+                _discard_pool(pool)
+                record_password_hash(op, 'timeout')
+                raise PasswordHashUnavailable('Password hashing timed out, please retry')
+            record_password_hash(op, 'ok', time.perf_counter() - started)
+            return result
+    finally:
+        with _pending_lock:
+            _pending -= 1
+            set_password_hash_pending(_pending)
+
+
+def hash_password(password):
+    """Hash under the current policy (PASSWORD_HASH_METHOD)"""
+    return _run('hash', generate_password_hash, password, _setting('PASSWORD_HASH_METHOD'))
+
+
+def verify_password(password_hash, password):
+    if not password_hash:
+        return False
+    return _run('verify', check_password_hash, password_hash, password)
+
+
+@lru_cache(maxsize=8)
+def _method_prefix(method):
+    # werkzeug fills in default parameters (e.g. iterations); a throwaway hash shows them
+    return generate_password_hash('', method).split('$', 1)[0]
+
+
+def needs_rehash(password_hash):
+    """Whether a stored hash was made with parameters other than the current policy's"""
+    if not password_hash or '$' not in password_hash:
+        return True
+    return password_hash.split('$', 1)[0] != _method_prefix(_setting('PASSWORD_HASH_METHOD'))
+
+
+def shutdown_pool():
+    """Stop this process's hashing pool (it is restarted on next use)"""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=True, cancel_futures=True)
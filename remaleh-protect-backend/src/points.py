@@ -0,0 +1,355 @@
+"""
+Community points service.
+
+``user_point_logs`` stays the source of truth, but summing it for every feed
+page, leaderboard and cap check grows with log volume. This module keeps
+``user_point_totals`` (all-time, rolling 90-day and today's points per user)
+and ``user_point_daily`` (per-day buckets inside the 90-day window) in step
+with the log, inside the caller's transaction.
+
+Days are UTC calendar days. The 90-day window is today plus the 89 days
+before it. A user's 90-day and today figures are "rolled" forward the first
+time they are touched on a new day; ``roll_point_windows`` does the same for
+every user in one statement before ranking queries.
+
+If totals ever drift (manual SQL, restored backups), ``rebuild_point_totals``
+recomputes them from the log. See ``rebuild_point_totals.py``.
+"""
+
+import logging
+from datetime import datetime, date, time, timedelta
+
+from sqlalchemy import delete, func, select, update, or_
+from sqlalchemy.exc import IntegrityError
+
+try:
+    from .models import db, User, UserPointLog, UserPointTotal, UserPointDaily
+    from .leaderboard import record_points_change, record_user_reset
+except ImportError:
+    from models import db, User, UserPointLog, UserPointTotal, UserPointDaily
+    from leaderboard import record_points_change, record_user_reset
+
+logger = logging.getLogger(__name__)
+
+WINDOW_DAYS = 90
+
+_PERIOD_COLUMNS = {
+    'all': UserPointTotal.points_all_time,
+    '90d': UserPointTotal.points_90d,
+}
+
+# Last UTC day roll_point_windows completed in this process
+_last_rolled_on = None
+
+
+def _today():
+    return datetime.utcnow().date()
+
+
+def window_start(today=None):
+    """First day included in the rolling 90-day window"""
+    return (today or _today()) - timedelta(days=WINDOW_DAYS - 1)
+
+
+def _period_column(period):
+    return _PERIOD_COLUMNS['all' if period == 'all' else '90d']
+
+
+def _daily_sum(user_id, start, end=None):
+    q = db.session.query(func.coalesce(func.sum(UserPointDaily.points), 0)).filter(
+        UserPointDaily.user_id == user_id,
+        UserPointDaily.day >= start
+    )
+    if end is not None:
+        q = q.filter(UserPointDaily.day <= end)
+    return int(q.scalar() or 0)
+
+
+def _lock_or_create(model, **key):
+    """SELECT ... FOR UPDATE a row by primary key, inserting it if missing"""
+    row = model.query.filter_by(**key).with_for_update().first()
+    if row is not None:
+        return row, False
+    try:
+        with db.session.begin_nested():
+            row = model(**key)
+            db.session.add(row)
+        return row, True
+    except IntegrityError:
+        # Lost the insert race to a concurrent award; lock the winner's row
+        return model.query.filter_by(**key).with_for_update().first(), False
+
+
+def _roll_user(total, today):
+    if total.rolled_on == today:
+        return
+    total.points_90d = _daily_sum(total.user_id, window_start(today))
+    total.points_today = _daily_sum(total.user_id, today, today)
+    total.rolled_on = today
+
+
+def _locked_total(user_id, today):
+    total, created = _lock_or_create(UserPointTotal, user_id=user_id)
+    if created:
+        total.points_all_time = 0
+        total.points_90d = 0
+        total.points_today = 0
+        total.rolled_on = today
+    _roll_user(total, today)
+    return total
+
+
+def _apply(total, day, delta, today):
+    """Add `delta` points earned on `day` to a locked, rolled totals row"""
+    total.points_all_time = (total.points_all_time or 0) + delta
+    if day >= window_start(today):
+        total.points_90d = (total.points_90d or 0) + delta
+        bucket, created = _lock_or_create(UserPointDaily, user_id=total.user_id, day=day)
+        bucket.points = (0 if created else (bucket.points or 0)) + delta
+    if day == today:
+        total.points_today = (total.points_today or 0) + delta
+    record_points_change(total.user_id, day, delta)
+
+
+def award_points_with_daily_cap(user_id, base_points, reason, report_id=None, daily_cap=120):
+    """Award points with a per-day cap. Returns points actually awarded.
+
+    The totals row is locked for the rest of the transaction, so concurrent
+    awards for the same user cannot both pass the cap check.
+    """
+    today = _today()
+    total = _locked_total(user_id, today)
+    remaining = max(0, daily_cap - int(total.points_today or 0))
+    to_award = min(int(base_points), remaining)
+    if to_award <= 0:
+        return 0
+    log = UserPointLog(user_id=user_id, report_id=report_id, points=to_award, reason=reason)
+    db.session.add(log)
+    _apply(total, today, to_award, today)
+    try:
+        db.session.flush()  # ensure subsequent reads see this award within the same transaction
+    except Exception:
+        pass
+    return to_award
+
+
+def revoke_logged_points(logs, except_user_id=None):
+    """Subtract deleted point logs (anything with user_id, points and created_at) from the totals.
+
+    Adjusts each user's totals once per day the points were earned, locking users
+    in id order. Logs of ``except_user_id`` are skipped (their totals are being
+    removed). Returns the number of points revoked.
+    """
+    today = _today()
+    per_day = {}
+    for log in logs:
+        if log.user_id == except_user_id:
+            continue
+        key = (log.user_id, (log.created_at or datetime.utcnow()).date())
+        per_day[key] = per_day.get(key, 0) + int(log.points or 0)
+    totals = {}
+    for (user_id, earned_on), points in sorted(per_day.items()):
+        if user_id not in totals:
+            totals[user_id] = _locked_total(user_id, today)
+        _apply(totals[user_id], earned_on, -points, today)
+    return sum(per_day.values())
+
+
+def revoke_report_points(report_id):
+    """Delete the point logs tied to a report and subtract them from the totals.
+    Returns the number of points revoked.
+    """
+    logs = UserPointLog.query.filter_by(report_id=report_id).all()
+    revoked = revoke_logged_points(logs)
+    if logs:
+        db.session.query(UserPointLog).filter_by(report_id=report_id).delete(synchronize_session=False)
+    return revoked
+
+
+def delete_user_points(user_id):
+    """Remove a user's totals rows (callers delete the user's logs themselves)"""
+    db.session.query(UserPointDaily).filter(UserPointDaily.user_id == user_id).delete(synchronize_session=False)
+    db.session.query(UserPointTotal).filter(UserPointTotal.user_id == user_id).delete(synchronize_session=False)
+    record_user_reset(user_id)
+
+
+def get_user_points(user_id):
+    """Return {'all': int, '90d': int, 'today': int} for a user, or None if they never earned points"""
+    total = db.session.get(UserPointTotal, user_id)
+    if total is None:
+        return None
+    today = _today()
+    if total.rolled_on == today:
+        return {'all': int(total.points_all_time or 0), '90d': int(total.points_90d or 0), 'today': int(total.points_today or 0)}
+    return {
+        'all': int(total.points_all_time or 0),
+        '90d': _daily_sum(user_id, window_start(today)),
+        'today': _daily_sum(user_id, today, today),
+    }
+
+
+def points_for_users(user_ids, period='all'):
+    """Map user_id -> points for the given users (users without points are omitted)"""
+    if not user_ids:
+        return {}
+    if period != 'all':
+        roll_point_windows()
+    column = _period_column(period)
+    rows = db.session.query(UserPointTotal.user_id, column).filter(UserPointTotal.user_id.in_(user_ids)).all()
+    return {int(uid): int(pts or 0) for uid, pts in rows}
+
+
+def roll_point_windows(today=None):
+    """Bring every user's 90-day and today figures up to date for `today`.
+
+    Runs at most once per process per day; later calls are a no-op. The
+    update commits on a connection of its own, so the caller's session
+    (often a read-only request) is left alone.
+    """
+    global _last_rolled_on
+    today = today or _today()
+    if _last_rolled_on == today:
+        return 0
+    start = window_start(today)
+    window_sum = select(func.coalesce(func.sum(UserPointDaily.points), 0)).where(
+        UserPointDaily.user_id == UserPointTotal.user_id,
+        UserPointDaily.day >= start
+    ).scalar_subquery()
+    today_sum = select(func.coalesce(func.sum(UserPointDaily.points), 0)).where(
+        UserPointDaily.user_id == UserPointTotal.user_id,
+        UserPointDaily.day == today
+    ).scalar_subquery()
+    with db.engine.begin() as conn:
+        rolled = conn.execute(
+            update(UserPointTotal.__table__).where(
+                or_(UserPointTotal.rolled_on.is_(None), UserPointTotal.rolled_on < today)
+            ).values(points_90d=window_sum, points_today=today_sum, rolled_on=today)
+        ).rowcount
+        # Buckets that fell out of the window are no longer needed; the log keeps history
+        conn.execute(delete(UserPointDaily.__table__).where(UserPointDaily.day < start))
+    _last_rolled_on = today
+    if rolled:
+        logger.info(f"Rolled points windows for {rolled} users to {today.isoformat()}")
+    return rolled
+
+
+def top_users(period='90d', limit=20):
+    """Highest-scoring users for a period: [(user_id, first_name, last_name, points)]"""
+    if period != 'all':
+        roll_point_windows()
+    column = _period_column(period)
+    return db.session.query(
+        User.id, User.first_name, User.last_name, column.label('points')
+    ).join(UserPointTotal, UserPointTotal.user_id == User.id).filter(
+        column > 0
+    ).order_by(column.desc(), User.id).limit(limit).all()
+
+
+def user_rank(user_id, period='90d'):
+    """1-based rank of a user by points for a period, or None if they have no points in it"""
+    points = get_user_points(user_id)
+    if not points:
+        return None
+    mine = points['all' if period == 'all' else '90d']
+    if mine <= 0:
+        return None
+    if period != 'all':
+        roll_point_windows()
+    column = _period_column(period)
+    ahead = db.session.query(func.count(UserPointTotal.user_id)).filter(column > mine).scalar() or 0
+    return int(ahead) + 1
+
+
+def _as_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+
+def rebuild_point_totals(user_ids=None, dry_run=False, today=None, commit=True):
+    """Recompute totals from user_point_logs and report/fix any drift.
+
+    With ``user_ids`` only those users are reconciled. With ``dry_run`` the
+    tables are left untouched. Pass ``commit=False`` to leave the rewrite in
+    the caller's transaction. Returns a summary dict.
+    """
+    today = today or _today()
+    start = window_start(today)
+
+    all_q = db.session.query(UserPointLog.user_id, func.sum(UserPointLog.points)).group_by(UserPointLog.user_id)
+    day_col = func.date(UserPointLog.created_at)
+    daily_q = db.session.query(UserPointLog.user_id, day_col, func.sum(UserPointLog.points)).filter(
+        UserPointLog.created_at >= datetime.combine(start, time.min)
+    ).group_by(UserPointLog.user_id, day_col)
+    existing_q = UserPointTotal.query
+    if user_ids is not None:
+        all_q = all_q.filter(UserPointLog.user_id.in_(user_ids))
+        daily_q = daily_q.filter(UserPointLog.user_id.in_(user_ids))
+        existing_q = existing_q.filter(UserPointTotal.user_id.in_(user_ids))
+
+    expected = {}
+    for uid, pts in all_q.all():
+        expected[int(uid)] = {'all': int(pts or 0), 'daily': {}}
+    for uid, day, pts in daily_q.all():
+        entry = expected.setdefault(int(uid), {'all': 0, 'daily': {}})
+        entry['daily'][_as_date(day)] = int(pts or 0)
+
+    existing = {t.user_id: t for t in existing_q.all()}
+    mismatched = []
+    for uid in set(expected) | set(existing):
+        want = expected.get(uid)
+        have = existing.get(uid)
+        if want is None or have is None:
+            mismatched.append(uid)
+            continue
+        want_90d = sum(want['daily'].values())
+        want_today = want['daily'].get(today, 0)
+        have_90d = have.points_90d if have.rolled_on == today else _daily_sum(uid, start)
+        have_today = have.points_today if have.rolled_on == today else _daily_sum(uid, today, today)
+        if (have.points_all_time, have_90d, have_today) != (want['all'], want_90d, want_today):
+            mismatched.append(uid)
+
+    if not dry_run:
+        daily_delete = db.session.query(UserPointDaily)
+        total_delete = db.session.query(UserPointTotal)
+        if user_ids is not None:
+            daily_delete = daily_delete.filter(UserPointDaily.user_id.in_(user_ids))
+            total_delete = total_delete.filter(UserPointTotal.user_id.in_(user_ids))
+        daily_delete.delete(synchronize_session=False)
+        total_delete.delete(synchronize_session=False)
+        db.session.bulk_insert_mappings(UserPointTotal, [{
+            'user_id': uid,
+            'points_all_time': e['all'],
+            'points_90d': sum(e['daily'].values()),
+            'points_today': e['daily'].get(today, 0),
+            'rolled_on': today,
+        } for uid, e in expected.items()])
+        db.session.bulk_insert_mappings(UserPointDaily, [
+            {'user_id': uid, 'day': day, 'points': pts}
+            for uid, e in expected.items() for day, pts in e['daily'].items()
+        ])
+        # A full rebuild is followed by rebuild_leaderboard(); targeted ones patch Redis per user
+        if user_ids is not None:
+            for uid in set(expected) | set(existing):
+                e = expected.get(uid, {'all': 0, 'daily': {}})
+                record_user_reset(uid, e['all'], e['daily'])
+        if commit:
+            db.session.commit()
+
+    return {
+        'users': len(expected),
+        'mismatched': len(mismatched),
+        'mismatched_user_ids': sorted(mismatched)[:100],
+        'dry_run': dry_run,
+    }
+
+
+def ensure_point_totals():
+    """Populate the totals tables on first start after they were introduced"""
+    has_logs = db.session.query(UserPointLog.id).limit(1).first() is not None
+    has_totals = db.session.query(UserPointTotal.user_id).limit(1).first() is not None
+    if has_logs and not has_totals:
+        summary = rebuild_point_totals()
+        logger.info(f"Built points totals for {summary['users']} users")
@@ -1,51 +1,37 @@
-from flask import Blueprint, request, jsonify, current_app
+from flask import Blueprint, request, jsonify
 from functools import wraps
 from datetime import datetime
 import logging
 from sqlalchemy import text, func
-import os
-from urllib.parse import urlparse
-
-# Optional Cloudinary support
-try:
-    import cloudinary
-    import cloudinary.uploader
-except ImportError:
-    cloudinary = None
+from sqlalchemy.orm import selectinload, undefer_group
 
 # Import production modules - try relative imports first, then absolute
 try:
-    from ..models import db, User, CommunityReport, CommunityReportMedia, UserPointLog, ReportVote, CommunityReportComment, LearningProgress, LessonProgress, ProtectionStatus
+    from ..models import db, User, CommunityReport, UserPointLog, DeletionJob, OutboundEmail
     from ..auth import token_required, admin_required, validate_password_strength
+    from ..points import award_points_with_daily_cap
+    from ..trending import report_status_changed
+    from ..stats import user_counts, report_counts, admin_recent_activity
+    from ..pagination import keyset_page, offset_page, count_rows, exact_count, InvalidCursorError
+    from ..user_search import apply_user_search, MATCH_MODES
+    from ..bulk_delete import delete_reports, start_deletion_job, run_deletion_in_background, maybe_process_media_deletions
+    from ..orphan_cleanup import cleanup_orphans, last_cleanup_status
+    from ..email_outbox import outbox_status
 except ImportError:
-    from models import db, User, CommunityReport, CommunityReportMedia, UserPointLog, ReportVote, CommunityReportComment, LearningProgress, LessonProgress, ProtectionStatus
+    from models import db, User, CommunityReport, UserPointLog, DeletionJob, OutboundEmail
     from auth import token_required, admin_required, validate_password_strength
+    from points import award_points_with_daily_cap
+    from trending import report_status_changed
+    from stats import user_counts, report_counts, admin_recent_activity
+    from pagination import keyset_page, offset_page, count_rows, exact_count, InvalidCursorError
+    from user_search import apply_user_search, MATCH_MODES
+    from bulk_delete import delete_reports, start_deletion_job, run_deletion_in_background, maybe_process_media_deletions
+    from orphan_cleanup import cleanup_orphans, last_cleanup_status
+    from email_outbox import outbox_status
 
 logger = logging.getLogger(__name__)
 admin_bp = Blueprint('admin', __name__)
 
-def award_points_with_daily_cap(user_id, base_points, reason, report_id=None, daily_cap=120):
-    """Award points with a per-day cap. Returns points actually awarded."""
-    try:
-        start_of_day = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
-        today_points = db.session.query(func.coalesce(func.sum(UserPointLog.points), 0)).filter(
-            UserPointLog.user_id == user_id,
-            UserPointLog.created_at >= start_of_day
-        ).scalar() or 0
-        remaining = max(0, daily_cap - int(today_points))
-        to_award = min(int(base_points), int(remaining))
-        if to_award <= 0:
-            return 0
-        log = UserPointLog(user_id=user_id, report_id=report_id, points=to_award, reason=reason)
-        db.session.add(log)
-        try:
-            db.session.flush()
-        except Exception:
-            pass
-        return to_award
-    except Exception:
-        return 0
-
 def admin_required(f):
     """Decorator to check if user is admin - must be used AFTER token_required"""
     @wraps(f)
@@ -81,33 +67,39 @@ def moderator_or_admin_required(f):
             return jsonify({'error': 'Authentication error'}), 500
     return decorated_function
 
+def _report_counts_by_user(user_ids):
+    """{user_id: report count} for a page of users in one grouped query"""
+    if not user_ids:
+        return {}
+    try:
+        rows = db.session.query(
+            CommunityReport.user_id, func.count(CommunityReport.id)
+        ).filter(
+            CommunityReport.user_id.in_(user_ids)
+        ).group_by(CommunityReport.user_id).all()
+    except Exception:
+        # Default to no counts if the reports table doesn't exist
+        db.session.rollback()
+        return {}
+    return dict(rows)
+
 @admin_bp.route('/users', methods=['GET'])
 @token_required
 @admin_required
 def get_users(current_user):
-    """Get all users with pagination and filtering"""
+    """Get users with search, filtering and pagination.
+    Query params: search (email/name terms), match=prefix|contains, status, role,
+    cursor (keyset mode) or page, include_total=true|false|approx|auto.
+    """
     try:
-        # Debug logging
-        logger.info(f"Admin users endpoint called by user: {current_user.email if current_user else 'None'}")
-        logger.info(f"User is_admin: {current_user.is_admin if current_user else 'None'}")
-        logger.info(f"User role: {current_user.role if current_user else 'None'}")
-        
-        # Check database connectivity
-        try:
-            db.session.execute(text('SELECT 1'))
-            logger.info("Database connection test successful")
-        except Exception as db_error:
-            logger.error(f"Database connection error: {db_error}")
-            return jsonify({'error': 'Database connection failed', 'details': str(db_error)}), 503
-        
-        # Check if users table has data
-        total_users = User.query.count()
-        logger.info(f"Total users in database: {total_users}")
-        
         page = request.args.get('page', 1, type=int)
-        per_page = request.args.get('per_page', 20, type=int)
+        per_page = max(1, min(request.args.get('per_page', 20, type=int), 200))
         status = request.args.get('status')
         role = request.args.get('role')
+        search = (request.args.get('search') or '').strip()
+        match = (request.args.get('match') or 'prefix').lower()
+        if match not in MATCH_MODES:
+            return jsonify({'error': f"match must be one of: {', '.join(MATCH_MODES)}"}), 400
         
         query = User.query.filter(User.account_status != 'DELETED')  # Exclude deleted users
         
@@ -115,23 +107,28 @@ def get_users(current_user):
             query = query.filter(User.account_status == status)
         if role:
             query = query.filter(User.role == role)
-            
-        users = query.paginate(
-            page=page, 
-            per_page=per_page, 
-            error_out=False
-        )
+        query = apply_user_search(query, search, match)
         
-        logger.info(f"Query returned {len(users.items)} users for page {page}")
+        # Newest first; (created_at, id) is indexed and unique, so cursors are unambiguous
+        sort_columns = [User.created_at, User.id]
+        use_cursor = 'cursor' in request.args
+        include_total = request.args.get('include_total', 'false' if use_cursor else 'auto').lower()
+        total, total_is_estimate = count_rows(query, include_total)
         
-        user_list = []
-        for user in users.items:
-            # Safely get report count, handle case where table might not exist
+        if use_cursor:
             try:
-                report_count = CommunityReport.query.filter_by(user_id=user.id).count()
-            except Exception:
-                report_count = 0  # Default to 0 if table doesn't exist
-                
+                items, next_cursor = keyset_page(query, sort_columns, request.args.get('cursor'), per_page)
+            except InvalidCursorError as e:
+                return jsonify({'error': str(e)}), 400
+            has_next = next_cursor is not None
+        else:
+            items, has_next = offset_page(query.order_by(*[c.desc() for c in sort_columns]), page, per_page)
+            next_cursor = None
+        
+        report_counts = _report_counts_by_user([user.id for user in items])
+        
+        user_list = []
+        for user in items:
             user_data = {
                 'id': user.id,
                 'username': user.email.split('@')[0] if user.email else 'Unknown',
@@ -144,21 +141,21 @@ def get_users(current_user):
                 'email_verified': getattr(user, 'email_verified', None),
                 'created_at': user.created_at.isoformat() if user.created_at else None,
                 'last_login': user.last_login.isoformat() if user.last_login else None,
-                'report_count': report_count
+                'report_count': report_counts.get(user.id, 0)
             }
             user_list.append(user_data)
         
-        logger.info(f"Returning {len(user_list)} users")
-        
         return jsonify({
             'users': user_list,
             'pagination': {
-                'page': page,
+                'page': None if use_cursor else page,
                 'per_page': per_page,
-                'total': users.total,
-                'pages': users.pages,
-                'has_next': users.has_next,
-                'has_prev': users.has_prev
+                'total': total,
+                'total_is_estimate': total_is_estimate,
+                'pages': -(-total // per_page) if total is not None else None,
+                'has_next': has_next,
+                'has_prev': not use_cursor and page > 1,
+                'next_cursor': next_cursor
             }
         }), 200
         
@@ -239,14 +236,10 @@ def get_deleted_users(current_user):
         # Get only deleted users
         deleted_users = User.query.filter(User.account_status == 'DELETED').all()
         
+        report_counts = _report_counts_by_user([user.id for user in deleted_users])
+        
         user_list = []
         for user in deleted_users:
-            # Safely get report count, handle case where table might not exist
-            try:
-                report_count = CommunityReport.query.filter_by(user_id=user.id).count()
-            except Exception:
-                report_count = 0  # Default to 0 if table doesn't exist
-                
             user_data = {
                 'id': user.id,
                 'username': user.email.split('@')[0] if user.email else 'Unknown',
@@ -258,7 +251,7 @@ def get_deleted_users(current_user):
                 'is_admin': user.is_admin,
                 'created_at': user.created_at.isoformat() if user.created_at else None,
                 'last_login': user.last_login.isoformat() if user.last_login else None,
-                'report_count': report_count
+                'report_count': report_counts.get(user.id, 0)
             }
             user_list.append(user_data)
         
@@ -534,85 +527,69 @@ def delete_user(current_user, user_id):
 @token_required
 @admin_required
 def hard_delete_user(current_user, user_id):
-    """Permanently delete a user and associated data. Use with caution."""
+    """Permanently delete a user and associated data. Use with caution.
+
+    Runs as a background deletion job in bounded batches; poll
+    /deletion-jobs/<job_id> for progress.
+    """
     try:
         user = User.query.get(user_id)
         if not user:
             return jsonify({'error': 'User not found'}), 404
 
-        # Delete user's community reports (and media)
-        try:
-            reports = CommunityReport.query.filter_by(user_id=user.id).all()
-            for report in reports:
-                for m in list(getattr(report, 'media', [])):
-                    media_url = getattr(m, 'media_url', '') or ''
-                    if media_url.startswith('/api/community/uploads/'):
-                        try:
-                            filename = media_url.split('/api/community/uploads/', 1)[1]
-                            upload_folder = current_app.config.get('UPLOAD_FOLDER')
-                            if upload_folder:
-                                file_path = os.path.join(upload_folder, filename)
-                                if os.path.exists(file_path):
-                                    os.remove(file_path)
-                        except Exception:
-                            pass
-                    else:
-                        if cloudinary and ('res.cloudinary.com' in media_url):
-                            try:
-                                cloud_name = current_app.config.get('CLOUDINARY_CLOUD_NAME')
-                                api_key = current_app.config.get('CLOUDINARY_API_KEY')
-                                api_secret = current_app.config.get('CLOUDINARY_API_SECRET')
-                                if cloud_name and api_key and api_secret:
-                                    cloudinary.config(cloud_name=cloud_name, api_key=api_key, api_secret=api_secret, secure=True)
-                                    parsed = urlparse(media_url)
-                                    parts = parsed.path.split('/')
-                                    if 'upload' in parts:
-                                        upload_idx = parts.index('upload')
-                                        public_parts = parts[upload_idx+2:]
-                                        public_id_with_ext = '/'.join(public_parts)
-                                        if public_id_with_ext:
-                                            public_id = os.path.splitext(public_id_with_ext)[0]
-                                            cloudinary.uploader.destroy(public_id)
-                            except Exception:
-                                pass
-                db.session.delete(report)
-        except Exception:
-            pass
-
-        # Delete other dependent records
-        try:
-            db.session.query(ReportVote).where(ReportVote.user_id == user.id).delete(synchronize_session=False)
-        except Exception:
-            pass
-        try:
-            db.session.query(CommunityReportComment).where(CommunityReportComment.user_id == user.id).delete(synchronize_session=False)
-        except Exception:
-            pass
-        try:
-            db.session.query(UserPointLog).where(UserPointLog.user_id == user.id).delete(synchronize_session=False)
-        except Exception:
-            pass
-        try:
-            db.session.query(LessonProgress).where(LessonProgress.user_id == user.id).delete(synchronize_session=False)
-        except Exception:
-            pass
-        try:
-            db.session.query(LearningProgress).where(LearningProgress.user_id == user.id).delete(synchronize_session=False)
-        except Exception:
-            pass
-        try:
-            db.session.query(ProtectionStatus).where(ProtectionStatus.user_id == user.id).delete(synchronize_session=False)
-        except Exception:
-            pass
+        job = start_deletion_job('user', user.id, requested_by=current_user.id)
+        run_deletion_in_background(job.id)
+        logger.info(f"Admin {current_user.email} started hard delete of user {user_id} (job {job.id})")
+        return jsonify({'message': 'User deletion started', 'user_id': user_id, 'job': job.to_dict()}), 202
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': 'Internal server error', 'details': str(e)}), 500
 
-        # Finally delete the user
-        db.session.delete(user)
-        db.session.commit()
-        return jsonify({'message': 'User permanently deleted', 'user_id': user_id}), 200
+@admin_bp.route('/deletion-jobs/<int:job_id>', methods=['GET'])
+@token_required
+@admin_required
+def get_deletion_job(current_user, job_id):
+    """Progress of a bulk deletion job"""
+    job = db.session.get(DeletionJob, job_id)
+    if not job:
+        return jsonify({'error': 'Deletion job not found'}), 404
+    return jsonify({'job': job.to_dict()}), 200
+
+@admin_bp.route('/deletion-jobs/<int:job_id>/resume', methods=['POST'])
+@token_required
+@admin_required
+def resume_deletion_job(current_user, job_id):
+    """Restart a failed or interrupted deletion job from the step it stopped in"""
+    try:
+        job = db.session.get(DeletionJob, job_id)
+        if not job:
+            return jsonify({'error': 'Deletion job not found'}), 404
+        if job.status == 'done':
+            return jsonify({'error': 'Deletion job already finished', 'job': job.to_dict()}), 400
+        job = start_deletion_job(job.kind, job.target_id, requested_by=job.requested_by)
+        run_deletion_in_background(job.id)
+        return jsonify({'message': 'Deletion job resumed', 'job': job.to_dict()}), 202
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': 'Internal server error', 'details': str(e)}), 500
 
+@admin_bp.route('/email-outbox', methods=['GET'])
+@token_required
+@admin_required
+def get_email_outbox(current_user):
+    """Delivery status of queued email: counts per status and the most recent messages
+    (optionally only one status, e.g. ?status=failed)"""
+    try:
+        status = request.args.get('status')
+        limit = min(max(request.args.get('limit', 50, type=int), 1), 200)
+        query = OutboundEmail.query
+        if status:
+            query = query.filter(OutboundEmail.status == status)
+        messages = query.order_by(OutboundEmail.id.desc()).limit(limit).all()
+        return jsonify({'counts': outbox_status(), 'messages': [m.to_dict() for m in messages]}), 200
+    except Exception as e:
+        return jsonify({'error': 'Internal server error', 'details': str(e)}), 500
+
 @admin_bp.route('/users/<int:user_id>/restore', methods=['PUT'])
 @token_required
 @admin_required
@@ -669,26 +646,29 @@ def get_reports(current_user):
             }), 200
         
         page = request.args.get('page', 1, type=int)
-        per_page = request.args.get('per_page', 20, type=int)
+        per_page = max(1, request.args.get('per_page', 20, type=int))
         status = request.args.get('status')
         urgency = request.args.get('urgency')
         
-        query = CommunityReport.query
+        # Creators and media in one batched query each per page. A joined load would
+        # make OFFSET join every skipped row, which is slower on deep pages.
+        query = CommunityReport.query.options(
+            undefer_group('report_detail'),
+            selectinload(CommunityReport.user),
+            selectinload(CommunityReport.media)
+        )
         
         if status:
             query = query.filter(CommunityReport.status == status)
         if urgency:
             query = query.filter(CommunityReport.urgency == urgency)
             
-        reports = query.paginate(
-            page=page, 
-            per_page=per_page, 
-            error_out=False
-        )
+        items, has_next = offset_page(query, page, per_page)
+        total = exact_count(query)
         
         report_list = []
-        for report in reports.items:
-            user = User.query.get(report.user_id)
+        for report in items:
+            user = report.user
             report_data = {
                 'id': report.id,
                 'threat_type': report.threat_type,
@@ -714,10 +694,10 @@ def get_reports(current_user):
             'pagination': {
                 'page': page,
                 'per_page': per_page,
-                'total': reports.total,
-                'pages': reports.pages,
-                'has_next': reports.has_next,
-                'has_prev': reports.has_prev
+                'total': total,
+                'pages': -(-total // per_page),
+                'has_next': has_next,
+                'has_prev': page > 1
             }
         }), 200
         
@@ -729,54 +709,15 @@ def get_reports(current_user):
 @token_required
 @admin_required
 def admin_delete_report(current_user, report_id):
-    """Admin delete a report and associated media (local or Cloudinary)."""
+    """Admin delete a report; its media (local or Cloudinary) is queued for background deletion."""
     try:
         report = CommunityReport.query.get(report_id)
         if not report:
             return jsonify({'error': 'Report not found'}), 404
 
-        # Remove media files
-        for m in list(getattr(report, 'media', [])):
-            media_url = getattr(m, 'media_url', '') or ''
-            if media_url.startswith('/api/community/uploads/'):
-                try:
-                    filename = media_url.split('/api/community/uploads/', 1)[1]
-                    upload_folder = current_app.config.get('UPLOAD_FOLDER')
-                    if upload_folder:
-                        file_path = os.path.join(upload_folder, filename)
-                        if os.path.exists(file_path):
-                            os.remove(file_path)
-                except Exception:
-                    pass
-            else:
-                if cloudinary and ('res.cloudinary.com' in media_url):
-                    try:
-                        cloud_name = current_app.config.get('CLOUDINARY_CLOUD_NAME')
-                        api_key = current_app.config.get('CLOUDINARY_API_KEY')
-                        api_secret = current_app.config.get('CLOUDINARY_API_SECRET')
-                        if cloud_name and api_key and api_secret:
-                            cloudinary.config(cloud_name=cloud_name, api_key=api_key, api_secret=api_secret, secure=True)
-                            parsed = urlparse(media_url)
-                            parts = parsed.path.split('/')
-                            if 'upload' in parts:
-                                upload_idx = parts.index('upload')
-                                public_parts = parts[upload_idx+2:]
-                                public_id_with_ext = '/'.join(public_parts)
-                                if public_id_with_ext:
-                                    public_id = os.path.splitext(public_id_with_ext)[0]
-                                    cloudinary.uploader.destroy(public_id)
-                    except Exception:
-                        pass
-
-        # Clean up related point logs referencing this report to avoid FK constraint
-        try:
-            from ..models import UserPointLog
-        except ImportError:
-            from models import UserPointLog
-        db.session.query(UserPointLog).filter_by(report_id=report.id).delete(synchronize_session=False)
-
-        db.session.delete(report)
+        delete_reports([report.id])
         db.session.commit()
+        maybe_process_media_deletions()
         return jsonify({'message': 'Report deleted', 'report_id': report_id}), 200
     except Exception as e:
         db.session.rollback()
@@ -786,44 +727,26 @@ def admin_delete_report(current_user, report_id):
 @token_required
 @admin_required
 def cleanup_orphan_records(current_user):
-    """Admin-only: cleanup orphan point logs and media with missing parent report.
-    Does not remove local files; only DB rows for safety.
+    """Admin-only: cleanup orphan point logs, media, comments and votes with missing parent report.
+    Does not remove local files; only DB rows for safety. ?dry_run=true only counts them.
     """
     try:
-        removed = { 'point_logs': 0, 'media': 0, 'comments': 0, 'votes': 0 }
-        # Delete UserPointLogs with report_id not existing
-        try:
-            missing_point_logs = db.session.execute(text(
-                """
-                DELETE FROM user_point_logs
-                WHERE report_id IS NOT NULL AND report_id NOT IN (SELECT id FROM community_reports)
-                """
-            ))
-            removed['point_logs'] = getattr(missing_point_logs, 'rowcount', 0) or 0
-        except Exception:
-            pass
-
-        # Delete child tables orphans via raw SQL for speed/safety
-        for table_name, key in [
-            ('community_report_media','media'),
-            ('community_report_comments','comments'),
-            ('report_votes','votes')
-        ]:
-            try:
-                result = db.session.execute(text(f"""
-                    DELETE FROM {table_name}
-                    WHERE report_id NOT IN (SELECT id FROM community_reports)
-                """))
-                removed[key] = getattr(result, 'rowcount', 0) or removed.get(key, 0)
-            except Exception:
-                pass
-
-        db.session.commit()
-        return jsonify({'message': 'Orphan cleanup complete', 'removed': removed}), 200
+        dry_run = request.args.get('dry_run', 'false').lower() == 'true'
+        batch_size = request.args.get('batch_size', type=int)
+        summary = cleanup_orphans(batch_size=max(1, batch_size) if batch_size else None, dry_run=dry_run)
+        message = 'Orphan count complete' if dry_run else 'Orphan cleanup complete'
+        return jsonify({'message': message, **summary}), 200
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': 'Internal server error', 'details': str(e)}), 500
 
+@admin_bp.route('/reports/cleanup/orphans', methods=['GET'])
+@token_required
+@admin_required
+def orphan_cleanup_status(current_user):
+    """Summary of the last orphan cleanup pass (scheduled, cron or manual)"""
+    return jsonify({'last_run': last_cleanup_status()}), 200
+
 @admin_bp.route('/reports/<int:report_id>/moderate', methods=['PUT'])
 @token_required
 @moderator_or_admin_required
@@ -847,6 +770,7 @@ def moderate_report(current_user, report_id):
             
         previous_status = report.status
         report.status = action
+        report_status_changed(report, previous_status)
 
         # Award +2 points for APPROVED (only once per report and not when already VERIFIED)
         awarded_points = 0
@@ -881,62 +805,27 @@ def moderate_report(current_user, report_id):
 def get_admin_stats(current_user):
     """Get admin dashboard statistics"""
     try:
-        # User statistics
-        total_users = User.query.count()
-        active_users = User.query.filter_by(account_status='ACTIVE').count()
-        suspended_users = User.query.filter_by(account_status='SUSPENDED').count()
-        admin_users = User.query.filter_by(role='ADMIN').count()
-        
-        # Report statistics - safely handle case where table might not exist
+        # Counter snapshots: one aggregate query per table, cached briefly and kept current on writes
+        users = user_counts()
         try:
-            total_reports = CommunityReport.query.count()
-            pending_reports = CommunityReport.query.filter_by(status='PENDING').count()
-            approved_reports = CommunityReport.query.filter_by(status='APPROVED').count()
-            rejected_reports = CommunityReport.query.filter_by(status='REJECTED').count()
+            reports = report_counts()
         except Exception:
-            total_reports = 0
-            pending_reports = 0
-            approved_reports = 0
-            rejected_reports = 0
-        
-        # Recent activity
-        recent_users = User.query.order_by(User.created_at.desc()).limit(5).all()
-        
-        try:
-            recent_reports = CommunityReport.query.order_by(CommunityReport.created_at.desc()).limit(5).all()
-        except Exception:
-            recent_reports = []
+            reports = {'total': 0, 'status': {}}
         
         stats = {
             'users': {
-                'total': total_users,
-                'active': active_users,
-                'suspended': suspended_users,
-                'admin': admin_users
+                'total': users['total'],
+                'active': users['status']['ACTIVE'],
+                'suspended': users['status']['SUSPENDED'],
+                'admin': users['role']['ADMIN']
             },
             'reports': {
-                'total': total_reports,
-                'pending': pending_reports,
-                'approved': approved_reports,
-                'rejected': rejected_reports
+                'total': reports['total'],
+                'pending': reports['status'].get('PENDING', 0),
+                'approved': reports['status'].get('APPROVED', 0),
+                'rejected': reports['status'].get('REJECTED', 0)
             },
-            'recent_activity': {
-                'new_users': [
-                    {
-                        'id': user.id,
-                        'username': user.email.split('@')[0] if user.email else 'Unknown',
-                        'created_at': user.created_at.isoformat() if user.created_at else None
-                    } for user in recent_users
-                ],
-                'new_reports': [
-                    {
-                        'id': report.id,
-                        'threat_type': report.threat_type,
-                        'status': report.status,
-                        'created_at': report.created_at.isoformat() if report.created_at else None
-                    } for report in recent_reports
-                ]
-            }
+            'recent_activity': admin_recent_activity(limit=5)
         }
         
         return jsonify(stats), 200
@@ -1,75 +1,40 @@
-from flask import Blueprint, request, jsonify, current_app, redirect
+from flask import Blueprint, request, jsonify, current_app, redirect, g
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime, timedelta
 import jwt
 import os
 import random
 import string
-import smtplib
-from email.mime.text import MIMEText
 import re
 import requests
+from sqlalchemy.orm import undefer_group
 try:
-    from ..models import db, User
+    from ..models import db, User, LearningProgress, CommunityReport
     from ..auth import create_tokens, token_required, get_current_user_id, update_user_login
     from ..cache import cache
+    from ..scan_retention import user_scan_history
+    from ..email_outbox import queue_email, maybe_send_outbox
+    from ..id_tokens import verify_id_token, IdTokenError
+    from ..login_throttle import check_login, login_failed, login_succeeded
+    from ..passwords import PasswordHashUnavailable
+    from ..token_store import rotate, start_legacy_family, revoke_family, revoke_user, RefreshTokenError
+    from ..domain_index import is_disposable_domain
 except ImportError:
-    from models import db, User
+    from models import db, User, LearningProgress, CommunityReport
     from auth import create_tokens, token_required, get_current_user_id, update_user_login
     from cache import cache
+    from scan_retention import user_scan_history
+    from email_outbox import queue_email, maybe_send_outbox
+    from id_tokens import verify_id_token, IdTokenError
+    from login_throttle import check_login, login_failed, login_succeeded
+    from passwords import PasswordHashUnavailable
+    from token_store import rotate, start_legacy_family, revoke_family, revoke_user, RefreshTokenError
+    from domain_index import is_disposable_domain
 
 auth_bp = Blueprint('auth', __name__)
 def _generate_code(length=6):
     return ''.join(random.choices(string.digits, k=length))
 
-def _send_email(subject, to_email, html_body):
-    provider = current_app.config.get('EMAIL_PROVIDER', 'SMTP')
-    sender = current_app.config.get('EMAIL_SENDER') or 'no-reply@remalehprotect.remaleh.com.au'
-    if provider == 'SMTP':
-        host = current_app.config.get('SMTP_HOST')
-        username = current_app.config.get('SMTP_USERNAME')
-        password = current_app.config.get('SMTP_PASSWORD')
-        port = current_app.config.get('SMTP_PORT', 587)
-        use_tls = current_app.config.get('SMTP_USE_TLS', True)
-        if not host or not username or not password:
-            return False, 'SMTP not configured'
-        msg = MIMEText(html_body, 'html')
-        msg['Subject'] = subject
-        msg['From'] = sender
-        msg['To'] = to_email
-        try:
-            with smtplib.SMTP(host, port, timeout=10) as server:
-                if use_tls:
-                    server.starttls()
-                server.login(username, password)
-                server.sendmail(sender, [to_email], msg.as_string())
-            return True, None
-        except Exception as e:
-            return False, str(e)
-    # Future: add RESEND/SENDGRID if configured
-    return False, 'Email provider not configured'
-
-
-_DISPOSABLE_DOMAINS_DEFAULT = {
-    'mailinator.com', '10minutemail.com', 'tempmail.com', 'guerrillamail.com',
-    'trashmail.com', 'yopmail.com', 'emailtemp.org', 'maildrop.cc',
-    'dispostable.com', 'fakeinbox.com', 'temp-mail.org', 'moakt.com'
-}
-
-def _is_disposable_domain(domain: str) -> bool:
-    if not domain:
-        return False
-    domain = domain.lower()
-    # Allow runtime extension via env var (comma-separated)
-    extra = current_app.config.get('DISPOSABLE_EMAIL_DOMAINS') or os.getenv('DISPOSABLE_EMAIL_DOMAINS')
-    disposable = set(_DISPOSABLE_DOMAINS_DEFAULT)
-    if extra:
-        for d in str(extra).split(','):
-            d = d.strip().lower()
-            if d:
-                disposable.add(d)
-    return domain in disposable
-
 def _validate_email_input(email: str):
     if not email:
         return 'Email is required'
@@ -84,7 +49,8 @@ def _validate_email_input(email: str):
         domain = email.split('@', 1)[1]
     except Exception:
         return 'Please enter a valid email address so we can send you a verification code.'
-    if _is_disposable_domain(domain):
+    # Also matches subdomains; extended by DISPOSABLE_EMAIL_DOMAINS and DISPOSABLE_DOMAINS_FILE
+    if is_disposable_domain(domain):
         return 'This email domain is not accepted. Please use your personal or work email address.'
     return None
 
@@ -123,7 +89,6 @@ def register():
             user.email_verification_code = code
             user.email_verification_expires_at = datetime.utcnow() + timedelta(minutes=15)
         db.session.add(user)
-        db.session.commit()
         if require_verification:
             subject = 'Verify your Remaleh Protect account'
             html = f"""
@@ -132,9 +97,10 @@ def register():
                 <h2 style='letter-spacing:4px'>{code}</h2>
                 <p>This code expires in 15 minutes.</p>
             """
-            ok, err = _send_email(subject, user.email, html)
-            if not ok:
-                return jsonify({'error': 'We could not send the verification email. Please check your address or try again later.'}), 502
+            queue_email(subject, user.email, html)
+        db.session.commit()
+        if require_verification:
+            maybe_send_outbox()
         
         # If verification required, do not issue tokens yet
         if require_verification:
@@ -165,9 +131,18 @@ def login():
         if not data or not data.get('email') or not data.get('password'):
             return jsonify({'error': 'Email and password are required'}), 400
         
+        # Refuse attempts while the account or this IP is locked out after repeated failures
+        retry_after = check_login(data['email'], request.remote_addr)
+        if retry_after:
+            return jsonify({
+                'error': 'Too many login attempts. Please try again later.',
+                'retry_after': retry_after
+            }), 429, {'Retry-After': str(retry_after)}
+        
         user = User.query.filter_by(email=data['email']).first()
         
         if not user:
+            login_failed(data['email'], request.remote_addr)
             return jsonify({'error': 'Invalid email or password'}), 401
         
         if not user.is_active:
@@ -176,7 +151,9 @@ def login():
         # Test password verification
         password_valid = user.check_password(data['password'])
         if not password_valid:
+            login_failed(data['email'], request.remote_addr)
             return jsonify({'error': 'Invalid email or password'}), 401
+        login_succeeded(data['email'])
         
         # Enforce email verification if required
         if current_app.config.get('REQUIRE_EMAIL_VERIFICATION', False) and not user.email_verified:
@@ -193,6 +170,10 @@ def login():
             'access_token': access_token,
             'refresh_token': refresh_token
         }), 200
+    except PasswordHashUnavailable as e:
+        db.session.rollback()
+        retry_after = current_app.config.get('PASSWORD_HASH_RETRY_AFTER_SECONDS', 1)
+        return jsonify({'error': str(e), 'retry_after': retry_after}), 503, {'Retry-After': str(retry_after)}
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 @auth_bp.route('/verify-email', methods=['POST'])
@@ -273,14 +254,15 @@ def resend_verification():
         code = _generate_code(6)
         user.email_verification_code = code
         user.email_verification_expires_at = datetime.utcnow() + timedelta(minutes=15)
-        db.session.commit()
         subject = 'Verify your Remaleh Protect account'
         html = f"""
             <p>Your verification code is:</p>
             <h2 style='letter-spacing:4px'>{code}</h2>
             <p>This code expires in 15 minutes.</p>
         """
-        _send_email(subject, user.email, html)
+        queue_email(subject, user.email, html)
+        db.session.commit()
+        maybe_send_outbox()
         return jsonify({'message': 'Verification code resent'}), 200
     except Exception as e:
         db.session.rollback()
@@ -325,7 +307,6 @@ def request_password_reset():
         alphabet = string.ascii_letters + string.digits
         temp_password = ''.join(random.choices(alphabet, k=12))
         user.set_password(temp_password)
-        db.session.commit()
 
         # Email the temporary password
         subject = 'Your Remaleh Protect temporary password'
@@ -335,10 +316,9 @@ def request_password_reset():
             <h2 style='letter-spacing:2px'>{temp_password}</h2>
             <p>Please sign in and change your password immediately from Profile Settings.</p>
         """
-        ok, err_send = _send_email(subject, user.email, html)
-        if not ok:
-            # Still avoid enumeration; generic success response
-            return jsonify({'message': 'If this email exists, a temporary password has been sent.'}), 200
+        queue_email(subject, user.email, html)
+        db.session.commit()
+        maybe_send_outbox()
 
         return jsonify({'message': 'If this email exists, a temporary password has been sent.'}), 200
     except Exception as e:
@@ -508,14 +488,7 @@ def oauth_google_idtoken():
         if not id_token:
             return jsonify({'error': 'id_token is required'}), 400
 
-        # Use Google's tokeninfo endpoint to validate and decode the token
-        resp = requests.get('https://oauth2.googleapis.com/tokeninfo', params={'id_token': id_token}, timeout=10)
-        if resp.status_code != 200:
-            return jsonify({'error': 'Invalid Google ID token'}), 401
-        info = resp.json()
-
         # Audience check: allow any configured Google client IDs (web, iOS, Android)
-        aud = info.get('aud')
         allowed_auds = set()
         # Primary web client id
         if current_app.config.get('GOOGLE_CLIENT_ID'):
@@ -530,8 +503,12 @@ def oauth_google_idtoken():
             allowed_auds.add(current_app.config.get('GOOGLE_ANDROID_CLIENT_ID'))
         if os.getenv('GOOGLE_ANDROID_CLIENT_ID'):
             allowed_auds.add(os.getenv('GOOGLE_ANDROID_CLIENT_ID'))
-        if allowed_auds and aud not in allowed_auds:
-            return jsonify({'error': 'ID token audience mismatch'}), 401
+
+        # Verify signature, issuer, expiry and audience against Google's cached keys
+        try:
+            info = verify_id_token('google', id_token, allowed_auds)
+        except IdTokenError as e:
+            return jsonify({'error': str(e)}), 401
 
         email = (info.get('email') or '').lower()
         if not email:
@@ -647,6 +624,19 @@ def _create_apple_client_secret():
     except Exception:
         return None
 
+def _apple_audiences():
+    """Accepted `aud` values for Apple ID tokens: Services ID (web) and Bundle ID (native app)"""
+    allowed_auds = set()
+    if current_app.config.get('APPLE_CLIENT_ID'):
+        allowed_auds.add(current_app.config.get('APPLE_CLIENT_ID'))
+    # Optional explicit bundle id via env/config
+    bundle_id = current_app.config.get('APPLE_BUNDLE_ID') or os.getenv('APPLE_BUNDLE_ID')
+    if bundle_id:
+        allowed_auds.add(bundle_id)
+    # Fallback to known bundle id if configured elsewhere
+    allowed_auds.add('com.remaleh.protect')
+    return allowed_auds
+
 @auth_bp.route('/oauth/apple/start', methods=['GET'])
 def oauth_apple_start():
     try:
@@ -701,8 +691,11 @@ def oauth_apple_callback():
             return redirect(f"{frontend}/?oauth=apple&error=token_exchange_failed", code=302)
         tokens = token_resp.json()
         id_token = tokens.get('id_token')
-        # Decode id_token to extract email and sub; skip signature verification for simplicity here
-        profile = jwt.decode(id_token, options={"verify_signature": False, "verify_aud": False}) if id_token else {}
+        try:
+            profile = verify_id_token('apple', id_token, _apple_audiences()) if id_token else {}
+        except IdTokenError:
+            frontend = current_app.config.get('FRONTEND_URL', 'http://localhost:5173')
+            return redirect(f"{frontend}/?oauth=apple&error=invalid_id_token", code=302)
         email = (profile.get('email') or '').lower()
         sub = profile.get('sub')
         if not email and sub:
@@ -755,7 +748,10 @@ def oauth_apple_exchange():
             return jsonify({'error': 'Token exchange failed'}), 400
         tokens = token_resp.json()
         id_token = tokens.get('id_token')
-        profile = jwt.decode(id_token, options={"verify_signature": False, "verify_aud": False}) if id_token else {}
+        try:
+            profile = verify_id_token('apple', id_token, _apple_audiences()) if id_token else {}
+        except IdTokenError as e:
+            return jsonify({'error': str(e)}), 400
         email = (profile.get('email') or '').lower()
         sub = profile.get('sub')
         if not email and sub:
@@ -781,38 +777,17 @@ def oauth_apple_exchange():
 
 @auth_bp.route('/oauth/apple/idtoken', methods=['POST'])
 def oauth_apple_idtoken():
-    """Verify an Apple identity token from the client and issue app tokens.
-
-    Note: For simplicity we decode without signature verification here. For production-grade
-    verification, fetch and cache Apple's JWKs and verify the signature and nonce.
-    """
+    """Verify an Apple identity token from the client and issue app tokens."""
     try:
         data = request.get_json() or {}
         id_token = data.get('id_token')
         if not id_token:
             return jsonify({'error': 'id_token is required'}), 400
 
-        # Decode without signature verification; validate basic claims
-        profile = jwt.decode(id_token, options={"verify_signature": False, "verify_aud": False})
-        if not profile:
-            return jsonify({'error': 'Invalid Apple ID token'}), 401
-
-        if profile.get('iss') not in ('https://appleid.apple.com', 'https://appleid.apple.com/'):
-            return jsonify({'error': 'Invalid token issuer'}), 401
-
-        # Accept multiple possible audiences: Services ID (web) and Bundle ID (native app)
-        aud = profile.get('aud')
-        allowed_auds = set()
-        if current_app.config.get('APPLE_CLIENT_ID'):
-            allowed_auds.add(current_app.config.get('APPLE_CLIENT_ID'))
-        # Optional explicit bundle id via env/config
-        bundle_id = current_app.config.get('APPLE_BUNDLE_ID') or os.getenv('APPLE_BUNDLE_ID')
-        if bundle_id:
-            allowed_auds.add(bundle_id)
-        # Fallback to known bundle id if configured elsewhere
-        allowed_auds.add('com.remaleh.protect')
-        if allowed_auds and aud not in allowed_auds:
-            return jsonify({'error': 'ID token audience mismatch', 'aud': aud, 'allowed': list(allowed_auds)}), 401
+        try:
+            profile = verify_id_token('apple', id_token, _apple_audiences())
+        except IdTokenError as e:
+            return jsonify({'error': str(e)}), 401
 
         email = (profile.get('email') or '').lower()
         sub = profile.get('sub')
@@ -894,6 +869,8 @@ def change_password(current_user):
             return jsonify({'error': 'Current password is incorrect'}), 401
         
         current_user.set_password(data['new_password'])
+        # Sign out other devices; this one keeps its tokens
+        revoke_user(current_user.id, 'password_change', keep=g.token_payload.get('fid'))
         db.session.commit()
         
         return jsonify({'message': 'Password changed successfully'}), 200
@@ -932,9 +909,16 @@ def refresh_token():
             if not user or not user.is_active:
                 return jsonify({'error': 'User not found or inactive'}), 401
             
-            # Create new tokens
-            from ..auth import create_tokens
-            new_access_token, new_refresh_token = create_tokens(user.id)
+            # Rotate: this refresh token is spent, presenting it again revokes the family.
+            # Tokens issued before families existed carry no fid and start one, once.
+            try:
+                if payload.get('fid'):
+                    family = (payload['fid'], rotate(payload['fid'], payload.get('jti')))
+                else:
+                    family = start_legacy_family(user.id, data['refresh_token'])
+            except RefreshTokenError as e:
+                return jsonify({'error': str(e)}), 401
+            new_access_token, new_refresh_token = create_tokens(user.id, family)
             
             return jsonify({
                 'message': 'Token refreshed successfully',
@@ -953,13 +937,18 @@ def refresh_token():
 @auth_bp.route('/logout', methods=['POST'])
 @token_required
 def logout(current_user):
-    """User logout endpoint"""
+    """User logout endpoint; `{"all": true}` signs out every device"""
     try:
-        # In a real implementation, you might want to blacklist the token
-        # For now, we'll just return a success message
+        data = request.get_json(silent=True) or {}
+        if data.get('all'):
+            revoke_user(current_user.id, 'logout')
+        elif g.token_payload.get('fid'):
+            revoke_family(g.token_payload['fid'], 'logout')
+        db.session.commit()
         return jsonify({'message': 'Logout successful'}), 200
         
     except Exception as e:
+        db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
 @auth_bp.route('/profile/delete-account', methods=['POST'])
@@ -979,6 +968,7 @@ def delete_own_account(current_user):
         current_user.account_status = 'DELETED'
         current_user.is_active = False
         current_user.email = f"deleted_{current_user.id}_{current_user.email}"
+        revoke_user(current_user.id, 'account_deleted')
         
         db.session.commit()
         
@@ -1021,11 +1011,7 @@ def get_user_activity(current_user):
     """Get user's recent activity"""
     try:
         # Get recent scans
-        recent_scans = UserScan.query.filter_by(
-            user_id=current_user.id
-        ).order_by(
-            UserScan.scanned_at.desc()
-        ).limit(10).all()
+        recent_scans = user_scan_history(current_user.id, limit=10)
         
         # Get learning progress
         learning_progress = LearningProgress.query.filter_by(
@@ -1035,7 +1021,7 @@ def get_user_activity(current_user):
         ).limit(10).all()
         
         # Get community reports
-        community_reports = CommunityReport.query.filter_by(
+        community_reports = CommunityReport.query.options(undefer_group('report_detail')).filter_by(
             user_id=current_user.id
         ).order_by(
             CommunityReport.created_at.desc()
@@ -1,8 +1,20 @@
-from flask import Blueprint, request, jsonify, make_response
+from flask import Blueprint, Response, request, jsonify, make_response, stream_with_context
+import hashlib
+import json
 import os
+import re
 from openai import OpenAI
 import logging
 
+try:
+    from ..chat_cache import get_answer, cached_answer, remember_answer, stats as answer_cache_stats
+    from ..monitoring import record_chat_stream
+    from ..intent_router import IntentRouter
+except ImportError:
+    from chat_cache import get_answer, cached_answer, remember_answer, stats as answer_cache_stats
+    from monitoring import record_chat_stream
+    from intent_router import IntentRouter
+
 # Set up minimal logging for production
 logging.basicConfig(level=logging.WARNING)
 logger = logging.getLogger(__name__)
@@ -159,94 +171,121 @@ Thank you for reaching out - we're here to help keep you safe online! 🛡️"""
     }
 }
 
-def get_rule_based_response(message):
-    """Check if message matches rule-based knowledge"""
-    message_lower = message.lower()
-    
-    # Check for Remaleh Guardian escalation requests first (highest priority)
-    if any(keyword in message_lower for keyword in ['connect me with a remaleh guardian', 'connect me with remaleh guardian', 'remaleh guardian', 'human help', 'speak to someone', 'talk to someone', 'human assistance']):
-        return {
-            'response': "**Connecting you to a Remaleh Guardian...** 🔗\n\nI'm escalating your request to connect you with a Remaleh Guardian for direct human assistance. A Guardian will be in touch with you shortly to provide personalized cybersecurity guidance and support.\n\n**What to expect:**\n• A Remaleh Guardian will contact you within 24 hours\n• They'll review your specific situation and provide tailored advice\n• You'll receive ongoing support for your cybersecurity needs\n\n**In the meantime:** If you have an urgent security concern, please ensure you're safe and don't share any sensitive information. The Guardian will help you address any immediate threats when they connect.\n\nThank you for reaching out - we're here to help keep you safe online! 🛡️",
-            'source': 'expert_knowledge',
-            'category': 'guardian_escalation'
-        }
-    
-    # Check for Remaleh services questions (second priority)
-    if any(keyword in message_lower for keyword in ['what services', 'services do', 'remaleh offer', 'remaleh services', 'what does remaleh do', 'remaleh help']):
-        return {
-            'response': "Remaleh offers cybersecurity services including security assessments, training, and consulting. We help businesses and individuals protect against cyber threats and improve their digital security posture. For specific service details, please contact our team directly.",
-            'source': 'expert_knowledge',
-            'category': 'remaleh_services'
-        }
-    
-    # Check for scam reporting questions (second priority)
-    if any(keyword in message_lower for keyword in ['report scam', 'report fraud', 'report cybercrime', 'where to report', 'who to report']):
-        return {
-            'response': "I'd be happy to help you with scam reporting options! To give you the most accurate information, could you please let me know which country you're located in? This will help me provide specific reporting channels and resources for your area.",
-            'source': 'expert_knowledge',
-            'category': 'scam_reporting'
-        }
-    
-    for category, data in CYBERSECURITY_KNOWLEDGE.items():
-        for keyword in data['keywords']:
-            if keyword in message_lower:
-                return {
-                    'response': data['response'],
-                    'source': 'expert_knowledge',
-                    'category': category
-                }
-    
-    return None
+# Rules checked before the knowledge base, in order: Remaleh Guardian requests first, then
+# Remaleh services and scam reporting questions
+PRIORITY_RULES = [
+    {
+        'category': 'guardian_escalation',
+        'keywords': ['connect me with a remaleh guardian', 'connect me with remaleh guardian', 'remaleh guardian', 'human help', 'speak to someone', 'talk to someone', 'human assistance'],
+        'response': "**Connecting you to a Remaleh Guardian...** 🔗\n\nI'm escalating your request to connect you with a Remaleh Guardian for direct human assistance. A Guardian will be in touch with you shortly to provide personalized cybersecurity guidance and support.\n\n**What to expect:**\n• A Remaleh Guardian will contact you within 24 hours\n• They'll review your specific situation and provide tailored advice\n• You'll receive ongoing support for your cybersecurity needs\n\n**In the meantime:** If you have an urgent security concern, please ensure you're safe and don't share any sensitive information. The Guardian will help you address any immediate threats when they connect.\n\nThank you for reaching out - we're here to help keep you safe online! 🛡️"
+    },
+    {
+        'category': 'remaleh_services',
+        'keywords': ['what services', 'services do', 'remaleh offer', 'remaleh services', 'what does remaleh do', 'remaleh help'],
+        'response': "Remaleh offers cybersecurity services including security assessments, training, and consulting. We help businesses and individuals protect against cyber threats and improve their digital security posture. For specific service details, please contact our team directly."
+    },
+    {
+        'category': 'scam_reporting',
+        'keywords': ['report scam', 'report fraud', 'report cybercrime', 'where to report', 'who to report'],
+        'response': "I'd be happy to help you with scam reporting options! To give you the most accurate information, could you please let me know which country you're located in? This will help me provide specific reporting channels and resources for your area."
+    },
+]
 
-def should_escalate_to_guardian(message):
-    """Check if message should be escalated to Guardian with enhanced detection"""
+# Rule-based answers in priority order; a message gets the first one with a matching keyword
+RULES = PRIORITY_RULES + [
+    {'category': category, 'keywords': data['keywords'], 'response': data['response']}
+    for category, data in CYBERSECURITY_KNOWLEDGE.items()
+]
+
+# Guardian escalation keywords by level, highest first
+ESCALATION_KEYWORDS = {
     # High priority escalation keywords (immediate Guardian contact)
-    high_priority_keywords = [
+    'high': [
         'hacked', 'hack', 'stolen', 'breach', 'compromised', 'attacked',
         'help me', 'urgent', 'emergency', 'crisis', 'threat', 'malicious',
         'scammed', 'fraud', 'identity theft', 'ransomware', 'blackmail',
         'suspicious activity', 'unauthorized access', 'data stolen',
         'account compromised', 'credit card fraud', 'bank account',
         'what do i do', 'need help', 'been hacked', 'lost money'
-    ]
-    
+    ],
     # Medium priority keywords (suggest Guardian contact)
-    medium_priority_keywords = [
+    'medium': [
         'worried', 'concerned', 'suspicious', 'strange', 'unusual',
         'not sure', 'confused', 'advice', 'guidance', 'recommendation'
-    ]
-    
-    message_lower = message.lower()
-    
-    # Check for high priority escalation
-    for keyword in high_priority_keywords:
-        if keyword in message_lower:
-            return 'high'
-    
-    # Check for medium priority escalation
-    for keyword in medium_priority_keywords:
-        if keyword in message_lower:
-            return 'medium'
-    
-    return None
+    ],
+}
+
+# A message with one of these may be telling us the user's country...
+COUNTRY_MENTION_KEYWORDS = ['australia', 'united states', 'uk', 'canada', 'us', 'united kingdom', 'i am in', 'i live in', 'located in']
+# ...which is the first of these with a matching keyword
+COUNTRY_KEYWORDS = {
+    'australia': ['australia', 'australian'],
+    'united states': ['united states', 'us', 'usa', 'american'],
+    'united kingdom': ['united kingdom', 'uk', 'british', 'england'],
+    'canada': ['canada', 'canadian'],
+}
+# Country names that make asking for the country unnecessary
+COUNTRY_NAME_KEYWORDS = ['australia', 'united states', 'uk', 'canada', 'us', 'united kingdom']
+
+COUNTRY_CONTEXT_KEYWORDS = [
+    'in my country', 'in my area', 'in my region', 'in my state',
+    'in australia', 'in the us', 'in the uk', 'in canada',
+    'local police', 'local authorities', 'national', 'government',
+    'report to', 'report scam', 'report fraud', 'report cybercrime',
+    'consumer protection', 'cybercrime unit', 'police department'
+]
+
+def build_intent_router(rules):
+    """IntentRouter for `rules` and the escalation and country keywords above"""
+    return IntentRouter(
+        [('rule', index, rule['keywords']) for index, rule in enumerate(rules)]
+        + [('escalation', level, keywords) for level, keywords in ESCALATION_KEYWORDS.items()]
+        + [('country', country, keywords) for country, keywords in COUNTRY_KEYWORDS.items()]
+        + [('country_mention', True, COUNTRY_MENTION_KEYWORDS),
+           ('country_name', True, COUNTRY_NAME_KEYWORDS),
+           ('country_context', True, COUNTRY_CONTEXT_KEYWORDS)]
+    )
+
+# Every keyword above, compiled once at import
+INTENT_ROUTER = build_intent_router(RULES)
+
+def route_message(message):
+    """Intents of a message, from one scan of it.
+
+    Returns a dict: ``escalation_level`` ('high', 'medium' or None), ``country`` the
+    user says they are in (or None), ``needs_country`` if the question depends on a
+    country that wasn't named, and ``rules``, the indexes into RULES of every matching
+    rule, best first.
+    """
+    intents = INTENT_ROUTER.match(message)
+    return {
+        'escalation_level': intents.get('escalation', [None])[0],
+        'country': intents['country'][0] if 'country_mention' in intents and 'country' in intents else None,
+        'needs_country': 'country_context' in intents and 'country_name' not in intents,
+        'rules': intents.get('rule', []),
+    }
+
+def _rule_response(intent):
+    if not intent['rules']:
+        return None
+    rule = RULES[intent['rules'][0]]
+    return {
+        'response': rule['response'],
+        'source': 'expert_knowledge',
+        'category': rule['category']
+    }
+
+def get_rule_based_response(message):
+    """Check if message matches rule-based knowledge"""
+    return _rule_response(route_message(message))
+
+def should_escalate_to_guardian(message):
+    """Check if message should be escalated to Guardian with enhanced detection"""
+    return route_message(message)['escalation_level']
 
 def needs_country_context(message):
     """Check if message needs country-specific context"""
-    country_context_keywords = [
-        'in my country', 'in my area', 'in my region', 'in my state',
-        'in australia', 'in the us', 'in the uk', 'in canada',
-        'local police', 'local authorities', 'national', 'government',
-        'report to', 'report scam', 'report fraud', 'report cybercrime',
-        'consumer protection', 'cybercrime unit', 'police department'
-    ]
-    
-    message_lower = message.lower()
-    
-    for keyword in country_context_keywords:
-        if keyword in message_lower:
-            return True
-    
-    return False
+    return 'country_context' in INTENT_ROUTER.match(message)
 
 def get_country_specific_response(country):
     """Get country-specific scam reporting information"""
@@ -338,96 +377,224 @@ Our cybersecurity specialists can provide detailed analysis and customized secur
 
     return base_response + guardian_message
 
-def get_openai_response(message):
-    """Get response from OpenAI API"""
+GPT4_SYSTEM_PROMPT = "You are a friendly cybersecurity expert assistant for Remaleh. Provide helpful, accurate information about cybersecurity topics. Keep responses conversational and easy to understand. Focus on the user's country of residence context when relevant. CRITICAL RULES: 1) NEVER make up fake organizations, agencies, or services - especially do NOT mention 'Remaleh Cybersecurity Agency (RCA)', 'Remaleh Financial Intelligence Unit (RFIU)', 'Remaleh Police Cybercrime Division', or any other fake Remaleh organizations as they do not exist. 2) Only mention Remaleh services that actually exist. 3) If you're unsure about Remaleh's specific services, focus on providing accurate cybersecurity advice. 4) Always verify information before sharing it. 5) For scam reporting, provide legitimate government and law enforcement options for the user's country. 6) NEVER mention Remaleh in the context of scam reporting, police, or government agencies."
+
+FALLBACK_SYSTEM_PROMPT = "You are a cybersecurity expert assistant. CRITICAL: You must NEVER mention any organizations, agencies, or services unless you are 100% certain they exist. For scam reporting questions, ONLY provide information about legitimate government agencies, police departments, and consumer protection organizations. NEVER mention Remaleh in the context of scam reporting, police, or government agencies. If asked about scam reporting, ask the user for their country and provide legitimate options for that country."
+
+# USD per 1,000 prompt and completion tokens, for the cost-saved estimate of cached answers
+MODEL_PRICES = {
+    'gpt-4': (0.03, 0.06),
+    'gpt-3.5-turbo': (0.0005, 0.0015),
+}
+
+# Part of the answer cache key: cached answers are not reused once the prompts change
+ANSWER_VERSION = hashlib.sha256(f"{GPT4_SYSTEM_PROMPT}\n{FALLBACK_SYSTEM_PROMPT}".encode()).hexdigest()[:12]
+
+SAFE_REPORTING_REPLY = "I apologize, but I need to provide you with accurate information. For scam reporting, please let me know which country you're located in so I can give you legitimate reporting options for your area."
+
+def _answer_cost(model, usage):
+    """Tokens used and estimated USD cost of a completion"""
+    if usage is None:
+        return 0, 0.0
+    prompt_price, completion_price = MODEL_PRICES.get(model, (0.0, 0.0))
+    cost = (usage.prompt_tokens * prompt_price + usage.completion_tokens * completion_price) / 1000
+    return usage.total_tokens, cost
+
+# Safety check: fake organization names the model must never present as real
+FAKE_ORGANIZATIONS = [
+    'remaleh cybersecurity agency', 'rca', 'remaleh cyber agency',
+    'remaleh security agency', 'remaleh fraud agency',
+    'remaleh financial intelligence unit', 'rfiu', 'remaleh police',
+    'remaleh cybercrime division', 'remaleh fraud unit',
+    'remaleh security division', 'remaleh cyber division'
+]
+# Any pattern of "Remaleh [Something] [Unit/Division/Agency]"
+REMALEH_ORGANIZATION_PATTERN = re.compile(r'remaleh\s+\w+\s+(?:unit|division|agency|department|bureau|office|center|centre)')
+SCAM_REPORTING_KEYWORDS = ['report', 'scam', 'fraud', 'cybercrime', 'police', 'investigate', 'financial crime']
+
+def answer_safety_issue(response_lower):
+    """Why a (lower-cased) AI answer must not be shown, or None if it passes the safety checks"""
+    if REMALEH_ORGANIZATION_PATTERN.search(response_lower):
+        return "AI response contained fake Remaleh organization pattern"
+    
+    # Check for Remaleh mentioned in scam reporting context
+    if any(keyword in response_lower for keyword in SCAM_REPORTING_KEYWORDS) and 'remaleh' in response_lower:
+        return "AI response mentioned Remaleh in scam reporting context"
+    
+    # Check for fake organizations
+    for fake_org in FAKE_ORGANIZATIONS:
+        if fake_org in response_lower:
+            return f"AI response contained fake organization: {fake_org}"
+    
+    return None
+
+def _create_completion(openai_client, message, **kwargs):
+    """(model, completion) from GPT-4, falling back to GPT-3.5-turbo if the call fails"""
     try:
-        # Get OpenAI client
-        openai_client = get_openai_client()
-        
-        try:
-            # Try GPT-4 first for better accuracy
-            response = openai_client.chat.completions.create(
-                model="gpt-4",
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are a friendly cybersecurity expert assistant for Remaleh. Provide helpful, accurate information about cybersecurity topics. Keep responses conversational and easy to understand. Focus on the user's country of residence context when relevant. CRITICAL RULES: 1) NEVER make up fake organizations, agencies, or services - especially do NOT mention 'Remaleh Cybersecurity Agency (RCA)', 'Remaleh Financial Intelligence Unit (RFIU)', 'Remaleh Police Cybercrime Division', or any other fake Remaleh organizations as they do not exist. 2) Only mention Remaleh services that actually exist. 3) If you're unsure about Remaleh's specific services, focus on providing accurate cybersecurity advice. 4) Always verify information before sharing it. 5) For scam reporting, provide legitimate government and law enforcement options for the user's country. 6) NEVER mention Remaleh in the context of scam reporting, police, or government agencies."
-                    },
-                    {
-                        "role": "user",
-                        "content": message
-                    }
-                ],
-                max_tokens=300,
-                temperature=0.7
-            )
-        except Exception as gpt4_error:
-            logger.warning(f"GPT-4 not available, falling back to GPT-3.5-turbo: {str(gpt4_error)}")
-            # Fallback to GPT-3.5-turbo with even stricter instructions
-            response = openai_client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are a cybersecurity expert assistant. CRITICAL: You must NEVER mention any organizations, agencies, or services unless you are 100% certain they exist. For scam reporting questions, ONLY provide information about legitimate government agencies, police departments, and consumer protection organizations. NEVER mention Remaleh in the context of scam reporting, police, or government agencies. If asked about scam reporting, ask the user for their country and provide legitimate options for that country."
-                    },
-                    {
-                        "role": "user",
-                        "content": message
-                    }
-                ],
-                max_tokens=300,
-                temperature=0.3  # Lower temperature for more focused responses
-            )
+        # Try GPT-4 first for better accuracy
+        model = "gpt-4"
+        return model, openai_client.chat.completions.create(
+            model=model,
+            messages=[
+                {
+                    "role": "system",
+                    "content": GPT4_SYSTEM_PROMPT
+                },
+                {
+                    "role": "user",
+                    "content": message
+                }
+            ],
+            max_tokens=300,
+            temperature=0.7,
+            **kwargs
+        )
+    except Exception as gpt4_error:
+        logger.warning(f"GPT-4 not available, falling back to GPT-3.5-turbo: {str(gpt4_error)}")
+        # Fallback to GPT-3.5-turbo with even stricter instructions
+        model = "gpt-3.5-turbo"
+        return model, openai_client.chat.completions.create(
+            model=model,
+            messages=[
+                {
+                    "role": "system",
+                    "content": FALLBACK_SYSTEM_PROMPT
+                },
+                {
+                    "role": "user",
+                    "content": message
+                }
+            ],
+            max_tokens=300,
+            temperature=0.3,  # Lower temperature for more focused responses
+            **kwargs
+        )
+
+def ask_openai(message):
+    """Ask the model; returns {'text', 'tokens', 'cost', 'cacheable'} or None on error"""
+    try:
+        model, response = _create_completion(get_openai_client(), message)
         
         response_text = response.choices[0].message.content.strip()
+        tokens, cost = _answer_cost(model, getattr(response, 'usage', None))
         
-        # Create response_lower first for safety checks
-        response_lower = response_text.lower()
-        
-        # Safety check: Filter out fake organization names
-        fake_organizations = [
-            'remaleh cybersecurity agency', 'rca', 'remaleh cyber agency',
-            'remaleh security agency', 'remaleh fraud agency',
-            'remaleh financial intelligence unit', 'rfiu', 'remaleh police',
-            'remaleh cybercrime division', 'remaleh fraud unit',
-            'remaleh security division', 'remaleh cyber division'
-        ]
-        
-        # Check for any pattern of "Remaleh [Something] [Unit/Division/Agency]"
-        import re
-        remaleh_pattern = r'remaleh\s+\w+\s+(?:unit|division|agency|department|bureau|office|center|centre)'
-        if re.search(remaleh_pattern, response_lower):
-            logger.warning(f"AI response contained fake Remaleh organization pattern")
-            return "I apologize, but I need to provide you with accurate information. For scam reporting, please let me know which country you're located in so I can give you legitimate reporting options for your area."
+        issue = answer_safety_issue(response_text.lower())
+        if issue:
+            logger.warning(issue)
+            # Not cached, so a later ask may get a usable answer
+            return {'text': SAFE_REPORTING_REPLY, 'tokens': tokens, 'cost': cost, 'cacheable': False}
         
-        # Check for Remaleh mentioned in scam reporting context
-        scam_reporting_keywords = ['report', 'scam', 'fraud', 'cybercrime', 'police', 'investigate', 'financial crime']
-        if any(keyword in response_lower for keyword in scam_reporting_keywords) and 'remaleh' in response_lower:
-            logger.warning(f"AI response mentioned Remaleh in scam reporting context")
-            return "I apologize, but I need to provide you with accurate information. For scam reporting, please let me know which country you're located in so I can give you legitimate reporting options for your area."
-        
-        # Check for fake organizations
-        for fake_org in fake_organizations:
-            if fake_org in response_lower:
-                logger.warning(f"AI response contained fake organization: {fake_org}")
-                return "I apologize, but I need to provide you with accurate information. For scam reporting, please let me know which country you're located in so I can give you legitimate reporting options for your area."
-        
-        return response_text
+        return {'text': response_text, 'tokens': tokens, 'cost': cost, 'cacheable': True}
         
     except Exception as e:
         logger.error(f"OpenAI API error: {str(e)}")
         return None
 
+def get_openai_response(message):
+    """Get response from OpenAI API, sharing cached answers to the same (or a similar) question"""
+    return get_answer(message, ask_openai, version=ANSWER_VERSION)
+
+FALLBACK_RESPONSE = "I'm here to help with cybersecurity questions. Could you please rephrase your question or ask about topics like passwords, phishing, malware, or data breaches?"
+
+def _with_cors(response):
+    response.headers.add("Access-Control-Allow-Origin", "*")
+    response.headers.add('Access-Control-Allow-Headers', "*")
+    response.headers.add('Access-Control-Allow-Methods', "*")
+    return response
+
+def _preflight_response():
+    return _with_cors(make_response())
+
+def get_local_reply(intent):
+    """Response body for messages answered without the model (country details, country
+    question, expert knowledge), or None. `intent` is the message's route_message()."""
+    escalation_level = intent['escalation_level']
+    
+    # The user is providing their country
+    if intent['country']:
+        country_response = get_country_specific_response(intent['country'])
+        return {
+            'response': country_response,
+            'source': 'country_specific_knowledge',
+            'success': True,
+            'escalation_level': escalation_level,
+            'guardian_url': 'https://www.remaleh.com.au/contact-us' if escalation_level else None
+        }
+    
+    # Ask for country if the message needs it and doesn't name one
+    if intent['needs_country']:
+        return {
+            'response': "I'd be happy to help you with scam reporting options! To give you the most accurate information, could you please let me know which country you're located in? This will help me provide specific reporting channels and resources for your area.",
+            'source': 'country_context_request',
+            'success': True,
+            'escalation_level': None,
+            'guardian_url': None,
+            'needs_country': True
+        }
+    
+    # Try rule-based response first
+    rule_response = _rule_response(intent)
+    if rule_response:
+        base_response = rule_response['response']
+        
+        # Add Guardian escalation if needed
+        if escalation_level:
+            final_response = get_guardian_response(escalation_level, base_response)
+            source = 'expert_knowledge_with_guardian'
+        else:
+            final_response = base_response
+            source = 'expert_knowledge'
+        
+        return {
+            'response': final_response,
+            'source': source,
+            'success': True,
+            'escalation_level': escalation_level,
+            'guardian_url': 'https://www.remaleh.com.au/contact-us' if escalation_level else None
+        }
+    
+    return None
+
+def get_ai_reply(openai_response, escalation_level):
+    """Response body for an AI answer"""
+    # Add Guardian escalation if needed
+    if escalation_level:
+        final_response = get_guardian_response(escalation_level, openai_response)
+        source = 'ai_analysis_with_guardian'
+    else:
+        final_response = openai_response
+        source = 'ai_analysis'
+    
+    return {
+        'response': final_response,
+        'source': source,
+        'success': True,
+        'escalation_level': escalation_level,
+        'guardian_url': 'https://www.remaleh.com.au/contact-us' if escalation_level else None
+    }
+
+def get_fallback_reply(escalation_level):
+    """Response body when neither the rules nor the model could answer"""
+    # Fallback response with Guardian escalation
+    if escalation_level:
+        final_response = get_guardian_response(escalation_level, FALLBACK_RESPONSE)
+    else:
+        final_response = get_guardian_response('medium', FALLBACK_RESPONSE)  # Always offer Guardian for fallback
+        escalation_level = 'medium'
+    
+    return {
+        'response': final_response,
+        'source': 'fallback_with_guardian',
+        'success': True,
+        'escalation_level': escalation_level,
+        'guardian_url': 'https://www.remaleh.com.au/contact-us'
+    }
+
 @chat_bp.route('/', methods=['POST', 'OPTIONS'])
 def chat_message():
     # Handle preflight requests
     if request.method == 'OPTIONS':
-        response = make_response()
-        response.headers.add("Access-Control-Allow-Origin", "*")
-        response.headers.add('Access-Control-Allow-Headers', "*")
-        response.headers.add('Access-Control-Allow-Methods', "*")
-        return response
+        return _preflight_response()
     
     try:
         data = request.get_json()
@@ -440,135 +607,20 @@ def chat_message():
         
         message = data['message']
         
-        # Check for Guardian escalation first
-        escalation_level = should_escalate_to_guardian(message)
+        # Guardian escalation, country and rule intents, from one scan of the message
+        intent = route_message(message)
+        escalation_level = intent['escalation_level']
         
-        # Check if user is providing their country
-        country_keywords = ['australia', 'united states', 'uk', 'canada', 'us', 'united kingdom', 'i am in', 'i live in', 'located in']
-        if any(keyword in message.lower() for keyword in country_keywords):
-            # Extract country from message
-            detected_country = None
-            if any(country in message.lower() for country in ['australia', 'australian']):
-                detected_country = 'australia'
-            elif any(country in message.lower() for country in ['united states', 'us', 'usa', 'american']):
-                detected_country = 'united states'
-            elif any(country in message.lower() for country in ['united kingdom', 'uk', 'british', 'england']):
-                detected_country = 'united kingdom'
-            elif any(country in message.lower() for country in ['canada', 'canadian']):
-                detected_country = 'canada'
-            
-            if detected_country:
-                country_response = get_country_specific_response(detected_country)
-                response_data = {
-                    'response': country_response,
-                    'source': 'country_specific_knowledge',
-                    'success': True,
-                    'escalation_level': escalation_level,
-                    'guardian_url': 'https://www.remaleh.com.au/contact-us' if escalation_level else None
-                }
-                
-                response = make_response(jsonify(response_data))
-                response.headers.add("Access-Control-Allow-Origin", "*")
-                response.headers.add('Access-Control-Allow-Headers', "*")
-                response.headers.add('Access-Control-Allow-Methods', "*")
-                return response
-        
-        # Check if message needs country context
-        if needs_country_context(message):
-            # Ask for country if not provided
-            if not any(country in message.lower() for country in ['australia', 'united states', 'uk', 'canada', 'us', 'united kingdom']):
-                response_data = {
-                    'response': "I'd be happy to help you with scam reporting options! To give you the most accurate information, could you please let me know which country you're located in? This will help me provide specific reporting channels and resources for your area.",
-                    'source': 'country_context_request',
-                    'success': True,
-                    'escalation_level': None,
-                    'guardian_url': None,
-                    'needs_country': True
-                }
-                
-                response = make_response(jsonify(response_data))
-                response.headers.add("Access-Control-Allow-Origin", "*")
-                response.headers.add('Access-Control-Allow-Headers', "*")
-                response.headers.add('Access-Control-Allow-Methods', "*")
-                return response
-        
-        # Try rule-based response first
-        rule_response = get_rule_based_response(message)
-        if rule_response:
-            base_response = rule_response['response']
-            
-            # Add Guardian escalation if needed
-            if escalation_level:
-                final_response = get_guardian_response(escalation_level, base_response)
-                source = 'expert_knowledge_with_guardian'
+        response_data = get_local_reply(intent)
+        if response_data is None:
+            # Try OpenAI for complex questions
+            openai_response = get_openai_response(message)
+            if openai_response:
+                response_data = get_ai_reply(openai_response, escalation_level)
             else:
-                final_response = base_response
-                source = 'expert_knowledge'
-            
-            response_data = {
-                'response': final_response,
-                'source': source,
-                'success': True,
-                'escalation_level': escalation_level,
-                'guardian_url': 'https://www.remaleh.com.au/contact-us' if escalation_level else None
-            }
-            
-            response = make_response(jsonify(response_data))
-            response.headers.add("Access-Control-Allow-Origin", "*")
-            response.headers.add('Access-Control-Allow-Headers', "*")
-            response.headers.add('Access-Control-Allow-Methods', "*")
-            return response
-        
-        # Try OpenAI for complex questions
-        openai_response = get_openai_response(message)
+                response_data = get_fallback_reply(escalation_level)
         
-        if openai_response:
-            # Add Guardian escalation if needed
-            if escalation_level:
-                final_response = get_guardian_response(escalation_level, openai_response)
-                source = 'ai_analysis_with_guardian'
-            else:
-                final_response = openai_response
-                source = 'ai_analysis'
-            
-            response_data = {
-                'response': final_response,
-                'source': source,
-                'success': True,
-                'escalation_level': escalation_level,
-                'guardian_url': 'https://www.remaleh.com.au/contact-us' if escalation_level else None
-            }
-            
-            response = make_response(jsonify(response_data))
-            response.headers.add("Access-Control-Allow-Origin", "*")
-            response.headers.add('Access-Control-Allow-Headers', "*")
-            response.headers.add('Access-Control-Allow-Methods', "*")
-            return response
-        
-        # Fallback response with Guardian escalation
-        fallback_response = "I'm here to help with cybersecurity questions. Could you please rephrase your question or ask about topics like passwords, phishing, malware, or data breaches?"
-        
-        if escalation_level:
-            final_response = get_guardian_response(escalation_level, fallback_response)
-            source = 'fallback_with_guardian'
-        else:
-            final_response = get_guardian_response('medium', fallback_response)  # Always offer Guardian for fallback
-            source = 'fallback_with_guardian'
-            escalation_level = 'medium'
-        
-        response_data = {
-            'response': final_response,
-            'source': source,
-            'success': True,
-            'escalation_level': escalation_level,
-            'guardian_url': 'https://www.remaleh.com.au/contact-us'
-        }
-        
-        response = make_response(jsonify(response_data))
-        response.headers.add("Access-Control-Allow-Origin", "*")
-        response.headers.add('Access-Control-Allow-Headers', "*")
-        response.headers.add('Access-Control-Allow-Methods', "*")
-        return response
+        return _with_cors(make_response(jsonify(response_data)))
         
     except Exception as e:
         logger.error(f"Chat processing error: {str(e)}")
@@ -578,11 +630,138 @@ def chat_message():
             'guardian_url': 'https://www.remaleh.com.au/contact-us'
         }
         
-        response = make_response(jsonify(error_response), 500)
-        response.headers.add("Access-Control-Allow-Origin", "*")
-        response.headers.add('Access-Control-Allow-Headers', "*")
-        response.headers.add('Access-Control-Allow-Methods', "*")
-        return response
+        return _with_cors(make_response(jsonify(error_response), 500))
+
+# --- streaming ------------------------------------------------------------------------
+
+# Longest blocked name: streamed text this close to its end is held back until the
+# following tokens show it isn't the start of one
+STREAM_HOLDBACK_CHARS = max(len(name) for name in FAKE_ORGANIZATIONS + ['remaleh something department'])
+
+def _sse(data, event=None):
+    """One server-sent event with a JSON payload"""
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+def _held_back_from(text_lower):
+    """Index from which the text could still grow into a blocked name"""
+    start = max(0, len(text_lower) - STREAM_HOLDBACK_CHARS)
+    remaleh_at = text_lower.find('remaleh', start)
+    if remaleh_at != -1:
+        return remaleh_at
+    for i in range(start, len(text_lower)):
+        tail = text_lower[i:]
+        if any(name.startswith(tail) for name in FAKE_ORGANIZATIONS) or 'remaleh'.startswith(tail):
+            return i
+    return len(text_lower)
+
+def _reply_events(response_data):
+    """A complete reply as a stream: the whole text as one delta, then done"""
+    yield _sse({'delta': response_data['response']})
+    yield _sse(response_data, event='done')
+
+def stream_openai_reply(message, escalation_level):
+    """Relay the model's answer as server-sent events while it is generated.
+
+    ``data: {"delta": ...}`` events carry text to append, ``replace`` means the text
+    shown so far must be replaced by its ``response``, and ``done`` carries the complete
+    response body, as returned by the non-streaming endpoint. The safety checks run on
+    the text received so far after every chunk; text that could still become a blocked
+    name is held back, and a check that fails later cuts the stream off and replaces it.
+    """
+    try:
+        openai_client = get_openai_client()
+        try:
+            model, completion = _create_completion(openai_client, message, stream=True,
+                                                   stream_options={'include_usage': True})
+        except TypeError:
+            # openai releases before 1.26 don't take stream_options: stream without the usage chunk
+            model, completion = _create_completion(openai_client, message, stream=True)
+    except Exception as e:
+        logger.error(f"OpenAI API error: {str(e)}")
+        record_chat_stream('failed')
+        yield from _reply_events(get_fallback_reply(escalation_level))
+        return
+    
+    text, sent, usage = '', 0, None
+    try:
+        for chunk in completion:
+            usage = getattr(chunk, 'usage', None) or usage
+            if not chunk.choices:
+                continue
+            text += chunk.choices[0].delta.content or ''
+            issue = answer_safety_issue(text.lower())
+            if issue:
+                logger.warning(f"{issue}; streamed answer cut off")
+                record_chat_stream('replaced')
+                response_data = get_ai_reply(SAFE_REPORTING_REPLY, escalation_level)
+                yield _sse({'response': response_data['response']}, event='replace')
+                yield _sse(response_data, event='done')
+                return
+            upto = max(sent, _held_back_from(text.lower()))
+            if upto > sent:
+                yield _sse({'delta': text[sent:upto]})
+                sent = upto
+    except Exception as e:
+        logger.error(f"OpenAI stream error: {str(e)}")
+        record_chat_stream('failed')
+        response_data = get_fallback_reply(escalation_level)
+        yield _sse({'response': response_data['response']}, event='replace')
+        yield _sse(response_data, event='done')
+        return
+    finally:
+        completion.close()
+    
+    answer = text.strip()
+    if not answer:
+        record_chat_stream('failed')
+        response_data = get_fallback_reply(escalation_level)
+        yield _sse({'response': response_data['response']}, event='replace')
+        yield _sse(response_data, event='done')
+        return
+    
+    tokens, cost = _answer_cost(model, usage)
+    remember_answer(message, {'text': answer, 'tokens': tokens, 'cost': cost}, version=ANSWER_VERSION)
+    record_chat_stream('complete')
+    response_data = get_ai_reply(answer, escalation_level)
+    # The rest of the text, and the Guardian message if one is added
+    rest = response_data['response'][len(answer):] if response_data['response'].startswith(answer) else ''
+    yield _sse({'delta': text[sent:].rstrip() + rest})
+    yield _sse(response_data, event='done')
+
+@chat_bp.route('/stream', methods=['POST', 'OPTIONS'])
+def chat_stream():
+    """Chat over server-sent events: AI answers are relayed while they are generated"""
+    if request.method == 'OPTIONS':
+        return _preflight_response()
+    
+    data = request.get_json(silent=True)
+    if not data or 'message' not in data:
+        return jsonify({
+            'error': 'No message provided',
+            'success': False
+        }), 400
+    
+    message = data['message']
+    intent = route_message(message)
+    escalation_level = intent['escalation_level']
+    
+    response_data = get_local_reply(intent)
+    if response_data is None:
+        cached = cached_answer(message, version=ANSWER_VERSION)
+        if cached is not None:
+            response_data = get_ai_reply(cached, escalation_level)
+    if response_data is not None:
+        record_chat_stream('immediate')
+        events = _reply_events(response_data)
+    else:
+        events = stream_openai_reply(message, escalation_level)
+    
+    response = Response(stream_with_context(events), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    # Stop nginx from buffering the stream
+    response.headers['X-Accel-Buffering'] = 'no'
+    return _with_cors(response)
 
 @chat_bp.route('/health', methods=['GET'])
 def health_check():
@@ -591,6 +770,7 @@ def health_check():
         'status': 'healthy',
         'service': 'chat',
         'openai_configured': bool(os.getenv('OPENAI_API_KEY')),
+        'answer_cache': answer_cache_stats(),
         'guardian_url': 'https://www.remaleh.com.au/contact-us'
     })
 
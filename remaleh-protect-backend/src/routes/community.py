@@ -1,13 +1,29 @@
 from flask import Blueprint, request, jsonify, current_app, send_from_directory
 try:
-    from ..models import db, User, CommunityReport, ReportVote, CommunityAlert, CommunityReportMedia, CommunityReportComment, UserPointLog
+    from ..models import db, CommunityReport, ReportVote, CommunityAlert, CommunityReportMedia, CommunityReportComment
     from ..auth import token_required, get_current_user_id
     from ..cache import cache
+    from ..pagination import keyset_page, offset_page, estimate_row_count, exact_count, InvalidCursorError
+    from ..points import award_points_with_daily_cap, points_for_users, get_user_points
+    from ..leaderboard import top_users, user_rank
+    from ..trending import get_trending, report_created, report_status_changed
+    from ..stats import report_counts, user_report_counts, community_activity
+    from ..votes import cast_vote, maybe_flush_vote_buffer, pending_vote_counts
+    from ..bulk_delete import delete_reports, maybe_process_media_deletions
+    from ..orphan_cleanup import maybe_run_orphan_cleanup
 except ImportError:
-    from models import db, User, CommunityReport, ReportVote, CommunityAlert, CommunityReportMedia, CommunityReportComment, UserPointLog
+    from models import db, CommunityReport, ReportVote, CommunityAlert, CommunityReportMedia, CommunityReportComment
     from auth import token_required, get_current_user_id
     from cache import cache
-from datetime import datetime, timedelta
+    from pagination import keyset_page, offset_page, estimate_row_count, exact_count, InvalidCursorError
+    from points import award_points_with_daily_cap, points_for_users, get_user_points
+    from leaderboard import top_users, user_rank
+    from trending import get_trending, report_created, report_status_changed
+    from stats import report_counts, user_report_counts, community_activity
+    from votes import cast_vote, maybe_flush_vote_buffer, pending_vote_counts
+    from bulk_delete import delete_reports, maybe_process_media_deletions
+    from orphan_cleanup import maybe_run_orphan_cleanup
+from datetime import datetime
 def compute_user_tier(points):
     if points >= 500:
         return 'Guardian'
@@ -17,28 +33,10 @@ def compute_user_tier(points):
         return 'Ally'
     return 'Helper'
 
-def award_points_with_daily_cap(user_id, base_points, reason, report_id=None, daily_cap=120):
-    # Sum awarded today
-    start_of_day = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
-    today_points = db.session.query(func.coalesce(func.sum(UserPointLog.points), 0)).filter(
-        UserPointLog.user_id == user_id,
-        UserPointLog.created_at >= start_of_day
-    ).scalar() or 0
-
-    remaining = max(0, daily_cap - int(today_points))
-    to_award = min(base_points, remaining)
-    if to_award <= 0:
-        return 0
-    log = UserPointLog(user_id=user_id, report_id=report_id, points=to_award, reason=reason)
-    db.session.add(log)
-    try:
-        db.session.flush()  # ensure subsequent reads see this award within the same transaction
-    except Exception:
-        pass
-    return to_award
 import os
 from werkzeug.utils import secure_filename
-from sqlalchemy import func, desc, case, or_
+from sqlalchemy import func, or_
+from sqlalchemy.orm import joinedload, selectinload, undefer_group
 import json
 from urllib.parse import urlparse
 
@@ -51,13 +49,42 @@ except ImportError:
 
 community_bp = Blueprint('community', __name__)
 
+def latest_comments_for_reports(report_ids, limit=3):
+    """Newest `limit` comments for each report, with authors, in a single query.
+    Returns {report_id: [CommunityReportComment, ...]} ordered newest first.
+    """
+    if not report_ids:
+        return {}
+    ranked = db.session.query(
+        CommunityReportComment.id.label('id'),
+        func.row_number().over(
+            partition_by=CommunityReportComment.report_id,
+            order_by=(CommunityReportComment.created_at.desc(), CommunityReportComment.id.desc())
+        ).label('rn')
+    ).filter(CommunityReportComment.report_id.in_(report_ids)).subquery()
+
+    comments = CommunityReportComment.query.join(
+        ranked, ranked.c.id == CommunityReportComment.id
+    ).filter(ranked.c.rn <= limit).options(
+        joinedload(CommunityReportComment.user)
+    ).order_by(
+        CommunityReportComment.report_id,
+        CommunityReportComment.created_at.desc(),
+        CommunityReportComment.id.desc()
+    ).all()
+
+    grouped = {}
+    for c in comments:
+        grouped.setdefault(c.report_id, []).append(c)
+    return grouped
+
 @community_bp.route('/reports', methods=['GET'])
 @token_required
 def get_community_reports(current_user):
     """Get community reports with filtering and pagination"""
     try:
         page = request.args.get('page', 1, type=int)
-        per_page = request.args.get('per_page', 20, type=int)
+        per_page = max(1, request.args.get('per_page', 20, type=int))
         threat_type = request.args.get('threat_type')
         urgency = request.args.get('urgency')
         status = request.args.get('status')
@@ -66,7 +93,16 @@ def get_community_reports(current_user):
         include_own = request.args.get('include_own', 'false').lower() == 'true'
         sort = request.args.get('sort', 'newest').lower()  # newest | top | verified
         
-        query = CommunityReport.query
+        # Fold any Redis-buffered vote counts into the table before reading it
+        maybe_flush_vote_buffer()
+        maybe_run_orphan_cleanup()
+        
+        # Creators and media for the whole page arrive in one extra query each
+        query = CommunityReport.query.options(
+            undefer_group('report_detail'),
+            selectinload(CommunityReport.user).undefer_group('profile'),
+            selectinload(CommunityReport.media)
+        )
         
         if threat_type:
             query = query.filter(CommunityReport.threat_type == threat_type)
@@ -89,32 +125,64 @@ def get_community_reports(current_user):
             else:
                 query = query.filter(base_filter)
 
-        # Sorting
+        # Sorting: every ordering ends in id so keyset cursors are unambiguous,
+        # and each has a matching composite index on community_reports
         if sort == 'top':
-            query = query.order_by((CommunityReport.votes_up - CommunityReport.votes_down).desc(), CommunityReport.created_at.desc())
+            sort_columns = [CommunityReport.score, CommunityReport.created_at, CommunityReport.id]
         elif sort == 'verified':
             # Put verified first, then newest
-            query = query.order_by(CommunityReport.verified.desc(), CommunityReport.created_at.desc())
+            sort_columns = [CommunityReport.verified, CommunityReport.created_at, CommunityReport.id]
         else:
             # newest
-            query = query.order_by(CommunityReport.created_at.desc())
-        
-        reports = query.paginate(
-            page=page, per_page=per_page, error_out=False
-        )
+            sort_columns = [CommunityReport.created_at, CommunityReport.id]
+
+        # Cursor mode is selected by passing ?cursor= (empty for the first page).
+        # include_total=true|false|approx; counting is skipped by default in cursor mode.
+        use_cursor = 'cursor' in request.args
+        include_total = request.args.get('include_total', 'false' if use_cursor else 'true').lower()
+        total = None
+        if include_total == 'approx':
+            total = estimate_row_count(query)
+        elif include_total == 'true' and use_cursor:
+            total = exact_count(query)
+
+        if use_cursor:
+            try:
+                items, next_cursor = keyset_page(query, sort_columns, request.args.get('cursor'), per_page)
+            except InvalidCursorError as e:
+                return jsonify({'error': str(e)}), 400
+            pagination = {
+                'per_page': per_page,
+                'total': total,
+                'total_is_estimate': include_total == 'approx',
+                'has_next': next_cursor is not None,
+                'next_cursor': next_cursor
+            }
+        else:
+            query = query.order_by(*[c.desc() for c in sort_columns])
+            items, has_next = offset_page(query, page, per_page)
+            if include_total == 'true':
+                total = exact_count(query)
+            pages = -(-total // per_page) if total is not None else None
+            pagination = {
+                'page': page,
+                'per_page': per_page,
+                'total': total,
+                'total_is_estimate': include_total == 'approx',
+                'pages': pages,
+                'has_next': has_next,
+                'has_prev': page > 1,
+                'next_num': page + 1 if has_next else None,
+                'prev_num': page - 1 if page > 1 else None
+            }
         # Prepare tiers for creators (all-time points)
-        creator_ids = list({r.user_id for r in reports.items})
-        user_id_to_tier = {}
-        if creator_ids:
-            points_by_user = db.session.query(
-                UserPointLog.user_id,
-                func.coalesce(func.sum(UserPointLog.points), 0).label('points')
-            ).filter(UserPointLog.user_id.in_(creator_ids)).group_by(UserPointLog.user_id).all()
-            for uid, pts in points_by_user:
-                user_id_to_tier[int(uid)] = compute_user_tier(int(pts or 0))
+        creator_ids = list({r.user_id for r in items})
+        user_id_to_tier = {
+            uid: compute_user_tier(pts) for uid, pts in points_for_users(creator_ids, period='all').items()
+        }
 
         # Get user's votes for these reports (guard against empty list)
-        report_ids = [r.id for r in reports.items]
+        report_ids = [r.id for r in items]
         vote_dict = {}
         if report_ids:
             user_votes = ReportVote.query.filter(
@@ -122,10 +190,12 @@ def get_community_reports(current_user):
                 ReportVote.report_id.in_(report_ids)
             ).all()
             vote_dict = {v.report_id: v.vote_type for v in user_votes}
+
+        comments_by_report = latest_comments_for_reports(report_ids, limit=3)
         
         # Format reports with user's vote information
         formatted_reports = []
-        for report in reports.items:
+        for report in items:
             report_data = report.to_dict()
             report_data['user_vote'] = vote_dict.get(report.id)
             # Creator info (robust if user is missing)
@@ -148,22 +218,12 @@ def get_community_reports(current_user):
             # Attach media
             report_data['media'] = [m.to_dict() for m in getattr(report, 'media', [])]
             # Attach latest comments (limit 3)
-            comments = CommunityReportComment.query.filter_by(report_id=report.id).order_by(CommunityReportComment.created_at.desc()).limit(3).all()
-            report_data['comments'] = [c.to_dict() for c in comments]
+            report_data['comments'] = [c.to_dict() for c in comments_by_report.get(report.id, [])]
             formatted_reports.append(report_data)
         
         return jsonify({
             'reports': formatted_reports,
-            'pagination': {
-                'page': page,
-                'per_page': per_page,
-                'total': reports.total,
-                'pages': reports.pages,
-                'has_next': reports.has_next,
-                'has_prev': reports.has_prev,
-                'next_num': reports.next_num,
-                'prev_num': reports.prev_num
-            }
+            'pagination': pagination
         }), 200
         
     except Exception as e:
@@ -207,6 +267,8 @@ def create_report(current_user):
         )
         
         db.session.add(report)
+        db.session.flush()
+        report_created(report)
         db.session.commit()
         
         return jsonify({
@@ -223,7 +285,7 @@ def create_report(current_user):
 def get_report(current_user, report_id):
     """Get specific community report details"""
     try:
-        report = CommunityReport.query.get_or_404(report_id)
+        report = CommunityReport.query.options(undefer_group('report_detail')).get_or_404(report_id)
         
         # Get user's vote for this report
         user_vote = ReportVote.query.filter(
@@ -249,55 +311,17 @@ def get_report(current_user, report_id):
 @token_required
 def delete_report(current_user, report_id):
     """Delete a report owned by the current user, or by admin.
-    Cleans up media (local files or Cloudinary) and comments via cascade.
+    Votes, comments and points go with it; media files (local or Cloudinary)
+    are queued for the background deletion worker.
     """
     try:
         report = CommunityReport.query.get_or_404(report_id)
         if report.user_id != current_user.id and not getattr(current_user, 'is_admin', False):
             return jsonify({'error': 'Not authorized to delete this report'}), 403
 
-        # Delete associated media files (local or Cloudinary)
-        for m in list(getattr(report, 'media', [])):
-            media_url = m.media_url or ''
-            if media_url.startswith('/api/community/uploads/'):
-                try:
-                    filename = media_url.split('/api/community/uploads/', 1)[1]
-                    upload_folder = current_app.config.get('UPLOAD_FOLDER')
-                    if upload_folder:
-                        file_path = os.path.join(upload_folder, filename)
-                        if os.path.exists(file_path):
-                            os.remove(file_path)
-                except Exception:
-                    pass
-            else:
-                if cloudinary and ('res.cloudinary.com' in media_url):
-                    try:
-                        cloud_name = current_app.config.get('CLOUDINARY_CLOUD_NAME')
-                        api_key = current_app.config.get('CLOUDINARY_API_KEY')
-                        api_secret = current_app.config.get('CLOUDINARY_API_SECRET')
-                        if cloud_name and api_key and api_secret:
-                            cloudinary.config(cloud_name=cloud_name, api_key=api_key, api_secret=api_secret, secure=True)
-                            parsed = urlparse(media_url)
-                            parts = parsed.path.split('/')
-                            if 'upload' in parts:
-                                upload_idx = parts.index('upload')
-                                public_parts = parts[upload_idx+2:]
-                                public_id_with_ext = '/'.join(public_parts)
-                                if public_id_with_ext:
-                                    public_id = os.path.splitext(public_id_with_ext)[0]
-                                    cloudinary.uploader.destroy(public_id)
-                    except Exception:
-                        pass
-
-        # Clean up related point logs referencing this report to avoid FK constraint
-        try:
-            from ..models import UserPointLog
-        except ImportError:
-            from models import UserPointLog
-        db.session.query(UserPointLog).filter_by(report_id=report.id).delete(synchronize_session=False)
-
-        db.session.delete(report)
+        delete_reports([report.id])
         db.session.commit()
+        maybe_process_media_deletions()
         return jsonify({'message': 'Report deleted', 'report_id': report_id}), 200
     except Exception as e:
         db.session.rollback()
@@ -341,51 +365,24 @@ def vote_on_report(current_user, report_id):
         if vote_type not in ['up', 'down']:
             return jsonify({'error': 'Vote type must be "up" or "down"'}), 400
         
-        # Check if user already voted
-        existing_vote = ReportVote.query.filter(
-            ReportVote.user_id == current_user.id,
-            ReportVote.report_id == report_id
-        ).first()
-        
-        report = CommunityReport.query.get_or_404(report_id)
-        
-        if existing_vote:
-            # Update existing vote
-            if existing_vote.vote_type == vote_type:
-                # Remove vote if clicking same button
-                db.session.delete(existing_vote)
-                if vote_type == 'up':
-                    report.votes_up -= 1
-                else:
-                    report.votes_down -= 1
-            else:
-                # Change vote
-                if existing_vote.vote_type == 'up':
-                    report.votes_up -= 1
-                    report.votes_down += 1
-                else:
-                    report.votes_down -= 1
-                    report.votes_up += 1
-                existing_vote.vote_type = vote_type
-        else:
-            # Create new vote
-            vote = ReportVote(
-                user_id=current_user.id,
-                report_id=report_id,
-                vote_type=vote_type
-            )
-            db.session.add(vote)
-            
-            if vote_type == 'up':
-                report.votes_up += 1
-            else:
-                report.votes_down += 1
+        if not db.session.query(CommunityReport.id).filter(CommunityReport.id == report_id).first():
+            return jsonify({'error': 'Report not found'}), 404
         
+        # Vote row and counters change atomically on the server; see votes.py
+        user_vote = cast_vote(current_user.id, report_id, vote_type)
         db.session.commit()
+        maybe_flush_vote_buffer()
+        
+        report = CommunityReport.query.options(undefer_group('report_detail')).get(report_id)
+        report_data = report.to_dict()
+        pending_up, pending_down = pending_vote_counts([report_id]).get(report_id, (0, 0))
+        report_data['votes_up'] = (report_data.get('votes_up') or 0) + pending_up
+        report_data['votes_down'] = (report_data.get('votes_down') or 0) + pending_down
+        report_data['user_vote'] = user_vote
         
         return jsonify({
             'message': 'Vote recorded successfully',
-            'report': report.to_dict()
+            'report': report_data
         }), 200
         
     except Exception as e:
@@ -406,8 +403,10 @@ def verify_report(current_user, report_id):
         report = CommunityReport.query.get_or_404(report_id)
         total_awarded = 0
         if not report.verified:
+            previous_status = report.status
             report.verified = True
             report.status = 'VERIFIED'
+            report_status_changed(report, previous_status)
 
             # Points model: +10 base per verified report, +5 bonus if evidence is attached
             base_points = 10
@@ -634,25 +633,8 @@ def get_leaderboard(current_user):
     """
     try:
         period = (request.args.get('period') or '90d').lower()
-        if period == 'all':
-            points_by_user = db.session.query(
-                UserPointLog.user_id.label('uid'),
-                func.coalesce(func.sum(UserPointLog.points), 0).label('points')
-            ).group_by(UserPointLog.user_id).subquery()
-        else:
-            lookback_start = datetime.utcnow() - timedelta(days=90)
-            points_by_user = db.session.query(
-                UserPointLog.user_id.label('uid'),
-                func.coalesce(func.sum(UserPointLog.points), 0).label('points')
-            ).filter(UserPointLog.created_at >= lookback_start).group_by(UserPointLog.user_id).subquery()
-
         # Only include users who have points in the selected period
-        results = db.session.query(
-            User.id,
-            User.first_name,
-            User.last_name,
-            points_by_user.c.points.label('points')
-        ).join(points_by_user, points_by_user.c.uid == User.id).order_by(desc('points')).limit(20).all()
+        results = top_users(period, limit=20)
 
         leaderboard = []
         rank = 1
@@ -676,46 +658,8 @@ def get_leaderboard(current_user):
 def get_trending_threats(current_user):
     """Get trending threats based on community reports"""
     try:
-        # Get threat types with most reports in last 30 days
-        thirty_days_ago = datetime.utcnow() - timedelta(days=30)
-        
-        trending = db.session.query(
-            CommunityReport.threat_type,
-            func.count(CommunityReport.id).label('count'),
-            func.avg(
-                case(
-                    (CommunityReport.urgency == 'HIGH', 3),
-                    (CommunityReport.urgency == 'MEDIUM', 2),
-                    (CommunityReport.urgency == 'LOW', 1)
-                )
-            ).label('avg_urgency')
-        ).filter(
-            CommunityReport.created_at >= thirty_days_ago,
-            CommunityReport.status.in_(['PENDING', 'VERIFIED', 'APPROVED'])
-        ).group_by(
-            CommunityReport.threat_type
-        ).order_by(
-            desc('count')
-        ).limit(10).all()
-        
-        formatted_trending = []
-        for trend in trending:
-            # Calculate trend indicator
-            if trend.count > 20:
-                trend_indicator = '🔥 Surging'
-            elif trend.count > 10:
-                trend_indicator = '📈 Rising'
-            elif trend.count > 5:
-                trend_indicator = '📊 Stable'
-            else:
-                trend_indicator = '📉 Low'
-            
-            formatted_trending.append({
-                'threat_type': trend.threat_type,
-                'report_count': trend.count,
-                'urgency_score': round(trend.avg_urgency or 0, 1),
-                'trend': trend_indicator
-            })
+        # Top threat types over 30 days with 7-day and 24-hour velocity, from maintained buckets
+        formatted_trending = get_trending(limit=10)
         
         return jsonify({'trending_threats': formatted_trending}), 200
         
@@ -727,59 +671,16 @@ def get_trending_threats(current_user):
 def get_community_stats(current_user):
     """Get community statistics"""
     try:
-        # Total reports
-        total_reports = CommunityReport.query.count()
-        
-        # Reports by status
-        status_counts = db.session.query(
-            CommunityReport.status,
-            func.count(CommunityReport.id).label('count')
-        ).group_by(CommunityReport.status).all()
-        
-        # Reports by urgency
-        urgency_counts = db.session.query(
-            CommunityReport.urgency,
-            func.count(CommunityReport.id).label('count')
-        ).group_by(CommunityReport.urgency).all()
-        
-        # Top contributors
-        top_contributors = db.session.query(
-            User.id,
-            User.first_name,
-            User.last_name,
-            func.count(CommunityReport.id).label('report_count')
-        ).join(CommunityReport).group_by(
-            User.id, User.first_name, User.last_name
-        ).order_by(desc('report_count')).limit(5).all()
-        
-        # Recent activity
-        recent_activity = db.session.query(
-            CommunityReport.created_at,
-            CommunityReport.threat_type,
-            User.first_name,
-            User.last_name
-        ).join(User).order_by(
-            CommunityReport.created_at.desc()
-        ).limit(10).all()
+        # Counter snapshot (one aggregate query, cached briefly and kept current on writes)
+        counts = report_counts()
+        activity = community_activity(top_limit=5, recent_limit=10)
         
         stats = {
-            'total_reports': total_reports,
-            'status_breakdown': {s.status: s.count for s in status_counts},
-            'urgency_breakdown': {u.urgency: u.count for u in urgency_counts},
-            'top_contributors': [
-                {
-                    'id': c.id,
-                    'name': f"{c.first_name} {c.last_name}".strip() or 'Anonymous',
-                    'report_count': c.report_count
-                } for c in top_contributors
-            ],
-            'recent_activity': [
-                {
-                    'date': a.created_at.strftime('%Y-%m-%d %H:%M'),
-                    'threat_type': a.threat_type,
-                    'reporter': f"{a.first_name} {a.last_name}".strip() or 'Anonymous'
-                } for a in recent_activity
-            ]
+            'total_reports': counts['total'],
+            'status_breakdown': {k: n for k, n in counts['status'].items() if n},
+            'urgency_breakdown': {k: n for k, n in counts['urgency'].items() if n},
+            'top_contributors': activity['top_contributors'],
+            'recent_activity': activity['recent_activity']
         }
         
         return jsonify(stats), 200
@@ -795,45 +696,21 @@ def get_my_reporting_stats(current_user):
     """
     try:
         period = (request.args.get('period') or '90d').lower()
-        # Base counts
-        report_count = CommunityReport.query.filter_by(user_id=current_user.id).count()
-        approved_count = CommunityReport.query.filter_by(user_id=current_user.id, status='APPROVED').count()
-        verified_count = CommunityReport.query.filter_by(user_id=current_user.id, status='VERIFIED').count()
-        pending_count = CommunityReport.query.filter_by(user_id=current_user.id, status='PENDING').count()
-        rejected_count = CommunityReport.query.filter_by(user_id=current_user.id, status='REJECTED').count()
-
-        # Points from logs (period-bound)
-        q = db.session.query(func.coalesce(func.sum(UserPointLog.points), 0)).filter(UserPointLog.user_id == current_user.id)
-        if period != 'all':
-            lookback_start = datetime.utcnow() - timedelta(days=90)
-            q = q.filter(UserPointLog.created_at >= lookback_start)
-        total_points = q.scalar() or 0
-        points = int(total_points)
-        tier = compute_user_tier(points)
+        # Base counts from the per-user snapshot
+        counts = user_report_counts(current_user.id)
 
-        # Rank by points (period-bound)
-        pq = db.session.query(
-            UserPointLog.user_id,
-            func.coalesce(func.sum(UserPointLog.points), 0).label('points')
-        )
-        if period != 'all':
-            lookback_start = datetime.utcnow() - timedelta(days=90)
-            pq = pq.filter(UserPointLog.created_at >= lookback_start)
-        points_by_user = pq.group_by(UserPointLog.user_id).order_by(desc('points')).all()
-
-        rank = None
-        if points_by_user:
-            for idx, row in enumerate(points_by_user, start=1):
-                if row.user_id == current_user.id:
-                    rank = idx
-                    break
+        # Points and rank from the maintained totals (period-bound)
+        user_points = get_user_points(current_user.id) or {}
+        points = int(user_points.get('all' if period == 'all' else '90d', 0))
+        tier = compute_user_tier(points)
+        rank = user_rank(current_user.id, period)
 
         return jsonify({
-            'report_count': report_count,
-            'approved_count': approved_count,
-            'verified_count': verified_count,
-            'pending_count': pending_count,
-            'rejected_count': rejected_count,
+            'report_count': counts['total'],
+            'approved_count': counts['status']['APPROVED'],
+            'verified_count': counts['status']['VERIFIED'],
+            'pending_count': counts['status']['PENDING'],
+            'rejected_count': counts['status']['REJECTED'],
             'points': points,
             'tier': tier,
             'rank': rank
@@ -16,8 +16,14 @@ import base64
 enhanced_scam_bp = Blueprint('enhanced_scam', __name__)
 try:
     from ..models import db, User, UserScan
+    from ..scan_retention import user_scan_history, maybe_run_scan_retention
+    from ..scan_summary import scan_summary_items
+    from ..domain_index import is_disposable_domain
 except Exception:
     from models import db, User, UserScan
+    from scan_retention import user_scan_history, maybe_run_scan_retention
+    from scan_summary import scan_summary_items
+    from domain_index import is_disposable_domain
 try:
     from ..auth import token_required
 except Exception:
@@ -342,57 +348,8 @@ def recent_scans(current_user):
         limit = int(request.args.get('limit', 20))
     except Exception:
         limit = 20
-    q = UserScan.query.filter_by(user_id=current_user.id).order_by(UserScan.scanned_at.desc()).limit(limit)
-    items = []
-
-    def compute_recommendations(risk_level: str, indicators: list[str] | None, patterns: list[str] | None):
-        recs: list[str] = []
-        lvl = (risk_level or '').upper()
-        if lvl == 'SCAM':
-            recs.extend([
-                'Do not respond or click any links',
-                'Block the sender/contact',
-                'Report and delete the email'
-            ])
-        elif lvl == 'SUSPICIOUS':
-            recs.extend([
-                'Verify sender authenticity before taking action',
-                'Do not open attachments or share personal info'
-            ])
-        else:
-            recs.append('Content appears low risk; proceed with normal caution')
-        patterns = patterns or []
-        inds = indicators or []
-        if any('url' in p for p in patterns):
-            recs.append('Hover to verify URLs; avoid shortened or unusual domains')
-        if any('suspicious_domain' in p for p in patterns):
-            recs.append('Domain looks suspicious; do not click any links')
-        if any('phone' in i.lower() for i in inds):
-            recs.append('Do not call numbers in unsolicited emails')
-        # Deduplicate and cap to 4
-        out = []
-        for r in recs:
-            if r not in out:
-                out.append(r)
-        return out[:4]
-
-    for s in q.all():
-        result = s.analysis_result if isinstance(s.analysis_result, dict) else {}
-        dbg = result.get('debug_info') or {}
-        indicators = result.get('indicators') or []
-        patterns = result.get('patterns') or []
-        recs = compute_recommendations(s.risk_level, indicators, patterns)
-        items.append({
-            'id': s.id,
-            'subject': dbg.get('subject'),
-            'preview': dbg.get('preview'),
-            'attachments': dbg.get('attachments'),
-            'risk_level': s.risk_level,
-            'risk_score': s.risk_score,
-            'indicators': indicators[:3],
-            'recommendations': recs,
-            'scanned_at': s.scanned_at.isoformat() if s.scanned_at else None
-        })
+    scans = user_scan_history(current_user.id, limit, summary_only=True)
+    items = scan_summary_items(scans)
     return jsonify({'items': items})
 
 @enhanced_scam_bp.route('/forwarding-address', methods=['GET'])
@@ -414,7 +371,8 @@ def get_forwarding_address(current_user):
 def inbound_email_webhook():
     """
     Minimal inbound email webhook.
-    Expect JSON with: token, subject, text, html (optional), attachments (array of {filename, content_base64})
+    Expect JSON with: token, subject, text, html (optional), from (optional, the original sender),
+    attachments (array of {filename, content_base64})
     This endpoint should be wired to your email provider webhook to parse incoming forwards.
     """
     data = request.get_json(silent=True) or {}
@@ -441,6 +399,9 @@ def inbound_email_webhook():
             result['debug_info']['subject'] = subject
             result['debug_info']['preview'] = (text_body or '')[:200]
             result['debug_info']['attachments'] = len(data.get('attachments') or [])
+            sender = (data.get('from') or '').strip()
+            if sender:
+                result['debug_info']['sender_disposable'] = is_disposable_domain(sender.rstrip('>').rsplit('@', 1)[-1])
     except Exception:
         pass
 
@@ -455,6 +416,7 @@ def inbound_email_webhook():
     )
     db.session.add(scan)
     db.session.commit()
+    maybe_run_scan_retention()
 
     # TODO: attachments could be uploaded to Cloudinary if needed
     return jsonify({'success': True, 'scan_id': scan.id, 'result': result})
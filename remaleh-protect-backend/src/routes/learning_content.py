@@ -3,6 +3,7 @@ from functools import wraps
 from datetime import datetime
 import logging
 import json
+from sqlalchemy.orm import undefer_group
 
 # Import production modules - try relative imports first, then absolute
 try:
@@ -65,7 +66,7 @@ def get_modules(current_user):
     """Get all learning modules"""
     try:
         logger.info(f"Getting modules for user: {current_user.email}")
-        modules = LearningModule.query.filter_by(is_active=True).all()
+        modules = LearningModule.query.options(undefer_group('module_content')).filter_by(is_active=True).all()
         
         # Debug: Log each module's content
         for module in modules:
@@ -83,7 +84,7 @@ def get_modules(current_user):
 def get_module(current_user, module_id):
     """Get specific learning module with full content"""
     try:
-        module = LearningModule.query.get(module_id)
+        module = LearningModule.query.options(undefer_group('module_content')).get(module_id)
         if not module:
             return jsonify({'error': 'Module not found'}), 404
             
@@ -143,7 +144,7 @@ def update_module(current_user, module_id):
         logger.info(f"Request method: {request.method}")
         logger.info(f"Request headers: {dict(request.headers)}")
         
-        module = LearningModule.query.get(module_id)
+        module = LearningModule.query.options(undefer_group('module_content')).get(module_id)
         if not module:
             logger.warning(f"Module {module_id} not found")
             return jsonify({'error': 'Module not found'}), 404
@@ -208,7 +209,7 @@ def add_lesson(current_user, module_id):
     try:
         logger.info(f"Adding lesson to module {module_id} by user {current_user.email}")
         
-        module = LearningModule.query.get(module_id)
+        module = LearningModule.query.options(undefer_group('module_content')).get(module_id)
         if not module:
             logger.warning(f"Module {module_id} not found")
             return jsonify({'error': 'Module not found'}), 404
@@ -286,7 +287,7 @@ def add_lesson(current_user, module_id):
 def update_lesson(current_user, module_id, lesson_id):
     """Update a lesson in a module"""
     try:
-        module = LearningModule.query.get(module_id)
+        module = LearningModule.query.options(undefer_group('module_content')).get(module_id)
         if not module:
             return jsonify({'error': 'Module not found'}), 404
         
@@ -337,7 +338,7 @@ def update_lesson(current_user, module_id, lesson_id):
 def delete_lesson(current_user, module_id, lesson_id):
     """Delete a lesson from a module"""
     try:
-        module = LearningModule.query.get(module_id)
+        module = LearningModule.query.options(undefer_group('module_content')).get(module_id)
         if not module:
             return jsonify({'error': 'Module not found'}), 404
         
@@ -416,7 +417,7 @@ def update_lesson_progress(current_user, module_id, lesson_id):
         data = request.get_json()
         
         # Check if lesson exists in the module
-        module = LearningModule.query.get(module_id)
+        module = LearningModule.query.options(undefer_group('module_content')).get(module_id)
         if not module or not module.content or not module.content.get('lessons'):
             return jsonify({'error': 'Module or lesson not found'}), 404
         
@@ -556,7 +557,9 @@ def get_progress_overview(current_user):
         
         # Simple, read-only aggregation without committing or raw SQL
         lesson_progress_records = LessonProgress.query.filter_by(user_id=user_id).all()
-        active_modules = LearningModule.query.filter_by(is_active=True).all()
+        # Lesson counts only; the lesson JSON stays in the database
+        active_modules = db.session.query(LearningModule.id, LearningModule.lesson_count) \
+            .filter(LearningModule.is_active == True).all()
         
         total_lessons = 0
         completed_lessons = 0
@@ -570,8 +573,7 @@ def get_progress_overview(current_user):
                 completed_by_module[p.module_id] += 1
         
         for module in active_modules:
-            module_lessons = module.content.get('lessons', []) if module.content else []
-            module_total = len(module_lessons)
+            module_total = module.lesson_count or 0
             total_lessons += module_total
             completed_for_module = completed_by_module.get(module.id, 0)
             completed_lessons += completed_for_module
@@ -603,7 +605,7 @@ def get_progress_overview(current_user):
 def export_content(current_user):
     """Export all learning content as JSON"""
     try:
-        modules = LearningModule.query.filter_by(is_active=True).all()
+        modules = LearningModule.query.options(undefer_group('module_content')).filter_by(is_active=True).all()
         
         export_data = {
             'metadata': {
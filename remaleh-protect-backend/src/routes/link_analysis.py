@@ -15,6 +15,11 @@ import json
 from flask import Blueprint, request, jsonify
 import logging
 
+try:
+    from ..domain_index import DomainIndex, DomainList
+except ImportError:
+    from domain_index import DomainIndex, DomainList
+
 # Create Flask Blueprint
 link_analysis_bp = Blueprint('link_analysis', __name__)
 
@@ -28,6 +33,9 @@ KNOWN_MALICIOUS_DOMAINS = {
     'malware-download.com', 'phish-paypal.net', 'fake-amazon.co'
 }
 
+# Matched with subdomains; extended by MALICIOUS_DOMAINS_FILE (one domain per line)
+MALICIOUS_DOMAINS = DomainList(KNOWN_MALICIOUS_DOMAINS, 'MALICIOUS_DOMAINS_FILE')
+
 # Suspicious TLDs commonly used in scams
 SUSPICIOUS_TLDS = {
     '.tk', '.ml', '.ga', '.cf', '.pw', '.top', '.click', '.download',
@@ -41,6 +49,9 @@ URL_SHORTENERS = {
     'ow.ly', 'is.gd', 'buff.ly', 'adf.ly', 'tiny.cc'
 }
 
+# By domain suffix: a substring test took e.g. microsoft.com for t.co
+SHORTENER_DOMAINS = DomainIndex(URL_SHORTENERS)
+
 # Suspicious keywords in URLs
 SUSPICIOUS_URL_KEYWORDS = [
     'login', 'verify', 'account', 'secure', 'update', 'confirm',
@@ -114,11 +125,9 @@ class LocalLinkAnalyzer:
                     break
             
             # Check for URL shorteners
-            for shortener in URL_SHORTENERS:
-                if shortener in domain:
-                    risk_score += 10
-                    indicators.append("Uses URL shortener (may hide destination)")
-                    break
+            if domain in SHORTENER_DOMAINS:
+                risk_score += 10
+                indicators.append("Uses URL shortener (may hide destination)")
             
             # Check for suspicious keywords in URL
             full_url = url.lower()
@@ -152,8 +161,8 @@ class LocalLinkAnalyzer:
                     indicators.append("Potential homograph attack (suspicious characters)")
                     break
             
-            # Check for known malicious domains
-            if domain in KNOWN_MALICIOUS_DOMAINS:
+            # Check for known malicious domains (and their subdomains)
+            if domain in MALICIOUS_DOMAINS:
                 risk_score += 50
                 indicators.append("Known malicious domain")
             
@@ -715,7 +724,7 @@ def debug_info():
         'service': 'link_analysis',
         'status': 'operational',
         'features': {
-            'known_malicious_domains': len(KNOWN_MALICIOUS_DOMAINS),
+            'known_malicious_domains': len(MALICIOUS_DOMAINS.index()),
             'suspicious_tlds': len(SUSPICIOUS_TLDS),
             'url_shorteners': len(URL_SHORTENERS),
             'suspicious_keywords': len(SUSPICIOUS_URL_KEYWORDS)
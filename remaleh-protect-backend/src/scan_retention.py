@@ -0,0 +1,230 @@
+"""
+Hot/cold tiering and retention for user scans.
+
+``user_scans`` is the hot tier and keeps the last ``SCAN_HOT_DAYS`` (90) of
+scans as they were written. Older scans are moved in batches into
+``user_scans_archive``, the cold tier. There, the message and analysis are
+stored as one zlib-compressed JSON blob, and the analysis ``debug_info`` is
+cut down to the fields the history views display. Archived scans older than
+``SCAN_RETENTION_DAYS`` (365, 0 keeps them forever) are purged.
+
+Each batch is moved in its own transaction (insert into the archive, delete
+from ``user_scans``), so a pass can stop at any point without losing or
+duplicating scans. The job runs in a background thread at most once per
+``SCAN_RETENTION_INTERVAL_SECONDS`` (guarded by a Redis lock when Redis is
+available), and can be run from cron with ``run_scan_retention.py``.
+
+``user_scan_history`` reads both tiers. Archived scans are always older than
+the hot ones, so the archive is only queried when the hot tier cannot fill
+the page.
+"""
+
+import json
+import logging
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import undefer, undefer_group
+
+try:
+    from .models import db, UserScan, UserScanArchive
+    from .cache import cache
+    from .scan_summary import SUMMARY_COLUMNS, summarize, listing_query
+except ImportError:
+    from models import db, UserScan, UserScanArchive
+    from cache import cache
+    from scan_summary import SUMMARY_COLUMNS, summarize, listing_query
+
+logger = logging.getLogger(__name__)
+
+# debug_info fields still shown for archived scans (recent-scans subject/preview)
+ARCHIVED_DEBUG_FIELDS = ('subject', 'preview', 'attachments')
+RETENTION_LOCK_KEY = 'scans:retention_lock'
+
+# time.monotonic() of this process's last retention run
+_last_run = None
+_run_lock = threading.Lock()
+
+
+def _slim_analysis(result):
+    if not isinstance(result, dict) or 'debug_info' not in result:
+        return result
+    slim = dict(result)
+    debug = slim.pop('debug_info') or {}
+    kept = {k: debug[k] for k in ARCHIVED_DEBUG_FIELDS if isinstance(debug, dict) and k in debug}
+    if kept:
+        slim['debug_info'] = kept
+    return slim
+
+
+def pack_scan_payload(message, analysis_result):
+    """Compress a scan's message and analysis for the archive"""
+    data = {'message': message, 'analysis_result': _slim_analysis(analysis_result)}
+    return zlib.compress(json.dumps(data, separators=(',', ':'), default=str).encode('utf-8'))
+
+
+def _archive_row(scan, now):
+    if scan.recommendation_codes is None:
+        summary = summarize(scan.risk_level, scan.analysis_result)
+    else:
+        summary = {c: getattr(scan, c) for c in SUMMARY_COLUMNS}
+    return {
+        **summary,
+        'id': scan.id,
+        'user_id': scan.user_id,
+        'risk_level': scan.risk_level,
+        'risk_score': scan.risk_score,
+        'threat_type': scan.threat_type,
+        'scanned_at': scan.scanned_at,
+        'learned_from': scan.learned_from,
+        'archived_at': now,
+        'payload': pack_scan_payload(scan.message, scan.analysis_result),
+    }
+
+
+def archive_scans(older_than_days=None, batch_size=None):
+    """Move scans older than the hot window into the archive. Returns the number moved."""
+    days = current_app.config.get('SCAN_HOT_DAYS', 90) if older_than_days is None else older_than_days
+    batch_size = batch_size or current_app.config.get('SCAN_RETENTION_BATCH_SIZE', 500)
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    moved = 0
+    while True:
+        batch = (
+            UserScan.query
+            .options(undefer_group('scan_detail'))
+            .filter(UserScan.scanned_at < cutoff)
+            .order_by(UserScan.scanned_at, UserScan.id)
+            .limit(batch_size)
+            .all()
+        )
+        if not batch:
+            break
+        now = datetime.utcnow()
+        ids = [scan.id for scan in batch]
+        try:
+            db.session.execute(insert(UserScanArchive.__table__), [_archive_row(scan, now) for scan in batch])
+            db.session.execute(UserScan.__table__.delete().where(UserScan.id.in_(ids)))
+            db.session.commit()
+        except IntegrityError:
+            # Another worker archived this batch first
+            db.session.rollback()
+            logger.info("Scan archive batch already moved by another worker; stopping")
+            break
+        except Exception:
+            db.session.rollback()
+            raise
+        moved += len(ids)
+        if len(ids) < batch_size:
+            break
+    return moved
+
+
+def purge_archived_scans(older_than_days=None, batch_size=None):
+    """Delete archived scans past the retention period. Returns the number deleted."""
+    days = current_app.config.get('SCAN_RETENTION_DAYS', 365) if older_than_days is None else older_than_days
+    if not days:
+        return 0
+    batch_size = batch_size or current_app.config.get('SCAN_RETENTION_BATCH_SIZE', 500)
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    purged = 0
+    while True:
+        ids = [row.id for row in (
+            db.session.query(UserScanArchive.id)
+            .filter(UserScanArchive.scanned_at < cutoff)
+            .order_by(UserScanArchive.scanned_at, UserScanArchive.id)
+            .limit(batch_size)
+        )]
+        if not ids:
+            break
+        try:
+            db.session.execute(UserScanArchive.__table__.delete().where(UserScanArchive.id.in_(ids)))
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        purged += len(ids)
+        if len(ids) < batch_size:
+            break
+    return purged
+
+
+def run_scan_retention(batch_size=None):
+    """One full pass: archive, then purge. Returns {'archived': n, 'purged': n}."""
+    archived = archive_scans(batch_size=batch_size)
+    purged = purge_archived_scans(batch_size=batch_size)
+    if archived or purged:
+        logger.info(f"Scan retention: archived {archived}, purged {purged}")
+    return {'archived': archived, 'purged': purged}
+
+
+def _run_in_background(app):
+    with app.app_context():
+        try:
+            run_scan_retention()
+        except Exception as e:
+            logger.error(f"Scan retention run failed: {e}")
+        finally:
+            db.session.remove()
+
+
+def maybe_run_scan_retention():
+    """Start a background retention run if one is due; never raises"""
+    global _last_run
+    config = current_app.config
+    if not config.get('SCAN_RETENTION_ENABLED', True):
+        return False
+    interval = int(config.get('SCAN_RETENTION_INTERVAL_SECONDS', 3600))
+    with _run_lock:
+        now = time.monotonic()
+        if _last_run is not None and now - _last_run < interval:
+            return False
+        _last_run = now
+    if cache.redis_client is not None:
+        try:
+            # One worker per interval across processes
+            if not cache.redis_client.set(RETENTION_LOCK_KEY, 1, nx=True, ex=interval):
+                return False
+        except Exception as e:
+            logger.warning(f"Scan retention lock unavailable, running locally: {e}")
+    threading.Thread(
+        target=_run_in_background, args=(current_app._get_current_object(),),
+        name='scan-retention', daemon=True,
+    ).start()
+    return True
+
+
+def user_scan_history(user_id, limit=20, summary_only=False):
+    """The user's most recent scans, newest first, from the hot tier then the archive.
+
+    With ``summary_only`` these are rows of just the listing columns (see scan_summary.py).
+    """
+    # Full objects load what to_dict() shows: the message, not the analysis JSON
+    hot_query = listing_query(UserScan) if summary_only else UserScan.query.options(undefer(UserScan.message))
+    cold_query = listing_query(UserScanArchive) if summary_only else UserScanArchive.query
+    scans = (
+        hot_query
+        .filter_by(user_id=user_id)
+        .order_by(UserScan.scanned_at.desc(), UserScan.id.desc())
+        .limit(limit)
+        .all()
+    )
+    if len(scans) < limit:
+        scans.extend(
+            cold_query
+            .filter_by(user_id=user_id)
+            .order_by(UserScanArchive.scanned_at.desc(), UserScanArchive.id.desc())
+            .limit(limit - len(scans))
+            .all()
+        )
+    return scans
+
+
+def delete_user_scans(user_id):
+    """Remove a user's scans from both tiers (caller commits)"""
+    db.session.query(UserScan).where(UserScan.user_id == user_id).delete(synchronize_session=False)
+    db.session.query(UserScanArchive).where(UserScanArchive.user_id == user_id).delete(synchronize_session=False)
@@ -0,0 +1,173 @@
+"""
+Precomputed display summaries for user scans.
+
+The scan history lists show a subject, a preview, the top three indicators
+and a few recommendations per scan. These are derived from
+``analysis_result`` once, when the scan is inserted, and stored in narrow
+``summary_*`` columns on ``user_scans`` (and copied to ``user_scans_archive``).
+Listings select only these columns as plain rows, never ``message`` or the
+analysis JSON.
+
+Recommendations are stored as short codes (``recommendation_codes``,
+comma-separated) and turned into text when read, so the wording can change
+without a migration. A row whose ``recommendation_codes`` is NULL has not
+been summarized yet; ``backfill_scan_summaries`` fills those in, and until
+then listings compute their summaries from the full row.
+"""
+
+import json
+import logging
+import zlib
+
+from sqlalchemy import event, literal, update
+
+try:
+    from .models import db, UserScan, UserScanArchive
+except ImportError:
+    from models import db, UserScan, UserScanArchive
+
+logger = logging.getLogger(__name__)
+
+RECOMMENDATIONS = {
+    'no_reply': 'Do not respond or click any links',
+    'block_sender': 'Block the sender/contact',
+    'report_delete': 'Report and delete the email',
+    'verify_sender': 'Verify sender authenticity before taking action',
+    'no_attachments': 'Do not open attachments or share personal info',
+    'low_risk': 'Content appears low risk; proceed with normal caution',
+    'check_urls': 'Hover to verify URLs; avoid shortened or unusual domains',
+    'suspicious_domain': 'Domain looks suspicious; do not click any links',
+    'no_calls': 'Do not call numbers in unsolicited emails',
+}
+MAX_RECOMMENDATIONS = 4
+MAX_INDICATORS = 3
+SUBJECT_LENGTH = 255
+PREVIEW_LENGTH = 200
+
+SUMMARY_COLUMNS = (
+    'summary_subject', 'summary_preview', 'summary_attachments', 'summary_indicators', 'recommendation_codes',
+)
+# Everything a history listing needs from either tier
+LISTING_COLUMNS = ('id', 'user_id', 'risk_level', 'risk_score', 'threat_type', 'scanned_at') + SUMMARY_COLUMNS
+
+
+def recommendation_codes(risk_level, indicators=None, patterns=None):
+    """Recommendation codes for a scan, most important first"""
+    codes = []
+    level = (risk_level or '').upper()
+    if level == 'SCAM':
+        codes.extend(['no_reply', 'block_sender', 'report_delete'])
+    elif level == 'SUSPICIOUS':
+        codes.extend(['verify_sender', 'no_attachments'])
+    else:
+        codes.append('low_risk')
+    patterns = patterns or []
+    indicators = indicators or []
+    if any('url' in str(p) for p in patterns):
+        codes.append('check_urls')
+    if any('suspicious_domain' in str(p) for p in patterns):
+        codes.append('suspicious_domain')
+    if any('phone' in str(i).lower() for i in indicators):
+        codes.append('no_calls')
+    return list(dict.fromkeys(codes))[:MAX_RECOMMENDATIONS]
+
+
+def summarize(risk_level, analysis_result):
+    """Summary column values for a scan"""
+    result = analysis_result if isinstance(analysis_result, dict) else {}
+    debug = result.get('debug_info')
+    debug = debug if isinstance(debug, dict) else {}
+    indicators = result.get('indicators') or []
+    subject, preview = debug.get('subject'), debug.get('preview')
+    return {
+        'summary_subject': subject[:SUBJECT_LENGTH] if isinstance(subject, str) else None,
+        'summary_preview': preview[:PREVIEW_LENGTH] if isinstance(preview, str) else None,
+        'summary_attachments': debug.get('attachments'),
+        'summary_indicators': [str(i) for i in indicators[:MAX_INDICATORS]],
+        'recommendation_codes': ','.join(recommendation_codes(risk_level, indicators, result.get('patterns'))),
+    }
+
+
+@event.listens_for(UserScan, 'before_insert')
+def _summarize_new_scan(mapper, connection, scan):
+    if scan.recommendation_codes is None:
+        for column, value in summarize(scan.risk_level, scan.analysis_result).items():
+            setattr(scan, column, value)
+
+
+def listing_query(model):
+    """Row query over ``model`` projecting only the columns history listings need"""
+    tier = 'archive' if model is UserScanArchive else 'hot'
+    return db.session.query(*[getattr(model, c) for c in LISTING_COLUMNS], literal(tier).label('tier'))
+
+
+def _unsummarized_values(scans):
+    """{id: summary values} for listed scans that predate the summary columns (one query per tier)"""
+    missing = {'hot': [], 'archive': []}
+    for scan in scans:
+        if scan.recommendation_codes is None:
+            missing[scan.tier].append(scan.id)
+    values = {}
+    if missing['hot']:
+        rows = db.session.query(UserScan.id, UserScan.risk_level, UserScan.analysis_result) \
+            .filter(UserScan.id.in_(missing['hot']))
+        for scan_id, risk_level, result in rows:
+            values[scan_id] = summarize(risk_level, result)
+    if missing['archive']:
+        rows = db.session.query(UserScanArchive.id, UserScanArchive.risk_level, UserScanArchive.payload) \
+            .filter(UserScanArchive.id.in_(missing['archive']))
+        for scan_id, risk_level, payload in rows:
+            values[scan_id] = summarize(risk_level, json.loads(zlib.decompress(payload)).get('analysis_result'))
+    return values
+
+
+def scan_summary_items(scans):
+    """History list entries for rows from ``listing_query``"""
+    fallback = _unsummarized_values(scans)
+    items = []
+    for scan in scans:
+        summary = fallback.get(scan.id) or {c: getattr(scan, c) for c in SUMMARY_COLUMNS}
+        codes = [c for c in (summary['recommendation_codes'] or '').split(',') if c in RECOMMENDATIONS]
+        items.append({
+            'id': scan.id,
+            'subject': summary['summary_subject'],
+            'preview': summary['summary_preview'],
+            'attachments': summary['summary_attachments'],
+            'risk_level': scan.risk_level,
+            'risk_score': scan.risk_score,
+            'indicators': summary['summary_indicators'] or [],
+            'recommendations': [RECOMMENDATIONS[c] for c in codes],
+            'scanned_at': scan.scanned_at.isoformat() if scan.scanned_at else None
+        })
+    return items
+
+
+def backfill_scan_summaries(batch_size=500):
+    """Fill summary columns for scans written before they existed. Returns the number updated."""
+    updated = 0
+    for model in (UserScan, UserScanArchive):
+        last_id = 0
+        while True:
+            if model is UserScan:
+                query = db.session.query(model.id, model.risk_level, model.analysis_result)
+            else:
+                query = db.session.query(model.id, model.risk_level, model.payload)
+            rows = query.filter(model.recommendation_codes.is_(None), model.id > last_id) \
+                .order_by(model.id).limit(batch_size).all()
+            if not rows:
+                break
+            params = []
+            for scan_id, risk_level, data in rows:
+                if model is UserScanArchive:
+                    data = json.loads(zlib.decompress(data)).get('analysis_result')
+                params.append({'id': scan_id, **summarize(risk_level, data)})
+            try:
+                db.session.execute(update(model), params)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+            updated += len(params)
+            last_id = rows[-1][0]
+            logger.info(f"Backfilled summaries for {updated} scans")
+    return updated
@@ -0,0 +1,371 @@
+"""
+Dashboard counters for /admin/stats, /community/stats and /community/my-stats.
+
+Counts come from one conditional-aggregation query per table (users, reports,
+and a user's own reports) and are kept in Redis hashes for a short TTL:
+
+  stats:users         total, status:<STATUS>, role:<ROLE>
+  stats:reports       total, status:<STATUS>, urgency:<URGENCY>
+  stats:user:<id>     total, status:<STATUS> for that user's reports
+
+A ``before_flush`` listener turns inserts, deletes and status/role/urgency
+changes on User and CommunityReport into counter deltas. They are applied
+with HINCRBY after the transaction commits, and only to hashes that already
+exist, so an expired hash is simply recounted on the next read. Bulk
+``Query.delete()`` calls bypass the listener; the TTL bounds that drift.
+Set-based report deletes in bulk_delete.py report theirs through
+``record_reports_deleted``.
+
+The "recent activity" lists are cached as a whole for the same TTL and are
+not invalidated on writes. Without Redis every read runs the aggregate
+queries directly.
+"""
+
+import logging
+
+from sqlalchemy import case, desc, event, func, inspect
+from sqlalchemy.orm import Session
+
+try:
+    from .cache import cache
+    from .models import db, User, CommunityReport
+except ImportError:
+    from cache import cache
+    from models import db, User, CommunityReport
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_TTL = 60
+USER_STATUSES = ('ACTIVE', 'SUSPENDED', 'BANNED', 'DELETED')
+USER_ROLES = ('USER', 'MODERATOR', 'ADMIN')
+REPORT_STATUSES = ('PENDING', 'APPROVED', 'VERIFIED', 'REJECTED', 'FLAGGED')
+REPORT_URGENCIES = ('LOW', 'MEDIUM', 'HIGH', 'CRITICAL')
+
+USERS_KEY = 'stats:users'
+REPORTS_KEY = 'stats:reports'
+ADMIN_ACTIVITY_KEY = 'stats:admin_activity'
+COMMUNITY_ACTIVITY_KEY = 'stats:community_activity'
+_PENDING = 'stats_pending'
+
+# HINCRBY only into a live snapshot; a missing hash is recounted on read
+_INCR_IF_EXISTS = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    for i = 1, #ARGV, 2 do
+        redis.call('HINCRBY', KEYS[1], ARGV[i], ARGV[i + 1])
+    end
+end
+"""
+_incr_script = None
+
+
+def user_reports_key(user_id):
+    return f"stats:user:{user_id}"
+
+
+def _conditional_counts(column, prefix, values):
+    return [func.sum(case((column == v, 1), else_=0)).label(f"{prefix}:{v}") for v in values]
+
+
+def _row_to_fields(row):
+    return {key: int(value or 0) for key, value in row._mapping.items()}
+
+
+def _count_users():
+    row = db.session.query(
+        func.count(User.id).label('total'),
+        *_conditional_counts(User.account_status, 'status', USER_STATUSES),
+        *_conditional_counts(User.role, 'role', USER_ROLES)
+    ).one()
+    return _row_to_fields(row)
+
+
+def _count_reports():
+    row = db.session.query(
+        func.count(CommunityReport.id).label('total'),
+        *_conditional_counts(CommunityReport.status, 'status', REPORT_STATUSES),
+        *_conditional_counts(CommunityReport.urgency, 'urgency', REPORT_URGENCIES)
+    ).one()
+    return _row_to_fields(row)
+
+
+def _count_user_reports(user_id):
+    row = db.session.query(
+        func.count(CommunityReport.id).label('total'),
+        *_conditional_counts(CommunityReport.status, 'status', REPORT_STATUSES)
+    ).filter(CommunityReport.user_id == user_id).one()
+    return _row_to_fields(row)
+
+
+def _snapshot(key, compute):
+    """Counter fields from the Redis hash, recounting and storing them on a miss"""
+    client = cache.redis_client
+    if client is not None:
+        try:
+            stored = client.hgetall(key)
+            if stored:
+                return {k.decode(): int(v) for k, v in stored.items()}
+        except Exception as e:
+            logger.warning(f"Stats snapshot read failed for {key}: {e}")
+            client = None
+    fields = compute()
+    if client is not None:
+        try:
+            pipe = client.pipeline(transaction=True)
+            pipe.delete(key)
+            pipe.hset(key, mapping=fields)
+            pipe.expire(key, SNAPSHOT_TTL)
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"Stats snapshot write failed for {key}: {e}")
+    return fields
+
+
+def _group(fields, prefix, values):
+    return {v: fields.get(f"{prefix}:{v}", 0) for v in values}
+
+
+def user_counts():
+    """{'total', 'status': {STATUS: n}, 'role': {ROLE: n}} over all users"""
+    fields = _snapshot(USERS_KEY, _count_users)
+    return {
+        'total': fields.get('total', 0),
+        'status': _group(fields, 'status', USER_STATUSES),
+        'role': _group(fields, 'role', USER_ROLES),
+    }
+
+
+def report_counts():
+    """{'total', 'status': {STATUS: n}, 'urgency': {URGENCY: n}} over all reports"""
+    fields = _snapshot(REPORTS_KEY, _count_reports)
+    return {
+        'total': fields.get('total', 0),
+        'status': _group(fields, 'status', REPORT_STATUSES),
+        'urgency': _group(fields, 'urgency', REPORT_URGENCIES),
+    }
+
+
+def user_report_counts(user_id):
+    """{'total', 'status': {STATUS: n}} over one user's reports"""
+    fields = _snapshot(user_reports_key(user_id), lambda: _count_user_reports(user_id))
+    return {
+        'total': fields.get('total', 0),
+        'status': _group(fields, 'status', REPORT_STATUSES),
+    }
+
+
+def _cached(key, compute):
+    value = cache.get(key)
+    if value is None:
+        value = compute()
+        cache.set(key, value, timeout=SNAPSHOT_TTL)
+    return value
+
+
+def admin_recent_activity(limit=5):
+    """Newest users and reports for the admin dashboard"""
+    def compute():
+        users = db.session.query(User.id, User.email, User.created_at).order_by(
+            User.created_at.desc()
+        ).limit(limit).all()
+        reports = db.session.query(
+            CommunityReport.id, CommunityReport.threat_type, CommunityReport.status, CommunityReport.created_at
+        ).order_by(CommunityReport.created_at.desc()).limit(limit).all()
+        return {
+            'new_users': [
+                {
+                    'id': u.id,
+                    'username': u.email.split('@')[0] if u.email else 'Unknown',
+                    'created_at': u.created_at.isoformat() if u.created_at else None
+                } for u in users
+            ],
+            'new_reports': [
+                {
+                    'id': r.id,
+                    'threat_type': r.threat_type,
+                    'status': r.status,
+                    'created_at': r.created_at.isoformat() if r.created_at else None
+                } for r in reports
+            ]
+        }
+    return _cached(f"{ADMIN_ACTIVITY_KEY}:{limit}", compute)
+
+
+def community_activity(top_limit=5, recent_limit=10):
+    """Top contributors and latest reports for the community stats page"""
+    def compute():
+        contributors = db.session.query(
+            User.id,
+            User.first_name,
+            User.last_name,
+            func.count(CommunityReport.id).label('report_count')
+        ).join(CommunityReport).group_by(
+            User.id, User.first_name, User.last_name
+        ).order_by(desc('report_count')).limit(top_limit).all()
+        recent = db.session.query(
+            CommunityReport.created_at,
+            CommunityReport.threat_type,
+            User.first_name,
+            User.last_name
+        ).join(User).order_by(CommunityReport.created_at.desc()).limit(recent_limit).all()
+        return {
+            'top_contributors': [
+                {
+                    'id': c.id,
+                    'name': f"{c.first_name} {c.last_name}".strip() or 'Anonymous',
+                    'report_count': c.report_count
+                } for c in contributors
+            ],
+            'recent_activity': [
+                {
+                    'date': a.created_at.strftime('%Y-%m-%d %H:%M'),
+                    'threat_type': a.threat_type,
+                    'reporter': f"{a.first_name} {a.last_name}".strip() or 'Anonymous'
+                } for a in recent
+            ]
+        }
+    return _cached(f"{COMMUNITY_ACTIVITY_KEY}:{top_limit}:{recent_limit}", compute)
+
+
+# --- incremental maintenance -------------------------------------------------
+
+def _user_fields(status, role):
+    fields = ['total']
+    if (status or 'ACTIVE') in USER_STATUSES:
+        fields.append(f"status:{status or 'ACTIVE'}")
+    if (role or 'USER') in USER_ROLES:
+        fields.append(f"role:{role or 'USER'}")
+    return fields
+
+
+def _report_fields(status, urgency=None, with_urgency=True):
+    fields = ['total']
+    if (status or 'PENDING') in REPORT_STATUSES:
+        fields.append(f"status:{status or 'PENDING'}")
+    if with_urgency and (urgency or 'MEDIUM') in REPORT_URGENCIES:
+        fields.append(f"urgency:{urgency or 'MEDIUM'}")
+    return fields
+
+
+def _previous(obj, attr):
+    """(changed, old value, history known) for a column on a dirty object"""
+    history = inspect(obj).attrs[attr].history
+    if not history.has_changes():
+        return False, None, True
+    if not history.deleted:
+        # The old value was never loaded, so the delta is unknown
+        return True, None, False
+    return True, history.deleted[0], True
+
+
+def _report_deltas(report, sign, deltas):
+    deltas.extend((REPORTS_KEY, f, sign) for f in _report_fields(report.status, report.urgency))
+    if report.user_id is not None:
+        deltas.extend((user_reports_key(report.user_id), f, sign)
+                      for f in _report_fields(report.status, with_urgency=False))
+
+
+@event.listens_for(Session, 'before_flush')
+def _collect_deltas(session, flush_context, instances):
+    if cache.redis_client is None:
+        return
+    deltas, invalidate = [], set()
+
+    for obj in session.new:
+        if isinstance(obj, User):
+            deltas.extend((USERS_KEY, f, 1) for f in _user_fields(obj.account_status, obj.role))
+        elif isinstance(obj, CommunityReport):
+            _report_deltas(obj, 1, deltas)
+
+    for obj in session.deleted:
+        if isinstance(obj, User):
+            deltas.extend((USERS_KEY, f, -1) for f in _user_fields(obj.account_status, obj.role))
+            invalidate.add(user_reports_key(obj.id))
+        elif isinstance(obj, CommunityReport):
+            _report_deltas(obj, -1, deltas)
+
+    for obj in session.dirty:
+        if isinstance(obj, User):
+            status_changed, old_status, status_known = _previous(obj, 'account_status')
+            role_changed, old_role, role_known = _previous(obj, 'role')
+            if not (status_changed or role_changed):
+                continue
+            if not (status_known and role_known):
+                invalidate.add(USERS_KEY)
+                continue
+            old = _user_fields(old_status if status_changed else obj.account_status,
+                               old_role if role_changed else obj.role)
+            new = _user_fields(obj.account_status, obj.role)
+            deltas.extend((USERS_KEY, f, -1) for f in old)
+            deltas.extend((USERS_KEY, f, 1) for f in new)
+        elif isinstance(obj, CommunityReport):
+            status_changed, old_status, status_known = _previous(obj, 'status')
+            urgency_changed, old_urgency, urgency_known = _previous(obj, 'urgency')
+            owner_changed, old_owner, owner_known = _previous(obj, 'user_id')
+            if not (status_changed or urgency_changed or owner_changed):
+                continue
+            if not (status_known and urgency_known and owner_known):
+                invalidate.update({REPORTS_KEY, user_reports_key(obj.user_id)})
+                if old_owner is not None:
+                    invalidate.add(user_reports_key(old_owner))
+                continue
+            before_status = old_status if status_changed else obj.status
+            before_urgency = old_urgency if urgency_changed else obj.urgency
+            before_owner = old_owner if owner_changed else obj.user_id
+            deltas.extend((REPORTS_KEY, f, -1) for f in _report_fields(before_status, before_urgency))
+            deltas.extend((REPORTS_KEY, f, 1) for f in _report_fields(obj.status, obj.urgency))
+            if before_owner is not None:
+                deltas.extend((user_reports_key(before_owner), f, -1)
+                              for f in _report_fields(before_status, with_urgency=False))
+            if obj.user_id is not None:
+                deltas.extend((user_reports_key(obj.user_id), f, 1)
+                              for f in _report_fields(obj.status, with_urgency=False))
+
+    if deltas or invalidate:
+        pending = session.info.setdefault(_PENDING, {'deltas': [], 'invalidate': set()})
+        pending['deltas'].extend(deltas)
+        pending['invalidate'].update(invalidate)
+
+
+def record_reports_deleted(reports):
+    """Queue counter deltas for reports removed with Core DELETEs (rows with
+    status, urgency and user_id); applied after commit like the listener's"""
+    if cache.redis_client is None or not reports:
+        return
+    deltas = []
+    for report in reports:
+        _report_deltas(report, -1, deltas)
+    pending = db.session.info.setdefault(_PENDING, {'deltas': [], 'invalidate': set()})
+    pending['deltas'].extend(deltas)
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply_deltas(session):
+    global _incr_script
+    pending = session.info.pop(_PENDING, None)
+    client = cache.redis_client
+    if not pending or client is None:
+        return
+
+    per_key = {}
+    for key, field, delta in pending['deltas']:
+        fields = per_key.setdefault(key, {})
+        fields[field] = fields.get(field, 0) + delta
+    try:
+        if _incr_script is None:
+            _incr_script = client.register_script(_INCR_IF_EXISTS)
+        pipe = client.pipeline(transaction=False)
+        for key, fields in per_key.items():
+            args = [x for field, delta in fields.items() if delta for x in (field, delta)]
+            if args and key not in pending['invalidate']:
+                _incr_script(keys=[key], args=args, client=pipe)
+        for key in pending['invalidate']:
+            pipe.delete(key)
+        pipe.execute()
+    except Exception as e:
+        # Counters may now be off until their snapshot expires
+        logger.error(f"Failed to apply stats deltas: {e}")
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_deltas(session):
+    session.info.pop(_PENDING, None)
@@ -0,0 +1,278 @@
+"""
+Refresh-token families: rotation with reuse detection, and revocation.
+
+Every sign-in starts a token family (a ``token_families`` row). The family's
+id travels as ``fid`` in its access and refresh tokens, and the row records
+the ``jti`` of the one refresh token that may still be used. ``/refresh``
+swaps that jti for a new one in a single conditional UPDATE, so of two
+requests presenting the same refresh token only one can succeed. A refresh
+token that was already rotated away being presented again means it was
+copied; the whole family is revoked, which signs out both the thief and the
+legitimate client.
+
+Refresh requests always consult the database. Access tokens are checked on
+every authenticated request, so that check must not cost a round trip:
+revoked family ids are held in a dict in each process and looked up in
+O(1). Revocations are published to a Redis sorted set
+(``auth:revoked_families``, scored by revocation time) after their
+transaction commits, and a background thread in each process pulls new
+entries every ``TOKEN_REVOCATION_SYNC_SECONDS``. Without Redis the same
+incremental pull reads recently revoked rows from the database. A family
+needs to stay in the set only as long as an access token issued before its
+revocation can live (``ACCESS_TOKEN_LIFETIME``), so the set stays small.
+Revocations made in this process apply immediately; others within the sync
+interval.
+
+Refresh tokens issued before families existed carry no ``fid``. The first
+one presented starts a family whose id is a hash of the token, so the same
+token can never start a second one: presenting it again is reuse.
+"""
+
+import hashlib
+import logging
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import create_engine, event, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+try:
+    from .models import db, TokenFamily
+    from .cache import cache
+except ImportError:
+    from models import db, TokenFamily
+    from cache import cache
+
+logger = logging.getLogger(__name__)
+
+ACCESS_TOKEN_LIFETIME = timedelta(hours=1)
+REFRESH_TOKEN_LIFETIME = timedelta(days=30)
+REVOKED_KEY = 'auth:revoked_families'
+# Re-read this much before the last sync, for revocations committed out of timestamp order
+SYNC_OVERLAP_SECONDS = 5
+_REVOKED_IN_SESSION = 'revoked_families'
+
+# fid -> time.time() after which tokens of the family have all expired anyway
+_revoked = {}
+# Revocation time (epoch seconds) up to which revocations have been pulled
+_synced_until = None
+_sync_lock = threading.Lock()
+_poller_pid = None
+_poller_lock = threading.Lock()
+_engine = None
+_engine_pid = None
+
+
+class RefreshTokenError(Exception):
+    """A refresh token can't be exchanged; the message is safe to return to the client"""
+
+
+def _new_id():
+    return uuid.uuid4().hex
+
+
+def start_family(user_id):
+    """Record a new sign-in. Returns (fid, jti) for its first refresh token. Commits."""
+    fid, jti = _new_id(), _new_id()
+    db.session.execute(TokenFamily.__table__.insert().values(
+        id=fid, user_id=user_id, current_jti=jti, created_at=datetime.utcnow(),
+        expires_at=datetime.utcnow() + REFRESH_TOKEN_LIFETIME,
+    ))
+    db.session.commit()
+    return fid, jti
+
+
+def start_legacy_family(user_id, token):
+    """Start the family of a refresh token issued before families existed.
+
+    Returns (fid, jti) like start_family. The family id is derived from the
+    token, so a second use of it is refused as reuse. Commits.
+    """
+    fid, jti = hashlib.sha256(token.encode()).hexdigest()[:32], _new_id()
+    try:
+        db.session.execute(TokenFamily.__table__.insert().values(
+            id=fid, user_id=user_id, current_jti=jti, created_at=datetime.utcnow(),
+            expires_at=datetime.utcnow() + REFRESH_TOKEN_LIFETIME,
+        ))
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        _refuse(fid, datetime.utcnow())
+    return fid, jti
+
+
+def rotate(fid, jti):
+    """Exchange refresh token `jti` of family `fid` for a new jti. Commits.
+
+    Raises RefreshTokenError if the family is unknown, expired or revoked, or
+    if `jti` was already rotated away (the family is then revoked).
+    """
+    now = datetime.utcnow()
+    new_jti = _new_id()
+    rotated = db.session.execute(
+        update(TokenFamily)
+        .where(TokenFamily.id == fid, TokenFamily.current_jti == jti,
+               TokenFamily.revoked_at.is_(None), TokenFamily.expires_at > now)
+        .values(current_jti=new_jti, rotated_at=now, expires_at=now + REFRESH_TOKEN_LIFETIME)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.session.commit()
+    if rotated:
+        return new_jti
+    _refuse(fid, now)
+
+
+def _refuse(fid, now):
+    """Raise why family `fid` can't be refreshed; a spent token revokes the family"""
+    family = db.session.get(TokenFamily, fid)
+    if family is None or family.expires_at <= now:
+        raise RefreshTokenError('Invalid refresh token')
+    if family.revoked_at is not None:
+        raise RefreshTokenError('Refresh token has been revoked')
+    logger.warning(f"Refresh token reuse for user {family.user_id}; revoking token family")
+    revoke_family(fid, 'reuse')
+    db.session.commit()
+    raise RefreshTokenError('Refresh token reuse detected')
+
+
+def _revoke(condition, reason):
+    fids = db.session.scalars(select(TokenFamily.id).where(condition, TokenFamily.revoked_at.is_(None))).all()
+    if fids:
+        db.session.execute(
+            update(TokenFamily).where(TokenFamily.id.in_(fids))
+            .values(revoked_at=datetime.utcnow(), revoked_reason=reason)
+            .execution_options(synchronize_session=False)
+        )
+        db.session.info.setdefault(_REVOKED_IN_SESSION, set()).update(fids)
+    return len(fids)
+
+
+def revoke_family(fid, reason):
+    """Revoke one sign-in's tokens. Takes effect when the caller commits."""
+    return _revoke(TokenFamily.id == fid, reason)
+
+
+def revoke_user(user_id, reason, keep=None):
+    """Revoke every sign-in of a user, except family `keep`. Takes effect when the caller commits."""
+    condition = TokenFamily.user_id == user_id
+    if keep:
+        condition = condition & (TokenFamily.id != keep)
+    return _revoke(condition, reason)
+
+
+def purge_expired_families():
+    """Delete families whose refresh token has expired. Commits."""
+    removed = db.session.execute(
+        TokenFamily.__table__.delete().where(TokenFamily.expires_at < datetime.utcnow())
+    ).rowcount
+    db.session.commit()
+    return removed
+
+
+# --- revocation checks ----------------------------------------------------------------
+
+def _remember(fid, revoked_at):
+    expires = revoked_at + ACCESS_TOKEN_LIFETIME.total_seconds()
+    if expires > time.time():
+        _revoked[fid] = max(_revoked.get(fid, 0), expires)
+
+
+def _publish(fids):
+    now = time.time()
+    for fid in fids:
+        _remember(fid, now)
+    if cache.redis_client is None:
+        return
+    try:
+        pipe = cache.redis_client.pipeline(transaction=False)
+        pipe.zadd(REVOKED_KEY, {fid: now for fid in fids})
+        pipe.zremrangebyscore(REVOKED_KEY, '-inf', now - ACCESS_TOKEN_LIFETIME.total_seconds())
+        pipe.execute()
+    except Exception as e:
+        # The refresh token is still refused (that check reads the database), but other
+        # processes keep accepting the family's access tokens until they expire
+        logger.error(f"Could not publish token revocation: {e}")
+
+
+def _poll_engine():
+    """A one-connection engine of this process for the database pull, so the poller never
+    waits for (or holds) a connection of the request pool"""
+    global _engine, _engine_pid
+    if _engine is None or _engine_pid != os.getpid():
+        if _engine is not None:
+            _engine.dispose(close=False)
+        _engine = create_engine(db.engine.url, pool_size=1, max_overflow=0, pool_pre_ping=True)
+        _engine_pid = os.getpid()
+    return _engine
+
+
+def _pull(since):
+    """[(fid, revoked_at epoch seconds)] revoked at or after `since`"""
+    if cache.redis_client is not None:
+        return cache.redis_client.zrangebyscore(REVOKED_KEY, since, '+inf', withscores=True)
+    with _poll_engine().connect() as conn:
+        rows = conn.execute(
+            select(TokenFamily.id, TokenFamily.revoked_at)
+            .where(TokenFamily.revoked_at >= datetime.utcfromtimestamp(since))
+        ).all()
+    return [(fid, (revoked_at - datetime(1970, 1, 1)).total_seconds()) for fid, revoked_at in rows]
+
+
+def sync_revocations():
+    """Pull revocations made by other processes into this process's set. Never raises."""
+    global _synced_until
+    with _sync_lock:
+        try:
+            now = time.time()
+            since = (now - ACCESS_TOKEN_LIFETIME.total_seconds() if _synced_until is None
+                     else _synced_until - SYNC_OVERLAP_SECONDS)
+            for fid, revoked_at in _pull(since):
+                _remember(fid.decode() if isinstance(fid, bytes) else fid, revoked_at)
+            for fid in [fid for fid, expires in _revoked.items() if expires <= now]:
+                del _revoked[fid]
+            _synced_until = now
+        except Exception as e:
+            logger.warning(f"Could not sync token revocations: {e}")
+
+
+def _run_poller(app):
+    with app.app_context():
+        while True:
+            sync_revocations()
+            time.sleep(float(app.config.get('TOKEN_REVOCATION_SYNC_SECONDS', 1)))
+
+
+def start_revocation_sync(app=None):
+    """Start this process's revocation poller, if not running (threads don't survive a fork)"""
+    global _poller_pid
+    app = app or current_app._get_current_object()
+    with _poller_lock:
+        if _poller_pid == os.getpid():
+            return False
+        _poller_pid = os.getpid()
+    threading.Thread(target=_run_poller, args=(app,), daemon=True, name='token-revocations').start()
+    return True
+
+
+def is_revoked(fid):
+    """Whether tokens of family `fid` have been revoked: a set lookup, no round trip"""
+    if _poller_pid != os.getpid():
+        start_revocation_sync()
+    return fid in _revoked
+
+
+@event.listens_for(Session, 'after_commit')
+def _publish_revocations(session):
+    fids = session.info.pop(_REVOKED_IN_SESSION, None)
+    if fids:
+        _publish(fids)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_revocations(session):
+    session.info.pop(_REVOKED_IN_SESSION, None)
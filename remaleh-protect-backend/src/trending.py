@@ -0,0 +1,262 @@
+"""
+Trending threats from incrementally maintained time buckets.
+
+Every trend-eligible community report (status PENDING, APPROVED or VERIFIED)
+is counted in ``report_trend_buckets`` twice: in the UTC hour and the UTC day
+it was created, keyed by threat type and urgency. Counters move when reports
+are created, moderated into or out of an eligible status, or deleted, so
+``/community/trending`` reads a few hundred bucket rows instead of scanning
+``community_reports``.
+
+Velocity compares the last 7 days with the 7 days before, and the last 24
+hours with the 24 hours before.
+"""
+
+import logging
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete
+
+try:
+    from .models import db, CommunityReport, ReportTrendBucket
+    from .database import upsert_increment
+    from .cache import cache
+except ImportError:
+    from models import db, CommunityReport, ReportTrendBucket
+    from database import upsert_increment
+    from cache import cache
+
+logger = logging.getLogger(__name__)
+
+TRENDING_STATUSES = ('PENDING', 'VERIFIED', 'APPROVED')
+URGENCY_WEIGHTS = {'HIGH': 3, 'MEDIUM': 2, 'LOW': 1}
+
+HOURLY_RETENTION = timedelta(days=3)
+DAILY_RETENTION = timedelta(days=60)
+TRENDING_WINDOW_DAYS = 30
+VELOCITY_WINDOW_DAYS = 7
+TRENDING_CACHE_KEY = 'community:trending'
+TRENDING_CACHE_TTL = 60
+
+# Hour in which this process last pruned expired buckets
+_last_pruned_hour = None
+
+
+def _hour_start(ts):
+    return ts.replace(minute=0, second=0, microsecond=0)
+
+
+def _day_start(ts):
+    return ts.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _counted(status):
+    return status in TRENDING_STATUSES
+
+
+def _bucket_keys(report, now):
+    """Primary keys of the hour and day buckets still holding `report`"""
+    created = report.created_at or now
+    keys = {'threat_type': report.threat_type, 'urgency': report.urgency or ''}
+    buckets = []
+    if created >= _hour_start(now) - HOURLY_RETENTION:
+        buckets.append({'granularity': 'hour', 'bucket_start': _hour_start(created), **keys})
+    if created >= _day_start(now) - DAILY_RETENTION:
+        buckets.append({'granularity': 'day', 'bucket_start': _day_start(created), **keys})
+    return buckets
+
+
+def _bump(report, delta, now=None):
+    for keys in _bucket_keys(report, now or datetime.utcnow()):
+        upsert_increment(db.session, ReportTrendBucket, keys, {'report_count': delta})
+
+
+def report_created(report):
+    """Count a newly created report (call after flush so created_at is set)"""
+    if _counted(report.status or 'PENDING'):
+        _bump(report, 1)
+
+
+def report_status_changed(report, previous_status):
+    """Move a report into or out of the trend counters after a moderation decision"""
+    was, now = _counted(previous_status), _counted(report.status)
+    if was != now:
+        _bump(report, 1 if now else -1)
+
+
+def report_deleted(report):
+    if _counted(report.status):
+        _bump(report, -1)
+
+
+def reports_deleted(reports):
+    """Uncount reports removed in bulk (rows with status, created_at, threat_type
+    and urgency), with one upsert per affected bucket"""
+    now = datetime.utcnow()
+    deltas = {}
+    for report in reports:
+        if not _counted(report.status):
+            continue
+        for keys in _bucket_keys(report, now):
+            key = tuple(sorted(keys.items()))
+            deltas[key] = deltas.get(key, 0) - 1
+    for key, delta in deltas.items():
+        upsert_increment(db.session, ReportTrendBucket, dict(key), {'report_count': delta})
+
+
+def _velocity(current, previous):
+    return round((current - previous) / max(previous, 1), 2)
+
+
+def _trend_label(current, previous):
+    if current < 3 and previous < 3:
+        return '📉 Low'
+    velocity = _velocity(current, previous)
+    if velocity >= 1.0 and current >= 5:
+        return '🔥 Surging'
+    if velocity >= 0.25:
+        return '📈 Rising'
+    if velocity <= -0.25:
+        return '📉 Falling'
+    return '📊 Stable'
+
+
+def compute_trending(limit=10, now=None):
+    """Aggregate the bucket rows into the /community/trending payload"""
+    now = now or datetime.utcnow()
+    today = _day_start(now)
+    window_start = today - timedelta(days=TRENDING_WINDOW_DAYS - 1)
+    current_start = today - timedelta(days=VELOCITY_WINDOW_DAYS - 1)
+    previous_start = current_start - timedelta(days=VELOCITY_WINDOW_DAYS)
+    hour = _hour_start(now)
+    # Hour buckets are labelled by their start, so the last 24h is the current hour and the 23 before it
+    day_ago = hour - timedelta(hours=23)
+    two_days_ago = day_ago - timedelta(hours=24)
+
+    stats = {}
+
+    def entry(threat_type):
+        return stats.setdefault(threat_type, {
+            'count': 0, 'weighted': 0, 'weighted_count': 0,
+            'current': 0, 'previous': 0, 'last_24h': 0, 'previous_24h': 0
+        })
+
+    daily = ReportTrendBucket.query.filter(
+        ReportTrendBucket.granularity == 'day',
+        ReportTrendBucket.bucket_start >= min(window_start, previous_start)
+    ).all()
+    for b in daily:
+        e = entry(b.threat_type)
+        n = b.report_count or 0
+        if b.bucket_start >= window_start:
+            e['count'] += n
+            weight = URGENCY_WEIGHTS.get(b.urgency)
+            if weight:
+                e['weighted'] += weight * n
+                e['weighted_count'] += n
+        if b.bucket_start >= current_start:
+            e['current'] += n
+        elif b.bucket_start >= previous_start:
+            e['previous'] += n
+
+    hourly = ReportTrendBucket.query.filter(
+        ReportTrendBucket.granularity == 'hour',
+        ReportTrendBucket.bucket_start >= two_days_ago
+    ).all()
+    for b in hourly:
+        e = entry(b.threat_type)
+        if b.bucket_start >= day_ago:
+            e['last_24h'] += b.report_count or 0
+        else:
+            e['previous_24h'] += b.report_count or 0
+
+    ranked = sorted(
+        ((t, e) for t, e in stats.items() if e['count'] > 0),
+        key=lambda item: (-item[1]['count'], -item[1]['current'], item[0])
+    )[:limit]
+
+    return [{
+        'threat_type': threat_type,
+        'report_count': e['count'],
+        'urgency_score': round(e['weighted'] / e['weighted_count'], 1) if e['weighted_count'] else 0,
+        'trend': _trend_label(e['current'], e['previous']),
+        'velocity': _velocity(e['current'], e['previous']),
+        'count_7d': e['current'],
+        'count_prev_7d': e['previous'],
+        'count_24h': e['last_24h'],
+        'count_prev_24h': e['previous_24h'],
+    } for threat_type, e in ranked]
+
+
+def get_trending(limit=10):
+    """Cached trending payload (short TTL; counters are always current)"""
+    global _last_pruned_hour
+    key = f"{TRENDING_CACHE_KEY}:{limit}"
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+    hour = _hour_start(datetime.utcnow())
+    if _last_pruned_hour != hour:
+        prune_trend_buckets()
+        _last_pruned_hour = hour
+    result = compute_trending(limit)
+    cache.set(key, result, timeout=TRENDING_CACHE_TTL)
+    return result
+
+
+def prune_trend_buckets(now=None):
+    """Drop buckets past their retention. Returns rows removed.
+
+    Commits on a connection of its own, so the caller's session (a read-only
+    request in get_trending) is left alone.
+    """
+    now = now or datetime.utcnow()
+    buckets = ReportTrendBucket.__table__
+    with db.engine.begin() as conn:
+        removed = conn.execute(delete(buckets).where(
+            buckets.c.granularity == 'hour',
+            buckets.c.bucket_start < _hour_start(now) - HOURLY_RETENTION
+        )).rowcount
+        removed += conn.execute(delete(buckets).where(
+            buckets.c.granularity == 'day',
+            buckets.c.bucket_start < _day_start(now) - DAILY_RETENTION
+        )).rowcount
+    return removed
+
+
+def rebuild_trend_buckets(now=None):
+    """Recount every bucket inside the retention windows from community_reports. Commits."""
+    now = now or datetime.utcnow()
+    since = _day_start(now) - DAILY_RETENTION
+    hourly_since = _hour_start(now) - HOURLY_RETENTION
+    counts = {}
+    rows = db.session.query(
+        CommunityReport.created_at, CommunityReport.threat_type, CommunityReport.urgency
+    ).filter(
+        CommunityReport.created_at >= since,
+        CommunityReport.status.in_(TRENDING_STATUSES)
+    ).yield_per(5000)
+    for created, threat_type, urgency in rows:
+        keys = [('day', _day_start(created))]
+        if created >= hourly_since:
+            keys.append(('hour', _hour_start(created)))
+        for granularity, start in keys:
+            k = (granularity, start, threat_type, urgency or '')
+            counts[k] = counts.get(k, 0) + 1
+
+    ReportTrendBucket.query.delete(synchronize_session=False)
+    db.session.bulk_insert_mappings(ReportTrendBucket, [
+        {'granularity': g, 'bucket_start': start, 'threat_type': t, 'urgency': u, 'report_count': n}
+        for (g, start, t, u), n in counts.items()
+    ])
+    db.session.commit()
+    cache.clear_pattern(f"{TRENDING_CACHE_KEY}:*")
+    return len(counts)
+
+
+def ensure_trend_buckets():
+    """Build the buckets on first start after they were introduced"""
+    has_reports = db.session.query(CommunityReport.id).limit(1).first() is not None
+    has_buckets = db.session.query(ReportTrendBucket.granularity).limit(1).first() is not None
+    if has_reports and not has_buckets:
+        logger.info(f"Built {rebuild_trend_buckets()} trend buckets")
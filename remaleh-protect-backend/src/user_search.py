@@ -0,0 +1,151 @@
+"""
+Indexed admin search over user email and name.
+
+Every whitespace-separated term must match the start (``match=prefix``) or
+any part (``match=contains``) of the email, first name or last name.
+
+PostgreSQL
+  prefix    ``lower(col) LIKE 'term%'`` on ``text_pattern_ops`` expression indexes
+  contains  ``lower(col) LIKE '%term%'`` on ``pg_trgm`` GIN expression indexes
+
+SQLite
+  prefix    ``col LIKE 'term%'`` on ``COLLATE NOCASE`` indexes (SQLite's LIKE
+            optimisation; LIKE is case-insensitive by default)
+  contains  an FTS5 ``trigram`` table, ``users_search``, kept in sync with
+            ``users`` by triggers
+
+Trigrams need at least three characters. Shorter terms, and databases
+without these indexes, fall back to an unindexed LIKE.
+"""
+
+import logging
+
+from sqlalchemy import func, or_, text
+
+try:
+    from .models import db, User
+except ImportError:
+    from models import db, User
+
+logger = logging.getLogger(__name__)
+
+SEARCH_COLUMNS = ('email', 'first_name', 'last_name')
+MATCH_MODES = ('prefix', 'contains')
+TRIGRAM_MIN_LENGTH = 3
+
+# Whether the SQLite FTS5 trigram table exists in this process's database
+_sqlite_fts_ready = False
+
+_SQLITE_FTS_TRIGGERS = (
+    """
+    CREATE TRIGGER IF NOT EXISTS users_search_ai AFTER INSERT ON users BEGIN
+        INSERT INTO users_search(rowid, email, first_name, last_name)
+        VALUES (new.id, new.email, new.first_name, new.last_name);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS users_search_ad AFTER DELETE ON users BEGIN
+        INSERT INTO users_search(users_search, rowid, email, first_name, last_name)
+        VALUES ('delete', old.id, old.email, old.first_name, old.last_name);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS users_search_au AFTER UPDATE OF email, first_name, last_name ON users BEGIN
+        INSERT INTO users_search(users_search, rowid, email, first_name, last_name)
+        VALUES ('delete', old.id, old.email, old.first_name, old.last_name);
+        INSERT INTO users_search(rowid, email, first_name, last_name)
+        VALUES (new.id, new.email, new.first_name, new.last_name);
+    END
+    """,
+)
+
+
+def _ensure_postgres(conn):
+    for col in SEARCH_COLUMNS:
+        conn.execute(text(
+            f"CREATE INDEX IF NOT EXISTS idx_users_{col}_prefix ON users (lower({col}) text_pattern_ops)"
+        ))
+    try:
+        with conn.begin_nested():
+            conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+    except Exception as e:
+        # Needs a privileged role; substring search then scans
+        logger.warning(f"pg_trgm unavailable, substring user search will not be indexed: {e}")
+        return
+    for col in SEARCH_COLUMNS:
+        conn.execute(text(
+            f"CREATE INDEX IF NOT EXISTS idx_users_{col}_trgm ON users USING gin (lower({col}) gin_trgm_ops)"
+        ))
+
+
+def _ensure_sqlite(conn):
+    global _sqlite_fts_ready
+    for col in SEARCH_COLUMNS:
+        conn.execute(text(f"CREATE INDEX IF NOT EXISTS idx_users_{col}_nocase ON users ({col} COLLATE NOCASE)"))
+    exists = conn.execute(text(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'users_search'"
+    )).first() is not None
+    try:
+        with conn.begin_nested():
+            conn.execute(text(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS users_search USING fts5("
+                "email, first_name, last_name, content='users', content_rowid='id', tokenize='trigram')"
+            ))
+            for trigger in _SQLITE_FTS_TRIGGERS:
+                conn.execute(text(trigger))
+            if not exists:
+                conn.execute(text("INSERT INTO users_search(users_search) VALUES ('rebuild')"))
+    except Exception as e:
+        # SQLite older than 3.34 has no trigram tokenizer
+        logger.warning(f"FTS5 trigram unavailable, substring user search will not be indexed: {e}")
+        return
+    _sqlite_fts_ready = True
+
+
+def ensure_user_search_indexes():
+    """Create the search indexes for the current database (idempotent)"""
+    dialect = db.engine.dialect.name
+    with db.engine.connect() as conn:
+        if dialect == 'postgresql':
+            _ensure_postgres(conn)
+        elif dialect == 'sqlite':
+            _ensure_sqlite(conn)
+        conn.commit()
+
+
+def _escape_like(term):
+    return term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def _fts_phrase(term):
+    return '"' + term.replace('"', '""') + '"'
+
+
+def apply_user_search(query, search, match='prefix'):
+    """Filter a User query so every term in ``search`` matches email or name"""
+    terms = (search or '').lower().split()
+    if not terms:
+        return query
+    dialect = db.engine.dialect.name
+    columns = [getattr(User, col) for col in SEARCH_COLUMNS]
+
+    if match == 'contains' and dialect == 'sqlite' and _sqlite_fts_ready:
+        indexed = [t for t in terms if len(t) >= TRIGRAM_MIN_LENGTH]
+        if indexed:
+            query = query.filter(User.id.in_(
+                text("SELECT rowid FROM users_search WHERE users_search MATCH :search_phrase")
+                .bindparams(search_phrase=' AND '.join(_fts_phrase(t) for t in indexed))
+                .columns(rowid=db.Integer)
+            ))
+        terms = [t for t in terms if len(t) < TRIGRAM_MIN_LENGTH]
+
+    for term in terms:
+        pattern = _escape_like(term) + '%'
+        if match == 'contains':
+            pattern = '%' + pattern
+        if dialect == 'sqlite':
+            # Bare columns so the NOCASE indexes apply
+            query = query.filter(or_(*[c.like(pattern, escape='\\') for c in columns]))
+        else:
+            query = query.filter(or_(*[func.lower(c).like(pattern, escape='\\') for c in columns]))
+    return query
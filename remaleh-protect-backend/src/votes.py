@@ -0,0 +1,276 @@
+"""
+Atomic voting on community reports.
+
+A vote is one row per (report_id, user_id). ``cast_vote`` changes it with
+statements that are each atomic on their own, and derives the counter deltas
+from the rows they actually changed:
+
+  DELETE ... WHERE vote_type = :same       clicking the same button removes the vote
+  UPDATE ... WHERE vote_type <> :new       switching between up and down
+  INSERT ... ON CONFLICT DO NOTHING        a new vote (the upsert)
+
+The counters are then moved with a single ``UPDATE community_reports SET
+votes_up = votes_up + :du, ...``. Nothing is read and written back in Python,
+so concurrent votes never lose an update.
+
+Hot reports can optionally buffer their counter deltas in Redis
+(``VOTE_BUFFER_ENABLED``). A report counts as hot once it takes more than
+``VOTE_BUFFER_HOT_VOTES_PER_MINUTE`` votes in a minute. Its deltas are added
+to the ``votes:pending`` hash after commit. At most once per
+``VOTE_BUFFER_FLUSH_INTERVAL_MS`` one worker moves the hash aside and writes
+it back with one UPDATE per report. Flushes are attempted after each vote and
+on each feed read. The vote rows themselves are always written to the
+database straight away.
+
+A flush can outlive its interval, and the next flusher then finds the same
+batch. Each batch is given a random id when it is moved aside, and the id is
+inserted into ``vote_flush_batches`` in the same transaction as the deltas.
+A batch whose id is already there has been applied and is only removed from
+Redis, and only by its id, so a newer batch is never dropped.
+"""
+
+import logging
+import uuid
+from datetime import datetime, timedelta
+
+import redis
+from flask import current_app
+from sqlalchemy import event, func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+try:
+    from .models import db, CommunityReport, ReportVote, VoteFlushBatch
+    from .cache import cache
+except ImportError:
+    from models import db, CommunityReport, ReportVote, VoteFlushBatch
+    from cache import cache
+
+logger = logging.getLogger(__name__)
+
+PENDING_KEY = 'votes:pending'
+FLUSHING_KEY = 'votes:flushing'
+FLUSH_LOCK_KEY = 'votes:flush_lock'
+# Field of the batch hash holding the batch's id
+BATCH_FIELD = '_batch'
+# Applied batch ids are kept long enough to outlast any flush still holding one
+BATCH_RETENTION = timedelta(days=1)
+_PENDING = 'votes_pending'
+
+# Delete the batch hash only if it is still the batch with this id
+_DELETE_BATCH = """
+if redis.call('HGET', KEYS[1], ARGV[1]) == ARGV[2] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+_delete_batch_script = None
+
+
+def _vote_insert(values):
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        try:
+            with db.session.begin_nested():
+                db.session.execute(ReportVote.__table__.insert().values(**values))
+            return 1
+        except IntegrityError:
+            return 0
+    stmt = insert(ReportVote.__table__).values(**values).on_conflict_do_nothing(
+        index_elements=['report_id', 'user_id']
+    )
+    return db.session.execute(stmt).rowcount
+
+
+def apply_vote_counts(report_id, up_delta, down_delta):
+    """Move a report's counters (and the stored score) server-side"""
+    if not (up_delta or down_delta):
+        return
+    db.session.execute(
+        CommunityReport.__table__.update()
+        .where(CommunityReport.id == report_id)
+        .values(
+            votes_up=func.coalesce(CommunityReport.votes_up, 0) + up_delta,
+            votes_down=func.coalesce(CommunityReport.votes_down, 0) + down_delta,
+            score=func.coalesce(CommunityReport.score, 0) + (up_delta - down_delta),
+        )
+    )
+
+
+def _apply_change(user_id, report_id, vote_type):
+    """Change the user's vote row. Returns (up_delta, down_delta, resulting vote or None)."""
+    other = 'down' if vote_type == 'up' else 'up'
+    sign = {'up': (1, 0), 'down': (0, 1)}
+    votes = ReportVote.__table__
+
+    removed = db.session.execute(votes.delete().where(
+        votes.c.report_id == report_id, votes.c.user_id == user_id, votes.c.vote_type == vote_type
+    )).rowcount
+    if removed:
+        du, dd = sign[vote_type]
+        return -du, -dd, None
+
+    switched = db.session.execute(votes.update().where(
+        votes.c.report_id == report_id, votes.c.user_id == user_id, votes.c.vote_type == other
+    ).values(vote_type=vote_type)).rowcount
+    if switched:
+        (nu, nd), (ou, od) = sign[vote_type], sign[other]
+        return nu - ou, nd - od, vote_type
+
+    inserted = _vote_insert({
+        'report_id': report_id, 'user_id': user_id, 'vote_type': vote_type, 'created_at': datetime.utcnow()
+    })
+    if inserted:
+        du, dd = sign[vote_type]
+        return du, dd, vote_type
+    # A concurrent request from the same user inserted the same vote first
+    return 0, 0, vote_type
+
+
+def _buffer_enabled():
+    return bool(current_app.config.get('VOTE_BUFFER_ENABLED')) and cache.redis_client is not None
+
+
+def _is_hot(report_id):
+    """Count this vote towards the report's per-minute rate; True once it is hot"""
+    key = f"votes:rate:{report_id}:{datetime.utcnow().strftime('%Y%m%d%H%M')}"
+    try:
+        pipe = cache.redis_client.pipeline(transaction=False)
+        pipe.incr(key)
+        pipe.expire(key, 120)
+        rate = pipe.execute()[0]
+    except Exception as e:
+        logger.warning(f"Vote rate check failed: {e}")
+        return False
+    return int(rate) > current_app.config.get('VOTE_BUFFER_HOT_VOTES_PER_MINUTE', 30)
+
+
+def cast_vote(user_id, report_id, vote_type):
+    """Record an up/down vote (toggling off a repeated one). Caller commits.
+    Returns the user's vote after the change, or None if it was removed.
+    """
+    up_delta, down_delta, current = _apply_change(user_id, report_id, vote_type)
+    if (up_delta or down_delta) and _buffer_enabled() and _is_hot(report_id):
+        pending = db.session.info.setdefault(_PENDING, {})
+        du, dd = pending.get(report_id, (0, 0))
+        pending[report_id] = (du + up_delta, dd + down_delta)
+    else:
+        apply_vote_counts(report_id, up_delta, down_delta)
+    return current
+
+
+@event.listens_for(Session, 'after_commit')
+def _buffer_pending(session):
+    pending = session.info.pop(_PENDING, None)
+    if not pending or cache.redis_client is None:
+        return
+    try:
+        pipe = cache.redis_client.pipeline(transaction=False)
+        for report_id, (du, dd) in pending.items():
+            if du:
+                pipe.hincrby(PENDING_KEY, f"{report_id}:up", du)
+            if dd:
+                pipe.hincrby(PENDING_KEY, f"{report_id}:down", dd)
+        pipe.execute()
+    except Exception as e:
+        # The vote rows are committed, so the counters now trail report_votes by these deltas
+        logger.error(f"Failed to buffer vote counts: {e}")
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_pending(session):
+    session.info.pop(_PENDING, None)
+
+
+def pending_vote_counts(report_ids):
+    """{report_id: (up, down)} still buffered in Redis for these reports"""
+    if not report_ids or not _buffer_enabled():
+        return {}
+    client = cache.redis_client
+    fields = [f"{rid}:{kind}" for rid in report_ids for kind in ('up', 'down')]
+    try:
+        pipe = client.pipeline(transaction=False)
+        pipe.hmget(PENDING_KEY, fields)
+        pipe.hmget(FLUSHING_KEY, fields)
+        waiting, flushing = pipe.execute()
+    except Exception as e:
+        logger.warning(f"Could not read buffered vote counts: {e}")
+        return {}
+    values = [int(a or 0) + int(b or 0) for a, b in zip(waiting, flushing)]
+    result = {}
+    for i, rid in enumerate(report_ids):
+        up, down = values[2 * i], values[2 * i + 1]
+        if up or down:
+            result[rid] = (up, down)
+    return result
+
+
+def flush_vote_buffer(force=False):
+    """Write buffered counter deltas to the database. Returns the number of reports updated.
+
+    Runs at most once per VOTE_BUFFER_FLUSH_INTERVAL_MS across workers unless forced.
+    A batch is applied at most once, however many workers flush it.
+    """
+    global _delete_batch_script
+    client = cache.redis_client
+    if client is None:
+        return 0
+    interval = int(current_app.config.get('VOTE_BUFFER_FLUSH_INTERVAL_MS', 1000))
+    if not force and not client.set(FLUSH_LOCK_KEY, 1, nx=True, px=interval):
+        return 0
+    # A batch left by a failed or slow flush goes first; otherwise move the live hash aside
+    # (RENAMENX never replaces a batch another worker moved aside in the meantime)
+    if not client.exists(FLUSHING_KEY):
+        try:
+            client.renamenx(PENDING_KEY, FLUSHING_KEY)
+        except redis.exceptions.ResponseError:
+            # Nothing buffered
+            return 0
+    # The first flusher to see the batch names it; later ones read the same id
+    client.hsetnx(FLUSHING_KEY, BATCH_FIELD, uuid.uuid4().hex)
+    batch = client.hgetall(FLUSHING_KEY)
+    batch_id = batch.pop(BATCH_FIELD.encode(), b'').decode()
+    deltas = {}
+    for field, value in batch.items():
+        report_id, kind = field.decode().split(':')
+        du, dd = deltas.get(int(report_id), (0, 0))
+        deltas[int(report_id)] = (du + int(value), dd) if kind == 'up' else (du, dd + int(value))
+    applied = 0
+    if deltas:
+        try:
+            db.session.add(VoteFlushBatch(id=batch_id))
+            db.session.flush()
+        except IntegrityError:
+            # Another flusher applied this batch and has not removed it yet
+            db.session.rollback()
+        else:
+            try:
+                for report_id, (du, dd) in deltas.items():
+                    apply_vote_counts(report_id, du, dd)
+                VoteFlushBatch.query.filter(
+                    VoteFlushBatch.flushed_at < datetime.utcnow() - BATCH_RETENTION
+                ).delete(synchronize_session=False)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+            applied = len(deltas)
+    if _delete_batch_script is None:
+        _delete_batch_script = client.register_script(_DELETE_BATCH)
+    _delete_batch_script(keys=[FLUSHING_KEY], args=[BATCH_FIELD, batch_id])
+    return applied
+
+
+def maybe_flush_vote_buffer():
+    """Opportunistic flush, called after votes and on feed reads; never raises"""
+    if not _buffer_enabled():
+        return
+    try:
+        flush_vote_buffer()
+    except Exception as e:
+        logger.error(f"Vote buffer flush failed: {e}")
+
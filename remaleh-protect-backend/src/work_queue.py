@@ -0,0 +1,128 @@
+"""
+Tables of work done by a background thread: the email outbox and the media
+deletion queue.
+
+A row is ``pending`` until it is done or has failed, and due once its
+``next_attempt_at`` has passed. ``claim_due`` leases a batch of due rows to
+the caller: they get a random ``claimed_by`` token and a ``lease_until``, so
+two workers never take the same row, and the rows of a worker that died are
+picked up again when the lease runs out. ``failed_attempt`` records a failed
+attempt, backing off exponentially until the row is given up on.
+
+``ProcessWorker`` runs the thread that works through such a table, one per
+process. Threads don't survive a fork, so it remembers the pid that started
+its thread rather than a flag. ``start()`` wakes the running thread or starts
+one; the thread may wait on ``wake`` between rounds. When the work function
+returns, the thread stops, unless ``start()`` was called in the meantime, in
+which case the work runs again. Checking and stopping happen under the same
+lock ``start()`` takes, so work queued while the thread is stopping is never
+left waiting for the next trigger.
+"""
+
+import logging
+import os
+import threading
+import uuid
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import or_, update
+
+try:
+    from .models import db
+except ImportError:
+    from models import db
+
+logger = logging.getLogger(__name__)
+
+
+def config_int(name, default):
+    return int(current_app.config.get(name, default))
+
+
+def claim_due(model, now, lease, limit, *columns):
+    """Lease up to `limit` due rows of `model` to the caller. Commits.
+
+    Returns the claimed rows' `columns`, in id order, or None if nothing was due.
+    """
+    unleased = or_(model.lease_until.is_(None), model.lease_until < now)
+    due = [row.id for row in (
+        db.session.query(model.id)
+        .filter(model.status == 'pending', model.next_attempt_at <= now, unleased)
+        .order_by(model.id)
+        .limit(limit)
+    )]
+    if not due:
+        return None
+    token = uuid.uuid4().hex
+    db.session.execute(
+        update(model)
+        .where(model.id.in_(due), model.status == 'pending', unleased)
+        .values(lease_until=now + lease, claimed_by=token)
+    )
+    db.session.commit()
+    return (
+        db.session.query(*columns)
+        .filter(model.claimed_by == token)
+        .order_by(model.id)
+        .all()
+    )
+
+
+def failed_attempt(attempts, error, max_attempts, retry_seconds, give_up=False):
+    """Column values recording failed attempt number `attempts`, and its outcome
+    ('retrying', or 'failed' once `max_attempts` is reached or with `give_up`)"""
+    values = {'attempts': attempts, 'last_error': str(error)[:1000], 'lease_until': None, 'claimed_by': None}
+    if give_up or attempts >= max_attempts:
+        values['status'] = 'failed'
+        return values, 'failed'
+    values['next_attempt_at'] = datetime.utcnow() + timedelta(seconds=retry_seconds * 2 ** (attempts - 1))
+    return values, 'retrying'
+
+
+class ProcessWorker:
+    """One background thread per process running `work` in an app context"""
+
+    def __init__(self, name, work):
+        self.name = name
+        self.work = work
+        # Pid of the process whose thread is running
+        self.pid = None
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+
+    def start(self):
+        """Wake this process's thread, starting it if needed; never raises.
+        Returns whether a thread was started."""
+        with self.lock:
+            self.wake.set()
+            if self.pid == os.getpid():
+                return False
+            self.pid = os.getpid()
+        try:
+            threading.Thread(
+                target=self._run, args=(current_app._get_current_object(),),
+                name=self.name, daemon=True,
+            ).start()
+        except Exception as e:
+            logger.error(f"Could not start {self.name} thread: {e}")
+            with self.lock:
+                self.pid = None
+            return False
+        return True
+
+    def _run(self, app):
+        with app.app_context():
+            while True:
+                self.wake.clear()
+                try:
+                    self.work()
+                except Exception as e:
+                    logger.error(f"{self.name} thread failed: {e}")
+                    db.session.rollback()
+                finally:
+                    db.session.remove()
+                with self.lock:
+                    if not self.wake.is_set():
+                        self.pid = None
+                        return
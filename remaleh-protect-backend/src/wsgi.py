@@ -0,0 +1,53 @@
+"""
+Production WSGI entry point for Remaleh Protect Backend.
+
+Run with gunicorn using the tuned configuration in ``gunicorn.conf.py``:
+
+    gunicorn -c gunicorn.conf.py
+
+``create_app()`` runs when ``main`` is imported, so with ``preload_app`` the
+master process opens database and Redis connections before forking.
+``reset_connections_after_fork`` is called from gunicorn's ``post_fork`` hook
+so that every worker starts with its own fresh pools, followed by
+``start_password_pool`` while the worker still has a single thread.
+"""
+
+import logging
+
+try:
+    from .main import app
+    from .models import db
+    from .database import db_manager
+    from .cache import cache
+    from .monitoring import monitor
+    from .passwords import warm_pool
+except ImportError:
+    from main import app
+    from models import db
+    from database import db_manager
+    from cache import cache
+    from monitoring import monitor
+    from passwords import warm_pool
+
+logger = logging.getLogger("remaleh")
+
+
+def reset_connections_after_fork():
+    """Reset SQLAlchemy engines and Redis pools inherited from the master process."""
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+        db.session.remove()
+    db_manager.dispose_after_fork()
+    cache.reset_after_fork()
+    monitor.reset_after_fork()
+    logger.info("✓ Database and Redis connections reset after fork")
+
+
+def start_password_pool():
+    """Fork this worker's password hashing processes before it starts other threads."""
+    with app.app_context():
+        warm_pool()
+
+
+application = app
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Query-count regression test for the admin user and report listings.
+
+The number of SQL statements per listing must not grow with the number of
+users or reports on the page.
+"""
+
+import uuid
+
+from testsupport import app, count_queries, make_user
+from models import db, User, CommunityReport, CommunityReportMedia
+from auth import create_tokens
+
+MAX_LISTING_QUERIES = 8
+
+# A process resumes queued background work on its first request: keep that out of the counts
+app.test_client().get('/api/health')
+
+
+def _seed(users=12, deleted=6):
+    tag = uuid.uuid4().hex[:8]
+    with app.app_context():
+        admin = make_user(f"listq-admin-{tag}", first_name='List', last_name='Admin', role='ADMIN', is_admin=True)
+        people = []
+        for i in range(users + deleted):
+            u = User(email=f"listq-{i}-{tag}@example.com", first_name=f"User{i}", last_name='List',
+                     account_status='DELETED' if i >= users else 'ACTIVE')
+            u.password_hash = 'x'
+            db.session.add(u)
+            people.append(u)
+        db.session.flush()
+        for i, u in enumerate(people):
+            for _ in range(i % 3):
+                report = CommunityReport(user_id=u.id, threat_type=f"listq-{tag}", description='listing test')
+                db.session.add(report)
+                db.session.flush()
+                db.session.add(CommunityReportMedia(report_id=report.id, media_url='https://example.com/a.png', media_type='image'))
+        db.session.commit()
+        expected = {u.id: i % 3 for i, u in enumerate(people)}
+        token, _ = create_tokens(admin.id)
+        return token, expected, tag
+
+
+def _get(path, token, **params):
+    with count_queries() as statements:
+        response = app.test_client().get(path, headers={'Authorization': f'Bearer {token}'}, query_string=params)
+    assert response.status_code == 200, response.get_data(as_text=True)
+    return response.get_json(), len(statements)
+
+
+def test_user_listing_query_count_is_constant():
+    token, expected, _ = _seed()
+    small, small_queries = _get('/api/admin/users', token, per_page=2)
+    large, large_queries = _get('/api/admin/users', token, per_page=100)
+    assert len(large['users']) > len(small['users'])
+    assert small_queries == large_queries <= MAX_LISTING_QUERIES
+    for user in large['users']:
+        if user['id'] in expected:
+            assert user['report_count'] == expected[user['id']]
+
+
+def test_deleted_user_listing_query_count_is_constant():
+    token, expected, _ = _seed(deleted=2)
+    _, before = _get('/api/admin/users/deleted', token)
+    token, expected_more, _ = _seed(deleted=10)
+    body, after = _get('/api/admin/users/deleted', token)
+    assert before == after <= MAX_LISTING_QUERIES
+    expected.update(expected_more)
+    for user in body['users']:
+        if user['id'] in expected:
+            assert user['report_count'] == expected[user['id']]
+
+
+def test_report_listing_query_count_is_constant():
+    token, _, _ = _seed()
+    small, small_queries = _get('/api/admin/reports', token, per_page=2)
+    large, large_queries = _get('/api/admin/reports', token, per_page=50)
+    assert len(large['reports']) > len(small['reports'])
+    assert small_queries == large_queries <= MAX_LISTING_QUERIES
+    assert all(r['reporter'] and r['reporter']['email'] for r in large['reports'])
+
+
+if __name__ == "__main__":
+    print("🧪 Testing admin listing query counts...")
+    test_user_listing_query_count_is_constant()
+    test_deleted_user_listing_query_count_is_constant()
+    test_report_listing_query_count_is_constant()
+    print("✅ Admin listing query count tests passed")
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Test admin user search, keyset pagination and counting modes.
+
+Runs in-process against a throwaway SQLite database, which exercises the
+NOCASE prefix indexes and the FTS5 trigram fallback.
+"""
+
+import uuid
+
+from testsupport import app, count_queries
+from models import db, User
+from auth import create_tokens
+import user_search
+
+TAG = uuid.uuid4().hex[:8]
+ADMIN_EMAIL = f"search-admin-{uuid.uuid4().hex[:8]}@example.com"
+PEOPLE = [
+    ('Alice', 'Johnson', f"alice.j-{TAG}@example.com"),
+    ('Bob', 'Smithers', f"bsmith-{TAG}@example.org"),
+    ('Carol', 'Smith', f"carol_{TAG}@example.net"),
+    ('Dave', 'Jones', f"dave%{TAG}@example.com"),
+]
+
+
+def _setup():
+    with app.app_context():
+        admin = User.query.filter_by(email=ADMIN_EMAIL).first()
+        if admin is None:
+            admin = User(email=ADMIN_EMAIL, first_name='Search', last_name='Admin',
+                         role='ADMIN', is_admin=True)
+            admin.set_password('Password123!')
+            db.session.add(admin)
+            for first, last, email in PEOPLE:
+                u = User(email=email, first_name=first, last_name=last)
+                u.password_hash = 'x'
+                db.session.add(u)
+            db.session.commit()
+        token, _ = create_tokens(admin.id)
+        return token
+
+
+def _search(token, **params):
+    response = app.test_client().get('/api/admin/users', headers={'Authorization': f'Bearer {token}'},
+                                     query_string=params)
+    assert response.status_code == 200, response.get_data(as_text=True)
+    return response.get_json()
+
+
+def _emails(body):
+    return {u['email'] for u in body['users'] if TAG in u['email']}
+
+
+def test_prefix_search_matches_email_and_name_starts():
+    token = _setup()
+    assert _emails(_search(token, search='SMITH')) == {PEOPLE[1][2], PEOPLE[2][2]}
+    assert _emails(_search(token, search='bsm')) == {PEOPLE[1][2]}
+    # Not a prefix of any field
+    assert _emails(_search(token, search='ohnson')) == set()
+    # Every term must match some field
+    assert _emails(_search(token, search=f"carol {TAG}", match='contains')) == {PEOPLE[2][2]}
+
+
+def test_contains_search_uses_trigrams_and_short_terms():
+    token = _setup()
+    assert _emails(_search(token, search='ohnson', match='contains')) == {PEOPLE[0][2]}
+    assert _emails(_search(token, search=f"{TAG} mi", match='contains')) == {PEOPLE[1][2], PEOPLE[2][2]}
+    # LIKE wildcards in the term are literal
+    assert _emails(_search(token, search=f"%{TAG}", match='contains')) == {PEOPLE[3][2]}
+    assert _emails(_search(token, search=f"_{TAG}", match='contains')) == {PEOPLE[2][2]}
+
+
+def test_search_follows_renames():
+    token = _setup()
+    with app.app_context():
+        user = User.query.filter_by(email=PEOPLE[3][2]).first()
+        user.last_name = f"Renamed{TAG}"
+        db.session.commit()
+    try:
+        assert _emails(_search(token, search=f"named{TAG}", match='contains')) == {PEOPLE[3][2]}
+        assert _emails(_search(token, search='Jones', match='contains')) == set()
+    finally:
+        with app.app_context():
+            user = User.query.filter_by(email=PEOPLE[3][2]).first()
+            user.last_name = 'Jones'
+            db.session.commit()
+
+
+def test_keyset_pages_cover_the_listing_once():
+    token = _setup()
+    offset_ids = [u['id'] for u in _search(token, per_page=200, include_total='true')['users']]
+    seen, cursor = [], ''
+    while cursor is not None:
+        body = _search(token, per_page=2, cursor=cursor)
+        assert body['pagination']['total'] is None
+        seen.extend(u['id'] for u in body['users'])
+        cursor = body['pagination']['next_cursor']
+    assert seen == offset_ids[:len(seen)] and len(seen) == len(set(seen))
+    assert len(seen) >= len(PEOPLE)
+
+
+def test_counting_modes_and_no_diagnostic_queries():
+    token = _setup()
+    with count_queries() as statements:
+        body = _search(token, search=TAG, match='contains')
+    assert body['pagination']['total'] == len(PEOPLE)
+    assert body['pagination']['total_is_estimate'] is False
+    assert not any(s.strip().upper() == 'SELECT 1' for s in statements)
+    assert len([s for s in statements if 'count(' in s.lower()]) == 2  # listing total + report counts
+
+    assert _search(token, include_total='false')['pagination']['total'] is None
+
+
+def test_sqlite_plans_use_search_indexes():
+    with app.app_context():
+        assert user_search._sqlite_fts_ready
+        for match, marker in (('prefix', 'idx_users_email_nocase'), ('contains', 'users_search')):
+            query = user_search.apply_user_search(User.query, 'smith', match)
+            compiled = query.statement.compile(db.engine)
+            params = tuple(compiled.params[name] for name in compiled.positiontup)
+            plan = db.session.connection().exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}", params).fetchall()
+            assert any(marker in row[-1] for row in plan), plan
+
+
+if __name__ == "__main__":
+    print("🧪 Testing admin user search...")
+    test_prefix_search_matches_email_and_name_starts()
+    test_contains_search_uses_trigrams_and_short_terms()
+    test_search_follows_renames()
+    test_keyset_pages_cover_the_listing_once()
+    test_counting_modes_and_no_diagnostic_queries()
+    test_sqlite_plans_use_search_indexes()
+    print("✅ Admin user search tests passed")
@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+"""
+Test the bulk deletion engine: batched user deletion jobs with progress and
+resume, report deletion, and the retrying media deletion queue.
+"""
+
+import os
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from testsupport import app, make_user
+from models import (db, User, CommunityReport, CommunityReportMedia, CommunityReportComment, ReportVote,
+                    UserPointLog, UserScan, DeletionJob, MediaDeletion)
+from auth import create_tokens
+from points import award_points_with_daily_cap, get_user_points
+import bulk_delete
+
+UPLOAD_FOLDER = tempfile.mkdtemp(prefix='remaleh_uploads_')
+app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
+
+
+def _seed(reports=5):
+    """A user with reports (each with a local upload), votes, comments and points,
+    plus another user whose report the first one voted on"""
+    with app.app_context():
+        admin = make_user('bulk-admin', role='ADMIN', is_admin=True)
+        target = make_user('bulk-target')
+        other = make_user('bulk-other')
+        other_report = CommunityReport(user_id=other.id, threat_type='SMS_SCAM', description='other',
+                                       status='APPROVED', votes_up=1, score=1)
+        db.session.add(other_report)
+        db.session.flush()
+        db.session.add(ReportVote(report_id=other_report.id, user_id=target.id, vote_type='up'))
+        db.session.add(CommunityReportComment(report_id=other_report.id, user_id=target.id, comment='me too'))
+        files = []
+        for i in range(reports):
+            report = CommunityReport(user_id=target.id, threat_type='PHISHING', description=f"report {i}",
+                                     status='APPROVED')
+            db.session.add(report)
+            db.session.flush()
+            filename = f"{uuid.uuid4().hex}.png"
+            with open(os.path.join(UPLOAD_FOLDER, filename), 'wb') as f:
+                f.write(b'png')
+            files.append(filename)
+            db.session.add(CommunityReportMedia(report_id=report.id, media_url=f"/api/community/uploads/{filename}",
+                                                media_type='image'))
+            db.session.add(ReportVote(report_id=report.id, user_id=other.id, vote_type='up'))
+            db.session.add(CommunityReportComment(report_id=report.id, user_id=other.id, comment='thanks'))
+            award_points_with_daily_cap(other.id, 2, 'verified a report', report_id=report.id)
+            award_points_with_daily_cap(target.id, 5, 'report approved', report_id=report.id)
+        db.session.add(UserScan(user_id=target.id, message='hi', risk_level='SAFE', risk_score=0,
+                                analysis_result={}))
+        db.session.commit()
+        token, _ = create_tokens(admin.id)
+        return {'token': token, 'target': target.id, 'other': other.id, 'other_report': other_report.id,
+                'files': files}
+
+
+def _wait_for_job(token, job_id, timeout=15):
+    client = app.test_client()
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        response = client.get(f"/api/admin/deletion-jobs/{job_id}", headers={'Authorization': f'Bearer {token}'})
+        assert response.status_code == 200, response.get_data(as_text=True)
+        job = response.get_json()['job']
+        if job['status'] in ('done', 'failed'):
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f"Deletion job {job_id} did not finish")
+
+
+def _wait_for_media_queue(urls, timeout=15):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        with app.app_context():
+            if MediaDeletion.query.filter(MediaDeletion.media_url.in_(urls)).count() == 0:
+                return
+        time.sleep(0.05)
+    raise AssertionError('Media deletions were not processed')
+
+
+def test_hard_delete_runs_as_background_job():
+    seeded = _seed()
+    response = app.test_client().delete(f"/api/admin/users/{seeded['target']}/hard-delete",
+                                        headers={'Authorization': f"Bearer {seeded['token']}"})
+    assert response.status_code == 202, response.get_data(as_text=True)
+    job = _wait_for_job(seeded['token'], response.get_json()['job']['id'])
+    assert job['status'] == 'done', job
+    assert job['progress']['reports'] == 5
+    assert job['progress']['votes'] == 1 and job['progress']['user'] == 1
+
+    with app.app_context():
+        target = seeded['target']
+        assert db.session.get(User, target) is None
+        assert CommunityReport.query.filter_by(user_id=target).count() == 0
+        assert ReportVote.query.filter_by(user_id=target).count() == 0
+        assert CommunityReportComment.query.filter_by(user_id=target).count() == 0
+        assert UserPointLog.query.filter_by(user_id=target).count() == 0
+        assert UserScan.query.filter_by(user_id=target).count() == 0
+        # The other user's points for the deleted reports are revoked
+        assert get_user_points(seeded['other'])['all'] == 0
+        assert UserPointLog.query.filter_by(user_id=seeded['other']).count() == 0
+        # The deleted user's vote no longer counts on the other report
+        other_report = db.session.get(CommunityReport, seeded['other_report'])
+        assert (other_report.votes_up, other_report.score) == (0, 0)
+
+    _wait_for_media_queue([f"/api/community/uploads/{f}" for f in seeded['files']])
+    assert not any(os.path.exists(os.path.join(UPLOAD_FOLDER, f)) for f in seeded['files'])
+
+
+def test_job_commits_per_batch_and_resumes_after_a_crash():
+    seeded = _seed(reports=5)
+    with app.app_context():
+        job = bulk_delete.start_deletion_job('user', seeded['target'])
+        job_id = job.id
+        original = bulk_delete.STEPS['user']
+        calls = []
+
+        def crashing_reports(user_id, batch_size, job_id):
+            calls.append(1)
+            if len(calls) == 2:
+                raise RuntimeError('worker died')
+            return original[0][1](user_id, batch_size, job_id)
+
+        bulk_delete.STEPS['user'] = (('reports', crashing_reports),) + original[1:]
+        try:
+            try:
+                bulk_delete.run_deletion_job(job_id, batch_size=2)
+            except RuntimeError:
+                pass
+        finally:
+            bulk_delete.STEPS['user'] = original
+
+        job = db.session.get(DeletionJob, job_id)
+        assert job.status == 'failed' and 'worker died' in job.error
+        # The first batch stayed committed
+        assert job.step == 'reports' and job.progress == {'reports': 2}
+        assert CommunityReport.query.filter_by(user_id=seeded['target']).count() == 3
+
+        job = bulk_delete.run_deletion_job(job_id, batch_size=2)
+        assert job.status == 'done'
+        assert job.progress['reports'] == 5
+        assert db.session.get(User, seeded['target']) is None
+        # A finished job is not run again
+        assert bulk_delete.run_deletion_job(job_id) is None
+
+
+def test_a_leased_job_is_not_run_twice():
+    seeded = _seed(reports=1)
+    with app.app_context():
+        job_id = bulk_delete.start_deletion_job('user', seeded['target']).id
+        assert bulk_delete._claim(job_id)
+        assert bulk_delete.run_deletion_job(job_id) is None
+        # Once the lease expires (the worker crashed) the job can be resumed
+        db.session.get(DeletionJob, job_id).lease_until = datetime.utcnow() - timedelta(seconds=1)
+        db.session.commit()
+        assert job_id in bulk_delete.resume_deletion_jobs()
+        assert db.session.get(DeletionJob, job_id).status == 'done'
+
+
+def test_starting_a_user_job_locks_the_account_and_sweeps_late_rows():
+    seeded = _seed(reports=1)
+    client = app.test_client()
+    with app.app_context():
+        access, _ = create_tokens(seeded['target'])
+        assert client.get('/api/auth/profile', headers={'Authorization': f'Bearer {access}'}).status_code == 200
+        job_id = bulk_delete.start_deletion_job('user', seeded['target']).id
+        target = db.session.get(User, seeded['target'])
+        assert not target.is_active and target.account_status == 'DELETED'
+        assert client.get('/api/auth/profile', headers={'Authorization': f'Bearer {access}'}).status_code == 401
+
+        # A request already in flight adds a report and a vote after their steps passed
+        original = bulk_delete.STEPS['user']
+        names = [name for name, _ in original]
+        comments = original[names.index('comments')][1]
+        inserted = []
+
+        def late_rows(user_id, batch_size, job_id):
+            if not inserted:
+                inserted.append(1)
+                report = CommunityReport(user_id=user_id, threat_type='PHISHING', description='late',
+                                         status='APPROVED')
+                db.session.add(report)
+                db.session.flush()
+                db.session.add(ReportVote(report_id=seeded['other_report'], user_id=user_id, vote_type='up'))
+                db.session.commit()
+            return comments(user_id, batch_size, job_id)
+
+        steps = list(original)
+        steps[names.index('comments')] = ('comments', late_rows)
+        bulk_delete.STEPS['user'] = tuple(steps)
+        try:
+            job = bulk_delete.run_deletion_job(job_id)
+        finally:
+            bulk_delete.STEPS['user'] = original
+
+        assert job.status == 'done', job.error
+        assert db.session.get(User, seeded['target']) is None
+        assert CommunityReport.query.filter_by(user_id=seeded['target']).count() == 0
+        assert ReportVote.query.filter_by(user_id=seeded['target']).count() == 0
+
+
+def test_report_delete_queues_media_and_adjusts_counters():
+    seeded = _seed(reports=1)
+    with app.app_context():
+        report = CommunityReport.query.filter_by(user_id=seeded['target']).one()
+        report_id = report.id
+        owner_token, _ = create_tokens(seeded['target'])
+    response = app.test_client().delete(f"/api/community/reports/{report_id}",
+                                        headers={'Authorization': f'Bearer {owner_token}'})
+    assert response.status_code == 200, response.get_data(as_text=True)
+    with app.app_context():
+        assert db.session.get(CommunityReport, report_id) is None
+        assert CommunityReportMedia.query.filter_by(report_id=report_id).count() == 0
+        assert UserPointLog.query.filter_by(report_id=report_id).count() == 0
+        assert get_user_points(seeded['target'])['all'] == 0
+    _wait_for_media_queue([f"/api/community/uploads/{seeded['files'][0]}"])
+    assert not os.path.exists(os.path.join(UPLOAD_FOLDER, seeded['files'][0]))
+
+
+def test_failed_media_deletions_back_off_then_give_up():
+    url = f"https://res.cloudinary.com/demo/image/upload/v1/community_reports/{uuid.uuid4().hex}.png"
+    with app.app_context():
+        app.config['CLOUDINARY_CLOUD_NAME'] = None
+        bulk_delete.queue_media_deletions([url])
+        db.session.commit()
+        task = MediaDeletion.query.filter_by(media_url=url).one()
+
+        bulk_delete.process_media_deletions()
+        db.session.refresh(task)
+        assert task.status == 'pending' and task.attempts == 1
+        assert task.next_attempt_at > datetime.utcnow() + timedelta(seconds=30)
+        assert 'not configured' in task.last_error
+
+        for _ in range(app.config['MEDIA_DELETION_MAX_ATTEMPTS']):
+            task.next_attempt_at = datetime.utcnow() - timedelta(seconds=1)
+            db.session.commit()
+            bulk_delete.process_media_deletions()
+            db.session.refresh(task)
+        assert task.status == 'failed'
+        assert task.attempts == app.config['MEDIA_DELETION_MAX_ATTEMPTS']
+
+
+def test_forked_worker_starts_its_own_media_worker():
+    filename = f"{uuid.uuid4().hex}.png"
+    with open(os.path.join(UPLOAD_FOLDER, filename), 'wb') as f:
+        f.write(b'png')
+    url = f"/api/community/uploads/{filename}"
+    with app.app_context():
+        bulk_delete.queue_media_deletions([url])
+        db.session.commit()
+    # As in a preloaded gunicorn master that had started a worker: the flag is
+    # inherited by the fork, the thread is not
+    bulk_delete._media_worker.pid = os.getpid()
+    try:
+        pid = os.fork()
+        if pid == 0:
+            code = 1
+            try:
+                with app.app_context():
+                    db.engine.dispose(close=False)
+                # The worker's first request resumes the media queue in the worker
+                app.test_client().get('/api/health')
+                _wait_for_media_queue([url])
+                code = 0
+            finally:
+                os._exit(code)
+        assert os.waitpid(pid, 0)[1] == 0
+        assert not os.path.exists(os.path.join(UPLOAD_FOLDER, filename))
+    finally:
+        bulk_delete._media_worker.pid = None
+
+
+def test_media_queued_while_the_worker_stops_is_processed():
+    filename = f"{uuid.uuid4().hex}.png"
+    with open(os.path.join(UPLOAD_FOLDER, filename), 'wb') as f:
+        f.write(b'png')
+    url = f"/api/community/uploads/{filename}"
+    original = bulk_delete.process_media_deletions
+    queued = threading.Event()
+
+    def queue_after_the_last_claim(limit=None):
+        summary = original(limit)
+        if not queued.is_set():
+            bulk_delete.queue_media_deletions([url])
+            db.session.commit()
+            assert not bulk_delete.maybe_process_media_deletions()
+            queued.set()
+        return summary
+
+    bulk_delete.process_media_deletions = queue_after_the_last_claim
+    try:
+        with app.app_context():
+            assert bulk_delete.maybe_process_media_deletions()
+        assert queued.wait(10)
+        _wait_for_media_queue([url])
+        assert not os.path.exists(os.path.join(UPLOAD_FOLDER, filename))
+    finally:
+        bulk_delete.process_media_deletions = original
+
+
+def test_cloudinary_public_id():
+    assert bulk_delete.cloudinary_public_id(
+        'https://res.cloudinary.com/demo/image/upload/v1712/community_reports/abc.jpg'
+    ) == 'community_reports/abc'
+    assert bulk_delete.cloudinary_public_id('https://example.com/a.png') is None
+
+
+if __name__ == "__main__":
+    print("🧪 Testing bulk deletion...")
+    test_hard_delete_runs_as_background_job()
+    test_job_commits_per_batch_and_resumes_after_a_crash()
+    test_a_leased_job_is_not_run_twice()
+    test_starting_a_user_job_locks_the_account_and_sweeps_late_rows()
+    test_report_delete_queues_media_and_adjusts_counters()
+    test_failed_media_deletions_back_off_then_give_up()
+    test_forked_worker_starts_its_own_media_worker()
+    test_media_queued_while_the_worker_stops_is_processed()
+    test_cloudinary_public_id()
+    print("✅ Bulk deletion tests passed")
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Test the chat assistant's answer cache against a local OpenAI-compatible
+stub server: reworded questions are answered from the cache, concurrent
+identical questions share one upstream call, similar questions match only
+above the configured threshold, and failed or filtered answers are not
+cached.
+"""
+
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from openai import OpenAI
+
+from testsupport import app
+from cache import cache
+import chat_cache
+import routes.chat as chat
+
+QUESTION = 'Is this text from my bank a scam?'
+
+
+class StubOpenAI(BaseHTTPRequestHandler):
+    """Answers /chat/completions like the OpenAI API, after `delay` seconds"""
+    calls = []
+    delay = 0.0
+    status = 200
+    reply = None
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        question = body['messages'][-1]['content']
+        StubOpenAI.calls.append((body['model'], question))
+        time.sleep(StubOpenAI.delay)
+        if StubOpenAI.status != 200:
+            payload = {'error': {'message': 'unavailable', 'type': 'server_error'}}
+        else:
+            payload = {
+                'id': 'chatcmpl-test', 'object': 'chat.completion', 'created': int(time.time()), 'model': body['model'],
+                'choices': [{'index': 0, 'finish_reason': 'stop', 'message': {
+                    'role': 'assistant', 'content': StubOpenAI.reply or f"Answer {len(StubOpenAI.calls)}: {question}"}}],
+                'usage': {'prompt_tokens': 200, 'completion_tokens': 100, 'total_tokens': 300},
+            }
+        data = json.dumps(payload).encode()
+        self.send_response(StubOpenAI.status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+_server = ThreadingHTTPServer(('127.0.0.1', 0), StubOpenAI)
+threading.Thread(target=_server.serve_forever, daemon=True).start()
+
+
+def _reset(delay=0.0, status=200, reply=None, similarity=0):
+    StubOpenAI.calls, StubOpenAI.delay, StubOpenAI.status, StubOpenAI.reply = [], delay, status, reply
+    chat.client = OpenAI(api_key='test', base_url=f"http://127.0.0.1:{_server.server_port}/v1", max_retries=0)
+    app.config['CHAT_CACHE_SIMILARITY'] = similarity
+    chat_cache.clear()
+    if cache.redis_client is not None:
+        cache.clear_pattern('chat:answer:*')
+
+
+def _ask(message):
+    response = app.test_client().post('/api/chat/', json={'message': message})
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def test_reworded_question_is_answered_from_cache():
+    _reset()
+    first = _ask(QUESTION)
+    assert first['source'] == 'ai_analysis'
+    for message in ('is this text from my bank a scam', '  IS this text from my bank, a scam?!'):
+        assert _ask(message)['response'] == first['response']
+    assert len(StubOpenAI.calls) == 1
+    stats = chat_cache.stats()
+    assert (stats['hit'], stats['miss'], stats['hit_rate']) == (2, 1, 0.6667)
+    # 200 prompt + 100 completion tokens at the GPT-4 price, saved twice
+    assert stats['tokens_saved'] == 600
+    assert abs(stats['cost_saved_usd'] - 2 * (0.2 * 0.03 + 0.1 * 0.06)) < 1e-9
+    assert app.test_client().get('/api/chat/health').get_json()['answer_cache']['hit'] == 2
+
+
+def test_concurrent_identical_questions_share_one_call():
+    _reset(delay=0.5)
+    with ThreadPoolExecutor(6) as pool:
+        answers = list(pool.map(_ask, [QUESTION] * 6))
+    assert len({answer['response'] for answer in answers}) == 1
+    assert len(StubOpenAI.calls) == 1
+    stats = chat_cache.stats()
+    assert stats['miss'] == 1 and stats['coalesced'] + stats['hit'] == 5
+
+
+def test_similar_questions_match_above_threshold_only():
+    _reset(similarity=0.8)
+    try:
+        answer = _ask('How do I know if a text from my bank is real?')['response']
+        # Jaccard similarity 0.84: answered from the cache
+        assert _ask('how do i know if a text from my bank is real or fake')['response'] == answer
+        # 0.79: asked upstream
+        assert _ask('How do I know if a text from my bank is fake?')['response'] != answer
+        assert len(StubOpenAI.calls) == 2
+        assert chat_cache.stats()['similar'] == 1
+    finally:
+        app.config['CHAT_CACHE_SIMILARITY'] = 0
+
+
+def test_failed_and_filtered_answers_are_not_cached():
+    _reset(status=500)
+    assert _ask(QUESTION)['source'] == 'fallback_with_guardian'
+    # GPT-4, then the GPT-3.5 fallback
+    assert [model for model, _ in StubOpenAI.calls] == ['gpt-4', 'gpt-3.5-turbo']
+    StubOpenAI.status = 200
+    assert _ask(QUESTION)['source'] == 'ai_analysis'
+    assert len(StubOpenAI.calls) == 3
+
+    _reset(reply='Contact the Remaleh Fraud Unit to report it.')
+    for _ in range(2):
+        assert _ask(QUESTION)['response'] == chat.SAFE_REPORTING_REPLY
+    assert len(StubOpenAI.calls) == 2
+
+
+def test_lsh_finds_candidates_without_scanning():
+    _reset()
+    with app.app_context():
+        for i in range(200):
+            chat_cache._remember(f"key{i}", chat_cache.normalize_question(f"unrelated question number {i} about topic {i * 7}"),
+                                 {'text': str(i)}, 60)
+        normalized = chat_cache.normalize_question('unrelated question number 42 about topic 294')
+        signature_bands = chat_cache._bands(chat_cache.minhash(chat_cache.shingles(normalized)))
+        candidates = set().union(*(chat_cache._buckets.get(band, set()) for band in signature_bands))
+        assert 'key42' in candidates and len(candidates) < 200
+        assert chat_cache._similar(normalized, 0.9)['text'] == '42'
+    chat_cache.clear()
+
+
+if __name__ == "__main__":
+    print("🧪 Testing chat answer cache...")
+    test_reworded_question_is_answered_from_cache()
+    test_concurrent_identical_questions_share_one_call()
+    test_similar_questions_match_above_threshold_only()
+    test_failed_and_filtered_answers_are_not_cached()
+    test_lsh_finds_candidates_without_scanning()
+    print("✅ Chat answer cache tests passed")
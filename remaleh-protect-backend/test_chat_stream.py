@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+Test the streaming chat endpoint against a local OpenAI-compatible stub
+that streams its answer in timed chunks: text is relayed before the answer
+is complete, blocked names are held back or replaced, finished answers are
+cached, and replies that need no model come back as a single event.
+"""
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from openai import OpenAI
+
+from testsupport import app
+from cache import cache
+import chat_cache
+import routes.chat as chat
+
+QUESTION = 'Is this text from my bank a scam?'
+
+
+class StreamingStub(BaseHTTPRequestHandler):
+    """Streams `pieces` as chat.completion.chunk events, `delay` seconds apart"""
+    pieces = []
+    delay = 0.0
+    status = 200
+    calls = 0
+
+    def _event(self, payload):
+        self.wfile.write(f"data: {json.dumps(payload)}\n\n".encode())
+        self.wfile.flush()
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        StreamingStub.calls += 1
+        if StreamingStub.status != 200:
+            data = json.dumps({'error': {'message': 'unavailable', 'type': 'server_error'}}).encode()
+            self.send_response(StreamingStub.status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.end_headers()
+        chunk = {'id': 'chatcmpl-test', 'object': 'chat.completion.chunk', 'created': int(time.time()),
+                 'model': body['model']}
+        try:
+            for piece in StreamingStub.pieces:
+                time.sleep(StreamingStub.delay)
+                self._event({**chunk, 'choices': [{'index': 0, 'delta': {'content': piece}, 'finish_reason': None}]})
+            self._event({**chunk, 'choices': [{'index': 0, 'delta': {}, 'finish_reason': 'stop'}]})
+            self._event({**chunk, 'choices': [],
+                         'usage': {'prompt_tokens': 200, 'completion_tokens': 100, 'total_tokens': 300}})
+            self.wfile.write(b"data: [DONE]\n\n")
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def log_message(self, *args):
+        pass
+
+
+_server = ThreadingHTTPServer(('127.0.0.1', 0), StreamingStub)
+threading.Thread(target=_server.serve_forever, daemon=True).start()
+
+
+def _reset(pieces, delay=0.0, status=200):
+    StreamingStub.pieces, StreamingStub.delay, StreamingStub.status, StreamingStub.calls = pieces, delay, status, 0
+    chat.client = OpenAI(api_key='test', base_url=f"http://127.0.0.1:{_server.server_port}/v1", max_retries=0)
+    chat_cache.clear()
+    if cache.redis_client is not None:
+        cache.clear_pattern('chat:answer:*')
+
+
+def _events(message):
+    """[(seconds since the request, event, data)] of a streamed reply"""
+    started = time.perf_counter()
+    response = app.test_client().post('/api/chat/stream', json={'message': message}, buffered=False)
+    assert response.status_code == 200
+    assert response.mimetype == 'text/event-stream'
+    events, buffer = [], ''
+    for chunk in response.response:
+        buffer += chunk.decode() if isinstance(chunk, bytes) else chunk
+        while '\n\n' in buffer:
+            raw, buffer = buffer.split('\n\n', 1)
+            fields = dict(line.split(': ', 1) for line in raw.split('\n'))
+            events.append((time.perf_counter() - started, fields.get('event', 'message'), json.loads(fields['data'])))
+    response.close()
+    return events
+
+
+def _shown(events):
+    """The text a client displays: deltas appended, replace events starting over"""
+    text = ''
+    for _, event, data in events:
+        if event == 'message':
+            text += data['delta']
+        elif event == 'replace':
+            text = data['response']
+    return text
+
+
+def test_answer_is_relayed_while_generated():
+    pieces = ['Banks never ', 'ask for your ', 'password by text. ', 'Call the number ', 'on your card ', 'to check.']
+    _reset(pieces, delay=0.1)
+    events = _events(QUESTION)
+    first_delta = next(elapsed for elapsed, event, _ in events if event == 'message')
+    finished, event, done = events[-1]
+    assert event == 'done'
+    assert first_delta < 0.35 and finished >= 0.6
+    assert done['source'] == 'ai_analysis' and done['response'] == ''.join(pieces).strip()
+    assert _shown(events) == done['response']
+    assert len([event for _, event, _ in events if event == 'message']) > 3
+
+
+def test_blocked_name_is_held_back_and_replaced():
+    _reset(['Contact the ', 'Remaleh ', 'Fraud ', 'Unit today ', 'for help.'])
+    events = _events(QUESTION)
+    deltas = ''.join(data['delta'] for _, event, data in events if event == 'message')
+    # The name never left the server: it was held back until the check failed
+    assert 'remaleh' not in deltas.lower()
+    assert [event for _, event, _ in events][-2:] == ['replace', 'done']
+    assert _shown(events) == chat.SAFE_REPORTING_REPLY == events[-1][2]['response']
+    # Replaced answers are not cached
+    _events(QUESTION)
+    assert StreamingStub.calls == 2
+
+
+def test_text_already_sent_is_replaced_by_a_later_check():
+    _reset(['Remaleh ', 'has lots of ', 'tips for staying ', 'safe online, ', 'and you can also ', 'report it to us.'])
+    events = _events(QUESTION)
+    deltas = ''.join(data['delta'] for _, event, data in events if event == 'message')
+    assert deltas.startswith('Remaleh has')
+    assert _shown(events) == chat.SAFE_REPORTING_REPLY
+
+
+def test_streamed_answer_is_cached_for_both_endpoints():
+    _reset(['Never share ', 'one-time codes.'])
+    answer = _events(QUESTION)[-1][2]['response']
+    events = _events('is this text from my bank a scam')
+    assert [event for _, event, _ in events] == ['message', 'done']
+    assert _shown(events) == answer
+    response = app.test_client().post('/api/chat/', json={'message': QUESTION})
+    assert response.get_json()['response'] == answer
+    assert StreamingStub.calls == 1
+
+
+def test_guardian_message_and_local_replies():
+    _reset(['Change your ', 'passwords now.'])
+    events = _events('Urgent: is this text from my bank a scam?')
+    done = events[-1][2]
+    assert done['source'] == 'ai_analysis_with_guardian' and done['escalation_level'] == 'high'
+    assert _shown(events) == done['response']
+
+    # Rule-based answers need no model and come back at once
+    events = _events('How do I make a strong password?')
+    assert [event for _, event, _ in events] == ['message', 'done']
+    assert events[-1][2]['source'] == 'expert_knowledge'
+    assert StreamingStub.calls == 1
+
+
+def test_client_without_stream_options_still_streams():
+    _reset(['Banks never ', 'ask for codes.'])
+    create = chat.client.chat.completions.create
+
+    def old_create(*args, **kwargs):
+        # Like openai releases before 1.26
+        if 'stream_options' in kwargs:
+            raise TypeError("create() got an unexpected keyword argument 'stream_options'")
+        return create(*args, **kwargs)
+
+    chat.client.chat.completions.create = old_create
+    events = _events(QUESTION)
+    assert events[-1][2]['source'] == 'ai_analysis'
+    assert _shown(events) == 'Banks never ask for codes.'
+    assert StreamingStub.calls == 1
+
+
+def test_upstream_failure_falls_back():
+    _reset([], status=500)
+    events = _events(QUESTION)
+    assert events[-1][2]['source'] == 'fallback_with_guardian'
+    assert _shown(events) == events[-1][2]['response']
+    # GPT-4, then GPT-3.5
+    assert StreamingStub.calls == 2
+
+
+def test_missing_message_is_rejected():
+    response = app.test_client().post('/api/chat/stream', json={})
+    assert response.status_code == 400
+
+
+if __name__ == "__main__":
+    print("🧪 Testing streaming chat...")
+    test_answer_is_relayed_while_generated()
+    test_blocked_name_is_held_back_and_replaced()
+    test_text_already_sent_is_replaced_by_a_later_check()
+    test_streamed_answer_is_cached_for_both_endpoints()
+    test_guardian_message_and_local_replies()
+    test_client_without_stream_options_still_streams()
+    test_upstream_failure_falls_back()
+    test_missing_message_is_rejected()
+    print("✅ Streaming chat tests passed")
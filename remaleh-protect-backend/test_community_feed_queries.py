@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Query-count regression test for the community report feed.
+
+The number of SQL statements per feed page must not grow with the number
+of reports, media items or comments on the page.
+"""
+
+import uuid
+from datetime import datetime, timedelta
+
+from testsupport import app, count_queries, make_user
+from models import db, CommunityReport, CommunityReportMedia, CommunityReportComment
+from auth import create_tokens
+
+MAX_FEED_QUERIES = 8
+
+
+def _seed(report_count, comments_per_report=5):
+    threat_type = f"feedq-{uuid.uuid4().hex[:8]}"
+    with app.app_context():
+        users = [make_user(f"feedq-{i}", first_name=f"User{i}", last_name='Feed') for i in range(4)]
+        base = datetime.utcnow()
+        for r in range(report_count):
+            report = CommunityReport(
+                user_id=users[r % len(users)].id, threat_type=threat_type, description=f"report {r}",
+                status='APPROVED', created_at=base - timedelta(minutes=r)
+            )
+            db.session.add(report)
+            db.session.flush()
+            for m in range(2):
+                db.session.add(CommunityReportMedia(report_id=report.id, media_url=f"https://example.com/{r}/{m}.jpg"))
+            for c in range(comments_per_report):
+                db.session.add(CommunityReportComment(
+                    report_id=report.id, user_id=users[c % len(users)].id, comment=f"comment {c}",
+                    created_at=base - timedelta(minutes=r, seconds=c)
+                ))
+        db.session.commit()
+        token, _ = create_tokens(users[0].id)
+    return threat_type, {'Authorization': f'Bearer {token}'}
+
+
+def _fetch(client, headers, params):
+    with count_queries() as statements:
+        response = client.get('/api/community/reports', headers=headers, query_string=params)
+    assert response.status_code == 200, response.get_json()
+    return response.get_json(), len(statements)
+
+
+def test_feed_query_count_is_constant():
+    threat_type, headers = _seed(12)
+    client = app.test_client()
+    for params in ({'per_page': 2}, {'per_page': 12}, {'per_page': 12, 'cursor': ''}):
+        body, queries = _fetch(client, headers, {'threat_type': threat_type, **params})
+        assert len(body['reports']) == params['per_page']
+        assert queries <= MAX_FEED_QUERIES, f"{queries} queries for {params}"
+
+    _, small = _fetch(client, headers, {'threat_type': threat_type, 'per_page': 2})
+    _, large = _fetch(client, headers, {'threat_type': threat_type, 'per_page': 12})
+    assert small == large
+
+
+def test_feed_includes_latest_comments_media_and_creator():
+    threat_type, headers = _seed(3)
+    client = app.test_client()
+    body, _ = _fetch(client, headers, {'threat_type': threat_type})
+    for report in body['reports']:
+        assert [c['comment'] for c in report['comments']] == ['comment 0', 'comment 1', 'comment 2']
+        assert all(c['user_name'].endswith('Feed') for c in report['comments'])
+        assert len(report['media']) == 2
+        assert report['creator']['name'].endswith('Feed')
+
+
+if __name__ == "__main__":
+    print("🧪 Testing community feed query counts...")
+    test_feed_query_count_is_constant()
+    test_feed_includes_latest_comments_media_and_creator()
+    print("✅ Community feed query-count tests passed")
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Test keyset (cursor) pagination of the community report feed.
+
+Runs in-process against a throwaway SQLite database.
+"""
+
+import uuid
+from datetime import datetime, timedelta
+
+from testsupport import app, make_user
+from models import db, CommunityReport
+from auth import create_tokens
+from pagination import encode_cursor
+
+
+def _seed(count):
+    """Create a user and `count` approved reports under a unique threat type"""
+    threat_type = f"pagination-{uuid.uuid4().hex[:8]}"
+    with app.app_context():
+        user = make_user('pager', first_name='Page', last_name='Tester')
+        base = datetime.utcnow()
+        for i in range(count):
+            # Pairs share a timestamp so the id tiebreaker is exercised
+            votes_up = i % 7
+            db.session.add(CommunityReport(
+                user_id=user.id, threat_type=threat_type, description=f"report {i}",
+                status='APPROVED', created_at=base - timedelta(minutes=i // 2),
+                votes_up=votes_up, votes_down=0, score=votes_up
+            ))
+        db.session.commit()
+        token, _ = create_tokens(user.id)
+    return threat_type, {'Authorization': f'Bearer {token}'}
+
+
+def _walk(client, headers, params):
+    """Follow next_cursor until exhausted, returning all report ids in order"""
+    seen = []
+    cursor = ''
+    while True:
+        response = client.get('/api/community/reports', headers=headers, query_string={**params, 'cursor': cursor})
+        assert response.status_code == 200, response.get_json()
+        body = response.get_json()
+        seen.extend(r['id'] for r in body['reports'])
+        cursor = body['pagination']['next_cursor']
+        if not cursor:
+            return seen, body['pagination']
+
+
+def test_cursor_pages_match_offset_order():
+    """Walking cursors yields the same rows, in the same order, as one big offset page"""
+    threat_type, headers = _seed(25)
+    client = app.test_client()
+    for sort in ('newest', 'top', 'verified'):
+        params = {'threat_type': threat_type, 'sort': sort, 'per_page': 4}
+        walked, last_page = _walk(client, headers, params)
+
+        full = client.get('/api/community/reports', headers=headers,
+                          query_string={**params, 'per_page': 100}).get_json()
+        assert walked == [r['id'] for r in full['reports']]
+        assert len(set(walked)) == 25
+        assert last_page['has_next'] is False
+        assert last_page['total'] is None
+
+
+def test_cursor_total_modes():
+    threat_type, headers = _seed(5)
+    client = app.test_client()
+    for mode in ('true', 'approx'):
+        body = client.get('/api/community/reports', headers=headers, query_string={
+            'threat_type': threat_type, 'cursor': '', 'include_total': mode
+        }).get_json()
+        assert body['pagination']['total'] == 5
+        assert body['pagination']['total_is_estimate'] == (mode == 'approx')
+
+
+def test_offset_mode_without_count():
+    threat_type, headers = _seed(5)
+    client = app.test_client()
+    body = client.get('/api/community/reports', headers=headers, query_string={
+        'threat_type': threat_type, 'per_page': 2, 'page': 2, 'include_total': 'false'
+    }).get_json()
+    assert len(body['reports']) == 2
+    assert body['pagination']['total'] is None
+    assert body['pagination']['has_next'] is True
+    assert body['pagination']['has_prev'] is True
+
+
+def test_invalid_cursor_rejected():
+    threat_type, headers = _seed(1)
+    client = app.test_client()
+    response = client.get('/api/community/reports', headers=headers, query_string={
+        'threat_type': threat_type, 'cursor': 'not-a-cursor'
+    })
+    assert response.status_code == 400
+
+    # Well-formed JSON whose values don't fit the sort columns is rejected too
+    for values in ([{'dt': 'nope'}, 1], [{'dt': 5}, 1], [{'when': 5}, 1], ['2024-01-01T00:00:00', 1],
+                   [{'dt': '2024-01-01T00:00:00'}, '1'], [{'dt': '2024-01-01T00:00:00'}, True]):
+        response = client.get('/api/community/reports', headers=headers, query_string={
+            'threat_type': threat_type, 'cursor': encode_cursor(values)
+        })
+        assert response.status_code == 400, values
+    response = client.get('/api/community/reports', headers=headers, query_string={
+        'threat_type': threat_type, 'sort': 'verified', 'cursor': encode_cursor([1, datetime.utcnow(), 1])
+    })
+    assert response.status_code == 400
+    response = client.get('/api/community/reports', headers=headers, query_string={
+        'threat_type': threat_type, 'cursor': encode_cursor([datetime.utcnow() + timedelta(days=1), 2 ** 31])
+    })
+    assert response.status_code == 200 and len(response.get_json()['reports']) == 1
+
+
+if __name__ == "__main__":
+    print("🧪 Testing community feed pagination...")
+    test_cursor_pages_match_offset_order()
+    test_cursor_total_modes()
+    test_offset_mode_without_count()
+    test_invalid_cursor_rejected()
+    print("✅ Community feed pagination tests passed")
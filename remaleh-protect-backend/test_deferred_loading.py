@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Test that heavy columns (lesson JSON, scan messages, report descriptions,
+user bios) are only selected by the endpoints that return them.
+"""
+
+import uuid
+
+from testsupport import app, count_queries, make_user
+from models import db, CommunityReport, LearningModule
+from auth import create_tokens
+
+TAG = uuid.uuid4().hex[:8]
+
+
+def _setup():
+    with app.app_context():
+        admin = make_user(f"defer-admin-{TAG}", first_name='Defer', last_name='Admin',
+                          role='ADMIN', is_admin=True, bio='Admin bio ' + TAG)
+        for i in range(3):
+            db.session.add(CommunityReport(user_id=admin.id, threat_type=f"defer-{TAG}",
+                                           description=f"Long description {i} " + 'x' * 500,
+                                           status='APPROVED'))
+        db.session.commit()
+        token, _ = create_tokens(admin.id)
+        return token
+
+
+def _get(path, token, **params):
+    with count_queries() as statements:
+        response = app.test_client().get(path, headers={'Authorization': f'Bearer {token}'}, query_string=params)
+    assert response.status_code == 200, response.get_data(as_text=True)
+    return response.get_json(), statements
+
+
+def _selects(statements, column):
+    return [s for s in statements if s.lstrip().upper().startswith('SELECT') and column in s]
+
+
+def test_lesson_count_follows_content():
+    with app.app_context():
+        module = LearningModule(title=f"Deferred {TAG}", description='d', difficulty='BEGINNER', estimated_time=5,
+                                content={'lessons': [{'id': 1}, {'id': 2}]})
+        db.session.add(module)
+        db.session.commit()
+        assert module.lesson_count == 2
+        module.content = {'lessons': [{'id': 1}, {'id': 2}, {'id': 3}]}
+        db.session.commit()
+        module_id = module.id
+    with app.app_context():
+        module = db.session.get(LearningModule, module_id)
+        assert module.lesson_count == 3
+        assert 'content' not in module.__dict__
+        assert module.to_summary_dict()['lesson_count'] == 3
+        assert 'content' not in module.__dict__
+
+
+def test_progress_overview_skips_lesson_json():
+    token = _setup()
+    body, statements = _get('/api/learning/progress/overview', token)
+    with app.app_context():
+        expected = sum(m.lesson_count for m in LearningModule.query.filter_by(is_active=True))
+    assert body['total_lessons'] == expected > 0
+    assert not _selects(statements, 'learning_modules.content')
+    # The authenticated user is loaded without the bio
+    assert not _selects(statements, 'users.bio')
+
+
+def test_admin_listings_skip_bio_and_load_descriptions_once():
+    token = _setup()
+    _, statements = _get('/api/admin/users', token, per_page=50)
+    assert not _selects(statements, 'users.bio')
+
+    body, statements = _get('/api/admin/reports', token, per_page=50)
+    assert len(_selects(statements, 'community_reports.description')) == 1
+    assert body['reports'] and all(r['description'] for r in body['reports'])
+
+
+def test_community_feed_undefers_what_it_renders():
+    token = _setup()
+    body, statements = _get('/api/community/reports', token, per_page=20, include_own='true')
+    mine = [r for r in body['reports'] if r['threat_type'] == f"defer-{TAG}"]
+    assert mine and mine[0]['creator']['bio'] == 'Admin bio ' + TAG
+    assert mine[0]['description'].startswith('Long description')
+    assert len(_selects(statements, 'community_reports.description')) == 1
+    # Once for the creators of the page
+    assert len(_selects(statements, 'users.bio')) == 1
+
+
+if __name__ == "__main__":
+    print("🧪 Testing deferred column loading...")
+    test_lesson_count_follows_content()
+    test_progress_overview_skips_lesson_json()
+    test_admin_listings_skip_bio_and_load_descriptions_once()
+    test_community_feed_undefers_what_it_renders()
+    print("✅ Deferred loading tests passed")
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Test domain lists: subdomain matching, extension by setting and file, hot
+reload when the file changes, and their use at registration, in link
+analysis and on the inbound-email webhook.
+"""
+
+import os
+import tempfile
+import time
+import uuid
+
+from testsupport import app, make_user
+from models import db
+from domain_index import DomainIndex, DomainList, disposable_domains
+from routes.link_analysis import LocalLinkAnalyzer
+
+
+def _write(path, lines):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(lines) + '\n')
+    # Make sure the modification time differs from the previous write
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+
+
+def test_index_matches_subdomains_only():
+    index = DomainIndex(['Mailinator.com', '*.tempmail.dev', 'com', 'drop.example.org.'])
+    assert len(index) == 3
+    assert index.match('mailinator.com') == 'mailinator.com'
+    assert index.match('inbox.eu.MAILINATOR.com') == 'mailinator.com'
+    assert index.match('user@x.tempmail.dev') == 'tempmail.dev'
+    assert index.match('drop.example.org:8080') == 'drop.example.org'
+    assert 'notmailinator.com' not in index
+    assert 'mailinator.com.evil.net' not in index
+    assert 'example.org' not in index
+    # Single-label entries are ignored
+    assert 'gmail.com' not in index
+    assert '' not in index and None not in index
+
+
+def test_list_reloads_when_file_or_setting_changes():
+    path = os.path.join(tempfile.mkdtemp(), 'domains.txt')
+    _write(path, ['# disposable providers', 'first.example', '', 'second.example  # trailing comment'])
+    domains = DomainList({'builtin.example'}, 'TEST_DOMAINS_FILE', 'TEST_DOMAINS_EXTRA')
+    app.config.update(TEST_DOMAINS_FILE=path, TEST_DOMAINS_EXTRA='extra.example, ', DOMAIN_LIST_RELOAD_SECONDS=0)
+    try:
+        with app.app_context():
+            index = domains.index()
+            assert len(index) == 4
+            assert 'a.second.example' in domains and 'extra.example' in domains
+            # Unchanged sources: the same index, not rebuilt
+            assert domains.index() is index
+
+            _write(path, ['third.example'])
+            assert 'third.example' in domains and 'first.example' not in domains
+            assert 'builtin.example' in domains
+
+            # An unreadable file keeps the previous list
+            os.remove(path)
+            assert 'third.example' in domains
+
+            app.config['TEST_DOMAINS_EXTRA'] = 'later.example'
+            app.config['TEST_DOMAINS_FILE'] = ''
+            assert 'later.example' in domains and 'third.example' not in domains
+    finally:
+        app.config['DOMAIN_LIST_RELOAD_SECONDS'] = 30
+
+
+def test_reload_waits_for_interval():
+    path = os.path.join(tempfile.mkdtemp(), 'domains.txt')
+    _write(path, ['old.example'])
+    domains = DomainList((), 'TEST_DOMAINS_FILE')
+    app.config.update(TEST_DOMAINS_FILE=path, DOMAIN_LIST_RELOAD_SECONDS=0.2)
+    try:
+        with app.app_context():
+            assert 'old.example' in domains
+            _write(path, ['new.example'])
+            assert 'old.example' in domains
+            time.sleep(0.25)
+            assert 'new.example' in domains
+    finally:
+        app.config['DOMAIN_LIST_RELOAD_SECONDS'] = 30
+
+
+def test_registration_rejects_disposable_subdomains():
+    path = os.path.join(tempfile.mkdtemp(), 'disposable.txt')
+    _write(path, ['throwaway.example'])
+    app.config['DISPOSABLE_DOMAINS_FILE'] = path
+    with app.app_context():
+        disposable_domains.reload()
+    try:
+        for email in ('someone@eu.mailinator.com', 'someone@throwaway.example', 'someone@x.throwaway.example'):
+            response = app.test_client().post('/api/auth/register', json={
+                'email': email, 'password': 'Password123!', 'first_name': 'Disposable'
+            })
+            assert response.status_code == 400, email
+            assert 'domain is not accepted' in response.get_json()['error']
+        with app.app_context():
+            assert 'example.com' not in disposable_domains
+    finally:
+        app.config['DISPOSABLE_DOMAINS_FILE'] = ''
+        with app.app_context():
+            disposable_domains.reload()
+
+
+def test_link_analysis_uses_domain_lists():
+    analyzer = LocalLinkAnalyzer()
+    assert 'Known malicious domain' in analyzer.analyze_url_structure('https://login.phish-paypal.net/x')['indicators']
+    shortener = 'Uses URL shortener (may hide destination)'
+    assert shortener in analyzer.analyze_url_structure('https://bit.ly/abc')['indicators']
+    # Shorteners are matched by domain, not substring ("microsof[t.co]m")
+    assert shortener not in analyzer.analyze_url_structure('https://microsoft.com/')['indicators']
+
+
+def test_inbound_email_flags_disposable_sender():
+    with app.app_context():
+        user = make_user('inbound', first_name='Inbound', email_forward_token=uuid.uuid4().hex)
+        db.session.commit()
+        token = user.email_forward_token
+    response = app.test_client().post('/api/enhanced-scam/inbound-email', json={
+        'token': token, 'subject': 'You won', 'text': 'Claim your prize', 'from': 'Prize Desk <desk@x.yopmail.com>'
+    })
+    assert response.status_code == 200, response.get_data(as_text=True)
+    assert response.get_json()['result']['debug_info']['sender_disposable'] is True
+
+
+if __name__ == "__main__":
+    print("🧪 Testing domain lists...")
+    test_index_matches_subdomains_only()
+    test_list_reloads_when_file_or_setting_changes()
+    test_reload_waits_for_interval()
+    test_registration_rejects_disposable_subdomains()
+    test_link_analysis_uses_domain_lists()
+    test_inbound_email_flags_disposable_sender()
+    print("✅ Domain list tests passed")
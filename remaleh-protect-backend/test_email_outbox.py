@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+"""
+Test the email outbox: routes only enqueue, the background sender delivers
+over one reused SMTP session, and failures are retried or given up on.
+
+Runs against an in-process SMTP stand-in (SmtpStandIn below) on localhost.
+"""
+
+import base64
+import os
+import socketserver
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from testsupport import app
+from models import db, User, OutboundEmail
+import email_outbox
+
+# Let the background sender exit as soon as the queue is empty, so it does not
+# pick up messages the later tests send themselves
+app.config['EMAIL_SMTP_IDLE_SECONDS'] = 0
+
+
+class SmtpStandIn(socketserver.ThreadingTCPServer):
+    """A minimal SMTP server that records what it receives.
+
+    Recipients starting with 'reject' get a 550, 'busy' a 451. With
+    `drop_after`, the server closes each connection after that many messages.
+    `delay` is added to the greeting and login (the slow parts of a real relay).
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, delay=0.0, drop_after=None):
+        super().__init__(('127.0.0.1', 0), _SmtpHandler)
+        self.delay = delay
+        self.drop_after = drop_after
+        self.connections = 0
+        self.logins = 0
+        self.messages = []
+        self.lock = threading.Lock()
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def configure(self, config):
+        config.update(SMTP_HOST='127.0.0.1', SMTP_PORT=self.port, SMTP_USERNAME='user',
+                      SMTP_PASSWORD='secret', SMTP_USE_TLS=False, EMAIL_PROVIDER='SMTP')
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class _SmtpHandler(socketserver.StreamRequestHandler):
+    def _reply(self, line):
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self):
+        server = self.server
+        with server.lock:
+            server.connections += 1
+        time.sleep(server.delay)
+        self._reply('220 stand-in ESMTP')
+        sent = 0
+        rcpt = None
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode().strip()
+            verb = command.split(' ', 1)[0].upper()
+            if verb in ('EHLO', 'HELO'):
+                self.wfile.write(b"250-stand-in\r\n250 AUTH PLAIN\r\n")
+            elif verb == 'AUTH':
+                time.sleep(server.delay)
+                credentials = base64.b64decode(command.split()[-1]).split(b'\0')
+                if credentials[1:] == [b'user', b'secret']:
+                    with server.lock:
+                        server.logins += 1
+                    self._reply('235 Authentication successful')
+                else:
+                    self._reply('535 Authentication failed')
+            elif verb == 'MAIL':
+                rcpt = None
+                self._reply('250 OK')
+            elif verb == 'RCPT':
+                rcpt = command.split(':', 1)[1].strip().strip('<>')
+                if rcpt.startswith('reject'):
+                    self._reply('550 No such user')
+                elif rcpt.startswith('busy'):
+                    self._reply('451 Try again later')
+                else:
+                    self._reply('250 OK')
+            elif verb == 'DATA':
+                self._reply('354 End data with <CR><LF>.<CR><LF>')
+                body = []
+                while True:
+                    data = self.rfile.readline()
+                    if data in (b'.\r\n', b''):
+                        break
+                    body.append(data.decode())
+                with server.lock:
+                    server.messages.append((rcpt, ''.join(body)))
+                self._reply('250 Queued')
+                sent += 1
+                if server.drop_after and sent >= server.drop_after:
+                    return
+            elif verb in ('RSET', 'NOOP'):
+                self._reply('250 OK')
+            elif verb == 'QUIT':
+                self._reply('221 Bye')
+                return
+            else:
+                self._reply('502 Command not implemented')
+
+
+def _address(prefix='outbox'):
+    return f"{prefix}-{uuid.uuid4().hex[:8]}@example.com"
+
+
+def _clear_outbox():
+    with app.app_context():
+        OutboundEmail.query.delete()
+        db.session.commit()
+
+
+def _wait_until(predicate, timeout=10):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if predicate():
+            return
+        time.sleep(0.02)
+    raise AssertionError('Timed out waiting for the email sender')
+
+
+def _statuses():
+    with app.app_context():
+        return {m.to_email: m for m in OutboundEmail.query.all()}
+
+
+def test_password_reset_only_enqueues_and_the_sender_delivers():
+    _clear_outbox()
+    smtp = SmtpStandIn(delay=1.0)
+    smtp.configure(app.config)
+    email = _address()
+    try:
+        with app.app_context():
+            user = User(email=email, first_name='Outbox')
+            user.set_password('Password123!')
+            db.session.add(user)
+            db.session.commit()
+        started = time.perf_counter()
+        response = app.test_client().post('/api/auth/request-password-reset', json={'email': email})
+        elapsed = time.perf_counter() - started
+        assert response.status_code == 200, response.get_data(as_text=True)
+        # The request did not wait for the slow relay's greeting and login
+        assert elapsed < 1.0
+        _wait_until(lambda: _statuses()[email].status == 'sent')
+        message = _statuses()[email]
+        assert message.attempts == 1 and message.sent_at is not None
+        with app.app_context():
+            assert db.session.get(OutboundEmail, message.id).html_body is None
+        rcpt, body = smtp.messages[-1]
+        assert rcpt == email and 'temporary password' in body
+    finally:
+        smtp.stop()
+
+
+def test_one_session_is_reused_across_batches():
+    _clear_outbox()
+    smtp = SmtpStandIn()
+    smtp.configure(app.config)
+    try:
+        with app.app_context():
+            for _ in range(email_outbox.EMAIL_BATCH_SIZE * 2 + 5):
+                email_outbox.queue_email('Hello', _address(), '<p>hi</p>')
+            db.session.commit()
+            session = email_outbox.SmtpSession(app.config)
+            try:
+                summary = email_outbox.send_outbox(session)
+                # Another burst over the still-open session
+                email_outbox.queue_email('Hello again', _address(), '<p>hi</p>')
+                db.session.commit()
+                assert email_outbox.send_outbox(session)['sent'] == 1
+            finally:
+                session.close()
+        assert summary == {'sent': email_outbox.EMAIL_BATCH_SIZE * 2 + 5, 'retrying': 0, 'failed': 0}
+        assert smtp.connections == 1 and smtp.logins == 1
+        assert len(smtp.messages) == email_outbox.EMAIL_BATCH_SIZE * 2 + 6
+    finally:
+        smtp.stop()
+
+
+def test_dropped_session_is_reestablished():
+    _clear_outbox()
+    smtp = SmtpStandIn(drop_after=3)
+    smtp.configure(app.config)
+    try:
+        with app.app_context():
+            for _ in range(7):
+                email_outbox.queue_email('Hello', _address(), '<p>hi</p>')
+            db.session.commit()
+            summary = email_outbox.send_outbox()
+        assert summary['sent'] == 7
+        assert smtp.connections == 3
+    finally:
+        smtp.stop()
+
+
+def test_failures_are_retried_with_backoff_or_given_up():
+    _clear_outbox()
+    smtp = SmtpStandIn()
+    smtp.configure(app.config)
+    rejected, busy, ok = _address('reject'), _address('busy'), _address()
+    try:
+        with app.app_context():
+            for to in (rejected, busy, ok):
+                email_outbox.queue_email('Hello', to, '<p>hi</p>')
+            db.session.commit()
+            assert email_outbox.send_outbox() == {'sent': 1, 'retrying': 1, 'failed': 1}
+        messages = _statuses()
+        assert messages[rejected].status == 'failed' and '550' in messages[rejected].last_error
+        assert messages[busy].status == 'pending' and messages[busy].attempts == 1
+        assert messages[busy].next_attempt_at > datetime.utcnow() + timedelta(seconds=30)
+
+        with app.app_context():
+            task = OutboundEmail.query.filter_by(to_email=busy).one()
+            for _ in range(app.config['EMAIL_MAX_ATTEMPTS']):
+                task.next_attempt_at = datetime.utcnow() - timedelta(seconds=1)
+                db.session.commit()
+                email_outbox.send_outbox()
+                db.session.refresh(task)
+            assert task.status == 'failed'
+            assert task.attempts == app.config['EMAIL_MAX_ATTEMPTS']
+    finally:
+        smtp.stop()
+
+
+def test_unreachable_server_defers_the_whole_batch():
+    _clear_outbox()
+    smtp = SmtpStandIn()
+    smtp.configure(app.config)
+    smtp.stop()
+    try:
+        with app.app_context():
+            for _ in range(3):
+                email_outbox.queue_email('Hello', _address(), '<p>hi</p>')
+            db.session.commit()
+            assert email_outbox.send_outbox() == {'sent': 0, 'retrying': 3, 'failed': 0}
+            assert email_outbox.outbox_status() == {'pending': 3}
+    finally:
+        _clear_outbox()
+
+
+def test_rolled_back_transaction_sends_nothing():
+    _clear_outbox()
+    with app.app_context():
+        email_outbox.queue_email('Hello', _address(), '<p>hi</p>')
+        db.session.rollback()
+        assert OutboundEmail.query.count() == 0
+
+
+def test_forked_worker_starts_its_own_sender():
+    _clear_outbox()
+    smtp = SmtpStandIn()
+    smtp.configure(app.config)
+    email = _address()
+    try:
+        with app.app_context():
+            email_outbox.queue_email('Hello', email, '<p>hi</p>')
+            db.session.commit()
+        # As in a preloaded gunicorn master that had started a sender: the flag is
+        # inherited by the fork, the thread is not
+        email_outbox._sender.pid = os.getpid()
+        pid = os.fork()
+        if pid == 0:
+            code = 1
+            try:
+                with app.app_context():
+                    db.engine.dispose(close=False)
+                # The worker's first request resumes the outbox in the worker
+                app.test_client().get('/api/health')
+                _wait_until(lambda: _statuses()[email].status == 'sent')
+                code = 0
+            finally:
+                os._exit(code)
+        assert os.waitpid(pid, 0)[1] == 0
+        assert _statuses()[email].status == 'sent'
+        assert [rcpt for rcpt, _ in smtp.messages] == [email]
+    finally:
+        email_outbox._sender.pid = None
+        smtp.stop()
+
+
+def test_message_queued_while_the_sender_stops_is_sent():
+    _clear_outbox()
+    smtp = SmtpStandIn()
+    smtp.configure(app.config)
+    late = _address('late')
+    original = email_outbox.purge_sent
+    calls = []
+
+    def queue_during_the_final_purge(days=None):
+        # The sender found the queue empty and is stopping
+        if not calls:
+            calls.append(1)
+            email_outbox.queue_email('Late', late, '<p>late</p>')
+            db.session.commit()
+            email_outbox.maybe_send_outbox()
+        return original(days)
+
+    email_outbox.purge_sent = queue_during_the_final_purge
+    try:
+        with app.app_context():
+            assert email_outbox.maybe_send_outbox()
+        _wait_until(lambda: late in _statuses() and _statuses()[late].status == 'sent')
+        _wait_until(lambda: email_outbox._sender.pid is None)
+    finally:
+        email_outbox.purge_sent = original
+        smtp.stop()
+
+
+if __name__ == "__main__":
+    print("🧪 Testing the email outbox...")
+    test_password_reset_only_enqueues_and_the_sender_delivers()
+    test_one_session_is_reused_across_batches()
+    test_dropped_session_is_reestablished()
+    test_failures_are_retried_with_backoff_or_given_up()
+    test_unreachable_server_defers_the_whole_batch()
+    test_rolled_back_transaction_sends_nothing()
+    test_forked_worker_starts_its_own_sender()
+    test_message_queued_while_the_sender_stops_is_sent()
+    print("✅ Email outbox tests passed")
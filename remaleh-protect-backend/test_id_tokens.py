@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+Test local verification of Google and Apple ID tokens against cached JWKS.
+
+Tokens are signed with locally generated RSA keys, published by an
+in-process HTTP server (JwksServer below) in place of the providers' JWKS
+endpoints.
+"""
+
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import jwt
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+from testsupport import app
+from models import User
+import id_tokens
+
+GOOGLE_CLIENT_ID = 'web-client.apps.googleusercontent.com'
+app.config['GOOGLE_CLIENT_ID'] = GOOGLE_CLIENT_ID
+
+
+class JwksServer(ThreadingHTTPServer):
+    """Serves a JWKS built from locally generated keys and counts fetches"""
+
+    daemon_threads = True
+
+    def __init__(self, max_age=3600):
+        super().__init__(('127.0.0.1', 0), _JwksHandler)
+        self.max_age = max_age
+        self.keys = {}
+        self.fetches = 0
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/certs"
+
+    def add_key(self):
+        kid = uuid.uuid4().hex[:12]
+        self.keys[kid] = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        return kid
+
+    def jwks(self):
+        keys = []
+        for kid, private_key in self.keys.items():
+            jwk = json.loads(jwt.algorithms.RSAAlgorithm.to_jwk(private_key.public_key()))
+            jwk.update(kid=kid, alg='RS256', use='sig')
+            keys.append(jwk)
+        return {'keys': keys}
+
+    def sign(self, kid, private_key=None, **claims):
+        now = int(time.time())
+        payload = {'iss': 'https://accounts.google.com', 'aud': GOOGLE_CLIENT_ID, 'sub': uuid.uuid4().hex,
+                   'iat': now, 'exp': now + 600, 'email': f"idtoken-{uuid.uuid4().hex[:8]}@example.com"}
+        payload.update(claims)
+        return jwt.encode(payload, private_key or self.keys[kid], algorithm='RS256', headers={'kid': kid})
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class _JwksHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.server.fetches += 1
+        body = json.dumps(self.server.jwks()).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Cache-Control', f"public, max-age={self.server.max_age}")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def _serve(provider, **kwargs):
+    server = JwksServer(**kwargs)
+    id_tokens.PROVIDERS[provider]['jwks_uri'] = server.url
+    id_tokens._key_sets.pop(provider, None)
+    return server
+
+
+def _google_login(token):
+    return app.test_client().post('/api/auth/oauth/google/idtoken', json={'id_token': token})
+
+
+def test_google_login_verifies_locally_with_one_key_fetch():
+    server = _serve('google')
+    try:
+        kid = server.add_key()
+        email = f"google-{uuid.uuid4().hex[:8]}@example.com"
+        response = _google_login(server.sign(kid, email=email, given_name='Ada'))
+        assert response.status_code == 200, response.get_data(as_text=True)
+        assert response.get_json()['token']
+        for _ in range(5):
+            assert _google_login(server.sign(kid)).status_code == 200
+        assert server.fetches == 1
+        with app.app_context():
+            assert User.query.filter_by(email=email).one().first_name == 'Ada'
+    finally:
+        server.stop()
+
+
+def test_bad_tokens_are_rejected():
+    server = _serve('google')
+    try:
+        kid = server.add_key()
+        forged_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        cases = {
+            'ID token audience mismatch': server.sign(kid, aud='someone-else'),
+            'Invalid token issuer': server.sign(kid, iss='https://evil.example.com'),
+            'Google ID token has expired': server.sign(kid, iat=int(time.time()) - 7200,
+                                                       exp=int(time.time()) - 3600),
+            'Invalid Google ID token': server.sign(kid, private_key=forged_key),
+        }
+        for message, token in cases.items():
+            response = _google_login(token)
+            assert response.status_code == 401, message
+            assert response.get_json()['error'] == message
+        unsigned = jwt.encode({'email': 'x@example.com', 'iss': 'https://accounts.google.com'}, None, algorithm='none')
+        assert _google_login(unsigned).status_code == 401
+        assert _google_login('not-a-jwt').status_code == 401
+    finally:
+        server.stop()
+
+
+def test_rotated_key_is_fetched_once_and_unknown_kids_are_throttled():
+    server = _serve('google')
+    try:
+        old_kid = server.add_key()
+        assert _google_login(server.sign(old_kid)).status_code == 200
+        assert server.fetches == 1
+
+        # The provider publishes a new key and starts signing with it
+        app.config['JWKS_REFRESH_MIN_SECONDS'] = 0
+        new_kid = server.add_key()
+        assert _google_login(server.sign(new_kid)).status_code == 200
+        assert _google_login(server.sign(new_kid)).status_code == 200
+        assert server.fetches == 2
+
+        # Tokens with made-up key ids don't refetch within JWKS_REFRESH_MIN_SECONDS of the last fetch
+        app.config['JWKS_REFRESH_MIN_SECONDS'] = 60
+        private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        for _ in range(5):
+            assert _google_login(server.sign('made-up', private_key=private_key)).status_code == 401
+        assert server.fetches == 2
+        assert _google_login(server.sign(old_kid)).status_code == 200
+        assert server.fetches == 2
+    finally:
+        app.config['JWKS_REFRESH_MIN_SECONDS'] = 60
+        server.stop()
+
+
+def test_expired_key_set_is_refetched():
+    server = _serve('google', max_age=1)
+    try:
+        kid = server.add_key()
+        assert _google_login(server.sign(kid)).status_code == 200
+        time.sleep(1.1)
+        assert _google_login(server.sign(kid)).status_code == 200
+        assert server.fetches == 2
+    finally:
+        server.stop()
+
+
+def test_apple_idtoken_is_verified():
+    server = _serve('apple')
+    try:
+        kid = server.add_key()
+        claims = {'iss': 'https://appleid.apple.com', 'aud': 'com.remaleh.protect'}
+        response = app.test_client().post('/api/auth/oauth/apple/idtoken',
+                                          json={'id_token': server.sign(kid, **claims)})
+        assert response.status_code == 200, response.get_data(as_text=True)
+        forged = server.sign(kid, private_key=rsa.generate_private_key(public_exponent=65537, key_size=2048),
+                             **claims)
+        response = app.test_client().post('/api/auth/oauth/apple/idtoken', json={'id_token': forged})
+        assert response.status_code == 401
+        assert response.get_json()['error'] == 'Invalid Apple ID token'
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    print("🧪 Testing ID token verification...")
+    test_google_login_verifies_locally_with_one_key_fetch()
+    test_bad_tokens_are_rejected()
+    test_rotated_key_is_fetched_once_and_unknown_kids_are_throttled()
+    test_expired_key_set_is_refetched()
+    test_apple_idtoken_is_verified()
+    print("✅ ID token verification tests passed")
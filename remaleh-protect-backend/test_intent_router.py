@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Test the compiled intent router: it finds exactly the keywords that
+``keyword in message.lower()`` finds, ranks intents by table order, and
+routes chat messages to the same replies as the per-list keyword loops it
+replaced.
+"""
+
+import random
+
+from testsupport import app
+from intent_router import IntentRouter
+import routes.chat as chat
+
+
+def _naive(intents, text):
+    groups = {}
+    for group, name, keywords in intents:
+        if any(keyword.lower() in text.lower() for keyword in keywords):
+            groups.setdefault(group, []).append(name)
+    return groups
+
+
+def test_router_matches_every_substring_keyword():
+    intents = [
+        ('rule', 'long', ['password security', 'pass']),
+        ('rule', 'short', ['password', 'word', 'a.b']),
+        ('country', 'us', ['us']),
+        ('country', 'uk', ['uk', 'ru']),
+    ]
+    router = IntentRouter(intents)
+    # Overlapping keywords and keywords that are prefixes or suffixes of others all count
+    assert router.match('PASSWORD SECURITY') == {'rule': ['long', 'short']}
+    assert router.match('a virus') == {'country': ['us', 'uk']}
+    assert router.match('a.b') == {'rule': ['short']}
+    assert router.match('axb') == {}
+    assert router.match('') == {} and IntentRouter([]).match('anything') == {}
+
+    rng = random.Random(5)
+    fragments = ['pass', 'word', ' security', 'us', 'uk', 'r', 'a.b', 'x', ' ', 'Pa']
+    for _ in range(2000):
+        text = ''.join(rng.choice(fragments) for _ in range(rng.randint(0, 8)))
+        assert router.match(text) == _naive(intents, text), text
+
+
+def test_chat_intents_match_keyword_loops():
+    intents = ([('rule', i, rule['keywords']) for i, rule in enumerate(chat.RULES)]
+               + [('escalation', level, keywords) for level, keywords in chat.ESCALATION_KEYWORDS.items()])
+    rng = random.Random(11)
+    words = [keyword for _, _, keywords in intents for keyword in keywords] + ['the', 'my', 'is', '?', 'what']
+    for _ in range(1000):
+        message = ' '.join(rng.choice(words) for _ in range(rng.randint(1, 6)))
+        assert chat.INTENT_ROUTER.match(message).get('rule') == _naive(intents, message).get('rule'), message
+
+
+def test_route_message_decisions():
+    intent = chat.route_message('How do I make a strong password? I was hacked')
+    assert intent['escalation_level'] == 'high'
+    # Priority rules rank first, then the knowledge base in order
+    assert chat.RULES[intent['rules'][0]]['category'] == 'passwords'
+    assert chat.RULES[chat.route_message('Can I talk to someone about my password?')['rules'][0]]['category'] == 'guardian_escalation'
+
+    assert chat.route_message('I live in Canada')['country'] == 'canada'
+    # "australia" contains "us": Australia ranks before the United States
+    assert chat.route_message('I am in Australia')['country'] == 'australia'
+    assert chat.route_message('I live in France')['country'] is None
+
+    assert chat.route_message('Who are the local police here?')['needs_country']
+    assert not chat.route_message('Which local police in the UK?')['needs_country']
+    assert chat.route_message('Which local police in the UK?')['country'] == 'united kingdom'
+    assert chat.route_message('I am worried')['escalation_level'] == 'medium'
+    assert chat.route_message('Hello')['rules'] == []
+
+
+def test_chat_endpoint_routes_in_one_pass():
+    client = app.test_client()
+    response = client.post('/api/chat/', json={'message': 'I got a phishing email and I am worried'}).get_json()
+    assert response['source'] == 'expert_knowledge_with_guardian' and response['escalation_level'] == 'medium'
+    response = client.post('/api/chat/', json={'message': 'Where do I report fraud in my area?'}).get_json()
+    assert response['source'] == 'country_context_request' and response['needs_country'] is True
+    response = client.post('/api/chat/', json={'message': 'I live in the United Kingdom'}).get_json()
+    assert response['source'] == 'country_specific_knowledge'
+
+
+if __name__ == "__main__":
+    print("🧪 Testing intent router...")
+    test_router_matches_every_substring_keyword()
+    test_chat_intents_match_keyword_loops()
+    test_route_message_decisions()
+    test_chat_endpoint_routes_in_one_pass()
+    print("✅ Intent router tests passed")
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Test the Redis sorted-set leaderboard against the database totals.
+
+Runs in-process against a throwaway SQLite database. The Redis cases use
+REDIS_URL (default database 15) and are skipped when Redis is unreachable.
+"""
+
+import os
+import sys
+
+import pytest
+
+os.environ.setdefault('REDIS_URL', 'redis://localhost:6379/15')
+
+from testsupport import app, make_user
+from models import db
+from cache import cache
+from auth import create_tokens
+import leaderboard
+import points
+
+
+def _user_with_points(amount, **fields):
+    u = make_user('board', first_name='Board', last_name='Tester', **fields)
+    if amount:
+        points.award_points_with_daily_cap(u.id, amount, 'leaderboard test')
+    db.session.commit()
+    return u.id
+
+
+def _require_redis():
+    if cache.redis_client is None:
+        pytest.skip('Redis not reachable')
+
+
+def test_cold_leaderboard_falls_back_to_database():
+    with app.app_context():
+        _user_with_points(30)
+        if cache.redis_client is not None:
+            cache.redis_client.delete(leaderboard.READY_KEY)
+        assert leaderboard.top_users('all', 10) == points.top_users('all', 10)
+
+
+def test_redis_rank_and_top_match_database():
+    _require_redis()
+    with app.app_context():
+        ids = [_user_with_points(p) for p in (5, 80, 80, 40)]
+        assert leaderboard.rebuild_leaderboard() is not None
+        for period in ('all', '90d'):
+            assert [r[0] for r in leaderboard.top_users(period, 50)] == [r[0] for r in points.top_users(period, 50)]
+            for uid in ids:
+                assert leaderboard.user_rank(uid, period) == points.user_rank(uid, period)
+
+
+def test_redis_ties_at_the_cut_are_ordered_by_id():
+    _require_redis()
+    with app.app_context():
+        # 120 (the daily cap) is more than anyone else here; by member string Redis orders "99999", "100001", "100000"
+        ids = [_user_with_points(120, id=uid) for uid in (100001, 99999, 100000)]
+        leaderboard.rebuild_leaderboard()
+        for period in ('all', '90d'):
+            for limit in (1, 2, 3):
+                top = [r[0] for r in leaderboard.top_users(period, limit)]
+                assert top == sorted(ids)[:limit] == [r[0] for r in points.top_users(period, limit)]
+
+
+def test_leaderboard_endpoint_reads_redis():
+    _require_redis()
+    with app.app_context():
+        uid = _user_with_points(120)
+        leaderboard.rebuild_leaderboard()
+        token, _ = create_tokens(uid)
+    response = app.test_client().get('/api/community/leaderboard?period=all',
+                                     headers={'Authorization': f'Bearer {token}'})
+    assert response.status_code == 200, response.get_data(as_text=True)
+    row = next(row for row in response.get_json()['leaderboard'] if row['id'] == uid)
+    assert row['points'] == 120 and row['name'] == 'Board Tester'
+
+
+def test_redis_updates_only_after_commit():
+    _require_redis()
+    with app.app_context():
+        uid = _user_with_points(0)
+        leaderboard.rebuild_leaderboard()
+
+        points.award_points_with_daily_cap(uid, 10, 'rolled back')
+        db.session.rollback()
+        assert cache.redis_client.zscore(leaderboard.ALL_KEY, uid) is None
+
+        points.award_points_with_daily_cap(uid, 10, 'committed')
+        db.session.commit()
+        assert cache.redis_client.zscore(leaderboard.ALL_KEY, uid) == 10
+        assert cache.redis_client.zscore(leaderboard.WINDOW_KEY, uid) == 10
+
+
+def test_points_committed_during_a_rebuild_survive_the_swap():
+    _require_redis()
+    with app.app_context():
+        before, during = _user_with_points(20), _user_with_points(0)
+        original = leaderboard._load_copies
+
+        def load_then_award(*args):
+            loaded = original(*args)
+            # Committed after the database was read, before the copies are swapped in
+            points.award_points_with_daily_cap(before, 5, 'during rebuild')
+            points.award_points_with_daily_cap(during, 7, 'during rebuild')
+            db.session.commit()
+            return loaded
+
+        leaderboard._load_copies = load_then_award
+        try:
+            leaderboard.rebuild_leaderboard()
+        finally:
+            leaderboard._load_copies = original
+        assert not cache.redis_client.exists(leaderboard.REBUILDING_KEY)
+        for period in ('all', '90d'):
+            key = leaderboard._period_key(period)
+            assert cache.redis_client.zscore(key, before) == 25
+            assert cache.redis_client.zscore(key, during) == 7
+            for uid in (before, during):
+                assert leaderboard.user_rank(uid, period) == points.user_rank(uid, period)
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, '-q']))
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Test sign-in throttling: sliding-window failure counts per account and per
+IP, doubling lockouts, reset on success, and atomic counting under
+concurrent attempts.
+
+The Redis cases use REDIS_URL (default database 15) and are skipped when
+Redis is unreachable; the rest exercise the in-process fallback.
+"""
+
+import os
+import random
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+os.environ.setdefault('REDIS_URL', 'redis://localhost:6379/15')
+
+from testsupport import PASSWORD, app, make_user
+from models import db
+from cache import cache
+from monitoring import LOGIN_LOCKOUTS
+import login_throttle
+
+app.config.update(LOGIN_LOCKOUT_SECONDS=1, LOGIN_LOCKOUT_MAX_SECONDS=4)
+
+
+def _user():
+    with app.app_context():
+        user = make_user('throttle', first_name='Throttle')
+        db.session.commit()
+        return user.email
+
+
+def _ip():
+    return f"10.{random.randint(0, 255)}.{random.randint(0, 255)}.{random.randint(1, 254)}"
+
+
+def _login(email, password, ip):
+    return app.test_client().post('/api/auth/login', json={'email': email, 'password': password},
+                                  environ_base={'REMOTE_ADDR': ip})
+
+
+def _login_via_proxy(email, password, forwarded_for, proxy='10.0.0.1'):
+    return app.test_client().post('/api/auth/login', json={'email': email, 'password': password},
+                                  environ_base={'REMOTE_ADDR': proxy},
+                                  headers={'X-Forwarded-For': forwarded_for})
+
+
+def _lockouts(scope):
+    return LOGIN_LOCKOUTS.labels(scope=scope)._value.get()
+
+
+def test_account_locks_after_max_failures_and_doubles():
+    email, ip = _user(), _ip()
+    for _ in range(app.config['LOGIN_MAX_FAILURES_PER_ACCOUNT']):
+        assert _login(email, 'wrong', ip).status_code == 401
+    # Locked out: even the right password is refused
+    response = _login(email, PASSWORD, ip)
+    assert response.status_code == 429
+    assert response.headers['Retry-After'] == '1' and response.get_json()['retry_after'] == 1
+
+    time.sleep(1.1)
+    for _ in range(app.config['LOGIN_MAX_FAILURES_PER_ACCOUNT']):
+        assert _login(email, 'wrong', ip).status_code == 401
+    # The second lockout lasts twice as long
+    assert _login(email, PASSWORD, ip).headers['Retry-After'] == '2'
+
+
+def test_success_resets_the_account_counter():
+    email, ip = _user(), _ip()
+    limit = app.config['LOGIN_MAX_FAILURES_PER_ACCOUNT']
+    for _ in range(limit - 1):
+        assert _login(email, 'wrong', ip).status_code == 401
+    assert _login(email, PASSWORD, ip).status_code == 200
+    for _ in range(limit - 1):
+        assert _login(email, 'wrong', ip).status_code == 401
+    assert _login(email, PASSWORD, ip).status_code == 200
+
+
+def test_ip_is_locked_across_accounts():
+    ip = _ip()
+    for _ in range(app.config['LOGIN_MAX_FAILURES_PER_IP']):
+        assert _login(f"nobody-{uuid.uuid4().hex[:8]}@example.com", 'wrong', ip).status_code == 401
+    email = _user()
+    assert _login(email, PASSWORD, ip).status_code == 429
+    # The account itself is not locked from other addresses
+    assert _login(email, PASSWORD, _ip()).status_code == 200
+
+
+def test_ip_lockout_behind_a_proxy_is_per_client():
+    assert app.config['PROXY_FIX_X_FOR'] == 1
+    client, neighbour = _ip(), _ip()
+    for _ in range(app.config['LOGIN_MAX_FAILURES_PER_IP']):
+        # A client can prepend addresses, but the proxy appends the real one last
+        spoofed = f"{_ip()}, {client}"
+        assert _login_via_proxy(f"nobody-{uuid.uuid4().hex[:8]}@example.com", 'wrong', spoofed).status_code == 401
+    email = _user()
+    assert _login_via_proxy(email, PASSWORD, client).status_code == 429
+    # Other clients of the same proxy are not locked out with it
+    assert _login_via_proxy(email, PASSWORD, neighbour).status_code == 200
+
+
+def test_concurrent_failures_start_exactly_one_lockout():
+    email = f"race-{uuid.uuid4().hex[:8]}@example.com"
+    before = _lockouts('account')
+    limit = app.config['LOGIN_MAX_FAILURES_PER_ACCOUNT']
+
+    def fail(_):
+        with app.app_context():
+            return login_throttle.login_failed(email, None)
+
+    with ThreadPoolExecutor(8) as pool:
+        locks = list(pool.map(fail, range(limit + 2)))
+    assert len([lock for lock in locks if lock]) == 1
+    assert _lockouts('account') == before + 1
+    with app.app_context():
+        assert login_throttle.check_login(email, None) > 0
+
+
+def test_redis_counters_are_shared_and_atomic():
+    if cache.redis_client is None:
+        pytest.skip('Redis not reachable')
+    email = f"redis-{uuid.uuid4().hex[:8]}@example.com"
+    with app.app_context():
+        for _ in range(app.config['LOGIN_MAX_FAILURES_PER_ACCOUNT'] - 1):
+            assert login_throttle.login_failed(email, None) == 0
+        # A fresh process (no in-process state) sees the same counters
+        login_throttle._local.clear()
+        assert login_throttle.login_failed(email, None) == 1
+        assert login_throttle.check_login(email, None) == 1
+        login_throttle.login_succeeded(email)
+        assert login_throttle.check_login(email, None) == 0
+
+
+if __name__ == "__main__":
+    print("🧪 Testing login throttling...")
+    test_account_locks_after_max_failures_and_doubles()
+    test_success_resets_the_account_counter()
+    test_ip_is_locked_across_accounts()
+    test_ip_lockout_behind_a_proxy_is_per_client()
+    test_concurrent_failures_start_exactly_one_lockout()
+    print("✅ Login throttling tests passed")
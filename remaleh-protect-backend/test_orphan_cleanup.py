@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Test orphan cleanup: NOT EXISTS anti-joins in bounded batches, dry-run
+counts, and point totals rebuilt for users who lose point logs.
+"""
+
+
+from testsupport import app, count_queries, make_user
+from models import (db, CommunityReport, CommunityReportMedia, CommunityReportComment, ReportVote,
+                    UserPointLog)
+from auth import create_tokens
+from points import award_points_with_daily_cap, get_user_points
+from orphan_cleanup import cleanup_orphans, count_orphans
+
+ORPHAN_DELETES = tuple(f"DELETE FROM {table.upper()}" for table in (
+    'user_point_logs', 'community_report_media', 'community_report_comments', 'report_votes'))
+
+# Keep feed reads in other tests from cleaning up the orphans seeded here
+app.config['ORPHAN_CLEANUP_ENABLED'] = False
+
+
+def _seed(orphans=5):
+    """A live report with children, plus `orphans` rows per table pointing at missing reports"""
+    with app.app_context():
+        user = make_user('orphans', role='ADMIN', is_admin=True)
+        live = CommunityReport(user_id=user.id, threat_type='PHISHING', description='still here')
+        db.session.add(live)
+        db.session.flush()
+        missing = db.session.query(db.func.max(CommunityReport.id)).scalar() + 10000
+        for report_id in [live.id] + [missing + i for i in range(orphans)]:
+            db.session.add(CommunityReportMedia(report_id=report_id, media_url=f"/api/community/uploads/{report_id}.png"))
+            db.session.add(CommunityReportComment(report_id=report_id, user_id=user.id, comment='hi'))
+            db.session.add(ReportVote(report_id=report_id, user_id=user.id, vote_type='up'))
+            award_points_with_daily_cap(user.id, 1, 'report', report_id=report_id)
+        # Points not tied to any report are never orphans
+        award_points_with_daily_cap(user.id, 3, 'lesson completed')
+        db.session.commit()
+        token, _ = create_tokens(user.id)
+        return user.id, live.id, token
+
+
+def test_dry_run_counts_without_deleting():
+    _seed(orphans=4)
+    with app.app_context():
+        before = count_orphans()
+        assert all(n >= 4 for n in before.values())
+        summary = cleanup_orphans(dry_run=True)
+        assert summary['dry_run'] and summary['orphans'] == before
+        assert count_orphans() == before
+
+
+def test_cleanup_removes_orphans_in_batches():
+    user_id, live_id, _ = _seed(orphans=5)
+    with app.app_context():
+        expected = count_orphans()
+        with count_queries() as statements:
+            summary = cleanup_orphans(batch_size=2)
+        deletes = [s for s in statements if s.lstrip().upper().startswith(ORPHAN_DELETES)]
+
+        assert summary['removed'] == expected
+        # At most two orphans per transaction
+        assert summary['batches'] >= sum((n + 1) // 2 for n in expected.values())
+        assert deletes and all('NOT (EXISTS' in s.upper() and 'NOT IN' not in s.upper() for s in deletes)
+        assert count_orphans() == {key: 0 for key in expected}
+        # Rows of the live report and unrelated point logs survive
+        assert CommunityReportMedia.query.filter_by(report_id=live_id).count() == 1
+        assert CommunityReportComment.query.filter_by(report_id=live_id).count() == 1
+        assert ReportVote.query.filter_by(report_id=live_id).count() == 1
+        assert UserPointLog.query.filter_by(user_id=user_id).count() == 2
+        assert get_user_points(user_id)['all'] == 4
+
+
+def test_endpoint_dry_run_and_status():
+    _seed(orphans=2)
+    _, _, token = _seed(orphans=0)
+    client = app.test_client()
+    headers = {'Authorization': f'Bearer {token}'}
+    response = client.post('/api/admin/reports/cleanup/orphans', headers=headers, query_string={'dry_run': 'true'})
+    assert response.status_code == 200, response.get_data(as_text=True)
+    body = response.get_json()
+    assert body['dry_run'] is True and body['orphans']['media'] >= 2
+
+    response = client.post('/api/admin/reports/cleanup/orphans', headers=headers, query_string={'batch_size': 1})
+    assert response.status_code == 200, response.get_data(as_text=True)
+    body = response.get_json()
+    assert body['removed']['media'] >= 2 and body['batches'] >= 8
+
+    status = client.get('/api/admin/reports/cleanup/orphans', headers=headers).get_json()['last_run']
+    assert status['removed'] == body['removed']
+
+
+if __name__ == "__main__":
+    print("🧪 Testing orphan cleanup...")
+    test_dry_run_counts_without_deleting()
+    test_cleanup_removes_orphans_in_batches()
+    test_endpoint_dry_run_and_status()
+    print("✅ Orphan cleanup tests passed")
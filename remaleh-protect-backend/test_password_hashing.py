@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Test pooled password hashing: hashing and verification in the process pool,
+the inline mode, upgrading outdated hashes at sign-in, refusing calls with
+503 when the pool is saturated or slow, and recovery from a dead or stuck
+pool process.
+"""
+
+import os
+import signal
+
+import pytest
+from werkzeug.security import generate_password_hash
+
+from testsupport import PASSWORD, app, make_user
+from models import db, User
+from monitoring import PASSWORD_HASH_CALLS
+import passwords
+
+
+def _user(password_hash=None):
+    with app.app_context():
+        user = make_user('hash', first_name='Hash')
+        if password_hash:
+            user.password_hash = password_hash
+        db.session.commit()
+        return user.email
+
+
+def _login(email, password=PASSWORD):
+    return app.test_client().post('/api/auth/login', json={'email': email, 'password': password})
+
+
+def _stored_hash(email):
+    with app.app_context():
+        return User.query.filter_by(email=email).one().password_hash
+
+
+def _calls(op, outcome):
+    return PASSWORD_HASH_CALLS.labels(op=op, outcome=outcome)._value.get()
+
+
+def test_hash_and_verify_in_pool():
+    with app.app_context():
+        before = _calls('hash', 'ok')
+        stored = passwords.hash_password(PASSWORD)
+        assert stored.startswith('pbkdf2:sha256:600000$')
+        assert passwords.verify_password(stored, PASSWORD)
+        assert not passwords.verify_password(stored, 'wrong')
+        assert not passwords.verify_password(None, PASSWORD)
+        assert _calls('hash', 'ok') == before + 1
+    assert passwords._pool is not None and passwords._pool_pid == os.getpid()
+
+
+def test_inline_mode():
+    app.config['PASSWORD_HASH_WORKERS'] = 0
+    try:
+        with app.app_context():
+            before = _calls('verify', 'inline')
+            assert passwords.verify_password(passwords.hash_password(PASSWORD), PASSWORD)
+            assert _calls('verify', 'inline') == before + 1
+    finally:
+        app.config['PASSWORD_HASH_WORKERS'] = 1
+
+
+def test_outdated_hash_is_upgraded_at_login():
+    email = _user(generate_password_hash(PASSWORD, 'pbkdf2:sha256:1000'))
+    with app.app_context():
+        assert passwords.needs_rehash(_stored_hash(email))
+    assert _login(email, 'wrong').status_code == 401
+    assert _stored_hash(email).startswith('pbkdf2:sha256:1000$')
+
+    assert _login(email).status_code == 200
+    upgraded = _stored_hash(email)
+    assert upgraded.startswith('pbkdf2:sha256:600000$')
+    with app.app_context():
+        assert not passwords.needs_rehash(upgraded)
+    # The upgraded hash is used from then on
+    assert _login(email).status_code == 200
+    assert _stored_hash(email) == upgraded
+
+
+def test_policy_change_applies_to_existing_hashes():
+    email = _user()
+    app.config['PASSWORD_HASH_METHOD'] = 'pbkdf2:sha256:300000'
+    try:
+        assert _login(email).status_code == 200
+        assert _stored_hash(email).startswith('pbkdf2:sha256:300000$')
+    finally:
+        app.config['PASSWORD_HASH_METHOD'] = 'pbkdf2:sha256:600000'
+
+
+def test_saturated_pool_answers_503():
+    email = _user()
+    app.config['PASSWORD_HASH_MAX_PENDING'] = 0
+    try:
+        response = _login(email)
+        assert response.status_code == 503
+        assert response.headers['Retry-After'] == '1'
+        assert response.get_json()['retry_after'] == 1
+    finally:
+        app.config['PASSWORD_HASH_MAX_PENDING'] = 32
+    assert _login(email).status_code == 200
+
+
+def test_slow_hashing_times_out_with_503():
+    email = _user()
+    before = _calls('verify', 'timeout')
+    app.config['PASSWORD_HASH_TIMEOUT_SECONDS'] = 0.01
+    try:
+        assert _login(email).status_code == 503
+    finally:
+        app.config['PASSWORD_HASH_TIMEOUT_SECONDS'] = 10
+    assert _calls('verify', 'timeout') == before + 1
+    assert passwords._pending == 0
+
+
+def test_pool_recovers_after_a_worker_dies():
+    with app.app_context():
+        stored = passwords.hash_password(PASSWORD)
+        pool = passwords._pool
+        for pid in list(pool._processes):
+            os.kill(pid, signal.SIGKILL)
+        assert passwords.verify_password(stored, PASSWORD)
+        assert passwords._pool is not pool
+
+
+def test_stuck_pool_is_replaced_after_a_timeout():
+    with app.app_context():
+        passwords.warm_pool()
+        pool = passwords._pool
+        processes = list(pool._processes.values())
+        assert processes
+        # Stand-in for a child deadlocked on a lock copied by the fork
+        for process in processes:
+            os.kill(process.pid, signal.SIGSTOP)
+        app.config['PASSWORD_HASH_TIMEOUT_SECONDS'] = 0.5
+        try:
+            with pytest.raises(passwords.PasswordHashUnavailable):
+                passwords.hash_password(PASSWORD)
+        finally:
+            app.config['PASSWORD_HASH_TIMEOUT_SECONDS'] = 10
+        assert passwords._pool is not pool
+        for process in processes:
+            process.join(5)
+            assert not process.is_alive()
+        # The next call gets a working pool instead of timing out too
+        assert passwords.verify_password(passwords.hash_password(PASSWORD), PASSWORD)
+
+
+@pytest.fixture(scope='module', autouse=True)
+def _stop_pool():
+    yield
+    passwords.shutdown_pool()
+
+
+if __name__ == "__main__":
+    print("🧪 Testing password hashing...")
+    test_hash_and_verify_in_pool()
+    test_inline_mode()
+    test_outdated_hash_is_upgraded_at_login()
+    test_policy_change_applies_to_existing_hashes()
+    test_saturated_pool_answers_503()
+    test_slow_hashing_times_out_with_503()
+    test_pool_recovers_after_a_worker_dies()
+    test_stuck_pool_is_replaced_after_a_timeout()
+    passwords.shutdown_pool()
+    print("✅ Password hashing tests passed")
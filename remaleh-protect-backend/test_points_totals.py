@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Test the maintained points totals against the user_point_logs they summarise.
+
+Runs in-process against a throwaway SQLite database.
+"""
+
+import uuid
+from datetime import datetime, timedelta
+
+from testsupport import app, make_user
+from models import db, User, CommunityReport, UserPointLog, UserPointTotal
+from auth import create_tokens
+import points
+
+
+def _user():
+    return make_user('points', first_name='Point', last_name='Tester')
+
+
+def _report(user):
+    r = CommunityReport(user_id=user.id, threat_type='phishing', description='points test', status='APPROVED')
+    db.session.add(r)
+    db.session.flush()
+    return r
+
+
+def test_award_updates_totals_and_enforces_daily_cap():
+    with app.app_context():
+        user = _user()
+        report = _report(user)
+        assert points.award_points_with_daily_cap(user.id, 100, 'test', report_id=report.id) == 100
+        assert points.award_points_with_daily_cap(user.id, 50, 'test', report_id=report.id) == 20
+        assert points.award_points_with_daily_cap(user.id, 5, 'test', report_id=report.id) == 0
+        db.session.commit()
+
+        assert points.get_user_points(user.id) == {'all': 120, '90d': 120, 'today': 120}
+        logged = db.session.query(db.func.sum(UserPointLog.points)).filter_by(user_id=user.id).scalar()
+        assert logged == 120
+
+
+def test_revoke_report_points():
+    with app.app_context():
+        user = _user()
+        kept, removed = _report(user), _report(user)
+        points.award_points_with_daily_cap(user.id, 10, 'kept', report_id=kept.id)
+        points.award_points_with_daily_cap(user.id, 15, 'removed', report_id=removed.id)
+        db.session.commit()
+
+        assert points.revoke_report_points(removed.id) == 15
+        db.session.commit()
+        assert points.get_user_points(user.id) == {'all': 10, '90d': 10, 'today': 10}
+        assert UserPointLog.query.filter_by(report_id=removed.id).count() == 0
+
+
+def test_rebuild_reconciles_drift_and_rolling_window():
+    with app.app_context():
+        user = _user()
+        report = _report(user)
+        # An old award the totals never saw, outside the 90-day window
+        db.session.add(UserPointLog(user_id=user.id, report_id=report.id, points=40, reason='old',
+                                    created_at=datetime.utcnow() - timedelta(days=120)))
+        points.award_points_with_daily_cap(user.id, 10, 'recent', report_id=report.id)
+        db.session.commit()
+
+        summary = points.rebuild_point_totals(user_ids=[user.id], dry_run=True)
+        assert summary['mismatched_user_ids'] == [user.id]
+
+        points.rebuild_point_totals(user_ids=[user.id])
+        assert points.get_user_points(user.id) == {'all': 50, '90d': 10, 'today': 10}
+        assert points.rebuild_point_totals(user_ids=[user.id], dry_run=True)['mismatched'] == 0
+
+
+def test_leaderboard_and_my_stats_rank():
+    with app.app_context():
+        low, high = _user(), _user()
+        points.award_points_with_daily_cap(low.id, 1, 'low')
+        points.award_points_with_daily_cap(high.id, 119, 'high')
+        db.session.commit()
+        expected_high_rank = UserPointTotal.query.filter(UserPointTotal.points_90d > 119).count() + 1
+        token, _ = create_tokens(high.id)
+
+    client = app.test_client()
+    headers = {'Authorization': f'Bearer {token}'}
+    stats = client.get('/api/community/my-stats', headers=headers).get_json()
+    assert stats['points'] == 119
+    assert stats['rank'] == expected_high_rank
+
+    board = client.get('/api/community/leaderboard?period=all', headers=headers).get_json()['leaderboard']
+    assert [row['points'] for row in board] == sorted((row['points'] for row in board), reverse=True)
+
+
+def test_rolling_windows_leaves_the_callers_session_alone():
+    with app.app_context():
+        user = _user()
+        points.award_points_with_daily_cap(user.id, 30, 'stale')
+        total = db.session.get(UserPointTotal, user.id)
+        total.points_today, total.rolled_on = 99, datetime.utcnow().date() - timedelta(days=1)
+        db.session.commit()
+        user_id = user.id
+
+    with app.app_context():
+        points._last_rolled_on = None
+        unsaved = User(email=f"points-{uuid.uuid4().hex[:8]}@example.com", first_name='Unsaved', password_hash='x')
+        db.session.add(unsaved)
+        points.top_users('90d', 5)
+        # The roll committed on its own connection, not the request's pending changes
+        db.session.rollback()
+        assert User.query.filter_by(email=unsaved.email).count() == 0
+        total = db.session.get(UserPointTotal, user_id)
+        assert (total.points_today, total.rolled_on) == (30, datetime.utcnow().date())
+
+
+if __name__ == "__main__":
+    print("🧪 Testing points totals...")
+    test_award_updates_totals_and_enforces_daily_cap()
+    test_revoke_report_points()
+    test_rebuild_reconciles_drift_and_rolling_window()
+    test_leaderboard_and_my_stats_rank()
+    test_rolling_windows_leaves_the_callers_session_alone()
+    print("✅ Points totals tests passed")
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Test request principal resolution: the token is decoded and the user loaded
+at most once per request (also with stacked decorators), writes through the
+principal persist, and role/status changes invalidate the cached snapshot.
+
+The cross-request cache cases use REDIS_URL (default database 15) and are
+skipped when Redis is unreachable.
+"""
+
+import os
+
+import pytest
+
+os.environ.setdefault('REDIS_URL', 'redis://localhost:6379/15')
+
+from testsupport import app, count_queries, make_user
+from models import db, User
+from cache import cache
+import auth
+
+
+def _user(**fields):
+    with app.app_context():
+        user = make_user('principal', first_name='Principal', **fields)
+        db.session.commit()
+        token, _ = auth.create_tokens(user.id)
+        return user.id, token
+
+
+def _request(method, path, token, **kwargs):
+    """(response, statements that read the users table)"""
+    with count_queries() as statements:
+        response = app.test_client().open(path, method=method, headers={'Authorization': f'Bearer {token}'}, **kwargs)
+    return response, [s for s in statements if s.lstrip().upper().startswith('SELECT') and 'FROM users' in s]
+
+
+def _require_redis():
+    if cache.redis_client is None:
+        pytest.skip('Redis not reachable')
+
+
+def test_token_is_decoded_once_per_request():
+    user_id, token = _user()
+    decodes = []
+    original = auth.jwt.decode
+
+    def counting_decode(*args, **kwargs):
+        decodes.append(1)
+        return original(*args, **kwargs)
+
+    auth.jwt.decode = counting_decode
+    try:
+        with app.test_request_context(headers={'Authorization': f'Bearer {token}'}):
+            first = auth.current_principal()
+            assert auth.current_principal() is first
+            assert auth.get_current_user_id() == user_id
+    finally:
+        auth.jwt.decode = original
+    assert len(decodes) == 1
+    assert first.id == user_id and first.first_name == 'Principal'
+
+
+def test_stacked_admin_decorators_load_the_user_once():
+    _, token = _user(role='ADMIN', is_admin=True)
+    response, statements = _request('GET', '/api/admin/users/deleted', token)
+    assert response.status_code == 200, response.get_data(as_text=True)
+    assert len([s for s in statements if 'users.id = ' in s]) <= 1
+
+
+def test_errors_are_unchanged():
+    assert _request('GET', '/api/auth/profile', 'not-a-jwt')[0].get_json() == {'message': 'Invalid token'}
+    response = app.test_client().get('/api/auth/profile')
+    assert response.status_code == 401 and response.get_json() == {'message': 'Token is missing'}
+    user_id, token = _user()
+    with app.app_context():
+        db.session.delete(db.session.get(User, user_id))
+        db.session.commit()
+    response, _ = _request('GET', '/api/auth/profile', token)
+    assert response.status_code == 401 and response.get_json() == {'message': 'Invalid token'}
+
+
+def test_writes_through_the_principal_persist():
+    user_id, token = _user()
+    response, _ = _request('PUT', '/api/auth/profile', token, json={'first_name': 'Renamed', 'bio': 'hi'})
+    assert response.status_code == 200, response.get_data(as_text=True)
+    assert response.get_json()['user']['first_name'] == 'Renamed'
+    with app.app_context():
+        user = db.session.get(User, user_id)
+        assert (user.first_name, user.bio) == ('Renamed', 'hi')
+
+
+def test_snapshot_changes_invalidate_on_commit_only():
+    user_id, _ = _user()
+    invalidated = []
+    original = auth.invalidate_principal
+    auth.invalidate_principal = invalidated.append
+    try:
+        with app.app_context():
+            user = db.session.get(User, user_id)
+            user.bio = 'not part of the snapshot'
+            db.session.commit()
+            assert invalidated == []
+
+            user.role = 'MODERATOR'
+            db.session.flush()
+            db.session.rollback()
+            assert invalidated == []
+
+            user = db.session.get(User, user_id)
+            user.account_status = 'SUSPENDED'
+            db.session.commit()
+            assert invalidated == [user_id]
+
+            db.session.delete(user)
+            db.session.commit()
+            assert invalidated == [user_id, user_id]
+    finally:
+        auth.invalidate_principal = original
+
+
+def test_cached_principal_skips_the_user_query():
+    _require_redis()
+    _, token = _user(role='ADMIN', is_admin=True)
+    _request('GET', '/api/admin/users/deleted', token)
+    response, statements = _request('GET', '/api/admin/users/deleted', token)
+    assert response.status_code == 200
+    assert not [s for s in statements if 'users.id = ' in s]
+
+
+def test_demoted_admin_loses_access_immediately():
+    _require_redis()
+    admin_id, admin_token = _user(role='ADMIN', is_admin=True)
+    other_id, other_token = _user(role='ADMIN', is_admin=True)
+    assert _request('GET', '/api/admin/users/deleted', other_token)[0].status_code == 200
+    response, _ = _request('PUT', f'/api/admin/users/{other_id}/role', admin_token, json={'role': 'USER'})
+    assert response.status_code == 200, response.get_data(as_text=True)
+    assert _request('GET', '/api/admin/users/deleted', other_token)[0].status_code == 403
+
+
+if __name__ == "__main__":
+    print("🧪 Testing principal resolution...")
+    test_token_is_decoded_once_per_request()
+    test_stacked_admin_decorators_load_the_user_once()
+    test_errors_are_unchanged()
+    test_writes_through_the_principal_persist()
+    test_snapshot_changes_invalidate_on_commit_only()
+    print("✅ Principal resolution tests passed")
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Test user scan tiering: old scans move to the compressed archive, expired
+archived scans are purged, and history endpoints read both tiers.
+"""
+
+import zlib
+from datetime import datetime, timedelta
+
+from testsupport import app, make_user
+from models import db, UserScan, UserScanArchive
+from auth import create_tokens
+from scan_retention import run_scan_retention, user_scan_history, delete_user_scans
+
+# Days ago for each seeded scan: 3 hot, 3 to archive, 2 past retention
+SCAN_AGES = [1, 5, 30, 120, 200, 300, 400, 500]
+
+
+def _seed():
+    now = datetime.utcnow()
+    with app.app_context():
+        user = make_user('scans', first_name='Scan', last_name='User')
+        for days in SCAN_AGES:
+            db.session.add(UserScan(
+                user_id=user.id,
+                message=f"Scan from {days} days ago " + 'x' * 2000,
+                risk_level='SUSPICIOUS',
+                risk_score=50,
+                threat_type='EMAIL_FORWARD',
+                analysis_result={
+                    'risk_level': 'SUSPICIOUS',
+                    'indicators': [f"indicator-{days}"],
+                    'debug_info': {'subject': f"Subject {days}", 'preview': 'Hello', 'tokens': ['t'] * 500},
+                },
+                scanned_at=now - timedelta(days=days),
+            ))
+        db.session.commit()
+        token, _ = create_tokens(user.id)
+        return user.id, token
+
+
+def test_old_scans_move_to_archive_and_expire():
+    user_id, _ = _seed()
+    with app.app_context():
+        summary = run_scan_retention(batch_size=2)
+        assert summary['archived'] >= 5 and summary['purged'] >= 2
+
+        hot = UserScan.query.filter_by(user_id=user_id).all()
+        cold = UserScanArchive.query.filter_by(user_id=user_id).order_by(UserScanArchive.scanned_at.desc()).all()
+        assert len(hot) == 3
+        assert len(cold) == 3
+        oldest = cold[-1]
+        assert oldest.message.startswith('Scan from 300 days ago')
+        assert oldest.analysis_result['indicators'] == ['indicator-300']
+        # debug_info is cut down to what the history views show
+        assert oldest.analysis_result['debug_info'] == {'subject': 'Subject 300', 'preview': 'Hello'}
+        assert len(oldest.payload) < len(zlib.decompress(oldest.payload)) / 4
+
+        # Nothing left to do on a second pass
+        assert run_scan_retention() == {'archived': 0, 'purged': 0}
+
+
+def test_history_reads_both_tiers():
+    user_id, token = _seed()
+    with app.app_context():
+        run_scan_retention()
+        history = user_scan_history(user_id, limit=10)
+        assert [s.scanned_at for s in history] == sorted((s.scanned_at for s in history), reverse=True)
+        assert len(history) == 6
+        # A hot-only page never touches the archive
+        assert all(isinstance(s, UserScan) for s in user_scan_history(user_id, limit=3))
+
+    client = app.test_client()
+    headers = {'Authorization': f'Bearer {token}'}
+    response = client.get('/api/enhanced-scam/recent-scans?limit=10', headers=headers)
+    assert response.status_code == 200, response.get_data(as_text=True)
+    items = response.get_json()['items']
+    assert [i['subject'] for i in items] == [f"Subject {d}" for d in (1, 5, 30, 120, 200, 300)]
+    assert items[-1]['indicators'] == ['indicator-300']
+
+    response = client.get('/api/auth/profile/activity', headers=headers)
+    assert response.status_code == 200, response.get_data(as_text=True)
+    scans = response.get_json()['recent_scans']
+    assert len(scans) == 6
+    assert scans[-1]['message'].startswith('Scan from 300 days ago')
+
+
+def test_delete_user_scans_clears_both_tiers():
+    user_id, _ = _seed()
+    with app.app_context():
+        run_scan_retention()
+        delete_user_scans(user_id)
+        db.session.commit()
+        assert user_scan_history(user_id, limit=10) == []
+
+
+if __name__ == "__main__":
+    print("🧪 Testing scan retention...")
+    test_old_scans_move_to_archive_and_expire()
+    test_history_reads_both_tiers()
+    test_delete_user_scans_clears_both_tiers()
+    print("✅ Scan retention tests passed")
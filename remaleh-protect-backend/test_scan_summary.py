@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Test precomputed scan summaries: written at insert, read by the recent-scans
+listing without loading message/analysis_result, and backfilled for old rows.
+"""
+
+from datetime import datetime, timedelta
+
+from testsupport import app, count_queries, make_user
+from models import db, UserScan, UserScanArchive
+from auth import create_tokens
+from scan_retention import archive_scans
+from scan_summary import backfill_scan_summaries, RECOMMENDATIONS
+
+
+def _analysis(n):
+    return {
+        'risk_level': 'SCAM',
+        'indicators': [f"Suspicious phone number {n}", 'Urgency', 'Prize', 'Extra'],
+        'patterns': ['url_shortener', 'suspicious_domain'],
+        'debug_info': {'subject': f"You won {n}", 'preview': 'Claim now', 'attachments': 1},
+    }
+
+
+def _seed(count=3, days_ago=0):
+    now = datetime.utcnow()
+    with app.app_context():
+        user = make_user('summary', first_name='Sum', last_name='Mary')
+        for n in range(count):
+            db.session.add(UserScan(user_id=user.id, message='x' * 5000, risk_level='SCAM', risk_score=90,
+                                    threat_type='EMAIL_FORWARD', analysis_result=_analysis(n),
+                                    scanned_at=now - timedelta(days=days_ago, minutes=n)))
+        db.session.commit()
+        token, _ = create_tokens(user.id)
+        return user.id, token
+
+
+def _recent(token, **params):
+    with count_queries() as statements:
+        response = app.test_client().get('/api/enhanced-scam/recent-scans',
+                                         headers={'Authorization': f'Bearer {token}'}, query_string=params)
+    assert response.status_code == 200, response.get_data(as_text=True)
+    return response.get_json()['items'], [s for s in statements if 'user_scans' in s]
+
+
+EXPECTED_RECOMMENDATIONS = [RECOMMENDATIONS[c] for c in ('no_reply', 'block_sender', 'report_delete', 'check_urls')]
+
+
+def test_summary_written_at_insert():
+    user_id, _ = _seed(count=1)
+    with app.app_context():
+        scan = UserScan.query.filter_by(user_id=user_id).one()
+        assert scan.summary_subject == 'You won 0'
+        assert scan.summary_indicators == ['Suspicious phone number 0', 'Urgency', 'Prize']
+        assert scan.recommendation_codes == 'no_reply,block_sender,report_delete,check_urls'
+
+
+def test_listing_reads_only_summary_columns():
+    _, token = _seed()
+    items, statements = _recent(token)
+    assert [i['subject'] for i in items] == ['You won 0', 'You won 1', 'You won 2']
+    assert items[0]['preview'] == 'Claim now' and items[0]['attachments'] == 1
+    assert items[0]['indicators'] == ['Suspicious phone number 0', 'Urgency', 'Prize']
+    assert items[0]['recommendations'] == EXPECTED_RECOMMENDATIONS
+    # Hot tier, then the archive for the rest of the page
+    assert len(statements) == 2
+    assert not any(col in s for s in statements for col in ('analysis_result', 'message', 'payload'))
+
+
+def test_unsummarized_rows_fall_back_then_backfill():
+    user_id, token = _seed()
+    with app.app_context():
+        db.session.execute(UserScan.__table__.update().where(UserScan.user_id == user_id)
+                           .values(summary_subject=None, summary_indicators=None, recommendation_codes=None))
+        db.session.commit()
+    items, statements = _recent(token)
+    assert items[1]['subject'] == 'You won 1'
+    assert items[1]['recommendations'] == EXPECTED_RECOMMENDATIONS
+    assert len(statements) == 3  # both tiers + one batch load of the unsummarized rows
+
+    with app.app_context():
+        assert backfill_scan_summaries(batch_size=2) >= 3
+        assert UserScan.query.filter_by(user_id=user_id, recommendation_codes=None).count() == 0
+    backfilled, statements = _recent(token)
+    assert backfilled == items and len(statements) == 2
+
+
+def test_archived_scans_keep_their_summary():
+    user_id, token = _seed(days_ago=200)
+    with app.app_context():
+        archive_scans()
+        assert UserScanArchive.query.filter_by(user_id=user_id).count() == 3
+        assert all(s.summary_subject for s in UserScanArchive.query.filter_by(user_id=user_id))
+    items, statements = _recent(token)
+    assert [i['subject'] for i in items] == ['You won 0', 'You won 1', 'You won 2']
+    assert not any('payload' in s for s in statements)
+
+
+if __name__ == "__main__":
+    print("🧪 Testing scan summaries...")
+    test_summary_written_at_insert()
+    test_listing_reads_only_summary_columns()
+    test_unsummarized_rows_fall_back_then_backfill()
+    test_archived_scans_keep_their_summary()
+    print("✅ Scan summary tests passed")
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Test the stats service behind /admin/stats, /community/stats and /community/my-stats.
+
+Runs in-process against a throwaway SQLite database. The incremental-update
+case uses REDIS_URL (default database 15) and is skipped when Redis is
+unreachable.
+"""
+
+import os
+import sys
+
+import pytest
+
+os.environ.setdefault('REDIS_URL', 'redis://localhost:6379/15')
+
+from testsupport import app, count_queries, make_user
+from models import db, User, CommunityReport
+from auth import create_tokens
+from cache import cache
+import stats
+
+
+def _user(role='USER'):
+    return make_user('stats', first_name='Stat', last_name='Tester', role=role, is_admin=role == 'ADMIN')
+
+
+def _expected_report_status(user_id=None):
+    query = db.session.query(CommunityReport.status, db.func.count(CommunityReport.id))
+    if user_id is not None:
+        query = query.filter(CommunityReport.user_id == user_id)
+    return {s: n for s, n in query.group_by(CommunityReport.status).all() if s in stats.REPORT_STATUSES}
+
+
+def _clear_snapshots():
+    if cache.redis_client is not None:
+        cache.clear_pattern('stats:*')
+
+
+def test_counts_match_group_by_queries():
+    with app.app_context():
+        user = _user()
+        for status in ('PENDING', 'APPROVED', 'APPROVED', 'REJECTED'):
+            db.session.add(CommunityReport(user_id=user.id, threat_type='phishing', description='stats', status=status))
+        db.session.commit()
+        _clear_snapshots()
+
+        reports = stats.report_counts()
+        assert reports['total'] == CommunityReport.query.count()
+        assert {k: n for k, n in reports['status'].items() if n} == _expected_report_status()
+
+        mine = stats.user_report_counts(user.id)
+        assert mine['total'] == 4
+        assert mine['status']['APPROVED'] == 2 and mine['status']['VERIFIED'] == 0
+
+        users = stats.user_counts()
+        assert users['total'] == User.query.count()
+        assert users['status']['ACTIVE'] == User.query.filter_by(account_status='ACTIVE').count()
+
+
+def test_endpoints_issue_one_count_query_per_table():
+    with app.app_context():
+        admin = _user(role='ADMIN')
+        db.session.add(CommunityReport(user_id=admin.id, threat_type='sms', description='stats'))
+        db.session.commit()
+        token, _ = create_tokens(admin.id)
+        _clear_snapshots()
+
+    client = app.test_client()
+    headers = {'Authorization': f'Bearer {token}'}
+    with count_queries() as statements:
+        assert client.get('/api/admin/stats', headers=headers).status_code == 200
+        assert client.get('/api/community/my-stats', headers=headers).status_code == 200
+
+    counts = [s for s in statements if 'count(' in s.lower()]
+    # users + reports for /admin/stats, the user's own reports (and rank) for /my-stats
+    assert len([s for s in counts if 'FROM users' in s and 'community_reports' not in s]) <= 2
+    assert len([s for s in counts if 'FROM community_reports' in s]) == 2
+
+
+def test_incremental_updates_after_commit():
+    if cache.redis_client is None:
+        pytest.skip('Redis not reachable')
+    with app.app_context():
+        user = _user()
+        db.session.commit()
+        _clear_snapshots()
+        before = stats.report_counts()
+        assert stats.user_report_counts(user.id)['total'] == 0
+
+        report = CommunityReport(user_id=user.id, threat_type='phishing', description='stats')
+        db.session.add(report)
+        db.session.rollback()
+        assert stats.report_counts()['total'] == before['total']
+
+        report = CommunityReport(user_id=user.id, threat_type='phishing', description='stats', urgency='HIGH')
+        db.session.add(report)
+        db.session.commit()
+        after = stats.report_counts()
+        assert after['total'] == before['total'] + 1
+        assert after['urgency']['HIGH'] == before['urgency']['HIGH'] + 1
+
+        report.status = 'APPROVED'
+        db.session.commit()
+        mine = stats.user_report_counts(user.id)
+        assert mine['status'] == {**{s: 0 for s in stats.REPORT_STATUSES}, 'APPROVED': 1}
+
+        db.session.delete(report)
+        db.session.commit()
+        assert stats.user_report_counts(user.id)['total'] == 0
+        assert stats.report_counts()['total'] == before['total']
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, '-q']))
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Test refresh-token rotation and revocation: a refresh token works once,
+presenting a rotated one revokes its family, logout and password changes
+revoke sessions, and revocations made by other processes are picked up by
+the periodic sync.
+
+The Redis case uses REDIS_URL (default database 15) and is skipped when
+Redis is unreachable; the rest sync through the database.
+"""
+
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import jwt
+import pytest
+
+os.environ.setdefault('REDIS_URL', 'redis://localhost:6379/15')
+
+from sqlalchemy import update
+
+from testsupport import PASSWORD, app, make_user
+from models import db, User, TokenFamily
+from cache import cache
+import token_store
+
+
+def _user():
+    with app.app_context():
+        user = make_user('tokens', first_name='Tokens')
+        db.session.commit()
+        return user.email
+
+
+def _login(email, password=PASSWORD):
+    response = app.test_client().post('/api/auth/login', json={'email': email, 'password': password})
+    assert response.status_code == 200, response.get_data(as_text=True)
+    data = response.get_json()
+    return data['access_token'], data['refresh_token']
+
+
+def _refresh(refresh_token):
+    return app.test_client().post('/api/auth/refresh', json={'refresh_token': refresh_token})
+
+
+def _profile(access_token):
+    return app.test_client().get('/api/auth/profile', headers={'Authorization': f'Bearer {access_token}'})
+
+
+def _claims(token):
+    return jwt.decode(token, options={'verify_signature': False})
+
+
+def test_refresh_token_rotates_and_reuse_revokes_the_family():
+    access, refresh = _login(_user())
+    response = _refresh(refresh)
+    assert response.status_code == 200
+    new_access, new_refresh = response.get_json()['access_token'], response.get_json()['refresh_token']
+    assert _claims(new_refresh)['fid'] == _claims(refresh)['fid']
+    assert _claims(new_refresh)['jti'] != _claims(refresh)['jti']
+    assert _profile(new_access).status_code == 200
+
+    # The spent token is presented again: someone else holds a copy
+    response = _refresh(refresh)
+    assert response.status_code == 401
+    assert response.get_json()['error'] == 'Refresh token reuse detected'
+    # Every token of the family stops working, including the legitimate latest ones
+    assert _refresh(new_refresh).get_json()['error'] == 'Refresh token has been revoked'
+    assert _profile(new_access).status_code == 401
+    assert _profile(access).get_json()['message'] == 'Token has been revoked'
+    with app.app_context():
+        assert db.session.get(TokenFamily, _claims(refresh)['fid']).revoked_reason == 'reuse'
+
+
+def test_concurrent_refreshes_with_one_token_succeed_once():
+    _, refresh = _login(_user())
+    with ThreadPoolExecutor(4) as pool:
+        statuses = sorted(response.status_code for response in pool.map(_refresh, [refresh] * 4))
+    assert statuses == [200, 401, 401, 401]
+
+
+def test_logout_revokes_only_this_session():
+    email = _user()
+    access, refresh = _login(email)
+    other_access, other_refresh = _login(email)
+    response = app.test_client().post('/api/auth/logout', headers={'Authorization': f'Bearer {access}'})
+    assert response.status_code == 200
+    assert _profile(access).status_code == 401
+    assert _refresh(refresh).status_code == 401
+    assert _profile(other_access).status_code == 200
+    assert _refresh(other_refresh).status_code == 200
+
+
+def test_logout_all_and_password_change():
+    email = _user()
+    sessions = [_login(email) for _ in range(3)]
+    # A password change signs out the other devices only
+    response = app.test_client().post('/api/auth/change-password', json={
+        'current_password': PASSWORD, 'new_password': 'NewPassword456!'
+    }, headers={'Authorization': f'Bearer {sessions[0][0]}'})
+    assert response.status_code == 200
+    assert [_profile(access).status_code for access, _ in sessions] == [200, 401, 401]
+
+    response = app.test_client().post('/api/auth/logout', json={'all': True},
+                                      headers={'Authorization': f'Bearer {sessions[0][0]}'})
+    assert response.status_code == 200
+    assert _profile(sessions[0][0]).status_code == 401
+    assert _refresh(sessions[0][1]).status_code == 401
+
+
+def test_refresh_token_is_not_an_access_token():
+    _, refresh = _login(_user())
+    assert _profile(refresh).status_code == 401
+
+
+def test_token_without_family_starts_one():
+    email = _user()
+    with app.app_context():
+        user_id = User.query.filter_by(email=email).one().id
+        legacy = jwt.encode({'user_id': user_id, 'type': 'refresh', 'iat': datetime.utcnow(),
+                             'exp': datetime.utcnow() + timedelta(days=30)},
+                            app.config['SECRET_KEY'], algorithm='HS256')
+    response = _refresh(legacy)
+    assert response.status_code == 200
+    new_refresh = response.get_json()['refresh_token']
+    assert _claims(new_refresh)['fid']
+    # The legacy token is spent; replaying it is reuse and ends the family it started
+    replay = _refresh(legacy)
+    assert replay.status_code == 401
+    assert replay.get_json()['error'] == 'Refresh token reuse detected'
+    assert _refresh(new_refresh).status_code == 401
+
+
+def test_revocations_from_other_processes_are_synced():
+    access, _ = _login(_user())
+    fid = _claims(access)['fid']
+    assert _profile(access).status_code == 200
+    # Another process revokes the family: the row changes, this process's set doesn't
+    with app.app_context():
+        db.session.execute(update(TokenFamily).where(TokenFamily.id == fid)
+                           .values(revoked_at=datetime.utcnow(), revoked_reason='logout'))
+        db.session.commit()
+    # The poller picks it up within TOKEN_REVOCATION_SYNC_SECONDS
+    time.sleep(app.config['TOKEN_REVOCATION_SYNC_SECONDS'] + 0.5)
+    assert _profile(access).status_code == 401
+
+
+def test_revocations_are_shared_through_redis():
+    if cache.redis_client is None:
+        pytest.skip('Redis not reachable')
+    access, _ = _login(_user())
+    fid = _claims(access)['fid']
+    assert app.test_client().post('/api/auth/logout', headers={'Authorization': f'Bearer {access}'}).status_code == 200
+    assert cache.redis_client.zscore(token_store.REVOKED_KEY, fid) is not None
+    # A fresh process (no in-process state) loads it on its first sync
+    token_store._revoked.clear()
+    token_store._synced_until = None
+    token_store.sync_revocations()
+    assert token_store.is_revoked(fid)
+
+
+if __name__ == "__main__":
+    print("🧪 Testing refresh-token rotation...")
+    test_refresh_token_rotates_and_reuse_revokes_the_family()
+    test_concurrent_refreshes_with_one_token_succeed_once()
+    test_logout_revokes_only_this_session()
+    test_logout_all_and_password_change()
+    test_refresh_token_is_not_an_access_token()
+    test_token_without_family_starts_one()
+    test_revocations_from_other_processes_are_synced()
+    print("✅ Refresh-token rotation tests passed")
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Test the trending threat counters against a full recount of community_reports.
+
+Runs in-process against a throwaway SQLite database.
+"""
+
+import uuid
+from datetime import datetime, timedelta
+
+from testsupport import app, make_user
+from models import db, User, CommunityReport, ReportTrendBucket
+from auth import create_tokens
+from cache import cache
+import trending
+
+
+def _user():
+    return make_user('trend', first_name='Trend', last_name='Tester')
+
+
+def _report(user, threat_type, urgency='MEDIUM', created_at=None):
+    r = CommunityReport(user_id=user.id, threat_type=threat_type, description='trend test',
+                        urgency=urgency, created_at=created_at or datetime.utcnow())
+    db.session.add(r)
+    db.session.flush()
+    trending.report_created(r)
+    return r
+
+
+def _day_count(threat_type):
+    return db.session.query(db.func.sum(ReportTrendBucket.report_count)).filter(
+        ReportTrendBucket.granularity == 'day',
+        ReportTrendBucket.threat_type == threat_type
+    ).scalar() or 0
+
+
+def test_counters_follow_create_moderate_delete():
+    with app.app_context():
+        user = _user()
+        kind = f"kind-{uuid.uuid4().hex[:6]}"
+        reports = [_report(user, kind) for _ in range(3)]
+        db.session.commit()
+        assert _day_count(kind) == 3
+
+        previous = reports[0].status
+        reports[0].status = 'REJECTED'
+        trending.report_status_changed(reports[0], previous)
+        # Moving between two counted statuses changes nothing
+        previous = reports[1].status
+        reports[1].status = 'APPROVED'
+        trending.report_status_changed(reports[1], previous)
+        db.session.commit()
+        assert _day_count(kind) == 2
+
+        trending.report_deleted(reports[2])
+        db.session.delete(reports[2])
+        db.session.commit()
+        assert _day_count(kind) == 1
+
+
+def test_velocity_labels():
+    with app.app_context():
+        user = _user()
+        now = datetime.utcnow()
+        surging, falling = f"surge-{uuid.uuid4().hex[:6]}", f"fall-{uuid.uuid4().hex[:6]}"
+        for _ in range(6):
+            _report(user, surging, 'HIGH', now - timedelta(hours=1))
+        _report(user, surging, 'LOW', now - timedelta(days=9))
+        for _ in range(4):
+            _report(user, falling, 'LOW', now - timedelta(days=10))
+        _report(user, falling, 'LOW', now - timedelta(days=2))
+        db.session.commit()
+
+        rows = {r['threat_type']: r for r in trending.compute_trending(limit=1000)}
+        assert rows[surging]['trend'] == '🔥 Surging'
+        assert rows[surging]['count_7d'] == 6 and rows[surging]['count_prev_7d'] == 1
+        assert rows[surging]['count_24h'] == 6
+        assert rows[surging]['urgency_score'] == round((6 * 3 + 1) / 7, 1)
+        assert rows[falling]['trend'] == '📉 Falling'
+        assert rows[falling]['velocity'] == -0.75
+
+
+def test_endpoint_matches_full_rebuild():
+    with app.app_context():
+        # Start from a recount so reports inserted by other test modules are included
+        trending.rebuild_trend_buckets()
+        user = _user()
+        for kind in ('phishing', 'sms', 'phishing'):
+            _report(user, kind, created_at=datetime.utcnow() - timedelta(days=3))
+        db.session.commit()
+        incremental = trending.compute_trending(limit=10)
+        trending.rebuild_trend_buckets()
+        assert trending.compute_trending(limit=10) == incremental
+        token, _ = create_tokens(user.id)
+
+    cache.clear_pattern(f"{trending.TRENDING_CACHE_KEY}:*")
+    response = app.test_client().get('/api/community/trending', headers={'Authorization': f'Bearer {token}'})
+    assert response.status_code == 200
+    assert response.get_json()['trending_threats'] == incremental
+
+
+def test_pruning_leaves_the_callers_session_alone():
+    expired = datetime.utcnow().replace(minute=0, second=0, microsecond=0) - trending.HOURLY_RETENTION - timedelta(hours=2)
+    with app.app_context():
+        db.session.add(ReportTrendBucket(granularity='hour', bucket_start=expired, threat_type='expired',
+                                         urgency='', report_count=1))
+        db.session.commit()
+
+    with app.app_context():
+        trending._last_pruned_hour = None
+        cache.clear_pattern(f"{trending.TRENDING_CACHE_KEY}:*")
+        unsaved = User(email=f"trend-{uuid.uuid4().hex[:8]}@example.com", first_name='Unsaved')
+        unsaved.password_hash = 'x'
+        db.session.add(unsaved)
+        trending.get_trending(limit=10)
+        # The prune committed on its own connection, not the request's pending changes
+        db.session.rollback()
+        assert User.query.filter_by(email=unsaved.email).count() == 0
+        assert ReportTrendBucket.query.filter_by(threat_type='expired').count() == 0
+
+
+if __name__ == "__main__":
+    print("🧪 Testing trending counters...")
+    test_counters_follow_create_moderate_delete()
+    test_velocity_labels()
+    test_endpoint_matches_full_rebuild()
+    test_pruning_leaves_the_callers_session_alone()
+    print("✅ Trending counter tests passed")
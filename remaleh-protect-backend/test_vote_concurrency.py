@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Concurrency test for atomic community report voting.
+
+Many users vote on one report at the same time through the API; the final
+votes_up/votes_down/score must match the report_votes rows exactly.
+
+Runs in-process against a throwaway SQLite database. The buffered case uses
+REDIS_URL (default database 15) and is skipped when Redis is unreachable.
+"""
+
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+os.environ.setdefault('RATE_LIMIT_DEFAULT', '1000000 per minute')
+os.environ.setdefault('REDIS_URL', 'redis://localhost:6379/15')
+
+from testsupport import app, make_user
+from models import db, CommunityReport, ReportVote, VoteFlushBatch
+from auth import create_tokens
+from cache import cache
+import votes
+
+VOTERS = 24
+# Each voter's clicks, in order; clicking the same button again removes the vote
+SEQUENCES = [['up'], ['down'], ['up', 'down'], ['up', 'up'], ['down', 'up', 'down']]
+
+
+def _setup():
+    with app.app_context():
+        owner = make_user('voter-owner', password=None, first_name='Vote', last_name='Owner')
+        report = CommunityReport(user_id=owner.id, threat_type='phishing', description='vote race', status='APPROVED')
+        db.session.add(report)
+        tokens = []
+        for i in range(VOTERS):
+            u = make_user(f"voter-{i}", password=None, first_name='Voter', last_name=str(i))
+            tokens.append(create_tokens(u.id)[0])
+        db.session.commit()
+        return report.id, tokens
+
+
+def _click(token, report_id, vote_type):
+    response = app.test_client().post(f'/api/community/reports/{report_id}/vote',
+                                      headers={'Authorization': f'Bearer {token}'}, json={'vote_type': vote_type})
+    assert response.status_code == 200, response.get_data(as_text=True)
+    return response.get_json()['report']
+
+
+def _run_voters(report_id, tokens):
+    def voter(i):
+        for vote_type in SEQUENCES[i % len(SEQUENCES)]:
+            _click(tokens[i], report_id, vote_type)
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(voter, range(len(tokens))))
+
+
+def _expected(tokens):
+    final = {'up': 0, 'down': 0}
+    for i in range(len(tokens)):
+        state = None
+        for vote_type in SEQUENCES[i % len(SEQUENCES)]:
+            state = None if state == vote_type else vote_type
+        if state:
+            final[state] += 1
+    return final
+
+
+def _stored(report_id):
+    with app.app_context():
+        report = db.session.get(CommunityReport, report_id)
+        rows = {kind: ReportVote.query.filter_by(report_id=report_id, vote_type=kind).count() for kind in ('up', 'down')}
+        return (report.votes_up, report.votes_down, report.score), rows
+
+
+def test_concurrent_votes_keep_counters_exact():
+    report_id, tokens = _setup()
+    _run_voters(report_id, tokens)
+    expected = _expected(tokens)
+    (up, down, score), rows = _stored(report_id)
+    assert rows == expected
+    assert (up, down, score) == (expected['up'], expected['down'], expected['up'] - expected['down'])
+
+
+def test_duplicate_concurrent_clicks_stay_consistent():
+    report_id, tokens = _setup()
+    # The same user double-submitting races with itself; whatever wins, counters must match the rows
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(lambda t: _click(t, report_id, 'up'), [tokens[0]] * 5 + [tokens[1]] * 4))
+    (up, down, score), rows = _stored(report_id)
+    assert (up, down) == (rows['up'], rows['down']) and score == up - down
+
+
+def test_buffered_hot_report_flushes_exact_counts():
+    if cache.redis_client is None:
+        pytest.skip('Redis not reachable')
+    report_id, tokens = _setup()
+    app.config.update(VOTE_BUFFER_ENABLED=True, VOTE_BUFFER_HOT_VOTES_PER_MINUTE=0)
+    try:
+        _run_voters(report_id, tokens)
+        with app.app_context():
+            votes.flush_vote_buffer(force=True)
+    finally:
+        app.config.update(VOTE_BUFFER_ENABLED=False)
+    expected = _expected(tokens)
+    (up, down, score), rows = _stored(report_id)
+    assert rows == expected
+    assert (up, down, score) == (expected['up'], expected['down'], expected['up'] - expected['down'])
+
+
+def test_a_batch_is_applied_once_however_many_workers_flush_it():
+    if cache.redis_client is None:
+        pytest.skip('Redis not reachable')
+    client = cache.redis_client
+    report_id, _ = _setup()
+    client.delete(votes.PENDING_KEY, votes.FLUSHING_KEY)
+    with app.app_context():
+        client.hset(votes.PENDING_KEY, mapping={f"{report_id}:up": 3, f"{report_id}:down": 1})
+        assert votes.flush_vote_buffer(force=True) == 1
+
+        # A flusher that committed a batch but stalled before removing it from Redis
+        client.hset(votes.FLUSHING_KEY, mapping={f"{report_id}:up": 5, votes.BATCH_FIELD: 'stalled'})
+        db.session.add(VoteFlushBatch(id='stalled'))
+        db.session.commit()
+        client.hset(votes.PENDING_KEY, f"{report_id}:up", 2)
+        # The next flusher only clears the applied batch; the newer one is left for the flush after
+        assert votes.flush_vote_buffer(force=True) == 0
+        assert not client.exists(votes.FLUSHING_KEY)
+        assert votes.flush_vote_buffer(force=True) == 1
+    (up, down, score), _ = _stored(report_id)
+    assert (up, down, score) == (5, 1, 4)
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, '-q']))
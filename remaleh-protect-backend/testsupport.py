@@ -0,0 +1,59 @@
+"""
+Shared setup for the in-process test modules.
+
+Importing this module points the app at a throwaway SQLite database and
+in-memory rate limits (unless the environment already names others) and
+puts src/ on the path, so test modules import it before anything from src/.
+Modules with Redis cases set REDIS_URL first.
+"""
+
+import os
+import sys
+import tempfile
+import uuid
+from contextlib import contextmanager
+
+os.environ.setdefault('DATABASE_URL', f"sqlite:///{tempfile.mkdtemp(prefix='remaleh_test_')}/test.db")
+os.environ.setdefault('RATE_LIMIT_STORAGE_URL', 'memory://')
+
+# Add the src directory to the Python path
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src'))
+
+from sqlalchemy import event
+
+from main import app
+from models import db, User
+
+PASSWORD = 'Password123!'
+
+
+def make_user(prefix, password=PASSWORD, **fields):
+    """Add a user with a unique <prefix>-<hex>@example.com address and flush it (caller commits).
+
+    With password=None the hash is a placeholder, for users who never sign in.
+    """
+    user = User(email=f"{prefix}-{uuid.uuid4().hex[:8]}@example.com", **fields)
+    if password is None:
+        user.password_hash = 'x'
+    else:
+        user.set_password(password)
+    db.session.add(user)
+    db.session.flush()
+    return user
+
+
+@contextmanager
+def count_queries():
+    """Count SQL statements executed against the app's engine"""
+    statements = []
+
+    def _record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', _record)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', _record)